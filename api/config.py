@@ -37,3 +37,57 @@ DEV_USER_ID = os.getenv("DEV_USER_ID", "test-user-id")
 
 # Cron Job API 密鑰
 CRON_API_KEY = os.getenv("CRON_API_KEY", "")
+
+# 圖片處理服務配置
+IMAGE_INGESTION_QUEUE_SIZE = int(os.getenv("IMAGE_INGESTION_QUEUE_SIZE", "100"))
+IMAGE_INGESTION_WORKERS = int(os.getenv("IMAGE_INGESTION_WORKERS", "4"))
+IMAGE_INGESTION_PROCESS_WORKERS = int(os.getenv("IMAGE_INGESTION_PROCESS_WORKERS", "2"))
+IMAGE_INGESTION_IO_WORKERS = int(os.getenv("IMAGE_INGESTION_IO_WORKERS", "8"))
+IMAGE_INGESTION_MAX_RETRIES = int(os.getenv("IMAGE_INGESTION_MAX_RETRIES", "3"))
+
+# 餐廳圖片衍生圖配置（長邊像素，逗號分隔）
+IMAGE_VARIANT_SIZES = [int(size) for size in os.getenv("IMAGE_VARIANT_SIZES", "256,512,1024").split(",") if size.strip()]
+IMAGE_ENABLE_AVIF = os.getenv("IMAGE_ENABLE_AVIF", "false").lower() == "true"
+
+# 使用者上傳圖片的縮圖長邊像素
+CHAT_THUMBNAIL_SIZE = int(os.getenv("CHAT_THUMBNAIL_SIZE", "320"))
+AVATAR_THUMBNAIL_SIZE = int(os.getenv("AVATAR_THUMBNAIL_SIZE", "128"))
+
+# FCM 即時推送的執行緒數（即同時進行的 FCM 請求數上限）
+FCM_SEND_MAX_CONCURRENCY = int(os.getenv("FCM_SEND_MAX_CONCURRENCY", "8"))
+
+# 通知 outbox 配置（各通道 worker 數與每次領取筆數、輪詢秒數、最大嘗試次數、租約秒數、大量推送的 FCM 並行數）
+NOTIFICATION_OUTBOX_REALTIME_WORKERS = int(os.getenv("NOTIFICATION_OUTBOX_REALTIME_WORKERS", "2"))
+NOTIFICATION_OUTBOX_BULK_WORKERS = int(os.getenv("NOTIFICATION_OUTBOX_BULK_WORKERS", "1"))
+NOTIFICATION_OUTBOX_REALTIME_BATCH_SIZE = int(os.getenv("NOTIFICATION_OUTBOX_REALTIME_BATCH_SIZE", "20"))
+NOTIFICATION_OUTBOX_BULK_BATCH_SIZE = int(os.getenv("NOTIFICATION_OUTBOX_BULK_BATCH_SIZE", "20"))
+NOTIFICATION_OUTBOX_POLL_SECONDS = float(os.getenv("NOTIFICATION_OUTBOX_POLL_SECONDS", "2"))
+NOTIFICATION_OUTBOX_MAX_ATTEMPTS = int(os.getenv("NOTIFICATION_OUTBOX_MAX_ATTEMPTS", "5"))
+NOTIFICATION_OUTBOX_LEASE_SECONDS = int(os.getenv("NOTIFICATION_OUTBOX_LEASE_SECONDS", "120"))
+# 大量推送使用獨立的執行緒池；發送通知的執行緒總數上限為 FCM_SEND_MAX_CONCURRENCY + NOTIFICATION_OUTBOX_BULK_SEND_CONCURRENCY
+NOTIFICATION_OUTBOX_BULK_SEND_CONCURRENCY = int(os.getenv("NOTIFICATION_OUTBOX_BULK_SEND_CONCURRENCY", "4"))
+
+# 聊天推送合併窗口秒數（同一聚餐事件的新訊息在窗口內合併為一則通知，0 表示不合併）
+CHAT_PUSH_COALESCE_SECONDS = float(os.getenv("CHAT_PUSH_COALESCE_SECONDS", "10"))
+
+# 設備令牌快取配置（有效秒數、用戶數量上限）
+# App 登入/登出時直接寫入 user_device_tokens，不會通知 API 清除快取，因此有效時間需很短：
+# 只用來合併短時間內對同一批用戶的重複查詢（例如同一群組連續的聊天推送）
+DEVICE_TOKEN_CACHE_TTL_SECONDS = float(os.getenv("DEVICE_TOKEN_CACHE_TTL_SECONDS", "5"))
+DEVICE_TOKEN_CACHE_MAX_USERS = int(os.getenv("DEVICE_TOKEN_CACHE_MAX_USERS", "50000"))
+
+# 聊天成員資格快取配置（有效秒數、聚餐事件數量上限）
+CHAT_AUTH_CACHE_TTL_SECONDS = int(os.getenv("CHAT_AUTH_CACHE_TTL_SECONDS", "300"))
+CHAT_AUTH_CACHE_MAX_EVENTS = int(os.getenv("CHAT_AUTH_CACHE_MAX_EVENTS", "5000"))
+
+# R2 儲存層同時進行的請求上限（亦為執行緒池與連線池大小）
+R2_STORAGE_MAX_CONCURRENCY = int(os.getenv("R2_STORAGE_MAX_CONCURRENCY", "16"))
+
+# Presigned GET URL 快取配置（快取數量上限、可重用的秒數）
+R2_PRESIGNED_URL_CACHE_SIZE = int(os.getenv("R2_PRESIGNED_URL_CACHE_SIZE", "20000"))
+R2_PRESIGNED_URL_REUSE_SECONDS = int(os.getenv("R2_PRESIGNED_URL_REUSE_SECONDS", "1800"))
+
+# R2 存在索引配置（Bloom filter 設計容量、誤判率與 LRU 大小）
+R2_EXISTENCE_INDEX_CAPACITY = int(os.getenv("R2_EXISTENCE_INDEX_CAPACITY", "200000"))
+R2_EXISTENCE_INDEX_ERROR_RATE = float(os.getenv("R2_EXISTENCE_INDEX_ERROR_RATE", "0.01"))
+R2_EXISTENCE_INDEX_LRU_SIZE = int(os.getenv("R2_EXISTENCE_INDEX_LRU_SIZE", "5000"))
@@ -1,10 +1,16 @@
+import asyncio
 import logging
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 
-from routers import restaurant, matching, dining, schedule, user, chat, reminder
+from routers import restaurant, matching, dining, schedule, user, chat, reminder, notification
+from services.image_ingestion_service import get_image_ingestion_service
+from services.notification_outbox_service import get_notification_outbox
+from services.chat_push_service import get_chat_push_coalescer
+from utils.r2_existence_index import seed_r2_existence_index
+from utils.r2_storage import get_object_storage
 
 
 logging.basicConfig(level=logging.INFO)
@@ -24,6 +30,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 啟動與關閉背景服務
+@app.on_event("startup")
+async def start_background_services():
+    await get_image_ingestion_service().start()
+    await get_notification_outbox().start()
+    # 在背景建立 R2 存在索引，完成前圖片處理會退回向 R2 確認（保留任務參照，關閉時取消）
+    app.state.r2_seed_task = asyncio.create_task(seed_r2_existence_index())
+
+@app.on_event("shutdown")
+async def stop_background_services():
+    seed_task = getattr(app.state, "r2_seed_task", None)
+    if seed_task is not None and not seed_task.done():
+        seed_task.cancel()
+        await asyncio.gather(seed_task, return_exceptions=True)
+    await get_image_ingestion_service().stop()
+    # 先送出尚未結束的聊天通知合併窗口，再停止 outbox
+    await get_chat_push_coalescer().flush_all()
+    await get_notification_outbox().stop()
+    get_object_storage().close()
+
 # 註冊路由
 app.include_router(restaurant.router, prefix="/api/restaurant", tags=["餐廳管理"])
 app.include_router(matching.router, prefix="/api/matching", tags=["配對系統"])
@@ -32,6 +58,7 @@ app.include_router(schedule.router, prefix="/api/schedule", tags=["排程管理"
 app.include_router(user.router, prefix="/api/user", tags=["用戶管理"])
 app.include_router(chat.router, prefix="/api/chat", tags=["聊天管理"])
 app.include_router(reminder.router, prefix="/api/reminder", tags=["提醒管理"])
+app.include_router(notification.router, prefix="/api/notification", tags=["通知管理"])
 
 if __name__ == "__main__":
     uvicorn.run("main:app", host="0.0.0.0", port=8000, reload=True) 
\ No newline at end of file
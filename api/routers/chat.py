@@ -6,6 +6,11 @@ from typing import List
 from schemas.chat import (
     ChatImageUploadRequest,
     ChatImageUploadResponse,
+    ChatImageBatchUploadRequest,
+    ChatImageBatchUploadResponse,
+    ChatImageUploadItem,
+    ChatImageUploadedRequest,
+    ImageUploadedResponse,
     ChatImageUrlRequest,
     ChatImageUrlResponse,
     ChatNotifyRequest,
@@ -17,16 +22,50 @@ from schemas.chat import (
 from dependencies import get_supabase_service, get_current_user
 from utils.cloudflare import (
     generate_presigned_put_url_async,
+    generate_presigned_put_urls_batch,
     generate_presigned_get_url_async,
     generate_presigned_get_urls_batch
 )
-from services.notification_service import NotificationService
+from services.chat_push_service import get_chat_push_coalescer
+from services.image_ingestion_service import get_image_ingestion_service, ImageQueueFullError
+from services.chat_auth_service import ChatMembership, get_chat_membership
+from utils.pagination import apply_keyset, order_keyset, split_page
+from utils.thumbnails import get_thumbnail_key
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 
+def authorize_chat_access(
+    supabase: Client,
+    dining_event_id: str,
+    user_id: str,
+    forbidden_detail: str = "您不在該聚餐事件中"
+) -> ChatMembership:
+    """
+    驗證用戶是否在該聚餐事件中（成員資格有快取），返回配對組成員資格
+    
+    Raises:
+        HTTPException: 聚餐事件不存在（404）或用戶不在配對組中（403）
+    """
+    membership = get_chat_membership(supabase, dining_event_id, user_id)
+    
+    if membership is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="找不到該聚餐事件"
+        )
+    
+    if not membership.is_member(user_id):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail=forbidden_detail
+        )
+    
+    return membership
+
+
 @router.post("/image/upload-url", response_model=ChatImageUploadResponse)
 async def get_chat_image_upload_url(
     request: ChatImageUploadRequest,
@@ -46,28 +85,7 @@ async def get_chat_image_upload_url(
         user_id = current_user.user.id
         
         # 驗證用戶是否在該聚餐事件中
-        result = supabase.table('dining_events').select(
-            'id, matching_group_id'
-        ).eq('id', request.dining_event_id).execute()
-        
-        if not result.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="找不到該聚餐事件"
-            )
-        
-        matching_group_id = result.data[0]['matching_group_id']
-        
-        # 檢查用戶是否在該配對組中
-        member_check = supabase.table('user_matching_info').select('user_id').eq(
-            'matching_group_id', matching_group_id
-        ).eq('user_id', user_id).execute()
-        
-        if not member_check.data:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="您不在該聚餐事件中"
-            )
+        authorize_chat_access(supabase, request.dining_event_id, user_id)
         
         # 生成圖片路徑
         image_path = f"chat_images/{request.dining_event_id}/{request.message_id}.webp"
@@ -105,6 +123,126 @@ async def get_chat_image_upload_url(
         )
 
 
+@router.post("/image/upload-urls", response_model=ChatImageBatchUploadResponse)
+async def get_chat_image_upload_urls(
+    request: ChatImageBatchUploadRequest,
+    supabase: Client = Depends(get_supabase_service),
+    current_user=Depends(get_current_user)
+):
+    """
+    批量獲取聊天圖片上傳的 Presigned PUT URLs（一次傳送多張圖片）
+    
+    流程：
+    1. 驗證用戶是否在該聚餐事件中（整批只驗證一次）
+    2. 生成圖片路徑：chat_images/{dining_event_id}/{message_id}.webp
+    3. 一次簽章所有 Presigned PUT URL
+    4. 依請求順序返回 URL 和路徑供前端上傳
+    """
+    try:
+        user_id = current_user.user.id
+        
+        # 驗證用戶是否在該聚餐事件中
+        authorize_chat_access(supabase, request.dining_event_id, user_id)
+        
+        # 生成圖片路徑（重複的訊息 ID 只保留一次）
+        message_ids = list(dict.fromkeys(request.message_ids))
+        image_paths = {
+            message_id: f"chat_images/{request.dining_event_id}/{message_id}.webp"
+            for message_id in message_ids
+        }
+        
+        logger.info(f"用戶 {user_id} 準備上傳 {len(image_paths)} 張聊天圖片")
+        
+        # 一次生成所有 Presigned PUT URL（有效期 1 小時）
+        url_map = await generate_presigned_put_urls_batch(
+            file_keys=list(image_paths.values()),
+            expiration=3600,
+            content_type="image/webp"
+        )
+        
+        if not all(url_map.values()):
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="無法生成上傳 URL"
+            )
+        
+        logger.info(f"已為用戶 {user_id} 生成 {len(url_map)} 個聊天圖片上傳 URL")
+        
+        return ChatImageBatchUploadResponse(
+            uploads=[
+                ChatImageUploadItem(
+                    message_id=message_id,
+                    upload_url=url_map[image_path],
+                    image_path=image_path
+                )
+                for message_id, image_path in image_paths.items()
+            ],
+            expires_in=3600
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"批量獲取聊天圖片上傳 URL 時發生錯誤: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="獲取上傳 URL 時發生錯誤"
+        )
+
+
+@router.post("/image/uploaded", response_model=ImageUploadedResponse)
+async def notify_chat_image_uploaded(
+    request: ChatImageUploadedRequest,
+    supabase: Client = Depends(get_supabase_service),
+    current_user=Depends(get_current_user)
+):
+    """
+    聊天圖片上傳完成通知，於背景產生縮圖
+    
+    流程：
+    1. 驗證用戶是否在該聚餐事件中
+    2. 提交縮圖任務：讀取原圖，寫入 chat_images/{dining_event_id}/{message_id}_thumb.webp
+    3. 縮圖完成後寫回 chat_messages.thumbnail_path（訊息尚未寫入時會稍後重試）
+    """
+    try:
+        user_id = current_user.user.id
+        
+        # 驗證用戶是否在該聚餐事件中
+        authorize_chat_access(supabase, request.dining_event_id, user_id)
+        
+        image_path = f"chat_images/{request.dining_event_id}/{request.message_id}.webp"
+        
+        task_id = None
+        try:
+            task_id = get_image_ingestion_service().submit(
+                "chat_thumbnail",
+                {
+                    "dining_event_id": request.dining_event_id,
+                    "image_path": image_path,
+                    "supabase": supabase
+                },
+                dedup_key=f"chat_thumbnail:{image_path}"
+            )
+            logger.info(f"用戶 {user_id} 已上傳聊天圖片，提交縮圖任務: {task_id}")
+        except ImageQueueFullError as e:
+            # 沒有縮圖時批次 API 會退回原圖
+            logger.warning(f"{str(e)}，略過聊天圖片 {image_path} 的縮圖")
+        
+        return ImageUploadedResponse(
+            task_id=task_id,
+            thumbnail_path=get_thumbnail_key(image_path)
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"處理聊天圖片上傳通知時發生錯誤: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="處理上傳通知時發生錯誤"
+        )
+
+
 @router.post("/image/url", response_model=ChatImageUrlResponse)
 async def get_chat_image_url(
     request: ChatImageUrlRequest,
@@ -135,28 +273,7 @@ async def get_chat_image_url(
         dining_event_id = path_parts[1]
         
         # 驗證用戶是否在該聚餐事件中
-        result = supabase.table('dining_events').select(
-            'id, matching_group_id'
-        ).eq('id', dining_event_id).execute()
-        
-        if not result.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="找不到該聚餐事件"
-            )
-        
-        matching_group_id = result.data[0]['matching_group_id']
-        
-        # 檢查用戶是否在該配對組中
-        member_check = supabase.table('user_matching_info').select('user_id').eq(
-            'matching_group_id', matching_group_id
-        ).eq('user_id', user_id).execute()
-        
-        if not member_check.data:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="您無權讀取該圖片"
-            )
+        authorize_chat_access(supabase, dining_event_id, user_id, "您無權讀取該圖片")
         
         # 生成 Presigned GET URL（有效期 1 小時，非同步）
         get_url = await generate_presigned_get_url_async(
@@ -200,34 +317,13 @@ async def send_chat_notification(
     1. 驗證用戶是否在該聚餐事件中
     2. 獲取發送者的暱稱
     3. 獲取聚餐事件的所有參與者（排除發送者）
-    4. 使用 NotificationService 發送通知
+    4. 加入聊天推送合併窗口，由通知 outbox 發送摘要
     """
     try:
         user_id = current_user.user.id
         
-        # 獲取聚餐事件的配對組 ID
-        dining_event = supabase.table('dining_events').select(
-            'id, matching_group_id'
-        ).eq('id', request.dining_event_id).execute()
-        
-        if not dining_event.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="找不到該聚餐事件"
-            )
-        
-        matching_group_id = dining_event.data[0]['matching_group_id']
-        
-        # 檢查用戶是否在該配對組中
-        member_check = supabase.table('user_matching_info').select('user_id').eq(
-            'matching_group_id', matching_group_id
-        ).eq('user_id', user_id).execute()
-        
-        if not member_check.data:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="您不在該聚餐事件中"
-            )
+        # 驗證用戶是否在該聚餐事件中
+        membership = authorize_chat_access(supabase, request.dining_event_id, user_id)
         
         # 獲取發送者的暱稱
         sender_profile = supabase.table('user_profiles').select('nickname').eq(
@@ -236,80 +332,31 @@ async def send_chat_notification(
         
         sender_nickname = sender_profile.data[0]['nickname'] if sender_profile.data else '匿名用戶'
         
-        # 獲取配對組的所有成員（排除發送者）
-        members = supabase.table('user_matching_info').select('user_id').eq(
-            'matching_group_id', matching_group_id
-        ).neq('user_id', user_id).execute()
+        # 配對組的所有成員（排除發送者）
+        member_ids = membership.other_member_ids(user_id)
         
-        if not members.data:
+        if not member_ids:
             # 沒有其他成員需要通知
             return {"message": "沒有其他成員需要通知", "notified_count": 0}
         
-        member_ids = [member['user_id'] for member in members.data]
-        
         # 準備通知內容
         if request.message_type == 'image':
             notification_body = f"{sender_nickname} 傳送了一張圖片"
         else:
             notification_body = f"{sender_nickname}: {request.message_preview}"
         
-        # 使用 NotificationService 發送通知
-        notification_service = NotificationService(use_service_role=True)
-        
-        notification_records = []
-        all_tokens = []
-        
-        for member_id in member_ids:
-            # 準備通知記錄
-            notification_records.append({
-                "user_id": member_id,
-                "title": "新訊息",
-                "body": notification_body,
-                "data": {
-                    "type": "chat_message",
-                    "dining_event_id": request.dining_event_id,
-                    "sender_id": user_id,
-                    "sender_nickname": sender_nickname
-                }
-            })
-            
-            # 獲取用戶設備令牌
-            tokens_result = supabase.table("user_device_tokens").select("token").eq(
-                "user_id", member_id
-            ).execute()
-            user_tokens = [item["token"] for item in tokens_result.data] if tokens_result.data else []
-            all_tokens.extend(user_tokens)
-        
-        # 儲存所有通知記錄
-        if notification_records:
-            supabase.table("user_notifications").insert(notification_records).execute()
-        
-        # 發送批量推送通知
-        notification_result = {"success": 0, "failure": 0}
-        if all_tokens:
-            from utils.firebase import send_notification_to_devices
-            notification_result = await send_notification_to_devices(
-                tokens=all_tokens,
-                title="新訊息",
-                body=notification_body,
-                data={
-                    "type": "chat_message",
-                    "dining_event_id": request.dining_event_id,
-                    "sender_id": user_id,
-                    "sender_nickname": sender_nickname
-                }
-            )
-        
-        logger.info(
-            f"已向 {len(member_ids)} 位成員發送聊天通知，"
-            f"成功: {notification_result.get('success', 0)}, "
-            f"失敗: {notification_result.get('failure', 0)}"
+        # 加入聊天推送合併窗口，窗口結束時每位成員只收到一則摘要通知（由通知 outbox 發送）
+        get_chat_push_coalescer().add(
+            request.dining_event_id,
+            member_ids,
+            sender_id=user_id,
+            sender_nickname=sender_nickname,
+            body=notification_body
         )
         
         return {
-            "message": "通知已發送",
-            "notified_count": len(member_ids),
-            "notification_result": notification_result
+            "message": "通知已排入發送佇列",
+            "notified_count": len(member_ids)
         }
         
     except HTTPException:
@@ -334,56 +381,31 @@ async def get_group_member_avatars(
     流程：
     1. 驗證用戶是否在該聚餐事件中
     2. 獲取配對組的所有成員資訊
-    3. 為每個有自訂頭像（avatars/ 開頭）的成員生成 Presigned URL
+    3. 為每個有自訂頭像（avatars/ 開頭）的成員生成 Presigned URL（預設使用縮圖，沒有縮圖時使用原圖）
     4. 返回 {user_id: url} 的映射，沒有自訂頭像的用戶值為 null
     """
     try:
         user_id = current_user.user.id
         
         # 驗證用戶是否在該聚餐事件中
-        result = supabase.table('dining_events').select(
-            'id, matching_group_id'
-        ).eq('id', request.dining_event_id).execute()
-        
-        if not result.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="找不到該聚餐事件"
-            )
-        
-        matching_group_id = result.data[0]['matching_group_id']
+        membership = authorize_chat_access(supabase, request.dining_event_id, user_id)
         
-        # 檢查用戶是否在該配對組中
-        member_check = supabase.table('user_matching_info').select('user_id').eq(
-            'matching_group_id', matching_group_id
-        ).eq('user_id', user_id).execute()
-        
-        if not member_check.data:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="您不在該聚餐事件中"
-            )
-        
-        # 獲取配對組的所有成員及其頭像路徑
-        members = supabase.table('user_matching_info').select(
-            'user_id'
-        ).eq('matching_group_id', matching_group_id).execute()
-        
-        if not members.data:
-            return GroupAvatarsResponse(avatars={}, expires_in=3600)
-        
-        member_ids = [member['user_id'] for member in members.data]
+        # 配對組的所有成員
+        member_ids = list(membership.member_ids)
         
         # 獲取所有成員的頭像路徑
         profiles = supabase.table('user_profiles').select(
-            'user_id, avatar_path'
+            'user_id, avatar_path, avatar_thumbnail_path'
         ).in_('user_id', member_ids).execute()
         
-        # 建立 user_id -> avatar_path 映射
-        avatar_paths = {
-            profile['user_id']: profile.get('avatar_path')
-            for profile in profiles.data
-        } if profiles.data else {}
+        # 建立 user_id -> avatar_path 映射（要求縮圖且自訂頭像已有縮圖時使用縮圖）
+        avatar_paths = {}
+        for profile in profiles.data or []:
+            avatar_path = profile.get('avatar_path')
+            thumbnail_path = profile.get('avatar_thumbnail_path')
+            if request.thumbnail and thumbnail_path and avatar_path and avatar_path.startswith('avatars/'):
+                avatar_path = thumbnail_path
+            avatar_paths[profile['user_id']] = avatar_path
         
         # 收集需要生成 URL 的頭像路徑
         paths_to_generate = {}  # member_id -> avatar_path
@@ -433,90 +455,97 @@ async def get_batch_chat_image_urls(
     
     流程：
     1. 驗證用戶是否在該聚餐事件中
-    2. 從 chat_messages 表查詢圖片訊息（按時間排序）
-    3. 支援分頁：limit 和 offset 參數
-    4. 為每張圖片生成 Presigned URL
-    5. 返回 {image_path: url} 的映射
+    2. 從 chat_messages 表查詢圖片訊息（按 created_at, id 排序）
+    3. 分頁：以 cursor 查詢上一頁最後一筆之後的資料（成本不隨頁數增加），多查詢一筆判斷 has_more；
+       未提供 cursor 時沿用 offset
+    4. 總數只在 include_total 時計算（預設只有第一頁）
+    5. 為每張圖片生成 Presigned URL（預設使用縮圖，沒有縮圖時使用原圖）
+    6. 返回 {image_path: url} 的映射與 next_cursor
     """
     try:
         user_id = current_user.user.id
         
         # 驗證用戶是否在該聚餐事件中
-        result = supabase.table('dining_events').select(
-            'id, matching_group_id'
-        ).eq('id', request.dining_event_id).execute()
-        
-        if not result.data:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail="找不到該聚餐事件"
-            )
-        
-        matching_group_id = result.data[0]['matching_group_id']
-        
-        # 檢查用戶是否在該配對組中
-        member_check = supabase.table('user_matching_info').select('user_id').eq(
-            'matching_group_id', matching_group_id
-        ).eq('user_id', user_id).execute()
+        authorize_chat_access(supabase, request.dining_event_id, user_id)
         
-        if not member_check.data:
-            raise HTTPException(
-                status_code=status.HTTP_403_FORBIDDEN,
-                detail="您不在該聚餐事件中"
-            )
-        
-        # 查詢該聚餐事件的圖片訊息總數
-        count_result = supabase.table('chat_messages').select(
-            'id', count='exact'
+        query = supabase.table('chat_messages').select(
+            'id, created_at, image_path, thumbnail_path'
         ).eq('dining_event_id', request.dining_event_id).eq(
             'message_type', 'image'
-        ).not_.is_('image_path', 'null').execute()
-        
-        total = count_result.count if count_result.count else 0
-        
-        # 查詢圖片訊息（帶分頁，按創建時間排序）
-        messages_result = supabase.table('chat_messages').select(
-            'image_path'
-        ).eq('dining_event_id', request.dining_event_id).eq(
-            'message_type', 'image'
-        ).not_.is_('image_path', 'null').order(
-            'created_at', desc=False
-        ).range(request.offset, request.offset + request.limit - 1).execute()
-        
-        if not messages_result.data:
+        ).not_.is_('image_path', 'null')
+        
+        if request.cursor:
+            try:
+                query = apply_keyset(query, request.cursor)
+            except ValueError as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=str(e)
+                )
+        
+        # 多查詢一筆以判斷是否還有下一頁
+        query = order_keyset(query)
+        if request.cursor or request.offset == 0:
+            query = query.limit(request.limit + 1)
+        else:
+            query = query.range(request.offset, request.offset + request.limit)
+        messages_result = query.execute()
+        
+        page, next_cursor = split_page(messages_result.data or [], request.limit)
+        
+        # 查詢該聚餐事件的圖片訊息總數（可選）
+        include_total = request.include_total if request.include_total is not None else not request.cursor
+        total = None
+        if include_total:
+            count_result = supabase.table('chat_messages').select(
+                'id', count='exact'
+            ).eq('dining_event_id', request.dining_event_id).eq(
+                'message_type', 'image'
+            ).not_.is_('image_path', 'null').limit(1).execute()
+            total = count_result.count or 0
+        
+        if not page:
             return BatchChatImagesResponse(
                 images={},
                 total=total,
                 has_more=False,
+                next_cursor=None,
                 expires_in=3600
             )
         
-        # 收集所有圖片路徑
-        image_paths = [
-            msg.get('image_path') 
-            for msg in messages_result.data 
+        # 收集所有圖片路徑：image_path -> 實際讀取的路徑（縮圖或原圖）
+        source_paths = {
+            msg['image_path']: (
+                msg.get('thumbnail_path')
+                if request.thumbnail and msg.get('thumbnail_path')
+                else msg['image_path']
+            )
+            for msg in page
             if msg.get('image_path')
-        ]
+        }
         
-        # 批量並行生成 Presigned URLs
-        images = await generate_presigned_get_urls_batch(
-            file_keys=image_paths,
+        # 批量生成 Presigned URLs
+        url_map = await generate_presigned_get_urls_batch(
+            file_keys=list(source_paths.values()),
             expiration=3600
         )
-        # 過濾掉生成失敗的
-        images = {k: v for k, v in images.items() if v}
-        
-        has_more = (request.offset + len(messages_result.data)) < total
+        # 以原圖路徑作為鍵值，過濾掉生成失敗的
+        images = {
+            image_path: url_map.get(source_path)
+            for image_path, source_path in source_paths.items()
+            if url_map.get(source_path)
+        }
         
         logger.info(
             f"已為用戶 {user_id} 批量生成 {len(images)} 張聊天圖片 URL "
-            f"(offset={request.offset}, limit={request.limit}, total={total})"
+            f"(cursor={'有' if request.cursor else '無'}, limit={request.limit}, total={total})"
         )
         
         return BatchChatImagesResponse(
             images=images,
             total=total,
-            has_more=has_more,
+            has_more=next_cursor is not None,
+            next_cursor=next_cursor,
             expires_in=3600
         )
         
@@ -19,6 +19,7 @@ from schemas.dining import (
 from dependencies import get_supabase_service, get_current_user, verify_cron_api_key
 from services.notification_service import NotificationService
 from utils.cloudflare import delete_folder_from_private_r2
+from services.chat_auth_service import invalidate_chat_memberships
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -1005,6 +1006,9 @@ async def finalize_dining_events(supabase: Client):
             .in_("matching_group_id", group_ids) \
             .execute()
         
+        # 配對組已解散，移除聊天成員資格快取
+        invalidate_chat_memberships(event_ids, group_ids)
+        
         # 4. 刪除 chat_messages（會自動清除因為有外鍵約束，但先主動刪除以確保完整性）
         supabase.table("chat_messages") \
             .delete() \
@@ -17,6 +17,8 @@ from schemas.matching import (
 from schemas.dining import DiningUserStatus
 from dependencies import get_supabase, get_current_user, get_supabase_service, verify_cron_api_key
 from services.notification_service import NotificationService
+from services.notification_outbox_service import get_notification_outbox, LANE_REALTIME
+from services.chat_auth_service import invalidate_chat_memberships
 from utils.dinner_time_utils import DinnerTimeUtils
 
 router = APIRouter()
@@ -45,7 +47,7 @@ async def update_user_status_to_restaurant(
         
         # 創建或更新配對信息
         matching_info_resp = supabase.table("user_matching_info") \
-            .select("id") \
+            .select("id, matching_group_id") \
             .eq("user_id", user_id) \
             .execute()
         
@@ -55,6 +57,8 @@ async def update_user_status_to_restaurant(
                 "confirmation_deadline": confirmation_deadline.isoformat(),
                 "updated_at": datetime.now().isoformat()
             }).eq("id", matching_info_resp.data[0]["id"]).execute()
+            # 用戶換到新的配對組，舊配對組的聊天成員資格快取已過時
+            invalidate_chat_memberships(matching_group_ids=[matching_info_resp.data[0].get("matching_group_id")])
         else:
             supabase.table("user_matching_info").insert({
                 "user_id": user_id,
@@ -82,11 +86,20 @@ async def update_user_status_to_failed(supabase: Client, user_id: str) -> bool:
             return False
         
         # 清除可能存在的舊配對信息
+        matching_info_resp = supabase.table("user_matching_info") \
+            .select("matching_group_id") \
+            .eq("user_id", user_id) \
+            .execute()
         supabase.table("user_matching_info") \
             .delete() \
             .eq("user_id", user_id) \
             .execute()
-            
+        if matching_info_resp.data:
+            # 用戶離開原配對組，該組的聊天成員資格快取已過時
+            invalidate_chat_memberships(
+                matching_group_ids=[row.get("matching_group_id") for row in matching_info_resp.data]
+            )
+
         logger.info(f"成功更新用戶 {user_id} 狀態為 matching_failed")
         return True
     except Exception as e:
@@ -94,13 +107,12 @@ async def update_user_status_to_failed(supabase: Client, user_id: str) -> bool:
         return False
 
 async def send_matching_notification(
-    notification_service: NotificationService,
     user_id: str,
     group_id: str,
     deadline: datetime
 ) -> bool:
     """
-    發送配對成功通知
+    發送配對成功通知（寫入通知 outbox 的即時通道，由背景 worker 發送）
     """
     try:
         # 準備通知數據
@@ -110,14 +122,15 @@ async def send_matching_notification(
             "deadline": deadline.isoformat()
         }
                 
-        # 發送通知
-        await notification_service.send_notification(
-            user_id=user_id,
+        # 加入通知 outbox
+        get_notification_outbox().enqueue(
+            [user_id],
             title="找到了！",
             body=f"成功找到聚餐夥伴，請在明天 6:00 前選擇餐廳",
-            data=notification_data
+            data=notification_data,
+            lane=LANE_REALTIME
         )
-        logger.info(f"成功發送配對通知到用戶 {user_id}")
+        logger.info(f"已將配對通知加入 outbox，用戶 {user_id}")
         return True
     except Exception as ne:
         logger.error(f"發送通知給用戶 {user_id} 失敗: {str(ne)}")
@@ -0,0 +1,111 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from supabase import Client
+from typing import Optional
+import logging
+
+from schemas.notification import (
+    NotificationListResponse,
+    UnreadCountResponse,
+    MarkNotificationsReadRequest,
+    MarkNotificationsReadResponse
+)
+from dependencies import get_supabase_service, get_current_user
+from services.notification_service import NotificationService, NOTIFICATION_PAGE_SIZE
+
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+@router.get("", response_model=NotificationListResponse)
+async def list_notifications(
+    limit: int = Query(NOTIFICATION_PAGE_SIZE, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="上一頁回傳的 next_cursor，第一頁不需提供"),
+    unread_only: bool = Query(False),
+    supabase: Client = Depends(get_supabase_service),
+    current_user = Depends(get_current_user)
+):
+    """
+    獲取當前用戶的通知列表（新到舊）
+
+    以 cursor 分頁，每頁的查詢成本不隨頁數增加；同時回傳未讀數量供顯示徽章
+    """
+    try:
+        user_id = current_user.user.id
+        notification_service = NotificationService(supabase=supabase)
+
+        try:
+            notifications, next_cursor = notification_service.get_user_notifications(
+                user_id, unread_only=unread_only, limit=limit, cursor=cursor
+            )
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e)
+            )
+
+        return {
+            "notifications": notifications,
+            "next_cursor": next_cursor,
+            "unread_count": notification_service.get_unread_count(user_id)
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"獲取通知列表時發生錯誤: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="獲取通知列表時發生錯誤"
+        )
+
+
+@router.get("/unread-count", response_model=UnreadCountResponse)
+async def get_unread_notification_count(
+    supabase: Client = Depends(get_supabase_service),
+    current_user = Depends(get_current_user)
+):
+    """
+    獲取當前用戶的未讀通知數量（讀取觸發器維護的計數）
+    """
+    try:
+        user_id = current_user.user.id
+        return {"unread_count": NotificationService(supabase=supabase).get_unread_count(user_id)}
+
+    except Exception as e:
+        logger.error(f"獲取未讀通知數量時發生錯誤: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="獲取未讀通知數量時發生錯誤"
+        )
+
+
+@router.post("/read", response_model=MarkNotificationsReadResponse)
+async def mark_notifications_read(
+    request: MarkNotificationsReadRequest,
+    supabase: Client = Depends(get_supabase_service),
+    current_user = Depends(get_current_user)
+):
+    """
+    將通知標記為已讀（一次更新）
+
+    - 提供 notification_ids：只標記這些通知
+    - 未提供：標記所有未讀通知
+    """
+    try:
+        user_id = current_user.user.id
+        notification_service = NotificationService(supabase=supabase)
+
+        updated = notification_service.mark_notifications_as_read(user_id, request.notification_ids)
+        logger.info(f"用戶 {user_id} 已將 {updated} 則通知標記為已讀")
+
+        return {
+            "updated": updated,
+            "unread_count": notification_service.get_unread_count(user_id)
+        }
+
+    except Exception as e:
+        logger.error(f"標記通知為已讀時發生錯誤: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="標記通知為已讀時發生錯誤"
+        )
@@ -1,14 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, status, BackgroundTasks, Query
+from fastapi.responses import StreamingResponse
 from supabase import Client
 from datetime import datetime, timezone
 from typing import Dict, Any, List, Optional
 from pydantic import BaseModel
+import json
 import logging
 
 from dependencies import get_supabase_service, verify_cron_api_key
 from services.reminder_service import (
     process_reminder_booking,
     process_reminder_attendance,
+    iter_reminder_recipients,
+    count_reminder_recipients,
     REMINDER_TARGET_STATUSES
 )
 
@@ -144,13 +148,19 @@ async def test_reminder(
 @router.get("/preview", dependencies=[Depends(verify_cron_api_key)])
 async def preview_reminder_recipients(
     reminder_type: str,
+    summary_only: bool = Query(False, description="只回傳各狀態的用戶數量，不列出用戶"),
     supabase: Client = Depends(get_supabase_service)
-) -> Dict[str, Any]:
+):
     """
     預覽將會收到提醒的用戶列表（不發送任何通知）
     
     用於在發送前確認目標用戶
     
+    - summary_only=true：回傳 JSON，只包含各狀態的用戶數量
+    - 否則以 NDJSON（application/x-ndjson）串流輸出，每行一個 JSON：
+      第一行為 {"type": "header", ...}，接著每位用戶一行 {"type": "recipient", ...}，
+      最後一行為 {"type": "summary", "total_recipients", "status_counts"}
+    
     Args:
         reminder_type: "reminder_booking" 或 "reminder_attendance"
     """
@@ -160,54 +170,46 @@ async def preview_reminder_recipients(
             detail=f"不支援的提醒類型: {reminder_type}"
         )
     
-    try:
-        target_statuses = REMINDER_TARGET_STATUSES[reminder_type]
-        
-        # 獲取符合條件的用戶
-        result = (
-            supabase.table("user_status")
-            .select("user_id, status")
-            .in_("status", target_statuses)
-            .execute()
-        )
-        
-        users = result.data or []
-        
-        # 獲取用戶的 nickname（可選）
-        user_details = []
-        for user in users:
-            user_id = user["user_id"]
-            nickname = None
-            try:
-                profile = (
-                    supabase.table("user_profiles")
-                    .select("nickname")
-                    .eq("user_id", user_id)
-                    .limit(1)
-                    .execute()
-                )
-                if profile.data and len(profile.data) > 0:
-                    nickname = profile.data[0].get("nickname")
-            except Exception:
-                pass  # 忽略查詢 nickname 的錯誤
-            
-            user_details.append({
-                "user_id": user_id,
-                "status": user["status"],
-                "nickname": nickname
-            })
-        
-        return {
-            "success": True,
-            "reminder_type": reminder_type,
-            "target_statuses": target_statuses,
-            "total_recipients": len(user_details),
-            "recipients": user_details
-        }
-        
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"預覽時發生錯誤: {str(e)}",
-        )
+    target_statuses = REMINDER_TARGET_STATUSES[reminder_type]
+    
+    if summary_only:
+        try:
+            status_counts = count_reminder_recipients(supabase, target_statuses)
+            return {
+                "success": True,
+                "reminder_type": reminder_type,
+                "target_statuses": target_statuses,
+                "total_recipients": sum(status_counts.values()),
+                "status_counts": status_counts
+            }
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"預覽時發生錯誤: {str(e)}",
+            )
+    
+    def generate_lines():
+        # 同步產生器由 StreamingResponse 在執行緒池中迭代，不會阻塞事件迴圈
+        yield _ndjson_line({"type": "header", "reminder_type": reminder_type, "target_statuses": target_statuses})
+        status_counts = {target_status: 0 for target_status in target_statuses}
+        try:
+            for batch in iter_reminder_recipients(supabase, target_statuses):
+                for recipient in batch:
+                    status_counts[recipient["status"]] = status_counts.get(recipient["status"], 0) + 1
+                yield "".join(_ndjson_line({"type": "recipient", **recipient}) for recipient in batch)
+        except Exception as e:
+            # 回應已開始傳送，無法再改變狀態碼，以錯誤行通知客戶端
+            logger.error(f"串流預覽 {reminder_type} 時發生錯誤: {e}")
+            yield _ndjson_line({"type": "error", "detail": f"預覽時發生錯誤: {str(e)}"})
+            return
+        yield _ndjson_line({
+            "type": "summary",
+            "total_recipients": sum(status_counts.values()),
+            "status_counts": status_counts
+        })
+    
+    return StreamingResponse(generate_lines(), media_type="application/x-ndjson")
+
 
+def _ndjson_line(record: Dict[str, Any]) -> str:
+    return json.dumps(record, ensure_ascii=False) + "\n"
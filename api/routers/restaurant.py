@@ -23,12 +23,11 @@ from utils.restaurant_helper import (
     process_place_details,
     format_phone_to_taiwan_format
 )
-from utils.image_processor import (
-    process_and_update_image,
-    download_and_upload_photo
-)
 from utils.cloudflare import delete_file_from_r2, extract_r2_path_from_url
-from services.notification_service import NotificationService
+from utils.image_processor import is_content_addressed_key, delete_unreferenced_variants
+from utils.geo_index import get_restaurant_geo_index_async, peek_restaurant_geo_index
+from services.notification_outbox_service import get_notification_outbox, LANE_REALTIME
+from services.image_ingestion_service import get_image_ingestion_service, ImageQueueFullError
 from utils.dinner_time_utils import DinnerTimeUtils
 
 router = APIRouter()
@@ -109,35 +108,34 @@ async def search_restaurants(
             normalized_name = normalize_restaurant_name(place_name)
             logger.info(f"[{request_id}] 標準化後的搜尋關鍵字: {normalized_name}")
             
-            # 從資料庫取得所有餐廳並在應用層過濾
-            response = supabase.table("restaurants").select("*").execute()
-            
-            if response.data:
-                # 在應用層比較標準化後的名稱
-                matching_restaurants = []
-                for restaurant in response.data:
-                    restaurant_normalized_name = normalize_restaurant_name(restaurant.get("name", ""))
-                    # 使用簡單的名稱匹配方式，避免錯誤匹配
-                    if normalized_name == restaurant_normalized_name:
-                        matching_restaurants.append(restaurant)
+            # 從地理索引以標準化名稱查詢，避免每次讀取整張餐廳表
+            geo_index = await get_restaurant_geo_index_async(supabase)
+            matching_restaurants = geo_index.find_by_name(place_name)
+
+            # 有提供位置時，只保留搜尋半徑內的同名餐廳
+            if matching_restaurants and latitude is not None and longitude is not None:
+                nearby_ids = {
+                    r["id"] for _, r in geo_index.within_radius(latitude, longitude, radius or 1000)
+                }
+                matching_restaurants = [r for r in matching_restaurants if r["id"] in nearby_ids]
+
+            if matching_restaurants:
+                logger.info(f"[{request_id}] 在資料庫中找到 {len(matching_restaurants)} 家相符餐廳")
+                # 檢查這些餐廳是否已在群組投票列表中
+                filtered_restaurants = []
+                for restaurant in matching_restaurants:
+                    restaurant_id = restaurant["id"]
+                    is_in_votes = await check_restaurant_in_group_votes(supabase, current_user.user.id, restaurant_id)
+                    if is_in_votes:
+                        logger.info(f"[{request_id}] 餐廳 {restaurant.get('name', '未知')} 已在群組投票中，不能重複新增")
+                        raise HTTPException(
+                            status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="此餐廳已在目前群組的投票列表中，無法重複新增"
+                        )
+                    filtered_restaurants.append(restaurant)
                 
-                if matching_restaurants:
-                    logger.info(f"[{request_id}] 在資料庫中找到 {len(matching_restaurants)} 家相符餐廳")
-                    # 檢查這些餐廳是否已在群組投票列表中
-                    filtered_restaurants = []
-                    for restaurant in matching_restaurants:
-                        restaurant_id = restaurant["id"]
-                        is_in_votes = await check_restaurant_in_group_votes(supabase, current_user.user.id, restaurant_id)
-                        if is_in_votes:
-                            logger.info(f"[{request_id}] 餐廳 {restaurant.get('name', '未知')} 已在群組投票中，不能重複新增")
-                            raise HTTPException(
-                                status_code=status.HTTP_400_BAD_REQUEST,
-                                detail="此餐廳已在目前群組的投票列表中，無法重複新增"
-                            )
-                        filtered_restaurants.append(restaurant)
-                    
-                    if filtered_restaurants:
-                        return [RestaurantResponse(**restaurant) for restaurant in filtered_restaurants]
+                if filtered_restaurants:
+                    return [RestaurantResponse(**restaurant) for restaurant in filtered_restaurants]
         
         # 繼續處理Google連結提取place_id
         valid_place_id = None
@@ -239,9 +237,22 @@ async def search_restaurants(
         # 處理搜尋結果
         restaurant_data = await process_place_details(valid_place_id, place_details, request_id)
         
+        # 用地理索引檢查附近是否已有同一家餐廳（同 place_id 或 100 公尺內同名）
+        geo_index = await get_restaurant_geo_index_async(supabase)
+        duplicate = geo_index.find_duplicate(restaurant_data)
+        if duplicate:
+            logger.info(f"[{request_id}] 地理索引找到重複餐廳: {duplicate.get('name', '未知')} ({duplicate['id']})")
+            is_in_votes = await check_restaurant_in_group_votes(supabase, current_user.user.id, duplicate["id"])
+            if is_in_votes:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="此餐廳已在目前群組的投票列表中，無法重複新增"
+                )
+            return [RestaurantResponse(**duplicate)]
+
         # 先返回結果給用戶
         restaurant_response = RestaurantResponse(**restaurant_data)
-        
+
         # 非同步處理圖片（在返回結果給用戶後進行）
         if restaurant_data.get("image_path") is None and place_details.get("photos") and len(place_details.get("photos")) > 0:
             # 提取第一張圖片的引用ID
@@ -256,11 +267,22 @@ async def search_restaurants(
                 photo_reference = photo.get("photoReference")
                 
             if photo_reference:
-                # 使用異步任務處理圖片，不阻塞API響應
-                process_image_task = asyncio.create_task(
-                    process_and_update_image(photo_reference, restaurant_data["id"], supabase, request_id)
-                )
-                logger.info(f"[{request_id}] 已啟動非同步圖片處理任務")
+                # 交由圖片處理服務在背景處理，不阻塞API響應
+                try:
+                    image_service = get_image_ingestion_service()
+                    restaurant_response.image_task_id = image_service.submit(
+                        "restaurant_photo",
+                        {
+                            "photo_reference": photo_reference,
+                            "restaurant_id": restaurant_data["id"],
+                            "supabase": supabase,
+                            "request_id": request_id
+                        },
+                        dedup_key=f"restaurant_photo:{restaurant_data['id']}"
+                    )
+                    logger.info(f"[{request_id}] 已提交圖片處理任務: {restaurant_response.image_task_id}")
+                except ImageQueueFullError as e:
+                    logger.warning(f"[{request_id}] {str(e)}，略過此餐廳的圖片處理")
         
         # 非同步儲存到資料庫
         try:
@@ -275,6 +297,7 @@ async def search_restaurants(
                 restaurant_data["added_by_user_id"] = current_user.user.id
                 # 儲存到資料庫
                 supabase.table("restaurants").insert(restaurant_data).execute()
+                geo_index.upsert(restaurant_data)
                 logger.info(f"[{request_id}] 餐廳保存到資料庫: {restaurant_data['name']}, 新增者: {current_user.user.id}")
         except HTTPException as e:
             # 重新拋出HTTP異常
@@ -321,7 +344,20 @@ async def create_restaurant(
                         detail="此餐廳已在目前群組的投票列表中，無法重複新增"
                     )
                 return RestaurantResponse(**existing.data[0])
-        
+
+        # 沒有 place_id 時，以位置與名稱檢查附近是否已有同一家餐廳
+        geo_index = await get_restaurant_geo_index_async(supabase)
+        duplicate = geo_index.find_duplicate(restaurant.dict())
+        if duplicate:
+            is_in_votes = await check_restaurant_in_group_votes(supabase, current_user.user.id, duplicate["id"])
+            if is_in_votes:
+                logger.info(f"餐廳 {restaurant.name} 已在群組投票中，不能重複新增")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="此餐廳已在目前群組的投票列表中，無法重複新增"
+                )
+            return RestaurantResponse(**duplicate)
+
         # 創建新餐廳
         restaurant_data = restaurant.dict()
         restaurant_id = str(uuid4())
@@ -344,7 +380,9 @@ async def create_restaurant(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="創建餐廳時出錯"
             )
-        
+
+        geo_index.upsert(result.data[0])
+
         return RestaurantResponse(**result.data[0])
     
     except HTTPException as e:
@@ -357,6 +395,50 @@ async def create_restaurant(
             detail=f"創建餐廳時出錯: {str(e)}"
         )
 
+@router.get("/image-tasks/{task_id}", response_model=Dict[str, Any])
+async def get_image_task_status(
+    task_id: str,
+    current_user = Depends(get_current_user)
+):
+    """
+    查詢餐廳圖片處理任務的狀態
+    - status: queued / running / retrying / succeeded / failed
+    - 成功時 result.image_path 為圖片URL
+    """
+    task = get_image_ingestion_service().get_task(task_id)
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"找不到ID為 {task_id} 的圖片處理任務"
+        )
+    return task
+
+@router.get("/nearby", response_model=List[RestaurantResponse])
+async def get_nearby_restaurants(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius: int = Query(1000, gt=0, le=50000),
+    limit: int = Query(20, ge=1, le=100),
+    supabase: Client = Depends(get_supabase_service),
+    current_user = Depends(get_current_user)
+):
+    """
+    查詢指定位置半徑內的餐廳
+    - 使用記憶體中的地理索引，依距離由近到遠排序
+    - radius 單位為公尺
+    """
+    try:
+        geo_index = await get_restaurant_geo_index_async(supabase)
+        results = geo_index.within_radius(latitude, longitude, radius, limit=limit)
+        return [RestaurantResponse(**restaurant) for _, restaurant in results]
+
+    except Exception as e:
+        logger.error(f"查詢附近餐廳時出錯: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"查詢附近餐廳時出錯: {str(e)}"
+        )
+
 @router.get("/{restaurant_id}", response_model=RestaurantResponse)
 async def get_restaurant(
     restaurant_id: str,
@@ -409,7 +491,7 @@ async def delete_restaurant(
     """
     刪除用戶自己新增的餐廳
     - 只有新增該餐廳的用戶才能刪除
-    - 同時刪除 R2 上的餐廳圖片
+    - 同時刪除 R2 上的餐廳圖片（共用的衍生圖在沒有其他餐廳引用時才刪除）
     - 同時刪除相關的投票記錄
     """
     try:
@@ -451,15 +533,15 @@ async def delete_restaurant(
             }
         
         # 刪除 R2 上的圖片（如果存在）
+        # 以內容雜湊定址的衍生圖（places/{雜湊}/）由使用相同原圖的餐廳共用，刪除餐廳資料後確認無其他引用才刪除
         image_path = restaurant.get("image_path")
-        if image_path:
-            r2_path = extract_r2_path_from_url(image_path)
-            if r2_path:
-                delete_success = await delete_file_from_r2(r2_path)
-                if delete_success:
-                    logger.info(f"成功刪除餐廳圖片: {r2_path}")
-                else:
-                    logger.warning(f"刪除餐廳圖片失敗: {r2_path}")
+        r2_path = extract_r2_path_from_url(image_path) if image_path else None
+        if r2_path and not is_content_addressed_key(r2_path):
+            delete_success = await delete_file_from_r2(r2_path)
+            if delete_success:
+                logger.info(f"成功刪除餐廳圖片: {r2_path}")
+            else:
+                logger.warning(f"刪除餐廳圖片失敗: {r2_path}")
         
         # 刪除相關的投票記錄
         supabase.table("restaurant_votes") \
@@ -474,7 +556,18 @@ async def delete_restaurant(
             .delete() \
             .eq("id", restaurant_id) \
             .execute()
-        
+
+        geo_index = peek_restaurant_geo_index()
+        if geo_index is not None:
+            geo_index.remove(restaurant_id)
+
+        if r2_path and is_content_addressed_key(r2_path):
+            try:
+                await delete_unreferenced_variants(supabase, r2_path)
+            except Exception as e:
+                # 餐廳已刪除，衍生圖清理失敗不影響結果
+                logger.warning(f"清理餐廳 {restaurant_id} 的衍生圖時出錯: {str(e)}")
+
         logger.info(f"用戶 {user_id} 成功刪除餐廳: {restaurant_id}")
         
         return {
@@ -788,9 +881,6 @@ async def process_group_voting(
             description = f"群組投票選出的餐廳: {restaurant_name}"
         else:
             description = f"系統選出的餐廳: {restaurant_name}"
-            
-        if is_forced:
-            description += " (投票時間已到自動選出)"
         
         # 創建聚餐事件
         dining_event = {
@@ -803,6 +893,7 @@ async def process_group_voting(
             "description": description,
             "candidate_restaurant_ids": candidate_restaurant_ids,  # 加入候選餐廳列表
             "attendee_count": len(group_members),  # 添加聚餐人數，預設為群組成員數量
+            "is_forced_close": is_forced,  # 強制結束時由 reminder_vote_result 排程發送投票結果通知
             "created_at": datetime.utcnow().isoformat(),
             "updated_at": datetime.utcnow().isoformat()
         }
@@ -863,23 +954,23 @@ async def process_group_voting(
             notification_title = "餐廳出爐！"
             notification_body = f"這次的餐廳是{restaurant_name}，期待{formatted_dinner_time}的聚餐歐！"
             
-            notification_service = NotificationService(use_service_role=True)
-            for member_id in group_members:
-                try:
-                    await notification_service.send_notification(
-                        user_id=member_id,
-                        title=notification_title,
-                        body=notification_body,
-                        data={
-                            "type": "dining_event_created",
-                            "event_id": event_id,
-                            "restaurant_id": restaurant_id
-                        }
-                    )
-                except Exception as ne:
-                    logger.error(f"發送通知給用戶 {member_id} 失敗: {str(ne)}")
+            # 全組一則通知寫入 outbox 的即時通道，由背景 worker 發送
+            try:
+                get_notification_outbox().enqueue(
+                    list(group_members),
+                    title=notification_title,
+                    body=notification_body,
+                    data={
+                        "type": "dining_event_created",
+                        "event_id": event_id,
+                        "restaurant_id": restaurant_id
+                    },
+                    lane=LANE_REALTIME
+                )
+            except Exception as ne:
+                logger.error(f"將群組 {group_id} 的聚餐通知加入 outbox 失敗: {str(ne)}")
             
-            logger.info(f"群組 {group_id} 的聚餐事件 {event_id} 已成功創建，已發送即時通知")
+            logger.info(f"群組 {group_id} 的聚餐事件 {event_id} 已成功創建，即時通知已加入 outbox")
         else:
             logger.info(f"群組 {group_id} 的聚餐事件 {event_id} 已成功創建（強制結束），通知將由 reminder_vote_result 排程發送")
         
@@ -8,14 +8,20 @@ from schemas.user import (
     UserProfileResponse, 
     UserProfileUpdate,
     AvatarUploadResponse,
-    AvatarUrlResponse
+    AvatarUrlResponse,
+    AvatarUploadedResponse,
+    DeviceTokenRequest
 )
 from dependencies import get_supabase_service, get_current_user
 from utils.cloudflare import (
-    generate_presigned_put_url,
-    generate_presigned_get_url,
+    generate_presigned_put_url_async,
+    generate_presigned_get_url_async,
+    invalidate_presigned_get_url,
     delete_file_from_private_r2  # 僅用於明確刪除頭像的 API
 )
+from services.image_ingestion_service import get_image_ingestion_service, ImageQueueFullError
+from utils.thumbnails import get_thumbnail_key
+from services.device_token_service import register_device_token
 
 logger = logging.getLogger(__name__)
 
@@ -75,6 +81,32 @@ router = APIRouter()
 #     """
 #     pass
 
+@router.post("/device-token")
+async def register_user_device_token(
+    request: DeviceTokenRequest,
+    supabase: Client = Depends(get_supabase_service),
+    current_user = Depends(get_current_user)
+):
+    """
+    註冊當前用戶的設備令牌（FCM token）
+    
+    注意：
+    - 資料庫觸發器會刪除該用戶的其他設備令牌（每位用戶只保留最新的設備）
+    - 透過此 API 註冊會立即更新推送通知使用的令牌快取
+    """
+    try:
+        user_id = current_user.user.id
+        register_device_token(supabase, user_id, request.token)
+        logger.info(f"已註冊用戶 {user_id} 的設備令牌")
+        return {"message": "設備令牌已註冊"}
+        
+    except Exception as e:
+        logger.error(f"註冊設備令牌時發生錯誤: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="註冊設備令牌時發生錯誤"
+        )
+
 @router.post("/avatar/upload-url", response_model=AvatarUploadResponse)
 async def get_avatar_upload_url(
     supabase: Client = Depends(get_supabase_service),
@@ -107,7 +139,7 @@ async def get_avatar_upload_url(
         logger.info(f"用戶 {user_id} 準備上傳/更新頭像: {avatar_path}")
         
         # 生成 Presigned PUT URL（有效期 1 小時）
-        upload_url = generate_presigned_put_url(
+        upload_url = await generate_presigned_put_url_async(
             file_key=avatar_path,
             expiration=3600,
             content_type="image/webp"
@@ -119,6 +151,9 @@ async def get_avatar_upload_url(
                 detail="無法生成上傳 URL"
             )
         
+        # 頭像即將被覆蓋，移除快取的讀取 URL，讓之後的讀取取得新的 URL（避免前端沿用舊圖快取）
+        invalidate_presigned_get_url(avatar_path)
+        
         logger.info(f"已為用戶 {user_id} 生成頭像上傳 URL（統一 WebP 格式）")
         
         return AvatarUploadResponse(
@@ -136,6 +171,59 @@ async def get_avatar_upload_url(
             detail="獲取上傳 URL 時發生錯誤"
         )
 
+@router.post("/avatar/uploaded", response_model=AvatarUploadedResponse)
+async def notify_avatar_uploaded(
+    supabase: Client = Depends(get_supabase_service),
+    current_user = Depends(get_current_user)
+):
+    """
+    頭像上傳完成通知，於背景產生縮圖
+    
+    流程：
+    1. 清除舊的縮圖路徑（新縮圖完成前讀取 API 退回原圖）
+    2. 提交縮圖任務：讀取原圖，寫入 avatars/{user_id}_thumb.webp
+    3. 縮圖完成後寫回 user_profiles.avatar_thumbnail_path
+    """
+    try:
+        user_id = current_user.user.id
+        avatar_path = f"avatars/{user_id}.webp"
+        thumbnail_path = get_thumbnail_key(avatar_path)
+        
+        # 舊縮圖已過時
+        supabase.table('user_profiles').update(
+            {'avatar_thumbnail_path': None}
+        ).eq('user_id', user_id).execute()
+        invalidate_presigned_get_url(thumbnail_path)
+        
+        task_id = None
+        try:
+            task_id = get_image_ingestion_service().submit(
+                "avatar_thumbnail",
+                {
+                    "user_id": user_id,
+                    "avatar_path": avatar_path,
+                    "supabase": supabase
+                },
+                dedup_key=f"avatar_thumbnail:{avatar_path}"
+            )
+            logger.info(f"用戶 {user_id} 已上傳頭像，提交縮圖任務: {task_id}")
+        except ImageQueueFullError as e:
+            logger.warning(f"{str(e)}，略過頭像 {avatar_path} 的縮圖")
+        
+        return AvatarUploadedResponse(
+            task_id=task_id,
+            thumbnail_path=thumbnail_path
+        )
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"處理頭像上傳通知時發生錯誤: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="處理上傳通知時發生錯誤"
+        )
+
 @router.delete("/avatar")
 async def delete_avatar_from_r2(
     supabase: Client = Depends(get_supabase_service),
@@ -147,7 +235,7 @@ async def delete_avatar_from_r2(
     流程：
     1. 查詢用戶當前的頭像路徑
     2. 檢查是否為 R2 上的檔案（avatars/ 開頭）
-    3. 從 R2 刪除檔案
+    3. 從 R2 刪除檔案（連同縮圖）
     4. 返回刪除結果
     
     注意：
@@ -159,7 +247,9 @@ async def delete_avatar_from_r2(
         user_id = current_user.user.id
         
         # 查詢用戶當前的頭像路徑
-        result = supabase.table('user_profiles').select('avatar_path').eq('user_id', user_id).execute()
+        result = supabase.table('user_profiles').select(
+            'avatar_path, avatar_thumbnail_path'
+        ).eq('user_id', user_id).execute()
         
         if not result.data:
             raise HTTPException(
@@ -168,6 +258,7 @@ async def delete_avatar_from_r2(
             )
         
         avatar_path = result.data[0].get('avatar_path')
+        thumbnail_path = result.data[0].get('avatar_thumbnail_path')
         
         if not avatar_path:
             raise HTTPException(
@@ -193,6 +284,15 @@ async def delete_avatar_from_r2(
                 detail="從 R2 刪除檔案失敗"
             )
         
+        # 縮圖只是衍生檔案，刪除失敗不影響結果
+        if thumbnail_path:
+            if await delete_file_from_private_r2(thumbnail_path):
+                supabase.table('user_profiles').update(
+                    {'avatar_thumbnail_path': None}
+                ).eq('user_id', user_id).execute()
+            else:
+                logger.warning(f"刪除用戶 {user_id} 的頭像縮圖失敗: {thumbnail_path}")
+        
         logger.info(f"已從 R2 刪除用戶 {user_id} 的頭像檔案: {avatar_path}")
         
         return {"message": "頭像檔案已從 R2 成功刪除"}
@@ -269,7 +369,7 @@ async def get_avatar_url(
             )
         
         # 生成 Presigned GET URL（有效期 1 小時）
-        get_url = generate_presigned_get_url(
+        get_url = await generate_presigned_get_url_async(
             file_key=avatar_path,
             expiration=3600
         )
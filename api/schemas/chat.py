@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 
 
 class ChatImageUploadRequest(BaseModel):
@@ -15,6 +15,37 @@ class ChatImageUploadResponse(BaseModel):
     expires_in: int = Field(..., description="URL 有效期（秒）")
 
 
+class ChatImageBatchUploadRequest(BaseModel):
+    """聊天圖片批量上傳請求（同一則多圖訊息）"""
+    dining_event_id: str = Field(..., description="聚餐事件 ID")
+    message_ids: List[str] = Field(..., min_length=1, max_length=20, description="訊息 ID 列表（前端生成的 UUID）")
+
+
+class ChatImageUploadItem(BaseModel):
+    """單張聊天圖片的上傳資訊"""
+    message_id: str = Field(..., description="訊息 ID")
+    upload_url: str = Field(..., description="圖片上傳 URL")
+    image_path: str = Field(..., description="圖片在 R2 上的路徑")
+
+
+class ChatImageBatchUploadResponse(BaseModel):
+    """聊天圖片批量上傳回應"""
+    uploads: List[ChatImageUploadItem] = Field(..., description="各訊息的上傳資訊（與請求順序相同）")
+    expires_in: int = Field(..., description="URL 有效期（秒）")
+
+
+class ChatImageUploadedRequest(BaseModel):
+    """聊天圖片上傳完成通知"""
+    dining_event_id: str = Field(..., description="聚餐事件 ID")
+    message_id: str = Field(..., description="訊息 ID（與取得上傳 URL 時相同）")
+
+
+class ImageUploadedResponse(BaseModel):
+    """圖片上傳完成通知回應"""
+    task_id: Optional[str] = Field(None, description="縮圖處理任務 ID，佇列已滿時為 null")
+    thumbnail_path: str = Field(..., description="縮圖完成後在 R2 上的路徑")
+
+
 class ChatImageUrlRequest(BaseModel):
     """聊天圖片讀取 URL 請求"""
     image_path: str = Field(..., description="圖片在 R2 上的路徑")
@@ -36,6 +67,7 @@ class ChatNotifyRequest(BaseModel):
 class GroupAvatarsRequest(BaseModel):
     """群組成員頭像批量請求"""
     dining_event_id: str = Field(..., description="聚餐事件 ID")
+    thumbnail: bool = Field(default=True, description="是否回傳縮圖 URL（沒有縮圖時回傳原圖）")
 
 
 class GroupAvatarsResponse(BaseModel):
@@ -48,14 +80,18 @@ class BatchChatImagesRequest(BaseModel):
     """批量聊天圖片 URL 請求"""
     dining_event_id: str = Field(..., description="聚餐事件 ID")
     limit: int = Field(default=50, ge=1, le=200, description="每次請求的圖片數量上限")
-    offset: int = Field(default=0, ge=0, description="從第幾張圖片開始（用於分頁）")
+    cursor: Optional[str] = Field(None, description="上一頁回傳的 next_cursor，第一頁不需提供")
+    offset: int = Field(default=0, ge=0, description="從第幾張圖片開始（舊版分頁，提供 cursor 時忽略）")
+    include_total: Optional[bool] = Field(None, description="是否計算總圖片數量，預設只在第一頁（沒有 cursor）計算")
+    thumbnail: bool = Field(default=True, description="是否回傳縮圖 URL（沒有縮圖時回傳原圖）")
 
 
 class BatchChatImagesResponse(BaseModel):
     """批量聊天圖片 URL 回應"""
-    images: dict = Field(..., description="圖片路徑與 URL 映射 {image_path: url}")
-    total: int = Field(..., description="總圖片數量")
+    images: dict = Field(..., description="圖片路徑與 URL 映射 {image_path: url}，thumbnail 為 true 時為縮圖 URL")
+    total: Optional[int] = Field(None, description="總圖片數量（未計算時為 null）")
     has_more: bool = Field(..., description="是否還有更多圖片")
+    next_cursor: Optional[str] = Field(None, description="下一頁的游標，沒有更多圖片時為 null")
     expires_in: int = Field(..., description="URL 有效期（秒）")
 
 
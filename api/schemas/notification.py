@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 from uuid import UUID
 
@@ -19,4 +19,38 @@ class NotificationResponse(NotificationBase):
 
     class Config:
         from_attributes = True
-        orm_mode = True  # 為了向後兼容 
\ No newline at end of file
+        orm_mode = True  # 為了向後兼容 
+
+class NotificationItem(BaseModel):
+    """收件匣中的單則通知"""
+    id: str
+    title: str
+    body: str
+    data: Optional[Dict[str, Any]] = None
+    created_at: datetime
+    read_at: Optional[datetime] = None
+
+
+class NotificationListResponse(BaseModel):
+    """通知列表回應（keyset 分頁）"""
+    notifications: List[NotificationItem] = Field(..., description="本頁通知（新到舊）")
+    next_cursor: Optional[str] = Field(None, description="下一頁的游標，沒有更多通知時為 null")
+    unread_count: int = Field(..., description="未讀通知數量")
+
+
+class UnreadCountResponse(BaseModel):
+    """未讀通知數量回應"""
+    unread_count: int = Field(..., description="未讀通知數量")
+
+
+class MarkNotificationsReadRequest(BaseModel):
+    """標記通知為已讀請求"""
+    notification_ids: Optional[List[str]] = Field(
+        None, min_length=1, max_length=200, description="要標記的通知 ID，未提供時標記所有未讀通知"
+    )
+
+
+class MarkNotificationsReadResponse(BaseModel):
+    """標記通知為已讀回應"""
+    updated: int = Field(..., description="標記為已讀的通知數量")
+    unread_count: int = Field(..., description="標記後的未讀通知數量")
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Optional, List, Dict, Any
 from datetime import datetime
 from uuid import UUID
 
@@ -11,6 +11,7 @@ class RestaurantBase(BaseModel):
     latitude: Optional[float] = None
     longitude: Optional[float] = None
     image_path: Optional[str] = None
+    image_variants: Optional[List[Dict[str, Any]]] = None  # 多尺寸衍生圖 [{width, height, format, url, size}]
     business_hours: Optional[str] = None
     google_place_id: Optional[str] = None
     is_user_added: bool = False
@@ -23,6 +24,7 @@ class RestaurantCreate(RestaurantBase):
 class RestaurantResponse(RestaurantBase):
     id: UUID
     created_at: datetime
+    image_task_id: Optional[str] = None  # 圖片仍在背景處理時的任務ID，可用於查詢處理狀態
 
     class Config:
         from_attributes = True
@@ -34,6 +34,15 @@ class AvatarUrlResponse(BaseModel):
     url: str
     expires_in: int = 3600
 
+class AvatarUploadedResponse(BaseModel):
+    """頭像上傳完成通知響應，task_id 為 None 表示處理佇列已滿、未產生縮圖"""
+    task_id: Optional[str] = None
+    thumbnail_path: str
+
+class DeviceTokenRequest(BaseModel):
+    """設備令牌註冊請求（FCM token）"""
+    token: str = Field(..., min_length=1, max_length=4096)
+
 class UserDeviceToken(BaseModel):
     user_id: str
     token: str
@@ -0,0 +1,166 @@
+"""
+聊天權限驗證服務
+
+聊天相關 API 每次呼叫都需確認用戶是否為聚餐事件的成員（dining_events -> user_matching_info）。
+成員資格以聚餐事件為單位快取（配對組 ID 與完整成員列表），(user_id, dining_event_id) 的驗證直接查詢快取：
+- 快取項目在 TTL 後過期；finalize_dining_events 清除配對組時主動移除
+- 用戶不在快取的成員列表中時重新查詢一次，避免剛加入配對組的用戶被誤擋
+- 不存在的聚餐事件不快取
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional, Tuple
+
+from supabase import Client
+
+from config import CHAT_AUTH_CACHE_TTL_SECONDS, CHAT_AUTH_CACHE_MAX_EVENTS
+
+logger = logging.getLogger(__name__)
+
+
+class ChatMembership:
+    """聚餐事件的配對組與成員"""
+
+    __slots__ = ("dining_event_id", "matching_group_id", "member_ids")
+
+    def __init__(self, dining_event_id: str, matching_group_id: Optional[str], member_ids: Iterable[str]):
+        self.dining_event_id = dining_event_id
+        self.matching_group_id = matching_group_id
+        # 保留查詢順序，供需要成員列表的 API 使用
+        self.member_ids: Tuple[str, ...] = tuple(dict.fromkeys(member_ids))
+
+    def is_member(self, user_id: str) -> bool:
+        return user_id in self.member_ids
+
+    def other_member_ids(self, user_id: str) -> List[str]:
+        """除了指定用戶以外的成員"""
+        return [member_id for member_id in self.member_ids if member_id != user_id]
+
+
+class ChatMembershipCache:
+    """聚餐事件成員資格的 TTL 快取（LRU，執行緒安全）"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = CHAT_AUTH_CACHE_TTL_SECONDS,
+        max_events: int = CHAT_AUTH_CACHE_MAX_EVENTS
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_events = max_events
+        # dining_event_id -> (成員資格, 過期時間)
+        self._entries: "OrderedDict[str, Tuple[ChatMembership, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, dining_event_id: str) -> Optional[ChatMembership]:
+        with self._lock:
+            entry = self._entries.get(dining_event_id)
+            if entry is None or entry[1] <= time.monotonic():
+                if entry is not None:
+                    del self._entries[dining_event_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(dining_event_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, membership: ChatMembership) -> None:
+        with self._lock:
+            self._entries[membership.dining_event_id] = (membership, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end(membership.dining_event_id)
+            while len(self._entries) > self.max_events:
+                self._entries.popitem(last=False)
+
+    def invalidate_events(self, dining_event_ids: Iterable[str]) -> int:
+        """移除指定聚餐事件的快取，回傳移除數量"""
+        with self._lock:
+            return sum(self._entries.pop(event_id, None) is not None for event_id in dining_event_ids)
+
+    def invalidate_groups(self, matching_group_ids: Iterable[str]) -> int:
+        """移除屬於指定配對組的快取，回傳移除數量"""
+        group_ids = set(matching_group_ids)
+        with self._lock:
+            event_ids = [
+                event_id for event_id, (membership, _) in self._entries.items()
+                if membership.matching_group_id in group_ids
+            ]
+            for event_id in event_ids:
+                del self._entries[event_id]
+            return len(event_ids)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def load_chat_membership(supabase: Client, dining_event_id: str) -> Optional[ChatMembership]:
+    """從資料庫查詢聚餐事件的配對組與成員，聚餐事件不存在時返回 None"""
+    result = supabase.table('dining_events').select(
+        'id, matching_group_id'
+    ).eq('id', dining_event_id).execute()
+
+    if not result.data:
+        return None
+
+    matching_group_id = result.data[0].get('matching_group_id')
+    member_ids = []
+    if matching_group_id:
+        members = supabase.table('user_matching_info').select('user_id').eq(
+            'matching_group_id', matching_group_id
+        ).execute()
+        member_ids = [member['user_id'] for member in members.data or []]
+
+    return ChatMembership(dining_event_id, matching_group_id, member_ids)
+
+
+# 單例快取
+_chat_membership_cache: Optional[ChatMembershipCache] = None
+
+
+def get_chat_membership_cache() -> ChatMembershipCache:
+    """獲取聊天成員資格快取單例"""
+    global _chat_membership_cache
+    if _chat_membership_cache is None:
+        _chat_membership_cache = ChatMembershipCache()
+    return _chat_membership_cache
+
+
+def get_chat_membership(supabase: Client, dining_event_id: str, user_id: Optional[str] = None) -> Optional[ChatMembership]:
+    """
+    取得聚餐事件的成員資格（優先使用快取）
+
+    Args:
+        supabase: Supabase 客戶端
+        dining_event_id: 聚餐事件 ID
+        user_id: 要驗證的用戶；不在快取的成員列表中時重新查詢一次
+
+    Returns:
+        成員資格，聚餐事件不存在時返回 None
+    """
+    cache = get_chat_membership_cache()
+    membership = cache.get(dining_event_id)
+    if membership is not None and (user_id is None or membership.is_member(user_id)):
+        return membership
+
+    membership = load_chat_membership(supabase, dining_event_id)
+    if membership is not None:
+        cache.put(membership)
+    return membership
+
+
+def invalidate_chat_memberships(
+    dining_event_ids: Iterable[str] = (),
+    matching_group_ids: Iterable[str] = ()
+) -> None:
+    """聚餐事件或配對組被清除時移除快取"""
+    cache = get_chat_membership_cache()
+    removed = cache.invalidate_events(dining_event_ids) + cache.invalidate_groups(matching_group_ids)
+    if removed:
+        logger.info(f"已清除 {removed} 個聊天成員資格快取")
@@ -0,0 +1,215 @@
+"""
+聊天推送合併服務
+
+活躍的聊天室中每則訊息都推送一次會產生大量推送與 user_notifications 記錄，
+改為以 (接收者, 聚餐事件) 為單位，在短時間窗口內收集新訊息通知，窗口結束時只發送一則摘要：
+- 窗口內只有一則訊息：內容與原本的通知相同（例如「小明: 晚點見」）
+- 多則訊息：「3 則新訊息，來自 小明、小華」
+窗口從該聚餐事件第一則未發送的訊息開始計算（CHAT_PUSH_COALESCE_SECONDS，設為 0 時不合併）。
+摘要寫入通知 outbox 的 realtime 通道：寫入為同步的資料庫請求，在單一執行緒中依序執行，不阻塞事件迴圈；
+寫入失敗時摘要放回待發送，FLUSH_RETRY_SECONDS 後重試。
+尚未結束的窗口只在記憶體中，應用程式關閉時會先全部送出。
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set
+
+from config import CHAT_PUSH_COALESCE_SECONDS
+from services.notification_outbox_service import get_notification_outbox, LANE_REALTIME
+
+logger = logging.getLogger(__name__)
+
+# 聊天通知標題
+CHAT_NOTIFICATION_TITLE = "新訊息"
+
+# 摘要中最多列出的發送者數量
+MAX_SUMMARY_SENDERS = 3
+
+# 寫入 outbox 失敗後重試的間隔（秒）
+FLUSH_RETRY_SECONDS = 5.0
+
+
+def build_chat_summary(messages: List[Dict[str, Any]]) -> str:
+    """產生窗口內訊息的摘要內容"""
+    if len(messages) == 1:
+        return messages[0]["body"]
+    senders = list(dict.fromkeys(message["sender_nickname"] for message in messages))
+    sender_text = "、".join(senders[:MAX_SUMMARY_SENDERS])
+    if len(senders) > MAX_SUMMARY_SENDERS:
+        sender_text += " 等人"
+    return f"{len(messages)} 則新訊息，來自 {sender_text}"
+
+
+def _enqueue_to_outbox(messages: List[Dict[str, Any]]) -> None:
+    get_notification_outbox().enqueue_bulk(messages, lane=LANE_REALTIME)
+
+
+class ChatPushCoalescer:
+    """以 (接收者, 聚餐事件) 合併聊天推送"""
+
+    def __init__(
+        self,
+        window_seconds: float = CHAT_PUSH_COALESCE_SECONDS,
+        enqueue: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        retry_seconds: float = FLUSH_RETRY_SECONDS
+    ):
+        self.window_seconds = window_seconds
+        self.enqueue = enqueue or _enqueue_to_outbox
+        self.retry_seconds = retry_seconds
+        # dining_event_id -> recipient_id -> 尚未發送的訊息
+        self._pending: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+        self._flush_tasks: Dict[str, asyncio.Task] = {}
+        # 寫入中的摘要（窗口為 0 時由 add 建立）
+        self._inflight: Set[asyncio.Task] = set()
+        # 單一執行緒依序寫入，同一聚餐事件的摘要不會亂序
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="chat-push")
+        self.received = 0
+        self.sent = 0
+        self.failed_flushes = 0
+
+    def add(
+        self,
+        dining_event_id: str,
+        recipient_ids: List[str],
+        sender_id: str,
+        sender_nickname: str,
+        body: str
+    ) -> None:
+        """
+        加入一則新訊息通知（需在事件迴圈中呼叫）
+
+        Args:
+            dining_event_id: 聚餐事件ID
+            recipient_ids: 接收者（不含發送者）
+            sender_id: 發送者ID
+            sender_nickname: 發送者暱稱
+            body: 單則訊息的通知內容
+        """
+        message = {"sender_id": sender_id, "sender_nickname": sender_nickname, "body": body}
+        event_pending = self._pending.setdefault(dining_event_id, {})
+        for recipient_id in recipient_ids:
+            event_pending.setdefault(recipient_id, []).append(message)
+        self.received += len(recipient_ids)
+
+        if self.window_seconds <= 0:
+            # 不合併：立即取出本則訊息，寫入在背景執行
+            event_pending = self._pending.pop(dining_event_id)
+            if not event_pending:
+                return
+            task = asyncio.create_task(self._send(dining_event_id, event_pending))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+        elif dining_event_id not in self._flush_tasks:
+            self._schedule_flush(dining_event_id, self.window_seconds)
+
+    def _schedule_flush(self, dining_event_id: str, delay: float) -> None:
+        self._flush_tasks[dining_event_id] = asyncio.create_task(self._flush_later(dining_event_id, delay))
+
+    async def _flush_later(self, dining_event_id: str, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            self._flush_tasks.pop(dining_event_id, None)
+        await self.flush(dining_event_id)
+
+    def _build_summaries(
+        self,
+        dining_event_id: str,
+        event_pending: Dict[str, List[Dict[str, Any]]]
+    ) -> List[Dict[str, Any]]:
+        summaries = []
+        for recipient_id, messages in event_pending.items():
+            last = messages[-1]
+            summaries.append({
+                "user_id": recipient_id,
+                "title": CHAT_NOTIFICATION_TITLE,
+                "body": build_chat_summary(messages),
+                "data": {
+                    "type": "chat_message",
+                    "dining_event_id": dining_event_id,
+                    "sender_id": last["sender_id"],
+                    "sender_nickname": last["sender_nickname"],
+                    "message_count": str(len(messages))
+                }
+            })
+        return summaries
+
+    def _restore(self, dining_event_id: str, event_pending: Dict[str, List[Dict[str, Any]]]) -> None:
+        """寫入失敗時將訊息放回待發送（排在寫入期間新加入的訊息之前）"""
+        current = self._pending.setdefault(dining_event_id, {})
+        for recipient_id, messages in event_pending.items():
+            current[recipient_id] = messages + current.get(recipient_id, [])
+
+    async def flush(self, dining_event_id: str, retry: bool = True) -> int:
+        """
+        發送聚餐事件目前累積的摘要（每位接收者一則）
+
+        寫入 outbox 失敗時訊息放回待發送，retry 為 True 時 retry_seconds 後重試
+
+        Returns:
+            發送的摘要數量
+        """
+        event_pending = self._pending.pop(dining_event_id, None)
+        if not event_pending:
+            return 0
+        return await self._send(dining_event_id, event_pending, retry)
+
+    async def _send(
+        self,
+        dining_event_id: str,
+        event_pending: Dict[str, List[Dict[str, Any]]],
+        retry: bool = True
+    ) -> int:
+        summaries = self._build_summaries(dining_event_id, event_pending)
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.enqueue, summaries)
+        except Exception as e:
+            logger.error(f"發送聚餐事件 {dining_event_id} 的聊天通知摘要時出錯: {str(e)}")
+            self.failed_flushes += 1
+            self._restore(dining_event_id, event_pending)
+            if retry and dining_event_id not in self._flush_tasks:
+                self._schedule_flush(dining_event_id, self.retry_seconds)
+            return 0
+
+        self.sent += len(summaries)
+        return len(summaries)
+
+    async def flush_all(self) -> int:
+        """立即發送所有尚未結束的窗口（應用程式關閉時呼叫，失敗時不再重試）"""
+        await asyncio.gather(*self._inflight, return_exceptions=True)
+        for task in list(self._flush_tasks.values()):
+            task.cancel()
+        await asyncio.gather(*self._flush_tasks.values(), return_exceptions=True)
+        self._flush_tasks = {}
+
+        sent = 0
+        for dining_event_id in list(self._pending):
+            sent += await self.flush(dining_event_id, retry=False)
+        if self._pending:
+            unsent = sum(len(event_pending) for event_pending in self._pending.values())
+            logger.error(f"關閉時仍有 {unsent} 則聊天通知摘要無法寫入 outbox")
+        return sent
+
+    def stats(self) -> Dict[str, Any]:
+        """合併統計：收到的通知數與實際發送的摘要數"""
+        return {
+            "window_seconds": self.window_seconds,
+            "pending_events": len(self._pending),
+            "received": self.received,
+            "sent": self.sent,
+            "failed_flushes": self.failed_flushes
+        }
+
+
+# 單例服務
+_chat_push_coalescer: Optional[ChatPushCoalescer] = None
+
+
+def get_chat_push_coalescer() -> ChatPushCoalescer:
+    """獲取聊天推送合併服務單例"""
+    global _chat_push_coalescer
+    if _chat_push_coalescer is None:
+        _chat_push_coalescer = ChatPushCoalescer()
+    return _chat_push_coalescer
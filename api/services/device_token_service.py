@@ -0,0 +1,236 @@
+"""
+設備令牌服務
+
+- 批次查詢：任意數量用戶的設備令牌以 in_ 查詢一次取得，前面有數秒 TTL 的快取；
+  App 登入/登出時直接寫入資料庫，變更在 TTL（DEVICE_TOKEN_CACHE_TTL_SECONDS）後生效；
+  令牌註冊（/api/user/device-token）與刪除時立即移除快取；沒有令牌的用戶不快取，新登入的設備下一次推送即可收到
+- 失效令牌刪除：推送通知後，依 FCM 回傳的錯誤碼批次刪除已失效的設備令牌，之後的推送不再為失效設備付出成本
+  - UNREGISTERED / SENDER_ID_MISMATCH：令牌已永久失效
+  - INVALID_ARGUMENT：只有同一次發送中有其他令牌成功時才視為令牌本身無效（避免訊息內容錯誤時刪除所有令牌）
+"""
+
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from supabase import Client
+
+from config import DEVICE_TOKEN_CACHE_TTL_SECONDS, DEVICE_TOKEN_CACHE_MAX_USERS
+from utils.firebase import send_notification_to_devices
+
+logger = logging.getLogger(__name__)
+
+# 令牌已永久失效的錯誤碼
+PERMANENT_TOKEN_ERRORS = {"UNREGISTERED", "SENDER_ID_MISMATCH"}
+
+# 可能是令牌格式錯誤，也可能是訊息內容錯誤的錯誤碼
+TOKEN_SPECIFIC_ERRORS = {"INVALID_ARGUMENT"}
+
+# 每次刪除的令牌數量（令牌約 160 字元，避免查詢字串過長）
+PRUNE_BATCH_SIZE = 50
+
+# 每次查詢的用戶數量（UUID 約 36 字元）
+RESOLVE_BATCH_SIZE = 200
+
+# 累計刪除的令牌數量
+_pruned_lock = threading.Lock()
+_pruned_total = 0
+
+
+class DeviceTokenCache:
+    """用戶設備令牌的 TTL 快取（LRU，執行緒安全），只快取有令牌的用戶"""
+
+    def __init__(
+        self,
+        ttl_seconds: float = DEVICE_TOKEN_CACHE_TTL_SECONDS,
+        max_users: int = DEVICE_TOKEN_CACHE_MAX_USERS
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.max_users = max_users
+        # user_id -> (令牌, 過期時間)
+        self._entries: "OrderedDict[str, Tuple[Tuple[str, ...], float]]" = OrderedDict()
+        # token -> user_id，刪除令牌時用來找到快取項目
+        self._token_users: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, user_ids: Iterable[str]) -> Tuple[Dict[str, List[str]], List[str]]:
+        """
+        查詢快取
+
+        Returns:
+            (命中的 {user_id: [token]}, 未命中的用戶列表)
+        """
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._entries.get(user_id)
+                if entry is not None and now < entry[1]:
+                    self._entries.move_to_end(user_id)
+                    found[user_id] = list(entry[0])
+                else:
+                    missing.append(user_id)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, tokens_by_user: Dict[str, List[str]]) -> None:
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self._lock:
+            for user_id, tokens in tokens_by_user.items():
+                self._remove(user_id)
+                if not tokens:
+                    # 沒有令牌的用戶不快取，剛登入的設備寫入令牌後立即可收到推送
+                    continue
+                self._entries[user_id] = (tuple(tokens), expires_at)
+                for token in tokens:
+                    self._token_users[token] = user_id
+            while len(self._entries) > self.max_users:
+                self._remove(next(iter(self._entries)))
+
+    def _remove(self, user_id: str) -> None:
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            for token in entry[0]:
+                if self._token_users.get(token) == user_id:
+                    del self._token_users[token]
+
+    def invalidate_users(self, user_ids: Iterable[str]) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._remove(user_id)
+
+    def invalidate_tokens(self, tokens: Iterable[str]) -> None:
+        """移除包含指定令牌的用戶快取"""
+        with self._lock:
+            for token in tokens:
+                user_id = self._token_users.get(token)
+                if user_id is not None:
+                    self._remove(user_id)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._token_users.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# 單例快取
+_device_token_cache: Optional[DeviceTokenCache] = None
+
+
+def get_device_token_cache() -> DeviceTokenCache:
+    """獲取設備令牌快取單例"""
+    global _device_token_cache
+    if _device_token_cache is None:
+        _device_token_cache = DeviceTokenCache()
+    return _device_token_cache
+
+
+def resolve_device_tokens(supabase: Client, user_ids: Iterable[str]) -> Dict[str, List[str]]:
+    """
+    批次取得用戶的設備令牌（優先使用快取，未命中的用戶以 in_ 查詢）
+
+    Returns:
+        {user_id: [token]}，沒有令牌的用戶對應空列表
+    """
+    user_ids = list(dict.fromkeys(user_id for user_id in user_ids if user_id))
+    cache = get_device_token_cache()
+    tokens_by_user, missing = cache.get_many(user_ids)
+
+    for i in range(0, len(missing), RESOLVE_BATCH_SIZE):
+        batch = missing[i:i + RESOLVE_BATCH_SIZE]
+        result = supabase.table("user_device_tokens").select("user_id, token").in_("user_id", batch).execute()
+        fetched = {user_id: [] for user_id in batch}
+        for row in result.data or []:
+            fetched.setdefault(row["user_id"], []).append(row["token"])
+        cache.put_many(fetched)
+        tokens_by_user.update(fetched)
+
+    return tokens_by_user
+
+
+def resolve_device_token_list(supabase: Client, user_ids: Iterable[str]) -> List[str]:
+    """取得多個用戶的所有設備令牌（去重）"""
+    tokens_by_user = resolve_device_tokens(supabase, user_ids)
+    return list(dict.fromkeys(token for tokens in tokens_by_user.values() for token in tokens))
+
+
+def register_device_token(supabase: Client, user_id: str, token: str) -> None:
+    """註冊（或更新）用戶的設備令牌，並移除該用戶的快取"""
+    supabase.table("user_device_tokens").upsert(
+        {"user_id": user_id, "token": token, "updated_at": "now()"},
+        on_conflict="user_id,token"
+    ).execute()
+    get_device_token_cache().invalidate_users([user_id])
+
+
+def find_dead_tokens(results: List[Dict[str, Any]]) -> List[str]:
+    """從 send_notification_to_devices 的結果中找出應刪除的令牌"""
+    any_success = any(result["success"] for result in results)
+    dead_tokens = []
+    for result in results:
+        error = result.get("error")
+        if result["success"] or not error:
+            continue
+        if error in PERMANENT_TOKEN_ERRORS or (any_success and error in TOKEN_SPECIFIC_ERRORS):
+            dead_tokens.append(result["token"])
+    return dead_tokens
+
+
+def prune_device_tokens(supabase: Client, tokens: Iterable[str]) -> int:
+    """
+    批次刪除失效的設備令牌
+
+    Returns:
+        刪除的令牌數量
+    """
+    global _pruned_total
+    tokens = list(dict.fromkeys(tokens))
+    pruned = 0
+    for i in range(0, len(tokens), PRUNE_BATCH_SIZE):
+        batch = tokens[i:i + PRUNE_BATCH_SIZE]
+        try:
+            result = supabase.table("user_device_tokens").delete().in_("token", batch).execute()
+            pruned += len(result.data) if result.data else 0
+        except Exception as e:
+            logger.error(f"刪除 {len(batch)} 個失效設備令牌時出錯: {str(e)}")
+
+    get_device_token_cache().invalidate_tokens(tokens)
+    if pruned:
+        with _pruned_lock:
+            _pruned_total += pruned
+        logger.info(f"已刪除 {pruned} 個失效設備令牌")
+    return pruned
+
+
+def get_pruned_token_count() -> int:
+    """啟動以來累計刪除的失效令牌數量"""
+    return _pruned_total
+
+
+async def send_push_to_devices(
+    supabase: Client,
+    tokens: List[str],
+    title: str,
+    body: str,
+    data: Dict[str, Any] = None,
+    executor: Optional[Executor] = None
+) -> Dict[str, Any]:
+    """
+    發送推送通知並刪除失效的設備令牌
+
+    Returns:
+        {"success": 成功數, "failure": 失敗數, "pruned": 刪除的令牌數, "results": [...]}
+    """
+    result = await send_notification_to_devices(tokens=tokens, title=title, body=body, data=data, executor=executor)
+    dead_tokens = find_dead_tokens(result["results"])
+    result["pruned"] = prune_device_tokens(supabase, dead_tokens) if dead_tokens else 0
+    return result
@@ -0,0 +1,272 @@
+"""
+圖片處理服務（餐廳圖片、聊天圖片與頭像縮圖）
+
+以有上限的佇列接收圖片任務，由固定數量的背景 worker 處理：
+- 圖片下載使用非同步 HTTP
+- PIL 的縮圖與編碼在進程池中執行
+- R2 與資料庫的同步請求在執行緒池中執行
+佇列滿時拒絕新任務（背壓），失敗的任務以指數退避重試，並可查詢任務狀態。
+"""
+
+import time
+import uuid
+import asyncio
+import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from config import (
+    IMAGE_INGESTION_QUEUE_SIZE,
+    IMAGE_INGESTION_WORKERS,
+    IMAGE_INGESTION_PROCESS_WORKERS,
+    IMAGE_INGESTION_IO_WORKERS,
+    IMAGE_INGESTION_MAX_RETRIES
+)
+
+logger = logging.getLogger(__name__)
+
+# 任務狀態
+TASK_QUEUED = "queued"
+TASK_RUNNING = "running"
+TASK_RETRYING = "retrying"
+TASK_SUCCEEDED = "succeeded"
+TASK_FAILED = "failed"
+
+# 記憶體中最多保留的任務狀態數量
+MAX_TRACKED_TASKS = 2000
+
+TaskHandler = Callable[[Dict[str, Any], "ImageIngestionService"], Awaitable[Any]]
+
+
+class ImageQueueFullError(Exception):
+    """圖片處理佇列已滿"""
+    pass
+
+
+class ImageIngestionService:
+    """圖片處理服務"""
+
+    def __init__(
+        self,
+        max_queue_size: int = IMAGE_INGESTION_QUEUE_SIZE,
+        worker_count: int = IMAGE_INGESTION_WORKERS,
+        process_workers: int = IMAGE_INGESTION_PROCESS_WORKERS,
+        io_workers: int = IMAGE_INGESTION_IO_WORKERS,
+        max_retries: int = IMAGE_INGESTION_MAX_RETRIES,
+        retry_base_delay: float = 1.0,
+        use_process_pool: bool = True
+    ):
+        self.max_queue_size = max_queue_size
+        self.worker_count = worker_count
+        self.process_workers = process_workers
+        self.io_workers = io_workers
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.use_process_pool = use_process_pool
+
+        self.process_pool: Optional[ProcessPoolExecutor] = None
+        self.thread_pool: Optional[ThreadPoolExecutor] = None
+
+        self._handlers: Dict[str, TaskHandler] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._tasks: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+        # 去重鍵 -> 尚未完成的任務ID
+        self._active_keys: Dict[str, str] = {}
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    def register_handler(self, kind: str, handler: TaskHandler) -> None:
+        """註冊任務類型的處理函數"""
+        self._handlers[kind] = handler
+
+    async def start(self) -> None:
+        """建立執行器並啟動 worker"""
+        if self.is_running:
+            return
+
+        if self.use_process_pool:
+            # 使用 spawn 避免在已有執行緒與事件迴圈的進程中 fork
+            self.process_pool = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        else:
+            self.process_pool = ThreadPoolExecutor(max_workers=self.process_workers, thread_name_prefix="image-cpu")
+        self.thread_pool = ThreadPoolExecutor(max_workers=self.io_workers, thread_name_prefix="image-io")
+
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker(i)) for i in range(self.worker_count)
+        ]
+        logger.info(f"圖片處理服務已啟動: {self.worker_count} 個 worker，佇列上限 {self.max_queue_size}")
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """等待佇列中的任務完成（最多 timeout 秒）後停止服務"""
+        if not self.is_running:
+            return
+
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"圖片處理服務停止時仍有 {self._queue.qsize()} 個任務未完成")
+
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+        self.thread_pool.shutdown(wait=False)
+        self.process_pool.shutdown(wait=False)
+        logger.info("圖片處理服務已停止")
+
+    def submit(self, kind: str, payload: Dict[str, Any], dedup_key: Optional[str] = None) -> str:
+        """
+        提交任務
+
+        Args:
+            kind: 任務類型，需先以 register_handler 註冊
+            payload: 任務資料
+            dedup_key: 去重鍵，相同鍵的任務尚未完成時直接回傳既有任務ID
+
+        Returns:
+            任務ID
+
+        Raises:
+            ImageQueueFullError: 佇列已滿
+        """
+        if not self.is_running:
+            raise RuntimeError("圖片處理服務尚未啟動")
+        if kind not in self._handlers:
+            raise ValueError(f"未註冊的任務類型: {kind}")
+
+        if dedup_key and dedup_key in self._active_keys:
+            return self._active_keys[dedup_key]
+
+        task_id = uuid.uuid4().hex
+        try:
+            self._queue.put_nowait(task_id)
+        except asyncio.QueueFull:
+            raise ImageQueueFullError(f"圖片處理佇列已滿（上限 {self.max_queue_size}）")
+
+        now = datetime.utcnow().isoformat()
+        self._tasks[task_id] = {
+            "task_id": task_id,
+            "kind": kind,
+            "status": TASK_QUEUED,
+            "attempts": 0,
+            "result": None,
+            "error": None,
+            "created_at": now,
+            "updated_at": now
+        }
+        self._payloads[task_id] = {"kind": kind, "payload": payload, "dedup_key": dedup_key}
+        if dedup_key:
+            self._active_keys[dedup_key] = task_id
+        self._trim_finished_tasks()
+        return task_id
+
+    def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
+        """查詢任務狀態"""
+        task = self._tasks.get(task_id)
+        return dict(task) if task else None
+
+    def stats(self) -> Dict[str, Any]:
+        """服務狀態摘要"""
+        counts = {}
+        for task in self._tasks.values():
+            counts[task["status"]] = counts.get(task["status"], 0) + 1
+        return {
+            "running": self.is_running,
+            "queue_size": self._queue.qsize() if self._queue else 0,
+            "max_queue_size": self.max_queue_size,
+            "tasks": counts
+        }
+
+    async def run_cpu(self, func: Callable, *args) -> Any:
+        """在進程池中執行 CPU 密集的函數（函數與參數需可序列化）"""
+        return await asyncio.get_running_loop().run_in_executor(self.process_pool, func, *args)
+
+    async def run_io(self, func: Callable, *args) -> Any:
+        """在執行緒池中執行同步 I/O 函數"""
+        return await asyncio.get_running_loop().run_in_executor(self.thread_pool, func, *args)
+
+    def _update_task(self, task_id: str, **fields) -> None:
+        task = self._tasks.get(task_id)
+        if task is not None:
+            task.update(fields)
+            task["updated_at"] = datetime.utcnow().isoformat()
+
+    def _trim_finished_tasks(self) -> None:
+        """只保留最近的任務狀態，優先移除已完成的任務"""
+        if len(self._tasks) <= MAX_TRACKED_TASKS:
+            return
+        for task_id in list(self._tasks.keys()):
+            if len(self._tasks) <= MAX_TRACKED_TASKS:
+                break
+            if self._tasks[task_id]["status"] in (TASK_SUCCEEDED, TASK_FAILED):
+                del self._tasks[task_id]
+
+    async def _worker(self, worker_index: int) -> None:
+        """從佇列取出任務並處理"""
+        while True:
+            task_id = await self._queue.get()
+            try:
+                await self._process(task_id)
+            except Exception as e:
+                logger.error(f"圖片處理 worker {worker_index} 處理任務 {task_id} 時發生未預期錯誤: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, task_id: str) -> None:
+        """執行任務，失敗時以指數退避重試"""
+        entry = self._payloads.pop(task_id, None)
+        if entry is None:
+            return
+
+        handler = self._handlers[entry["kind"]]
+        start_time = time.monotonic()
+        try:
+            for attempt in range(1, self.max_retries + 2):
+                self._update_task(task_id, status=TASK_RUNNING, attempts=attempt)
+                try:
+                    result = await handler(entry["payload"], self)
+                    self._update_task(task_id, status=TASK_SUCCEEDED, result=result, error=None)
+                    logger.info(f"圖片任務 {task_id} 完成，耗時 {time.monotonic() - start_time:.2f} 秒")
+                    return
+                except Exception as e:
+                    if attempt > self.max_retries:
+                        self._update_task(task_id, status=TASK_FAILED, error=str(e))
+                        logger.error(f"圖片任務 {task_id} 重試 {self.max_retries} 次後仍失敗: {str(e)}")
+                        return
+                    delay = self.retry_base_delay * (2 ** (attempt - 1))
+                    self._update_task(task_id, status=TASK_RETRYING, error=str(e))
+                    logger.warning(f"圖片任務 {task_id} 第 {attempt} 次執行失敗，{delay:.1f} 秒後重試: {str(e)}")
+                    await asyncio.sleep(delay)
+        finally:
+            if entry.get("dedup_key"):
+                self._active_keys.pop(entry["dedup_key"], None)
+
+
+# 單例服務（由應用程式啟動時啟動）
+_image_ingestion_service: Optional[ImageIngestionService] = None
+
+
+def get_image_ingestion_service() -> ImageIngestionService:
+    """獲取圖片處理服務單例，並註冊內建的任務類型"""
+    global _image_ingestion_service
+    if _image_ingestion_service is None:
+        from utils.image_processor import handle_restaurant_photo_task
+        from utils.thumbnails import handle_chat_thumbnail_task, handle_avatar_thumbnail_task
+
+        _image_ingestion_service = ImageIngestionService()
+        _image_ingestion_service.register_handler("restaurant_photo", handle_restaurant_photo_task)
+        _image_ingestion_service.register_handler("chat_thumbnail", handle_chat_thumbnail_task)
+        _image_ingestion_service.register_handler("avatar_thumbnail", handle_avatar_thumbnail_task)
+    return _image_ingestion_service
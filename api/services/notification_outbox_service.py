@@ -0,0 +1,505 @@
+"""
+通知 outbox 服務
+
+API 與排程不直接推送通知，而是寫入 notification_outbox，由背景 worker 領取後發送：
+- 進程重啟時尚未發送的通知仍在資料表中，租約到期後會被重新領取
+- 通知分為兩個優先通道，各自有獨立的 worker（大量推送另使用獨立的 FCM 執行緒池），
+  排程提醒的大量推送不會延遲聊天等即時推送
+  - realtime：聊天訊息等即時通知
+  - bulk：排程提醒等大量通知
+- worker 每次領取一批通知：一次寫入所有 user_notifications、一次查詢所有設備令牌，再在通道的 FCM 執行緒池中推送
+- 大量通知以 enqueue_bulk 加入：內容相同的用戶合併為同一則，5000 位用戶的提醒只需少數幾次往返
+- 推送全部失敗且非令牌本身的錯誤（例如 FCM 暫時無法使用）時，以指數退避重試，超過次數後標記為失敗
+
+資料表與領取函數見 sql/notification_outbox.sql；測試時可使用 InMemoryOutboxBackend。
+"""
+
+import json
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from supabase import Client, create_client
+
+from config import (
+    SUPABASE_URL,
+    SUPABASE_SERVICE_KEY,
+    NOTIFICATION_OUTBOX_REALTIME_WORKERS,
+    NOTIFICATION_OUTBOX_BULK_WORKERS,
+    NOTIFICATION_OUTBOX_REALTIME_BATCH_SIZE,
+    NOTIFICATION_OUTBOX_BULK_BATCH_SIZE,
+    NOTIFICATION_OUTBOX_POLL_SECONDS,
+    NOTIFICATION_OUTBOX_MAX_ATTEMPTS,
+    NOTIFICATION_OUTBOX_LEASE_SECONDS,
+    NOTIFICATION_OUTBOX_BULK_SEND_CONCURRENCY
+)
+from services.device_token_service import (
+    PERMANENT_TOKEN_ERRORS,
+    TOKEN_SPECIFIC_ERRORS,
+    resolve_device_tokens,
+    send_push_to_devices
+)
+
+logger = logging.getLogger(__name__)
+
+# 優先通道
+LANE_REALTIME = "realtime"
+LANE_BULK = "bulk"
+
+# 通知狀態
+OUTBOX_PENDING = "pending"
+OUTBOX_SENDING = "sending"
+OUTBOX_SENT = "sent"
+OUTBOX_FAILED = "failed"
+
+# 大量通知合併後每則 outbox 的用戶數上限（限制單筆 user_ids 陣列與單次推送的大小）
+BULK_ROW_MAX_USERS = 500
+
+# 每次寫入 user_notifications 的筆數
+INBOX_INSERT_BATCH_SIZE = 1000
+
+# 令牌本身的錯誤，重試也不會成功
+_TOKEN_ERRORS = PERMANENT_TOKEN_ERRORS | TOKEN_SPECIFIC_ERRORS
+
+
+class SupabaseOutboxBackend:
+    """以 notification_outbox 資料表儲存通知（同步 API，由服務在執行緒中呼叫）"""
+
+    def __init__(self, supabase: Client):
+        self.supabase = supabase
+
+    def insert(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        result = self.supabase.table("notification_outbox").insert(rows).execute()
+        return result.data or []
+
+    def claim(self, lane: str, limit: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        result = self.supabase.rpc("claim_notification_outbox", {
+            "p_lane": lane,
+            "p_limit": limit,
+            "p_lease_seconds": lease_seconds
+        }).execute()
+        return result.data or []
+
+    def mark_inbox_stored(self, outbox_ids: List[str]) -> None:
+        self.supabase.table("notification_outbox").update({"inbox_stored": True}).in_("id", outbox_ids).execute()
+
+    def mark_sent(self, outbox_ids: List[str]) -> None:
+        self.supabase.table("notification_outbox").update({
+            "status": OUTBOX_SENT,
+            "last_error": None,
+            "sent_at": datetime.now(timezone.utc).isoformat()
+        }).in_("id", outbox_ids).execute()
+
+    def mark_retry(self, outbox_id: str, error: str, delay_seconds: float) -> None:
+        next_attempt_at = datetime.now(timezone.utc) + timedelta(seconds=delay_seconds)
+        self.supabase.table("notification_outbox").update({
+            "status": OUTBOX_PENDING,
+            "last_error": error,
+            "next_attempt_at": next_attempt_at.isoformat()
+        }).eq("id", outbox_id).execute()
+
+    def mark_failed(self, outbox_id: str, error: str) -> None:
+        self.supabase.table("notification_outbox").update({
+            "status": OUTBOX_FAILED,
+            "last_error": error
+        }).eq("id", outbox_id).execute()
+
+
+class InMemoryOutboxBackend:
+    """記憶體中的 outbox（測試與本機開發用，語意與 claim_notification_outbox 相同）"""
+
+    def __init__(self):
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def insert(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        now = time.time()
+        inserted = []
+        with self._lock:
+            for row in rows:
+                stored = {
+                    "id": uuid.uuid4().hex,
+                    "data": {},
+                    "store_in_inbox": True,
+                    "inbox_stored": False,
+                    "status": OUTBOX_PENDING,
+                    "attempts": 0,
+                    "next_attempt_at": now,
+                    "last_error": None,
+                    "created_at": now,
+                    "sent_at": None,
+                    **row
+                }
+                self.rows[stored["id"]] = stored
+                inserted.append(dict(stored))
+        return inserted
+
+    def claim(self, lane: str, limit: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            due = sorted(
+                (
+                    row for row in self.rows.values()
+                    if row["lane"] == lane
+                    and row["status"] in (OUTBOX_PENDING, OUTBOX_SENDING)
+                    and row["next_attempt_at"] <= now
+                ),
+                key=lambda row: row["next_attempt_at"]
+            )[:limit]
+            for row in due:
+                row["status"] = OUTBOX_SENDING
+                row["attempts"] += 1
+                row["next_attempt_at"] = now + lease_seconds
+            return [dict(row) for row in due]
+
+    def _update(self, outbox_ids: List[str], **fields) -> None:
+        with self._lock:
+            for outbox_id in outbox_ids:
+                if outbox_id in self.rows:
+                    self.rows[outbox_id].update(fields)
+
+    def mark_inbox_stored(self, outbox_ids: List[str]) -> None:
+        self._update(outbox_ids, inbox_stored=True)
+
+    def mark_sent(self, outbox_ids: List[str]) -> None:
+        self._update(outbox_ids, status=OUTBOX_SENT, last_error=None, sent_at=time.time())
+
+    def mark_retry(self, outbox_id: str, error: str, delay_seconds: float) -> None:
+        self._update([outbox_id], status=OUTBOX_PENDING, last_error=error, next_attempt_at=time.time() + delay_seconds)
+
+    def mark_failed(self, outbox_id: str, error: str) -> None:
+        self._update([outbox_id], status=OUTBOX_FAILED, last_error=error)
+
+
+class RetryablePushError(Exception):
+    """推送暫時失敗，稍後重試"""
+    pass
+
+
+def _is_retryable_push_failure(result: Dict[str, Any]) -> bool:
+    """推送全部失敗，且至少有一個不是令牌本身的錯誤"""
+    if result["success"] or not result["failure"]:
+        return False
+    return any(
+        item["error"] not in _TOKEN_ERRORS
+        for item in result["results"] if not item["success"]
+    )
+
+
+def _default_lanes() -> Dict[str, Dict[str, Any]]:
+    return {
+        LANE_REALTIME: {
+            "workers": NOTIFICATION_OUTBOX_REALTIME_WORKERS,
+            "batch_size": NOTIFICATION_OUTBOX_REALTIME_BATCH_SIZE,
+            "poll_seconds": NOTIFICATION_OUTBOX_POLL_SECONDS,
+            "send_concurrency": None
+        },
+        LANE_BULK: {
+            "workers": NOTIFICATION_OUTBOX_BULK_WORKERS,
+            "batch_size": NOTIFICATION_OUTBOX_BULK_BATCH_SIZE,
+            "poll_seconds": NOTIFICATION_OUTBOX_POLL_SECONDS,
+            # 大量推送使用獨立的 FCM 執行緒池
+            "send_concurrency": NOTIFICATION_OUTBOX_BULK_SEND_CONCURRENCY
+        }
+    }
+
+
+class NotificationOutbox:
+    """通知 outbox：寫入待發送的通知，並由各通道的背景 worker 發送"""
+
+    def __init__(
+        self,
+        supabase: Client,
+        backend=None,
+        lanes: Optional[Dict[str, Dict[str, Any]]] = None,
+        max_attempts: int = NOTIFICATION_OUTBOX_MAX_ATTEMPTS,
+        lease_seconds: int = NOTIFICATION_OUTBOX_LEASE_SECONDS,
+        retry_base_delay: float = 5.0
+    ):
+        self.supabase = supabase
+        self.backend = backend or SupabaseOutboxBackend(supabase)
+        self.lanes = lanes or _default_lanes()
+        self.max_attempts = max_attempts
+        self.lease_seconds = lease_seconds
+        self.retry_base_delay = retry_base_delay
+
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._workers = []
+        self._stopping = False
+        self._wake_events: Dict[str, asyncio.Event] = {}
+        self._executors: Dict[str, ThreadPoolExecutor] = {}
+        self._counts = {lane: {"sent": 0, "retried": 0, "failed": 0} for lane in self.lanes}
+
+    @property
+    def is_running(self) -> bool:
+        return bool(self._workers)
+
+    def enqueue(
+        self,
+        user_ids: List[str],
+        title: str,
+        body: str,
+        data: Optional[Dict[str, Any]] = None,
+        lane: str = LANE_REALTIME,
+        store_in_inbox: bool = True
+    ) -> str:
+        """
+        寫入一則待發送的通知
+
+        Returns:
+            outbox ID
+        """
+        return self.enqueue_many([{
+            "user_ids": user_ids,
+            "title": title,
+            "body": body,
+            "data": data,
+            "lane": lane,
+            "store_in_inbox": store_in_inbox
+        }])[0]
+
+    def enqueue_many(self, notifications: List[Dict[str, Any]]) -> List[str]:
+        """
+        以一次寫入加入多則通知
+
+        Args:
+            notifications: [{"user_ids", "title", "body", "data", "lane", "store_in_inbox"}]
+
+        Returns:
+            outbox ID 列表
+        """
+        rows = []
+        for notification in notifications:
+            lane = notification.get("lane", LANE_REALTIME)
+            if lane not in self.lanes:
+                raise ValueError(f"未知的通知通道: {lane}")
+            rows.append({
+                "lane": lane,
+                "user_ids": list(notification["user_ids"]),
+                "title": notification["title"],
+                "body": notification["body"],
+                "data": notification.get("data") or {},
+                "store_in_inbox": notification.get("store_in_inbox", True)
+            })
+        if not rows:
+            return []
+
+        inserted = self.backend.insert(rows)
+        for lane in {row["lane"] for row in rows}:
+            self._wake(lane)
+        return [row["id"] for row in inserted]
+
+    def enqueue_bulk(
+        self,
+        messages: List[Dict[str, Any]],
+        lane: str = LANE_BULK,
+        store_in_inbox: bool = True
+    ) -> List[str]:
+        """
+        大量通知：在記憶體中依內容分組，內容相同的用戶合併為同一則（每則最多 BULK_ROW_MAX_USERS 位），
+        再以一次寫入加入 outbox；worker 對每則通知一次推送給所有用戶
+
+        Args:
+            messages: 每位用戶的通知 [{"user_id", "title", "body", "data"}]
+
+        Returns:
+            outbox ID 列表
+        """
+        groups: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        for message in messages:
+            data = message.get("data") or {}
+            key = (message["title"], message["body"], json.dumps(data, sort_keys=True, ensure_ascii=False))
+            group = groups.setdefault(key, {
+                "title": message["title"],
+                "body": message["body"],
+                "data": data,
+                "user_ids": []
+            })
+            group["user_ids"].append(message["user_id"])
+
+        notifications = []
+        for group in groups.values():
+            user_ids = list(dict.fromkeys(group["user_ids"]))
+            for i in range(0, len(user_ids), BULK_ROW_MAX_USERS):
+                notifications.append({
+                    "user_ids": user_ids[i:i + BULK_ROW_MAX_USERS],
+                    "title": group["title"],
+                    "body": group["body"],
+                    "data": group["data"],
+                    "lane": lane,
+                    "store_in_inbox": store_in_inbox
+                })
+        return self.enqueue_many(notifications)
+
+    async def start(self) -> None:
+        """啟動各通道的 worker"""
+        if self.is_running:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stopping = False
+        for lane, config in self.lanes.items():
+            self._wake_events[lane] = asyncio.Event()
+            if config.get("send_concurrency"):
+                self._executors[lane] = ThreadPoolExecutor(
+                    max_workers=config["send_concurrency"], thread_name_prefix=f"fcm-{lane}"
+                )
+            self._workers.extend(
+                asyncio.create_task(self._lane_worker(lane, i)) for i in range(config["workers"])
+            )
+        logger.info(
+            "通知 outbox 已啟動: " + ", ".join(f"{lane} {config['workers']} 個 worker" for lane, config in self.lanes.items())
+        )
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """等待 worker 完成目前的批次（最多 timeout 秒）後停止；未完成的通知租約到期後會重新領取"""
+        if not self.is_running:
+            return
+        self._stopping = True
+        for event in self._wake_events.values():
+            event.set()
+        done, pending = await asyncio.wait(self._workers, timeout=timeout)
+        for worker in pending:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+        self._executors = {}
+        logger.info("通知 outbox 已停止")
+
+    def stats(self) -> Dict[str, Any]:
+        """各通道的發送統計"""
+        return {"running": self.is_running, "lanes": {lane: dict(counts) for lane, counts in self._counts.items()}}
+
+    def _wake(self, lane: str) -> None:
+        """通知該通道的 worker 立即領取（可在其他執行緒呼叫）"""
+        event = self._wake_events.get(lane)
+        if event is None or self._loop is None or self._loop.is_closed():
+            return
+        self._loop.call_soon_threadsafe(event.set)
+
+    async def _run_io(self, func, *args) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def _lane_worker(self, lane: str, worker_index: int) -> None:
+        """領取並發送到期的通知，沒有通知時等待喚醒或輪詢間隔"""
+        config = self.lanes[lane]
+        wake_event = self._wake_events[lane]
+        while not self._stopping:
+            wake_event.clear()
+            try:
+                rows = await self._run_io(self.backend.claim, lane, config["batch_size"], self.lease_seconds)
+            except Exception as e:
+                logger.error(f"通知 outbox {lane} worker {worker_index} 領取通知時出錯: {str(e)}")
+                rows = []
+
+            if rows:
+                try:
+                    await self._deliver_batch(lane, rows)
+                except Exception as e:
+                    logger.error(f"通知 outbox {lane} worker {worker_index} 發送時發生未預期錯誤: {str(e)}")
+                continue
+
+            try:
+                await asyncio.wait_for(wake_event.wait(), timeout=config["poll_seconds"])
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver_batch(self, lane: str, rows: List[Dict[str, Any]]) -> None:
+        """發送一批通知：一次寫入通知記錄、一次查詢設備令牌，再並行推送"""
+        try:
+            await self._store_inbox(rows)
+            all_user_ids = [user_id for row in rows for user_id in row["user_ids"]]
+            tokens_by_user = await self._run_io(resolve_device_tokens, self.supabase, all_user_ids)
+        except Exception as e:
+            for row in rows:
+                await self._handle_failure(lane, row, str(e))
+            return
+
+        outcomes = await asyncio.gather(
+            *(self._push_row(lane, row, tokens_by_user) for row in rows),
+            return_exceptions=True
+        )
+
+        sent_ids = []
+        for row, outcome in zip(rows, outcomes):
+            if isinstance(outcome, Exception):
+                await self._handle_failure(lane, row, str(outcome))
+            else:
+                sent_ids.append(row["id"])
+        if sent_ids:
+            await self._run_io(self.backend.mark_sent, sent_ids)
+            self._counts[lane]["sent"] += len(sent_ids)
+
+    async def _store_inbox(self, rows: List[Dict[str, Any]]) -> None:
+        """寫入尚未寫入的 user_notifications（重試時不重複寫入）"""
+        pending = [row for row in rows if row.get("store_in_inbox", True) and not row.get("inbox_stored")]
+        records = [
+            {"user_id": user_id, "title": row["title"], "body": row["body"], "data": row.get("data")}
+            for row in pending
+            for user_id in row["user_ids"]
+        ]
+        if not records:
+            return
+
+        def insert_records():
+            for i in range(0, len(records), INBOX_INSERT_BATCH_SIZE):
+                self.supabase.table("user_notifications").insert(records[i:i + INBOX_INSERT_BATCH_SIZE]).execute()
+
+        await self._run_io(insert_records)
+        await self._run_io(self.backend.mark_inbox_stored, [row["id"] for row in pending])
+
+    async def _push_row(self, lane: str, row: Dict[str, Any], tokens_by_user: Dict[str, List[str]]) -> Dict[str, Any]:
+        """推送一則通知，暫時性失敗時拋出 RetryablePushError"""
+        tokens = list(dict.fromkeys(
+            token for user_id in row["user_ids"] for token in tokens_by_user.get(user_id, [])
+        ))
+        if not tokens:
+            return {"success": 0, "failure": 0, "pruned": 0}
+
+        result = await send_push_to_devices(
+            self.supabase,
+            tokens=tokens,
+            title=row["title"],
+            body=row["body"],
+            data=row.get("data") or {},
+            executor=self._executors.get(lane)
+        )
+        if _is_retryable_push_failure(result):
+            errors = sorted({item["error"] for item in result["results"] if not item["success"]})
+            raise RetryablePushError(f"推送 {result['failure']} 個設備全部失敗: {', '.join(errors)}")
+        return result
+
+    async def _handle_failure(self, lane: str, row: Dict[str, Any], error: str) -> None:
+        """未超過嘗試次數時以指數退避重新排程，否則標記為失敗"""
+        attempts = row.get("attempts", 1)
+        try:
+            if attempts >= self.max_attempts:
+                await self._run_io(self.backend.mark_failed, row["id"], error)
+                self._counts[lane]["failed"] += 1
+                logger.error(f"通知 {row['id']} 嘗試 {attempts} 次後仍失敗: {error}")
+            else:
+                delay = self.retry_base_delay * (2 ** (attempts - 1))
+                await self._run_io(self.backend.mark_retry, row["id"], error, delay)
+                self._counts[lane]["retried"] += 1
+                logger.warning(f"通知 {row['id']} 第 {attempts} 次發送失敗，{delay:.1f} 秒後重試: {error}")
+        except Exception as e:
+            # 無法更新狀態時租約到期後會重新領取
+            logger.error(f"更新通知 {row['id']} 狀態時出錯: {str(e)}")
+
+
+# 單例服務（由應用程式啟動時啟動）
+_notification_outbox: Optional[NotificationOutbox] = None
+
+
+def get_notification_outbox() -> NotificationOutbox:
+    """獲取通知 outbox 單例（使用服務角色金鑰）"""
+    global _notification_outbox
+    if _notification_outbox is None:
+        _notification_outbox = NotificationOutbox(create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY))
+    return _notification_outbox
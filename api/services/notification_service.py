@@ -1,15 +1,26 @@
 import json
-from typing import List, Dict, Any, Optional
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+from postgrest.types import CountMethod, ReturnMethod
 from supabase import Client, create_client
 
 from config import SUPABASE_URL, SUPABASE_KEY, SUPABASE_SERVICE_KEY
-from utils.firebase import send_notification_to_device, send_notification_to_devices, initialize_firebase
+from utils.firebase import initialize_firebase
+from services.device_token_service import send_push_to_devices, resolve_device_token_list
+from utils.pagination import apply_keyset, order_keyset, split_page
+
+# 通知列表每頁預設數量
+NOTIFICATION_PAGE_SIZE = 20
 
 class NotificationService:
-    def __init__(self, use_service_role=False):
-        # 使用服務角色金鑰以獲得更高權限
-        key = SUPABASE_SERVICE_KEY if use_service_role else SUPABASE_KEY
-        self.supabase = create_client(SUPABASE_URL, key)
+    def __init__(self, use_service_role=False, supabase: Optional[Client] = None):
+        if supabase is not None:
+            # 使用呼叫端既有的客戶端（例如路由的 get_supabase_service）
+            self.supabase = supabase
+        else:
+            # 使用服務角色金鑰以獲得更高權限
+            key = SUPABASE_SERVICE_KEY if use_service_role else SUPABASE_KEY
+            self.supabase = create_client(SUPABASE_URL, key)
         
         # 確保 Firebase 已初始化
         import firebase_admin
@@ -34,14 +45,14 @@ class NotificationService:
         
         created_notification = result.data[0]
         
-        # 獲取用戶設備令牌
-        tokens_result = self.supabase.table("user_device_tokens").select("token").eq("user_id", user_id).execute()
-        device_tokens = [item["token"] for item in tokens_result.data] if tokens_result.data else []
+        # 獲取用戶設備令牌（有快取）
+        device_tokens = resolve_device_token_list(self.supabase, [user_id])
         
         # 發送推送通知
         if device_tokens:
             data_dict = data if data else {}
-            await send_notification_to_devices(
+            await send_push_to_devices(
+                self.supabase,
                 tokens=device_tokens,
                 title=title,
                 body=body,
@@ -61,69 +72,111 @@ class NotificationService:
         if not member_ids:
             raise Exception("找不到群組成員")
         
-        # 為每個成員獲取設備令牌
-        all_tokens = []
-        notification_records = []
-        
-        for user_id in member_ids:
-            # 準備通知記錄
-            notification_records.append({
+        # 準備通知記錄
+        notification_records = [
+            {
                 "user_id": user_id,
                 "title": title,
                 "body": body,
                 "data": data
-            })
-            
-            # 獲取用戶設備令牌
-            tokens_result = self.supabase.table("user_device_tokens").select("token").eq("user_id", user_id).execute()
-            user_tokens = [item["token"] for item in tokens_result.data] if tokens_result.data else []
-            all_tokens.extend(user_tokens)
+            }
+            for user_id in member_ids
+        ]
+        
+        # 一次取得所有成員的設備令牌
+        all_tokens = resolve_device_token_list(self.supabase, member_ids)
         
         # 儲存所有通知記錄
         if notification_records:
             self.supabase.table("user_notifications").insert(notification_records).execute()
         
         # 發送批量推送通知
-        result = {"success": 0, "failure": 0}
+        result = {"success": 0, "failure": 0, "pruned": 0}
         if all_tokens:
             data_dict = data if data else {}
-            result = await send_notification_to_devices(
+            sent = await send_push_to_devices(
+                self.supabase,
                 tokens=all_tokens,
                 title=title,
                 body=body,
                 data=data_dict
             )
+            result = {key: sent[key] for key in ("success", "failure", "pruned")}
         
         return {
             "members_count": len(member_ids),
             "notification_sent": result
         }
     
-    def get_user_notifications(self, user_id: str, unread_only: bool = False) -> List[Dict]:
+    def get_user_notifications(
+        self,
+        user_id: str,
+        unread_only: bool = False,
+        limit: int = NOTIFICATION_PAGE_SIZE,
+        cursor: Optional[str] = None
+    ) -> Tuple[List[Dict], Optional[str]]:
         """
-        獲取用戶通知列表
+        以 keyset 分頁獲取用戶通知列表（新到舊）
+        
+        Returns:
+            (本頁通知, 下一頁游標；沒有下一頁時為 None)
+        
+        Raises:
+            ValueError: 游標格式錯誤
         """
-        query = self.supabase.table("user_notifications").select("*").eq("user_id", user_id)
+        query = self.supabase.table("user_notifications").select(
+            "id, title, body, data, created_at, read_at"
+        ).eq("user_id", user_id)
         
         if unread_only:
-            query = query.is_("read_at", None)
+            query = query.is_("read_at", "null")
+        if cursor:
+            query = apply_keyset(query, cursor, desc=True)
         
-        query = query.order("created_at", desc=True)
-        result = query.execute()
+        result = order_keyset(query, desc=True).limit(limit + 1).execute()
+        return split_page(result.data or [], limit)
+    
+    def get_unread_count(self, user_id: str) -> int:
+        """
+        獲取用戶的未讀通知數量（讀取由觸發器維護的計數，不需計算通知數量）
+        """
+        result = self.supabase.table("user_notification_counters").select("unread_count").eq(
+            "user_id", user_id
+        ).limit(1).execute()
+        return result.data[0]["unread_count"] if result.data else 0
+    
+    def mark_notifications_as_read(self, user_id: str, notification_ids: Optional[List[str]] = None) -> int:
+        """
+        以一次更新將用戶的未讀通知標記為已讀
+        
+        Args:
+            notification_ids: 要標記的通知；未提供時標記所有未讀通知
+        
+        Returns:
+            標記為已讀的通知數量
+        """
+        query = self.supabase.table("user_notifications").update(
+            {"read_at": datetime.now(timezone.utc).isoformat()},
+            count=CountMethod.exact,
+            returning=ReturnMethod.minimal
+        ).eq("user_id", user_id).is_("read_at", "null")
         
-        return result.data
+        if notification_ids is not None:
+            query = query.in_("id", notification_ids)
+        
+        result = query.execute()
+        return result.count or 0
     
     def mark_notification_as_read(self, notification_id: str, user_id: str) -> bool:
         """
         標記通知為已讀
         """
-        # 檢查通知是否存在且屬於當前用戶
-        notification = self.supabase.table("user_notifications").select("*").eq("id", notification_id).eq("user_id", user_id).execute()
+        # 只更新屬於當前用戶的通知
+        result = self.supabase.table("user_notifications").update(
+            {"read_at": datetime.now(timezone.utc).isoformat()}
+        ).eq("id", notification_id).eq("user_id", user_id).execute()
         
-        if not notification.data:
+        if not result.data:
             raise Exception("通知不存在或無權訪問")
         
-        # 更新為已讀
-        result = self.supabase.table("user_notifications").update({"read_at": "now()"}).eq("id", notification_id).execute()
-        
-        return True
\ No newline at end of file
+        return True
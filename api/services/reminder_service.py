@@ -7,6 +7,8 @@
 - attendance_reminder: 參加聚餐提醒（聚餐當天 9:00）
   - 目標用戶狀態: waiting_attendance
 
+通知寫入 notification_outbox 的 bulk 通道，由背景 worker 發送（不會延遲聊天等即時推送，進程重啟也不會遺失）
+
 支援功能：
 - dry_run 模式：僅模擬執行，不實際發送通知
 - test_user_ids：指定測試用戶，只對這些用戶發送通知
@@ -14,12 +16,13 @@
 
 import random
 import logging
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional
 from datetime import datetime, timezone
 from supabase import Client
+from postgrest.types import CountMethod
 
 import pytz
-from services.notification_service import NotificationService
+from services.notification_outbox_service import get_notification_outbox, LANE_BULK
 from utils.dinner_time_utils import DinnerTimeUtils
 
 # 設定臺灣時區
@@ -28,6 +31,12 @@ TW_TIMEZONE = pytz.timezone('Asia/Taipei')
 logger = logging.getLogger(__name__)
 
 
+# 批次查詢時每次 in_ 的 ID 數量（UUID 約 36 字元，避免查詢字串過長）
+QUERY_BATCH_SIZE = 200
+
+# 分頁讀取目標用戶時每頁的數量（不超過 PostgREST 的 max-rows，Supabase 預設為 1000）
+USER_PAGE_SIZE = 1000
+
 # 各提醒類型對應的目標用戶狀態
 REMINDER_TARGET_STATUSES = {
     "reminder_booking": ["booking", "matching_failed", "confirmation_timeout", "low_attendance"],
@@ -37,6 +46,37 @@ REMINDER_TARGET_STATUSES = {
 }
 
 
+
+def iter_user_status_pages(
+    supabase: Client,
+    target_statuses: List[str],
+    page_size: int = USER_PAGE_SIZE
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    以 user_id 做 keyset 分頁，逐頁讀取符合目標狀態的用戶
+    
+    單次查詢會被 PostgREST 的 max-rows 截斷，因此不論用戶數量都需分頁讀取
+    
+    Yields:
+        [{"user_id", "status"}]
+    """
+    last_user_id = None
+    while True:
+        query = (
+            supabase.table("user_status")
+            .select("user_id, status")
+            .in_("status", target_statuses)
+        )
+        if last_user_id is not None:
+            query = query.gt("user_id", last_user_id)
+        users = query.order("user_id").limit(page_size).execute().data or []
+        if not users:
+            return
+        yield users
+        if len(users) < page_size:
+            return
+        last_user_id = users[-1]["user_id"]
+
 class ReminderService:
     """提醒通知服務"""
     
@@ -55,7 +95,7 @@ class ReminderService:
             test_user_ids: 測試用戶 ID 列表（若提供，只對這些用戶發送通知）
         """
         self.supabase = supabase
-        self.notification_service = NotificationService(use_service_role=True)
+        self.outbox = get_notification_outbox()
         self.dry_run = dry_run
         self.test_user_ids = test_user_ids
     
@@ -122,16 +162,37 @@ class ReminderService:
             # 預約提醒直接發送
             return await self._send_booking_reminders(eligible_users, template)
     
+    def _fan_out(self, messages: List[Dict[str, Any]], errors: List[Dict[str, Any]]) -> int:
+        """
+        以一次寫入將所有已產生的通知加入 outbox 的 bulk 通道
+        
+        內容相同的用戶合併為同一則通知，由背景 worker 批次寫入通知記錄、查詢設備令牌並推送
+        
+        Args:
+            messages: [{"user_id", "title", "body", "data"}]
+            errors: 寫入失敗時加入錯誤資訊
+        
+        Returns:
+            寫入失敗的通知數量
+        """
+        if not messages:
+            return 0
+        try:
+            self.outbox.enqueue_bulk(messages, lane=LANE_BULK)
+            return 0
+        except Exception as e:
+            logger.error(f"寫入 {len(messages)} 則提醒通知時失敗: {e}")
+            errors.append({"user_id": None, "count": len(messages), "error": str(e)})
+            return len(messages)
+    
     async def _get_eligible_users(self, target_statuses: List[str]) -> List[Dict[str, Any]]:
-        """獲取符合目標狀態的用戶列表"""
+        """獲取符合目標狀態的用戶列表（分頁讀取，與預覽的用戶一致）"""
         try:
-            result = (
-                self.supabase.table("user_status")
-                .select("user_id, status")
-                .in_("status", target_statuses)
-                .execute()
-            )
-            return result.data or []
+            return [
+                user
+                for page in iter_user_status_pages(self.supabase, target_statuses)
+                for user in page
+            ]
         except Exception as e:
             logger.error(f"獲取符合條件的用戶時發生錯誤: {e}")
             return []
@@ -190,6 +251,7 @@ class ReminderService:
         skipped_count = 0
         errors = []
         dry_run_users = []
+        messages = []
         
         for user in users:
             user_id = user["user_id"]
@@ -204,26 +266,23 @@ class ReminderService:
                 skipped_count += 1
                 continue
             
-            try:
-                await self.notification_service.send_notification(
-                    user_id=user_id,
-                    title=title,
-                    body=body,
-                    data={
-                        "type": "booking_reminder",
-                        "action": "open_booking"
-                    }
-                )
-                success_count += 1
-            except Exception as e:
-                failed_count += 1
-                errors.append({"user_id": user_id, "error": str(e)})
-                logger.error(f"發送預約提醒給用戶 {user_id} 時失敗: {e}")
+            messages.append({
+                "user_id": user_id,
+                "title": title,
+                "body": body,
+                "data": {
+                    "type": "booking_reminder",
+                    "action": "open_booking"
+                }
+            })
+        
+        failed_count += self._fan_out(messages, errors)
+        success_count = len(messages) - failed_count
         
         if self.dry_run:
             logger.info(f"[booking_reminder] DRY RUN 模式 - 模擬發送給 {skipped_count} 位用戶")
         else:
-            logger.info(f"[booking_reminder] 發送完成 - 成功: {success_count}, 失敗: {failed_count}")
+            logger.info(f"[booking_reminder] 已排入發送佇列 - 成功: {success_count}, 失敗: {failed_count}")
         
         return {
             "success": True,
@@ -251,12 +310,15 @@ class ReminderService:
         skipped_count = 0
         errors = []
         dry_run_users = []
+        messages = []
+        
+        # 一次解析所有用戶的聚餐資訊
+        event_contexts = await self._resolve_event_contexts([user["user_id"] for user in users])
         
         for user in users:
             user_id = user["user_id"]
             try:
-                # 獲取用戶的聚餐資訊
-                event_info = await self._get_user_dining_event(user_id)
+                event_info = event_contexts.get(user_id)
                 
                 # 替換模板中的佔位符
                 title = template["title"]
@@ -273,26 +335,29 @@ class ReminderService:
                     skipped_count += 1
                     continue
                 
-                await self.notification_service.send_notification(
-                    user_id=user_id,
-                    title=title,
-                    body=body,
-                    data={
+                messages.append({
+                    "user_id": user_id,
+                    "title": title,
+                    "body": body,
+                    "data": {
                         "type": "attendance_reminder",
                         "action": "open_event",
                         "event_id": event_info.get("event_id") if event_info else None
                     }
-                )
-                success_count += 1
+                })
             except Exception as e:
                 failed_count += 1
                 errors.append({"user_id": user_id, "error": str(e)})
-                logger.error(f"發送出席提醒給用戶 {user_id} 時失敗: {e}")
+                logger.error(f"產生出席提醒給用戶 {user_id} 時失敗: {e}")
+        
+        fan_out_failed = self._fan_out(messages, errors)
+        success_count = len(messages) - fan_out_failed
+        failed_count += fan_out_failed
         
         if self.dry_run:
             logger.info(f"[attendance_reminder] DRY RUN 模式 - 模擬發送給 {skipped_count} 位用戶")
         else:
-            logger.info(f"[attendance_reminder] 發送完成 - 成功: {success_count}, 失敗: {failed_count}")
+            logger.info(f"[attendance_reminder] 已排入發送佇列 - 成功: {success_count}, 失敗: {failed_count}")
         
         return {
             "success": True,
@@ -308,67 +373,92 @@ class ReminderService:
             "errors": errors if errors else None
         }
     
-    async def _get_user_dining_event(self, user_id: str) -> Optional[Dict[str, Any]]:
-        """獲取用戶當前的聚餐活動資訊"""
-        try:
-            # 先獲取用戶的 matching_group_id
-            matching_info = (
+    async def _load_matching_groups(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批次獲取用戶的配對群組資訊（每 QUERY_BATCH_SIZE 位用戶一次 in_ 查詢）
+        
+        Returns:
+            {user_id: {"group_id", "deadline"}}，沒有配對資訊的用戶不在結果中
+        """
+        groups = {}
+        for i in range(0, len(user_ids), QUERY_BATCH_SIZE):
+            batch = user_ids[i:i + QUERY_BATCH_SIZE]
+            result = (
                 self.supabase.table("user_matching_info")
-                .select("matching_group_id")
-                .eq("user_id", user_id)
-                .limit(1)
+                .select("user_id, matching_group_id, confirmation_deadline")
+                .in_("user_id", batch)
                 .execute()
             )
+            for row in result.data or []:
+                groups.setdefault(row["user_id"], {
+                    "group_id": row.get("matching_group_id"),
+                    "deadline": row.get("confirmation_deadline")
+                })
+        return groups
+    
+    async def _resolve_event_contexts(self, user_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        批次解析用戶當前的聚餐活動資訊
+        
+        先批次取得配對群組，再以群組批次取得聚餐事件（含餐廳），同一群組的成員共用同一個事件，
+        查詢次數與用戶數無關，產生訊息時不需要再逐一查詢
+        
+        Returns:
+            {user_id: 聚餐資訊}，找不到聚餐活動的用戶對應 None
+        """
+        contexts: Dict[str, Optional[Dict[str, Any]]] = {user_id: None for user_id in user_ids}
+        try:
+            groups = await self._load_matching_groups(user_ids)
+            group_ids = list(dict.fromkeys(
+                info["group_id"] for info in groups.values() if info.get("group_id")
+            ))
             
-            if not matching_info.data or len(matching_info.data) == 0:
-                return None
-            
-            group_id = matching_info.data[0].get("matching_group_id")
-            if not group_id:
-                return None
-            
-            # 獲取該群組的聚餐活動
-            event_result = (
-                self.supabase.table("dining_events")
-                .select("id, name, date, restaurant_id, restaurants(name, address)")
-                .eq("matching_group_id", group_id)
-                .in_("status", ["confirmed", "pending_confirmation"])
-                .order("date", desc=True)
-                .limit(1)
-                .execute()
-            )
-            
-            if not event_result.data:
-                return None
-            
-            event = event_result.data[0]
-            restaurant = event.get("restaurants", {}) or {}
-            
-            # 格式化時間（需要轉換 UTC 到台灣時間）
-            event_date = event.get("date")
-            time_str = "18:00"  # 預設時間
-            if event_date:
-                try:
-                    dt = datetime.fromisoformat(event_date.replace("Z", "+00:00"))
-                    # 將 UTC 時間轉換為台灣時間
-                    dt_tw = dt.astimezone(TW_TIMEZONE)
-                    time_str = dt_tw.strftime("%H:%M")
-                except:
-                    pass
-            
-            return {
-                "event_id": event.get("id"),
-                "event_name": event.get("name"),
-                "time": time_str,
-                "date": event_date,
-                "restaurant_id": event.get("restaurant_id"),
-                "restaurant_name": restaurant.get("name", "待定"),
-                "location": restaurant.get("address", "")
-            }
+            # 每個群組取日期最新的聚餐事件
+            events_by_group = {}
+            for i in range(0, len(group_ids), QUERY_BATCH_SIZE):
+                batch = group_ids[i:i + QUERY_BATCH_SIZE]
+                result = (
+                    self.supabase.table("dining_events")
+                    .select("id, name, date, restaurant_id, matching_group_id, restaurants(name, address)")
+                    .in_("matching_group_id", batch)
+                    .in_("status", ["confirmed", "pending_confirmation"])
+                    .order("date", desc=True)
+                    .execute()
+                )
+                for event in result.data or []:
+                    events_by_group.setdefault(event["matching_group_id"], self._build_event_context(event))
             
+            for user_id, info in groups.items():
+                contexts[user_id] = events_by_group.get(info.get("group_id"))
         except Exception as e:
-            logger.error(f"獲取用戶 {user_id} 的聚餐資訊時發生錯誤: {e}")
-            return None
+            logger.error(f"批次獲取 {len(user_ids)} 位用戶的聚餐資訊時發生錯誤: {e}")
+        return contexts
+    
+    def _build_event_context(self, event: Dict[str, Any]) -> Dict[str, Any]:
+        """將聚餐事件（含餐廳）轉換為模板使用的聚餐資訊"""
+        restaurant = event.get("restaurants", {}) or {}
+        
+        # 格式化時間（需要轉換 UTC 到台灣時間）
+        event_date = event.get("date")
+        time_str = "18:00"  # 預設時間
+        if event_date:
+            try:
+                dt = datetime.fromisoformat(event_date.replace("Z", "+00:00"))
+                # 將 UTC 時間轉換為台灣時間
+                dt_tw = dt.astimezone(TW_TIMEZONE)
+                time_str = dt_tw.strftime("%H:%M")
+            except:
+                pass
+        
+        return {
+            "event_id": event.get("id"),
+            "event_name": event.get("name"),
+            "time": time_str,
+            "date": event_date,
+            "restaurant_id": event.get("restaurant_id"),
+            "restaurant_name": restaurant.get("name", "待定"),
+            "location": restaurant.get("address", "")
+        }
     
     def _format_template(self, template_body: str, event_info: Optional[Dict[str, Any]]) -> str:
         """替換模板中的佔位符"""
@@ -414,16 +504,18 @@ class ReminderService:
         skipped_count = 0
         errors = []
         dry_run_users = []
+        messages = []
+        
+        # 一次獲取所有用戶的群組資訊
+        try:
+            matching_groups = await self._load_matching_groups([user["user_id"] for user in users])
+        except Exception as e:
+            logger.error(f"批次獲取 {len(users)} 位用戶的群組資訊時失敗: {e}")
+            matching_groups = {}
         
         for user in users:
             user_id = user["user_id"]
-            
-            # 獲取用戶的群組資訊
-            try:
-                group_info = await self._get_user_matching_group(user_id)
-            except Exception as e:
-                logger.error(f"獲取用戶 {user_id} 的群組資訊時失敗: {e}")
-                group_info = None
+            group_info = matching_groups.get(user_id)
             
             # dry_run 模式：只記錄不發送
             if self.dry_run:
@@ -436,31 +528,28 @@ class ReminderService:
                 skipped_count += 1
                 continue
             
-            try:
-                notification_data = {
-                    "type": "matching_restaurant",
-                    "action": "open_restaurant_selection"
-                }
-                if group_info:
-                    notification_data["group_id"] = group_info.get("group_id")
-                    notification_data["deadline"] = group_info.get("deadline")
-                
-                await self.notification_service.send_notification(
-                    user_id=user_id,
-                    title=title,
-                    body=body,
-                    data=notification_data
-                )
-                success_count += 1
-            except Exception as e:
-                failed_count += 1
-                errors.append({"user_id": user_id, "error": str(e)})
-                logger.error(f"發送配對成功通知給用戶 {user_id} 時失敗: {e}")
+            notification_data = {
+                "type": "matching_restaurant",
+                "action": "open_restaurant_selection"
+            }
+            if group_info:
+                notification_data["group_id"] = group_info.get("group_id")
+                notification_data["deadline"] = group_info.get("deadline")
+            
+            messages.append({
+                "user_id": user_id,
+                "title": title,
+                "body": body,
+                "data": notification_data
+            })
+        
+        failed_count += self._fan_out(messages, errors)
+        success_count = len(messages) - failed_count
         
         if self.dry_run:
             logger.info(f"[reminder_matching] DRY RUN 模式 - 模擬發送給 {skipped_count} 位用戶")
         else:
-            logger.info(f"[reminder_matching] 發送完成 - 成功: {success_count}, 失敗: {failed_count}")
+            logger.info(f"[reminder_matching] 已排入發送佇列 - 成功: {success_count}, 失敗: {failed_count}")
         
         return {
             "success": True,
@@ -486,7 +575,7 @@ class ReminderService:
         邏輯說明：
         - 當所有用戶都投票完成時，會立即發送通知（在 vote_restaurant API 中處理）
         - 當投票時間到強制結束時，由此方法發送通知
-        - 判斷依據：dining_events.description 包含「投票時間已到自動選出」
+        - 判斷依據：dining_events.is_forced_close 為 true 且 vote_result_notified 為 false
         
         注意：傳入的 users 參數會被忽略，改為根據強制結束的聚餐事件來獲取用戶
         """
@@ -495,9 +584,11 @@ class ReminderService:
         skipped_count = 0
         errors = []
         dry_run_users = []
+        messages = []
+        notified_event_ids = []
         
         try:
-            # 獲取所有強制結束的聚餐事件（description 包含「投票時間已到自動選出」）
+            # 獲取所有尚未發送投票結果通知的強制結束聚餐事件
             forced_events = await self._get_forced_vote_events()
             
             if not forced_events:
@@ -554,27 +645,27 @@ class ReminderService:
                         skipped_count += 1
                         continue
                     
-                    try:
-                        await self.notification_service.send_notification(
-                            user_id=user_id,
-                            title=title,
-                            body=body,
-                            data={
-                                "type": "dining_event_created",
-                                "action": "open_event",
-                                "event_id": event_id,
-                                "restaurant_id": restaurant_id
-                            }
-                        )
-                        success_count += 1
-                    except Exception as e:
-                        failed_count += 1
-                        errors.append({"user_id": user_id, "error": str(e)})
-                        logger.error(f"發送投票結果通知給用戶 {user_id} 時失敗: {e}")
+                    messages.append({
+                        "user_id": user_id,
+                        "title": title,
+                        "body": body,
+                        "data": {
+                            "type": "dining_event_created",
+                            "action": "open_event",
+                            "event_id": event_id,
+                            "restaurant_id": restaurant_id
+                        }
+                    })
                 
-                # 更新聚餐事件的 description，移除強制結束標記（表示通知已發送）
-                if not self.dry_run:
-                    await self._mark_vote_result_notification_sent(event_id)
+                notified_event_ids.append(event_id)
+            
+            # 所有群組的通知以一次寫入加入 outbox
+            failed_count += self._fan_out(messages, errors)
+            success_count = len(messages) - failed_count
+            
+            # 通知寫入成功後才標記聚餐事件的投票結果通知已發送
+            if not self.dry_run and not failed_count and notified_event_ids:
+                await self._mark_vote_results_notified(notified_event_ids)
             
         except Exception as e:
             logger.error(f"[reminder_vote_result] 處理時發生錯誤: {e}")
@@ -587,7 +678,7 @@ class ReminderService:
         if self.dry_run:
             logger.info(f"[reminder_vote_result] DRY RUN 模式 - 模擬發送給 {skipped_count} 位用戶")
         else:
-            logger.info(f"[reminder_vote_result] 發送完成 - 成功: {success_count}, 失敗: {failed_count}")
+            logger.info(f"[reminder_vote_result] 已排入發送佇列 - 成功: {success_count}, 失敗: {failed_count}")
         
         return {
             "success": True,
@@ -606,16 +697,17 @@ class ReminderService:
         """
         獲取所有強制結束的聚餐事件（需要發送通知的）
         
-        判斷條件：
+        判斷條件（有部分索引）：
         - status 為 pending_confirmation 或 confirmed
-        - description 包含「投票時間已到自動選出」
+        - is_forced_close 為 true 且 vote_result_notified 為 false
         """
         try:
             result = (
                 self.supabase.table("dining_events")
-                .select("id, matching_group_id, restaurant_id, date, description, restaurants(name)")
+                .select("id, matching_group_id, restaurant_id, date, restaurants(name)")
                 .in_("status", ["pending_confirmation", "confirmed"])
-                .like("description", "*投票時間已到自動選出*")
+                .eq("is_forced_close", True)
+                .eq("vote_result_notified", False)
                 .execute()
             )
             return result.data or []
@@ -640,57 +732,17 @@ class ReminderService:
             logger.error(f"獲取群組 {group_id} 成員時發生錯誤: {e}")
             return []
     
-    async def _mark_vote_result_notification_sent(self, event_id: str):
-        """
-        標記聚餐事件的投票結果通知已發送
-        
-        做法：移除 description 中的「投票時間已到自動選出」標記
-        """
-        try:
-            # 先獲取當前的 description
-            event = (
-                self.supabase.table("dining_events")
-                .select("description")
-                .eq("id", event_id)
-                .limit(1)
-                .execute()
-            )
-            
-            if event.data and len(event.data) > 0:
-                current_desc = event.data[0].get("description", "")
-                # 移除強制結束標記
-                new_desc = current_desc.replace(" (投票時間已到自動選出)", "")
-                
-                # 更新 description
+    async def _mark_vote_results_notified(self, event_ids: List[str]):
+        """以一次更新標記聚餐事件的投票結果通知已發送"""
+        for i in range(0, len(event_ids), QUERY_BATCH_SIZE):
+            batch = event_ids[i:i + QUERY_BATCH_SIZE]
+            try:
                 self.supabase.table("dining_events").update({
-                    "description": new_desc
-                }).eq("id", event_id).execute()
-                
-                logger.info(f"已標記聚餐事件 {event_id} 的投票結果通知已發送")
-        except Exception as e:
-            logger.error(f"標記聚餐事件 {event_id} 通知已發送時發生錯誤: {e}")
-    
-    async def _get_user_matching_group(self, user_id: str) -> Optional[Dict[str, Any]]:
-        """獲取用戶的配對群組資訊"""
-        try:
-            matching_info = (
-                self.supabase.table("user_matching_info")
-                .select("matching_group_id, confirmation_deadline")
-                .eq("user_id", user_id)
-                .limit(1)
-                .execute()
-            )
-            
-            if not matching_info.data or len(matching_info.data) == 0:
-                return None
-            
-            return {
-                "group_id": matching_info.data[0].get("matching_group_id"),
-                "deadline": matching_info.data[0].get("confirmation_deadline")
-            }
-        except Exception as e:
-            logger.error(f"獲取用戶 {user_id} 的配對群組資訊時發生錯誤: {e}")
-            return None
+                    "vote_result_notified": True
+                }).in_("id", batch).execute()
+                logger.info(f"已標記 {len(batch)} 個聚餐事件的投票結果通知已發送")
+            except Exception as e:
+                logger.error(f"標記 {len(batch)} 個聚餐事件通知已發送時發生錯誤: {e}")
     
     def _format_dinner_date(self, event_date: Optional[str]) -> str:
         """格式化聚餐日期為 X月X日 格式"""
@@ -785,3 +837,61 @@ async def process_reminder_vote_result(
     service = ReminderService(supabase, dry_run=dry_run, test_user_ids=test_user_ids)
     return await service.send_reminders("reminder_vote_result")
 
+
+def iter_reminder_recipients(
+    supabase: Client,
+    target_statuses: List[str],
+    batch_size: int = QUERY_BATCH_SIZE
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    分批產生提醒的目標用戶（含 nickname），供預覽串流輸出
+    
+    以 user_id 做 keyset 分頁讀取 user_status，每批的 nickname 以一次 in_ 查詢取得，
+    查詢次數為 2 × 批數，記憶體中只保留一批資料
+    
+    Args:
+        supabase: Supabase 客戶端
+        target_statuses: 目標用戶狀態
+        batch_size: 每批用戶數量
+    
+    Yields:
+        [{"user_id", "status", "nickname"}]
+    """
+    for users in iter_user_status_pages(supabase, target_statuses, page_size=batch_size):
+        user_ids = [user["user_id"] for user in users]
+        nicknames = {}
+        try:
+            profiles = (
+                supabase.table("user_profiles")
+                .select("user_id, nickname")
+                .in_("user_id", user_ids)
+                .execute()
+            )
+            nicknames = {row["user_id"]: row.get("nickname") for row in profiles.data or []}
+        except Exception as e:
+            logger.warning(f"批次查詢 nickname 時發生錯誤: {e}")  # nickname 僅供參考
+        
+        yield [
+            {"user_id": user["user_id"], "status": user["status"], "nickname": nicknames.get(user["user_id"])}
+            for user in users
+        ]
+
+
+def count_reminder_recipients(supabase: Client, target_statuses: List[str]) -> Dict[str, int]:
+    """
+    統計各目標狀態的用戶數量（每個狀態一次 count 查詢，不讀取用戶資料）
+    
+    Returns:
+        {status: 用戶數量}
+    """
+    counts = {}
+    for target_status in target_statuses:
+        result = (
+            supabase.table("user_status")
+            .select("user_id", count=CountMethod.exact)
+            .eq("status", target_status)
+            .limit(1)
+            .execute()
+        )
+        counts[target_status] = result.count or 0
+    return counts
@@ -0,0 +1,6 @@
+-- 聊天圖片 keyset 分頁索引
+-- /api/chat/images/batch 以 (created_at, id) 游標分頁，索引讓每一頁都只需掃描該頁的資料
+
+CREATE INDEX IF NOT EXISTS idx_chat_messages_images_keyset
+ON public.chat_messages(dining_event_id, created_at, id)
+WHERE message_type = 'image' AND image_path IS NOT NULL;
@@ -0,0 +1,26 @@
+-- 強制結束投票的聚餐事件標記遷移
+-- 原本以 description 中的「(投票時間已到自動選出)」字串標記需要由排程發送投票結果通知的事件，
+-- 查詢需要對 description 做子字串掃描，改為明確的欄位並建立部分索引
+
+-- 1. 新增欄位到 dining_events 表
+ALTER TABLE dining_events
+ADD COLUMN IF NOT EXISTS is_forced_close BOOLEAN NOT NULL DEFAULT FALSE;
+
+ALTER TABLE dining_events
+ADD COLUMN IF NOT EXISTS vote_result_notified BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- 2. 回填：description 仍帶有標記的事件為尚未發送通知的強制結束事件，並移除 description 中的標記
+UPDATE dining_events
+SET is_forced_close = TRUE,
+    vote_result_notified = FALSE,
+    description = REPLACE(description, ' (投票時間已到自動選出)', '')
+WHERE description LIKE '%(投票時間已到自動選出)%';
+
+-- 3. 只索引尚未發送投票結果通知的強制結束事件
+CREATE INDEX IF NOT EXISTS idx_dining_events_vote_result_pending
+ON dining_events(status)
+WHERE is_forced_close AND NOT vote_result_notified;
+
+-- 4. 添加註釋說明欄位用途
+COMMENT ON COLUMN dining_events.is_forced_close IS '投票時間到時由系統強制結束投票並選出餐廳';
+COMMENT ON COLUMN dining_events.vote_result_notified IS '強制結束的投票結果通知是否已由 reminder_vote_result 排程發送';
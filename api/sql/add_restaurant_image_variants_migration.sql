@@ -0,0 +1,9 @@
+-- 餐廳圖片衍生圖欄位遷移
+-- 新增 image_variants 欄位記錄餐廳圖片的多尺寸衍生圖
+
+-- 1. 新增 image_variants 欄位到 restaurants 表
+ALTER TABLE restaurants
+ADD COLUMN IF NOT EXISTS image_variants JSONB;
+
+-- 2. 添加註釋說明欄位用途
+COMMENT ON COLUMN restaurants.image_variants IS '多尺寸衍生圖列表 [{width, height, format, url, size}]，路徑為 places/{原圖SHA-256}/{寬度}w.{格式}；NULL 表示尚未產生（僅有 image_path）';
@@ -0,0 +1,14 @@
+-- 使用者上傳圖片縮圖欄位遷移
+-- 聊天圖片與頭像上傳完成後由後端產生縮圖，寫在原圖旁邊（{主檔名}_thumb.webp）
+
+-- 1. 新增 thumbnail_path 欄位到 chat_messages 表
+ALTER TABLE chat_messages
+ADD COLUMN IF NOT EXISTS thumbnail_path TEXT;
+
+-- 2. 新增 avatar_thumbnail_path 欄位到 user_profiles 表
+ALTER TABLE user_profiles
+ADD COLUMN IF NOT EXISTS avatar_thumbnail_path TEXT;
+
+-- 3. 添加註釋說明欄位用途
+COMMENT ON COLUMN chat_messages.thumbnail_path IS '聊天圖片縮圖路徑，例如 chat_images/{dining_event_id}/{message_id}_thumb.webp；NULL 表示尚未產生（讀取時使用原圖）';
+COMMENT ON COLUMN user_profiles.avatar_thumbnail_path IS '頭像縮圖路徑，例如 avatars/{user_id}_thumb.webp；NULL 表示尚未產生（讀取時使用原圖）';
@@ -6,6 +6,7 @@ CREATE TABLE IF NOT EXISTS public.chat_messages (
     content TEXT,
     message_type TEXT NOT NULL DEFAULT 'text' CHECK (message_type IN ('text', 'image')),
     image_path TEXT,
+    thumbnail_path TEXT,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
@@ -13,6 +14,7 @@ CREATE TABLE IF NOT EXISTS public.chat_messages (
 CREATE INDEX IF NOT EXISTS idx_chat_messages_dining_event_id ON public.chat_messages(dining_event_id);
 CREATE INDEX IF NOT EXISTS idx_chat_messages_created_at ON public.chat_messages(created_at DESC);
 CREATE INDEX IF NOT EXISTS idx_chat_messages_user_id ON public.chat_messages(user_id);
+CREATE INDEX IF NOT EXISTS idx_chat_messages_images_keyset ON public.chat_messages(dining_event_id, created_at, id) WHERE message_type = 'image' AND image_path IS NOT NULL;
 
 -- 啟用 Realtime 訂閱
 ALTER PUBLICATION supabase_realtime ADD TABLE public.chat_messages;
@@ -63,6 +65,7 @@ COMMENT ON COLUMN public.chat_messages.user_id IS '發送者用戶 ID';
 COMMENT ON COLUMN public.chat_messages.content IS '訊息內容（文字訊息）';
 COMMENT ON COLUMN public.chat_messages.message_type IS '訊息類型：text（文字）或 image（圖片）';
 COMMENT ON COLUMN public.chat_messages.image_path IS '圖片路徑（R2 上的路徑，僅圖片訊息）';
+COMMENT ON COLUMN public.chat_messages.thumbnail_path IS '縮圖路徑（{image_path 主檔名}_thumb.webp，由上傳完成通知產生；NULL 表示尚未產生）';
 COMMENT ON COLUMN public.chat_messages.created_at IS '訊息建立時間';
 
 
@@ -11,6 +11,7 @@ create table public.user_profiles (
   gender text not null,
   personal_desc text null,
   avatar_path text null,
+  avatar_thumbnail_path text null,
   created_at timestamp with time zone null default now(),
   updated_at timestamp with time zone null default now(),
   constraint user_profiles_pkey primary key (id),
@@ -137,6 +138,7 @@ CREATE TABLE IF NOT EXISTS restaurants (
     latitude DOUBLE PRECISION,
     longitude DOUBLE PRECISION,
     image_path TEXT,
+    image_variants JSONB, -- 多尺寸衍生圖列表 [{width, height, format, url, size}]
     business_hours TEXT,
     google_place_id TEXT,
     is_user_added BOOLEAN DEFAULT FALSE,
@@ -186,7 +188,9 @@ CREATE TABLE IF NOT EXISTS dining_events (
     status_change_time TIMESTAMP WITH TIME ZONE,
     attendee_count INTEGER,
     reservation_name TEXT,
-    reservation_phone TEXT
+    reservation_phone TEXT,
+    is_forced_close BOOLEAN NOT NULL DEFAULT FALSE,
+    vote_result_notified BOOLEAN NOT NULL DEFAULT FALSE
 );
 
 -- 創建評價會話表（用於追蹤一次評價過程）
@@ -333,6 +337,7 @@ CREATE INDEX IF NOT EXISTS idx_dining_events_restaurant_id ON dining_events(rest
 CREATE INDEX IF NOT EXISTS idx_restaurant_votes_group_id ON restaurant_votes(group_id);
 CREATE INDEX IF NOT EXISTS idx_restaurant_votes_restaurant_id ON restaurant_votes(restaurant_id);
 CREATE INDEX IF NOT EXISTS idx_user_notifications_user_id ON user_notifications(user_id);
+CREATE INDEX IF NOT EXISTS idx_dining_events_vote_result_pending ON dining_events(status) WHERE is_forced_close AND NOT vote_result_notified;
 CREATE INDEX IF NOT EXISTS idx_user_notifications_read_at ON user_notifications(read_at);
 CREATE INDEX IF NOT EXISTS idx_user_status_user_id ON user_status(user_id);
 CREATE INDEX IF NOT EXISTS idx_user_status_status ON user_status(status);
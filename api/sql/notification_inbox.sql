@@ -0,0 +1,108 @@
+-- 通知收件匣：keyset 分頁索引與未讀數量計數
+-- /api/notification 以 (created_at, id) 游標分頁，未讀數量由觸發器維護，顯示徽章時不需計算通知數量
+
+-- 1. 分頁索引（全部通知與未讀通知）
+CREATE INDEX IF NOT EXISTS idx_user_notifications_inbox
+ON user_notifications(user_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_user_notifications_unread
+ON user_notifications(user_id, created_at DESC, id DESC)
+WHERE read_at IS NULL;
+
+-- 2. 每位用戶的未讀數量
+CREATE TABLE IF NOT EXISTS user_notification_counters (
+    user_id UUID PRIMARY KEY REFERENCES auth.users(id) ON DELETE CASCADE,
+    unread_count INTEGER NOT NULL DEFAULT 0 CHECK (unread_count >= 0),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE user_notification_counters ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Users can view their own notification counter"
+ON user_notification_counters
+FOR SELECT
+USING (auth.uid() = user_id);
+
+-- 3. 維護未讀數量的觸發器（以語句層級的轉換表彙總，批次寫入通知時每位用戶只更新一次）
+-- 計數表只開放 SELECT，函數以 SECURITY DEFINER 執行，非 service role 寫入通知時觸發器仍可更新計數
+CREATE OR REPLACE FUNCTION apply_unread_notification_delta(p_deltas JSONB) RETURNS VOID AS $$
+BEGIN
+  INSERT INTO user_notification_counters (user_id, unread_count, updated_at)
+  SELECT (key)::UUID, GREATEST(value::INTEGER, 0), NOW()
+  FROM jsonb_each_text(p_deltas)
+  ON CONFLICT (user_id) DO UPDATE
+  SET unread_count = GREATEST(user_notification_counters.unread_count + (p_deltas->>(EXCLUDED.user_id::TEXT))::INTEGER, 0),
+      updated_at = NOW();
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION count_inserted_unread_notifications() RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM apply_unread_notification_delta(COALESCE((
+    SELECT jsonb_object_agg(user_id, cnt)
+    FROM (SELECT user_id, COUNT(*) AS cnt FROM new_rows WHERE read_at IS NULL GROUP BY user_id) t
+  ), '{}'::jsonb));
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION count_updated_unread_notifications() RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM apply_unread_notification_delta(COALESCE((
+    SELECT jsonb_object_agg(user_id, delta)
+    FROM (
+      SELECT n.user_id,
+             SUM((n.read_at IS NULL)::INTEGER - (o.read_at IS NULL)::INTEGER) AS delta
+      FROM new_rows n
+      JOIN old_rows o ON o.id = n.id
+      GROUP BY n.user_id
+    ) t
+    WHERE delta <> 0
+  ), '{}'::jsonb));
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+CREATE OR REPLACE FUNCTION count_deleted_unread_notifications() RETURNS TRIGGER AS $$
+BEGIN
+  PERFORM apply_unread_notification_delta(COALESCE((
+    SELECT jsonb_object_agg(user_id, -cnt)
+    FROM (SELECT user_id, COUNT(*) AS cnt FROM old_rows WHERE read_at IS NULL GROUP BY user_id) t
+  ), '{}'::jsonb));
+  RETURN NULL;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET search_path = public;
+
+-- 計數只能由觸發器更新，不開放直接呼叫
+REVOKE EXECUTE ON FUNCTION apply_unread_notification_delta(JSONB) FROM PUBLIC, anon, authenticated;
+
+DROP TRIGGER IF EXISTS user_notifications_unread_insert ON user_notifications;
+CREATE TRIGGER user_notifications_unread_insert
+  AFTER INSERT ON user_notifications
+  REFERENCING NEW TABLE AS new_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION count_inserted_unread_notifications();
+
+DROP TRIGGER IF EXISTS user_notifications_unread_update ON user_notifications;
+CREATE TRIGGER user_notifications_unread_update
+  AFTER UPDATE ON user_notifications
+  REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION count_updated_unread_notifications();
+
+DROP TRIGGER IF EXISTS user_notifications_unread_delete ON user_notifications;
+CREATE TRIGGER user_notifications_unread_delete
+  AFTER DELETE ON user_notifications
+  REFERENCING OLD TABLE AS old_rows
+  FOR EACH STATEMENT
+  EXECUTE FUNCTION count_deleted_unread_notifications();
+
+-- 4. 回填現有的未讀數量
+INSERT INTO user_notification_counters (user_id, unread_count, updated_at)
+SELECT user_id, COUNT(*), NOW()
+FROM user_notifications
+WHERE read_at IS NULL
+GROUP BY user_id
+ON CONFLICT (user_id) DO UPDATE
+SET unread_count = EXCLUDED.unread_count,
+    updated_at = NOW();
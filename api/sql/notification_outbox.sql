@@ -0,0 +1,61 @@
+-- 通知 outbox 表
+-- API 與排程只寫入一筆待發送的通知，由背景 worker 領取後寫入 user_notifications 並推送，
+-- 進程重啟時未完成的通知不會遺失
+CREATE TABLE IF NOT EXISTS public.notification_outbox (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    -- 優先通道：realtime（聊天等即時推送）、bulk（排程提醒等大量推送），各自有獨立的 worker
+    lane TEXT NOT NULL DEFAULT 'realtime' CHECK (lane IN ('realtime', 'bulk')),
+    user_ids UUID[] NOT NULL,
+    title TEXT NOT NULL,
+    body TEXT NOT NULL,
+    data JSONB DEFAULT '{}'::jsonb,
+    -- 是否寫入 user_notifications（寫入後設為 inbox_stored，重試時不重複寫入）
+    store_in_inbox BOOLEAN NOT NULL DEFAULT TRUE,
+    inbox_stored BOOLEAN NOT NULL DEFAULT FALSE,
+    status TEXT NOT NULL DEFAULT 'pending' CHECK (status IN ('pending', 'sending', 'sent', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    -- pending：可領取的時間；sending：租約到期時間（worker 中斷時到期後可被重新領取）
+    next_attempt_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    last_error TEXT,
+    result JSONB,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    sent_at TIMESTAMP WITH TIME ZONE
+);
+
+-- 只索引尚未完成的通知，領取時依通道與時間掃描
+CREATE INDEX IF NOT EXISTS idx_notification_outbox_due
+ON public.notification_outbox(lane, next_attempt_at)
+WHERE status IN ('pending', 'sending');
+
+-- 只允許服務角色存取
+ALTER TABLE public.notification_outbox ENABLE ROW LEVEL SECURITY;
+
+-- 領取到期的通知：以 SKIP LOCKED 讓多個 worker（或多台機器）同時領取不同的資料列，
+-- 領取時增加嘗試次數並設定租約
+CREATE OR REPLACE FUNCTION public.claim_notification_outbox(
+    p_lane TEXT,
+    p_limit INTEGER,
+    p_lease_seconds INTEGER
+)
+RETURNS SETOF public.notification_outbox
+LANGUAGE sql
+AS $$
+    UPDATE public.notification_outbox o
+    SET status = 'sending',
+        attempts = o.attempts + 1,
+        next_attempt_at = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE o.id IN (
+        SELECT id
+        FROM public.notification_outbox
+        WHERE lane = p_lane
+          AND status IN ('pending', 'sending')
+          AND next_attempt_at <= NOW()
+        ORDER BY next_attempt_at
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING o.*;
+$$;
+
+-- 已完成的通知可定期清理，例如：
+-- DELETE FROM public.notification_outbox WHERE status IN ('sent', 'failed') AND created_at < NOW() - INTERVAL '7 days';
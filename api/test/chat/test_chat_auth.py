@@ -0,0 +1,142 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+test_dir = os.path.dirname(current_dir)
+api_dir = os.path.dirname(test_dir)
+sys.path.append(api_dir)
+sys.path.append(test_dir)
+
+import firebase_admin
+
+# 不需要真實憑證（matching 路由模組會載入通知服務）
+if not firebase_admin._apps:
+    firebase_admin.initialize_app(options={"projectId": "tuckin-test"})
+
+from fakes import FakeSupabase, FakeTable
+
+import services.chat_auth_service as chat_auth_service
+from services.chat_auth_service import (
+    ChatMembershipCache,
+    get_chat_membership,
+    invalidate_chat_memberships
+)
+from routers.matching import update_user_status_to_failed
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def make_supabase():
+    """一個聚餐事件與兩位成員，記錄查詢次數"""
+    return FakeSupabase({
+        "dining_events": [{"id": "e1", "matching_group_id": "g1"}],
+        "user_matching_info": [
+            {"user_id": "u1", "matching_group_id": "g1"},
+            {"user_id": "u2", "matching_group_id": "g1"},
+        ],
+    })
+
+
+def install_cache(ttl_seconds=300):
+    chat_auth_service._chat_membership_cache = ChatMembershipCache(ttl_seconds=ttl_seconds, max_events=10)
+    return chat_auth_service._chat_membership_cache
+
+
+def test_cached_membership():
+    """測試成員資格快取：第二次驗證不需查詢資料庫，並提供成員列表"""
+    logger.info("測試聊天成員資格快取...")
+    install_cache()
+    supabase = make_supabase()
+
+    membership = get_chat_membership(supabase, "e1", "u1")
+    assert membership.is_member("u1") and membership.matching_group_id == "g1"
+    assert len(supabase.queries) == 2
+
+    for _ in range(10):
+        membership = get_chat_membership(supabase, "e1", "u2")
+    assert len(supabase.queries) == 2
+    assert membership.other_member_ids("u2") == ["u1"]
+
+    assert get_chat_membership(supabase, "missing", "u1") is None
+    logger.info("聊天成員資格快取測試通過")
+
+
+def test_new_member_refreshes():
+    """測試不在快取成員列表中的用戶會重新查詢一次"""
+    install_cache()
+    supabase = make_supabase()
+    get_chat_membership(supabase, "e1", "u1")
+
+    supabase.tables["user_matching_info"].rows.append({"user_id": "u3", "matching_group_id": "g1"})
+    assert get_chat_membership(supabase, "e1", "u3").is_member("u3")
+    assert len(supabase.queries) == 4
+
+    # 非成員每次都會重新查詢，且仍被拒絕
+    assert not get_chat_membership(supabase, "e1", "stranger").is_member("stranger")
+
+
+def test_ttl_and_invalidation():
+    """測試快取過期與配對組解散時的清除"""
+    cache = install_cache(ttl_seconds=0.05)
+    supabase = make_supabase()
+    get_chat_membership(supabase, "e1", "u1")
+    time.sleep(0.06)
+    get_chat_membership(supabase, "e1", "u1")
+    assert len(supabase.queries) == 4
+
+    cache.ttl_seconds = 300
+    get_chat_membership(supabase, "e1", "u1")
+    assert len(cache) == 1
+
+    # finalize_dining_events 刪除成員後清除快取，已解散的成員不再通過驗證
+    supabase.tables["user_matching_info"].rows.clear()
+    invalidate_chat_memberships(matching_group_ids=["g1"])
+    assert len(cache) == 0
+    assert not get_chat_membership(supabase, "e1", "u1").is_member("u1")
+
+    invalidate_chat_memberships(dining_event_ids=["e1"])
+    assert len(cache) == 0
+
+
+def test_matching_failed_invalidates_group():
+    """測試用戶改為配對失敗並移除配對資訊時，清除原配對組的快取"""
+    cache = install_cache()
+    supabase = make_supabase()
+    supabase.tables["user_status"] = FakeTable([{"user_id": "u2", "status": "waiting_restaurant"}])
+    assert get_chat_membership(supabase, "e1", "u2").is_member("u2")
+
+    assert asyncio.run(update_user_status_to_failed(supabase, "u2"))
+
+    assert len(cache) == 0
+    assert not get_chat_membership(supabase, "e1", "u2").is_member("u2")
+    assert get_chat_membership(supabase, "e1", "u1").is_member("u1")
+
+
+def run_tests():
+    """運行所有聊天權限快取測試"""
+    logger.info("開始運行聊天權限快取測試...")
+    try:
+        test_cached_membership()
+        test_new_member_refreshes()
+        test_ttl_and_invalidation()
+        test_matching_failed_invalidates_group()
+    finally:
+        chat_auth_service._chat_membership_cache = None
+    logger.info("聊天權限快取測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,90 @@
+import os
+import sys
+import logging
+from urllib.parse import unquote
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+api_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(api_dir)
+
+from postgrest import SyncPostgrestClient
+
+from utils.pagination import encode_cursor, decode_cursor, apply_keyset, order_keyset, split_page
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def test_cursor_round_trip():
+    """測試游標編碼與解析，格式錯誤或含引號時拋出 ValueError"""
+    cursor = encode_cursor("2026-10-19T02:00:00.123+00:00", "9f1c")
+    assert "=" not in cursor
+    assert decode_cursor(cursor) == ("2026-10-19T02:00:00.123+00:00", "9f1c")
+
+    for invalid in ("not-a-cursor", "", encode_cursor('2026"', "x"), encode_cursor("2026", "a\\b")):
+        try:
+            decode_cursor(invalid)
+            assert False, invalid
+        except ValueError:
+            pass
+
+
+def test_pages_cover_all_rows_with_ties():
+    """測試以 (created_at, id) 分頁：同一時間戳的資料不會重複或遺漏"""
+    logger.info("測試 keyset 分頁...")
+    rows = sorted(
+        ({"created_at": f"2026-10-19T02:00:0{i // 4}+00:00", "id": f"{i:03d}"} for i in range(23)),
+        key=lambda row: (row["created_at"], row["id"])
+    )
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        if cursor:
+            after = decode_cursor(cursor)
+            candidates = [row for row in rows if (row["created_at"], row["id"]) > after]
+        else:
+            candidates = rows
+        page, cursor = split_page(candidates[:5 + 1], 5)
+        seen.extend(row["id"] for row in page)
+        pages += 1
+        if cursor is None:
+            break
+
+    assert seen == [row["id"] for row in rows]
+    assert pages == 5
+    assert split_page([], 5) == ([], None)
+    logger.info("keyset 分頁測試通過")
+
+
+def test_apply_keyset_query_params():
+    """測試游標條件以 PostgREST or 參數加入查詢"""
+    client = SyncPostgrestClient("https://example.supabase.co/rest/v1")
+    query = client.from_("chat_messages").select("id, created_at").eq("dining_event_id", "e1")
+    query = apply_keyset(query, encode_cursor("2026-10-19T02:00:00+00:00", "m1"), desc=True)
+    assert unquote(str(query.params)).endswith(
+        'or=(created_at.lt."2026-10-19T02:00:00+00:00",and(created_at.eq."2026-10-19T02:00:00+00:00",id.lt."m1"))'
+    )
+    # 兩個排序欄位合併為單一 order 參數
+    assert str(order_keyset(query, desc=True).params).count("order=") == 1
+
+
+def run_tests():
+    """運行所有分頁測試"""
+    logger.info("開始運行分頁測試...")
+    test_cursor_round_trip()
+    test_pages_cover_all_rows_with_ties()
+    test_apply_keyset_query_params()
+    logger.info("分頁測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
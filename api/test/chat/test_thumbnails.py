@@ -0,0 +1,138 @@
+import io
+import os
+import sys
+import asyncio
+import logging
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+test_dir = os.path.dirname(current_dir)
+api_dir = os.path.dirname(test_dir)
+sys.path.append(api_dir)
+sys.path.append(test_dir)
+# 共用 R2 儲存層測試的記憶體 S3 替身
+sys.path.append(os.path.join(test_dir, "restaurant"))
+
+from PIL import Image
+
+import utils.r2_storage as r2_storage
+from utils.r2_storage import AsyncObjectStorage
+from utils.thumbnails import (
+    get_thumbnail_key,
+    handle_chat_thumbnail_task,
+    handle_avatar_thumbnail_task
+)
+from config import R2_PRIVATE_BUCKET_NAME, CHAT_THUMBNAIL_SIZE, AVATAR_THUMBNAIL_SIZE
+from test_r2_storage import InMemoryS3Client
+from fakes import FakeSupabase
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "chat_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class InlineService:
+    """直接在當前執行緒執行的圖片處理服務替身"""
+
+    async def run_cpu(self, func, *args):
+        return func(*args)
+
+    async def run_io(self, func, *args):
+        return func(*args)
+
+
+def make_webp(width, height):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 80, 40)).save(buffer, format="WEBP")
+    return buffer.getvalue()
+
+
+def install_storage(client):
+    """以記憶體客戶端取代儲存層單例"""
+    r2_storage._object_storage = AsyncObjectStorage(lambda: client, max_concurrency=2)
+
+
+def test_thumbnail_key():
+    """測試縮圖路徑寫在原圖旁邊"""
+    assert get_thumbnail_key("chat_images/e1/m1.webp") == "chat_images/e1/m1_thumb.webp"
+    assert get_thumbnail_key("avatars/u1.webp") == "avatars/u1_thumb.webp"
+
+
+def test_chat_thumbnail_retries_until_message_exists():
+    """測試聊天縮圖：產生縮圖並寫回訊息，訊息尚未寫入時拋出例外且重試時不重新產生縮圖"""
+    logger.info("測試聊天圖片縮圖...")
+
+    client = InMemoryS3Client()
+    install_storage(client)
+    image_path = "chat_images/e1/m1.webp"
+    client.objects[(R2_PRIVATE_BUCKET_NAME, image_path)] = {"Body": make_webp(1200, 900)}
+
+    rows = []
+    supabase = FakeSupabase({"chat_messages": rows})
+    payload = {"dining_event_id": "e1", "image_path": image_path, "supabase": supabase}
+    service = InlineService()
+
+    try:
+        asyncio.run(handle_chat_thumbnail_task(payload, service))
+        assert False, "訊息不存在時應拋出例外"
+    except RuntimeError:
+        pass
+
+    thumbnail_key = get_thumbnail_key(image_path)
+    thumbnail = Image.open(io.BytesIO(client.objects[(R2_PRIVATE_BUCKET_NAME, thumbnail_key)]["Body"]))
+    assert thumbnail.format == "WEBP"
+    assert thumbnail.size == (CHAT_THUMBNAIL_SIZE, CHAT_THUMBNAIL_SIZE * 900 // 1200)
+    assert payload["thumbnail_path"] == thumbnail_key
+
+    # 訊息寫入後重試：不再讀取原圖
+    rows.append({"dining_event_id": "e1", "image_path": image_path, "thumbnail_path": None})
+    del client.objects[(R2_PRIVATE_BUCKET_NAME, image_path)]
+    result = asyncio.run(handle_chat_thumbnail_task(payload, service))
+    assert result == {"thumbnail_path": thumbnail_key}
+    assert rows[0]["thumbnail_path"] == thumbnail_key
+    logger.info("聊天圖片縮圖測試通過")
+
+
+def test_avatar_thumbnail_missing_original():
+    """測試頭像縮圖：原圖尚未上傳時拋出例外，上傳後寫回 avatar_thumbnail_path"""
+    client = InMemoryS3Client()
+    install_storage(client)
+    rows = [{"user_id": "u1", "avatar_thumbnail_path": None}]
+    payload = {"user_id": "u1", "avatar_path": "avatars/u1.webp", "supabase": FakeSupabase({"user_profiles": rows})}
+
+    try:
+        asyncio.run(handle_avatar_thumbnail_task(payload, InlineService()))
+        assert False, "原圖不存在時應拋出例外"
+    except RuntimeError:
+        pass
+    assert not payload.get("thumbnail_path")
+
+    # 小於縮圖尺寸的頭像不會被放大
+    client.objects[(R2_PRIVATE_BUCKET_NAME, "avatars/u1.webp")] = {"Body": make_webp(96, 96)}
+    asyncio.run(handle_avatar_thumbnail_task(payload, InlineService()))
+    assert rows[0]["avatar_thumbnail_path"] == "avatars/u1_thumb.webp"
+    thumbnail = Image.open(io.BytesIO(client.objects[(R2_PRIVATE_BUCKET_NAME, "avatars/u1_thumb.webp")]["Body"]))
+    assert thumbnail.size == (96, 96) and 96 < AVATAR_THUMBNAIL_SIZE
+
+
+def run_tests():
+    """運行所有縮圖測試"""
+    logger.info("開始運行縮圖測試...")
+    try:
+        test_thumbnail_key()
+        test_chat_thumbnail_retries_until_message_exists()
+        test_avatar_thumbnail_missing_original()
+    finally:
+        r2_storage._object_storage = None
+    logger.info("縮圖測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,180 @@
+"""
+測試共用的 Supabase 替身
+
+資料存在記憶體中，支援各服務用到的 select/insert/update/upsert/delete 與
+eq/in_/gt/like/order/limit 查詢；每次 execute 都會記錄，測試可檢查查詢次數與內容。
+"""
+
+import re
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+
+class FakeResult:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+class FakeQuery:
+    """單次查詢：記錄動作與條件，execute 時套用到資料表"""
+
+    def __init__(self, table: "FakeTable", db: Optional["FakeSupabase"] = None, name: Optional[str] = None):
+        self.table = table
+        self.db = db
+        self.name = name
+        self.action = "select"
+        self.payload = None
+        self.on_conflict = ""
+        self.count = None
+        self.filters: List[Callable[[Dict[str, Any]], bool]] = []
+        self.in_values: Optional[List[Any]] = None
+        self.order_key = None
+        self.row_limit = None
+
+    def select(self, columns="*", count=None):
+        self.count = count
+        return self
+
+    def insert(self, rows):
+        self.action, self.payload = "insert", rows
+        return self
+
+    def update(self, fields):
+        self.action, self.payload = "update", fields
+        return self
+
+    def upsert(self, row, on_conflict=""):
+        self.action, self.payload, self.on_conflict = "upsert", row, on_conflict
+        return self
+
+    def delete(self):
+        self.action = "delete"
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        self.in_values = list(values)
+        value_set = set(self.in_values)
+        self.filters.append(lambda row: row.get(column) in value_set)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and row.get(column) > value)
+        return self
+
+    def like(self, column, pattern):
+        regex = re.compile("".join(
+            ".*" if char == "%" else "." if char == "_" else re.escape(char) for char in pattern
+        ), re.DOTALL)
+        self.filters.append(lambda row: row.get(column) is not None and regex.fullmatch(row.get(column)) is not None)
+        return self
+
+    def order(self, column, desc=False):
+        self.order_key = (column, desc)
+        return self
+
+    def limit(self, count):
+        self.row_limit = count
+        return self
+
+    def execute(self):
+        if self.db is not None:
+            self.db.queries.append(self.name)
+        return self.table.execute(self)
+
+
+class FakeTable:
+    """記憶體資料表；rows 直接使用傳入的 list，測試可在查詢之間修改"""
+
+    def __init__(self, rows: Optional[List[Dict[str, Any]]] = None, max_rows: int = 1000):
+        self.rows = rows if rows is not None else []
+        # 模擬 PostgREST 的 max-rows：每次查詢最多回傳的資料數
+        self.max_rows = max_rows
+        self.executed: List[FakeQuery] = []
+        self._lock = threading.Lock()
+
+    def query(self, db: Optional["FakeSupabase"] = None, name: Optional[str] = None) -> FakeQuery:
+        return FakeQuery(self, db, name)
+
+    # 直接以資料表呼叫時（supabase.table(name) 回傳資料表本身）開始新的查詢
+    def select(self, columns="*", count=None):
+        return self.query().select(columns, count=count)
+
+    def insert(self, rows):
+        return self.query().insert(rows)
+
+    def update(self, fields):
+        return self.query().update(fields)
+
+    def upsert(self, row, on_conflict=""):
+        return self.query().upsert(row, on_conflict=on_conflict)
+
+    def delete(self):
+        return self.query().delete()
+
+    def calls(self, action: str) -> List[FakeQuery]:
+        """已執行的指定動作查詢"""
+        return [query for query in self.executed if query.action == action]
+
+    @property
+    def select_count(self) -> int:
+        return len(self.calls("select"))
+
+    def _matched(self, query: FakeQuery) -> List[Dict[str, Any]]:
+        return [row for row in self.rows if all(f(row) for f in query.filters)]
+
+    def _upsert(self, row: Dict[str, Any], on_conflict: str) -> Dict[str, Any]:
+        columns = [column for column in on_conflict.split(",") if column]
+        for existing in self.rows:
+            if columns and all(existing.get(column) == row.get(column) for column in columns):
+                existing.update(row)
+                return existing
+        self.rows.append(dict(row))
+        return row
+
+    def execute(self, query: FakeQuery) -> FakeResult:
+        with self._lock:
+            self.executed.append(query)
+
+            if query.action == "insert":
+                rows = query.payload if isinstance(query.payload, list) else [query.payload]
+                self.rows.extend(dict(row) for row in rows)
+                return FakeResult(rows)
+
+            if query.action == "upsert":
+                rows = query.payload if isinstance(query.payload, list) else [query.payload]
+                return FakeResult([self._upsert(row, query.on_conflict) for row in rows])
+
+            matched = self._matched(query)
+            if query.action == "update":
+                for row in matched:
+                    row.update(query.payload)
+                return FakeResult(matched)
+            if query.action == "delete":
+                # 原地修改，保留測試持有的 rows 參照
+                self.rows[:] = [row for row in self.rows if row not in matched]
+                return FakeResult(matched)
+
+            if query.order_key:
+                column, desc = query.order_key
+                matched.sort(key=lambda row: row[column], reverse=desc)
+            limit = min(query.row_limit or self.max_rows, self.max_rows)
+            return FakeResult(matched[:limit], count=len(matched) if query.count else None)
+
+
+class FakeSupabase:
+    """以資料表名稱對應 FakeTable 的 Supabase 替身，記錄每次查詢的資料表"""
+
+    def __init__(self, tables: Optional[Dict[str, Any]] = None):
+        self.tables: Dict[str, FakeTable] = {
+            name: table if isinstance(table, FakeTable) else FakeTable(table)
+            for name, table in (tables or {}).items()
+        }
+        self.queries: List[str] = []
+
+    def table(self, name: str) -> FakeQuery:
+        return self.tables.setdefault(name, FakeTable()).query(self, name)
@@ -0,0 +1,140 @@
+import os
+import sys
+import asyncio
+import logging
+import threading
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+api_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(api_dir)
+
+import firebase_admin
+
+# 不需要真實憑證（摘要寫入替身，不會實際發送）
+if not firebase_admin._apps:
+    firebase_admin.initialize_app(options={"projectId": "tuckin-test"})
+
+from services.chat_push_service import ChatPushCoalescer, build_chat_summary
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "notification_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+MEMBERS = ["a", "b", "c", "d", "e"]
+
+
+def send(coalescer, event_id, sender, text):
+    coalescer.add(event_id, [m for m in MEMBERS if m != sender], sender, sender.upper(), f"{sender.upper()}: {text}")
+
+
+def test_summary_text():
+    """測試摘要內容"""
+    single = [{"sender_nickname": "小明", "body": "小明: 晚點見"}]
+    assert build_chat_summary(single) == "小明: 晚點見"
+    many = [{"sender_nickname": name, "body": ""} for name in ("小明", "小華", "小明", "小美", "小強")]
+    assert build_chat_summary(many) == "5 則新訊息，來自 小明、小華、小美 等人"
+
+
+def test_burst_is_coalesced_per_recipient():
+    """測試窗口內的連續訊息對每位接收者只發送一則摘要"""
+    logger.info("測試聊天推送合併...")
+    batches = []
+
+    async def scenario():
+        coalescer = ChatPushCoalescer(window_seconds=0.05, enqueue=batches.append)
+        send(coalescer, "e1", "a", "在哪")
+        send(coalescer, "e1", "a", "我到了")
+        send(coalescer, "e1", "b", "馬上到")
+        send(coalescer, "e2", "a", "另一場")
+        assert batches == []
+        await asyncio.sleep(0.1)
+        # 窗口結束後的新訊息開始新的窗口
+        send(coalescer, "e1", "c", "好")
+        await asyncio.sleep(0.1)
+        return coalescer
+
+    coalescer = asyncio.run(scenario())
+
+    first = {(batch[0]["data"]["dining_event_id"], s["user_id"]): s for batch in batches[:2] for s in batch}
+    assert len(batches) == 3
+    assert first[("e1", "c")]["body"] == "3 則新訊息，來自 A、B"
+    assert first[("e1", "c")]["data"]["message_count"] == "3"
+    assert first[("e1", "a")]["body"] == "B: 馬上到"
+    assert first[("e1", "b")]["body"] == "2 則新訊息，來自 A"
+    assert first[("e2", "b")]["body"] == "A: 另一場"
+    assert len(batches[2]) == 4 and all(s["body"] == "C: 好" for s in batches[2])
+    # 13 則逐一推送的通知合併為 9 + 4 則
+    assert coalescer.stats()["received"] == 20 and coalescer.stats()["sent"] == 13
+    logger.info("聊天推送合併測試通過")
+
+
+def test_flush_all_and_disabled_window():
+    """測試關閉時送出未結束的窗口；窗口為 0 時不合併"""
+    batches = []
+
+    async def scenario():
+        coalescer = ChatPushCoalescer(window_seconds=60, enqueue=batches.append)
+        send(coalescer, "e1", "a", "嗨")
+        assert await coalescer.flush_all() == 4
+
+        immediate = ChatPushCoalescer(window_seconds=0, enqueue=batches.append)
+        send(immediate, "e1", "a", "嗨")
+        send(immediate, "e1", "a", "再見")
+        await immediate.flush_all()
+
+    asyncio.run(scenario())
+    assert [len(batch) for batch in batches] == [4, 4, 4]
+    assert batches[2][0]["body"] == "A: 再見"
+
+
+def test_failed_enqueue_is_retried():
+    """測試寫入在事件迴圈之外執行；失敗時摘要放回待發送並於稍後重試"""
+    logger.info("測試聊天推送寫入失敗重試...")
+    batches = []
+    threads = []
+
+    def flaky_enqueue(summaries):
+        threads.append(threading.current_thread())
+        if len(threads) == 1:
+            raise RuntimeError("outbox 暫時無法寫入")
+        batches.append(summaries)
+
+    async def scenario():
+        coalescer = ChatPushCoalescer(window_seconds=0.05, enqueue=flaky_enqueue, retry_seconds=0.05)
+        send(coalescer, "e1", "a", "在哪")
+        await asyncio.sleep(0.08)
+        assert batches == [] and coalescer.stats()["pending_events"] == 1
+        # 重試前的新訊息與放回的訊息合併為同一則摘要
+        send(coalescer, "e1", "a", "我到了")
+        await asyncio.sleep(0.1)
+        return coalescer
+
+    coalescer = asyncio.run(scenario())
+
+    assert len(threads) == 2 and threading.main_thread() not in threads
+    assert len(batches) == 1 and len(batches[0]) == 4
+    assert all(s["body"] == "2 則新訊息，來自 A" for s in batches[0])
+    assert coalescer.stats()["failed_flushes"] == 1 and coalescer.stats()["sent"] == 4
+    logger.info("聊天推送寫入失敗重試測試通過")
+
+
+def run_tests():
+    """運行所有聊天推送合併測試"""
+    logger.info("開始運行聊天推送合併測試...")
+    test_summary_text()
+    test_burst_is_coalesced_per_recipient()
+    test_flush_all_and_disabled_window()
+    test_failed_enqueue_is_retried()
+    logger.info("聊天推送合併測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
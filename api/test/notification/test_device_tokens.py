@@ -0,0 +1,159 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+from unittest import mock
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+test_dir = os.path.dirname(current_dir)
+api_dir = os.path.dirname(test_dir)
+sys.path.append(api_dir)
+sys.path.append(test_dir)
+sys.path.append(current_dir)
+
+from fakes import FakeSupabase, FakeTable
+from test_fcm_sender import FakeFcmSender
+from firebase_admin import messaging
+
+import services.device_token_service as device_token_service
+from services.device_token_service import (
+    PRUNE_BATCH_SIZE,
+    DeviceTokenCache,
+    resolve_device_tokens,
+    resolve_device_token_list,
+    register_device_token,
+    find_dead_tokens,
+    prune_device_tokens,
+    send_push_to_devices,
+    get_pruned_token_count
+)
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "notification_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class FakeTokenTable(FakeTable):
+    """user_device_tokens 替身"""
+
+    def __init__(self, tokens):
+        super().__init__([{"user_id": f"u{i}", "token": token} for i, token in enumerate(tokens)])
+
+    def _upsert(self, row, on_conflict):
+        # 與資料庫觸發器相同：每位用戶只保留最新的令牌
+        self.rows[:] = [existing for existing in self.rows if existing["user_id"] != row["user_id"]]
+        self.rows.append({"user_id": row["user_id"], "token": row["token"]})
+        return row
+
+
+def make_supabase(tokens):
+    return FakeSupabase({"user_device_tokens": FakeTokenTable(tokens)})
+
+
+def test_find_dead_tokens():
+    """測試只有永久失效的令牌會被刪除，整批 INVALID_ARGUMENT 視為訊息錯誤"""
+    results = [
+        {"token": "a", "success": True, "error": None},
+        {"token": "b", "success": False, "error": "UNREGISTERED"},
+        {"token": "c", "success": False, "error": "SENDER_ID_MISMATCH"},
+        {"token": "d", "success": False, "error": "INVALID_ARGUMENT"},
+        {"token": "e", "success": False, "error": "UNAVAILABLE"},
+        {"token": "f", "success": False, "error": "QUOTA_EXCEEDED"},
+    ]
+    assert find_dead_tokens(results) == ["b", "c", "d"]
+
+    all_invalid = [{"token": t, "success": False, "error": "INVALID_ARGUMENT"} for t in "xyz"]
+    assert find_dead_tokens(all_invalid) == []
+
+
+def test_send_and_prune():
+    """測試推送後批次刪除失效令牌並回傳刪除數量"""
+    logger.info("測試失效設備令牌刪除...")
+    live = [f"token-{i}" for i in range(200)]
+    dead = [f"dead-{i}" for i in range(120)]
+    supabase = make_supabase(live + dead)
+    before = get_pruned_token_count()
+
+    with mock.patch.object(messaging, "send", FakeFcmSender()):
+        result = asyncio.run(send_push_to_devices(supabase, live + dead, "標題", "內容"))
+
+    assert result["success"] == 200 and result["failure"] == 120
+    assert result["pruned"] == 120
+    tokens = supabase.tables["user_device_tokens"]
+    assert sorted(row["token"] for row in tokens.rows) == sorted(live)
+    assert max(len(query.in_values) for query in tokens.calls("delete")) <= PRUNE_BATCH_SIZE
+    assert get_pruned_token_count() - before == 120
+
+    # 已刪除的令牌不會重複計算
+    assert prune_device_tokens(supabase, dead[:10]) == 0
+    logger.info("失效設備令牌刪除測試通過")
+
+
+def test_resolve_and_cache():
+    """測試批次查詢設備令牌：未命中的用戶一次查詢，之後使用快取；沒有令牌的用戶不快取；註冊與刪除令牌時移除快取"""
+    logger.info("測試設備令牌批次查詢與快取...")
+    device_token_service._device_token_cache = DeviceTokenCache(ttl_seconds=300, max_users=1000)
+    supabase = make_supabase([f"token-{i}" for i in range(450)])
+    tokens = supabase.tables["user_device_tokens"]
+    user_ids = [f"u{i}" for i in range(450)] + ["no-device"]
+
+    tokens_by_user = resolve_device_tokens(supabase, user_ids)
+    assert tokens.select_count == 3
+    assert tokens_by_user["u7"] == ["token-7"] and tokens_by_user["no-device"] == []
+
+    # 有令牌的用戶使用快取，沒有令牌的用戶重新查詢
+    assert len(resolve_device_token_list(supabase, user_ids)) == 450
+    assert tokens.select_count == 4
+
+    # 刪除失效令牌後該用戶重新查詢
+    prune_device_tokens(supabase, ["token-7"])
+    assert resolve_device_tokens(supabase, ["u7", "u8"]) == {"u7": [], "u8": ["token-8"]}
+    assert tokens.select_count == 5
+
+    # 註冊新令牌後立即生效
+    register_device_token(supabase, "u8", "token-8b")
+    assert resolve_device_tokens(supabase, ["u8"]) == {"u8": ["token-8b"]}
+    assert tokens.select_count == 6
+
+    # App 直接寫入資料庫的令牌：沒有令牌的用戶未被快取，下一次查詢即可取得
+    tokens.rows.append({"user_id": "no-device", "token": "token-new"})
+    assert resolve_device_tokens(supabase, ["no-device"]) == {"no-device": ["token-new"]}
+    logger.info("設備令牌批次查詢與快取測試通過")
+
+
+def test_cache_expires_quickly():
+    """測試 App 直接刪除的令牌（登出）在 TTL 後不再使用"""
+    device_token_service._device_token_cache = DeviceTokenCache(ttl_seconds=0.05, max_users=1000)
+    supabase = make_supabase(["token-0"])
+    assert resolve_device_tokens(supabase, ["u0"]) == {"u0": ["token-0"]}
+
+    supabase.tables["user_device_tokens"].rows.clear()
+    assert resolve_device_tokens(supabase, ["u0"]) == {"u0": ["token-0"]}
+    time.sleep(0.06)
+    assert resolve_device_tokens(supabase, ["u0"]) == {"u0": []}
+
+
+def run_tests():
+    """運行所有設備令牌測試"""
+    logger.info("開始運行設備令牌測試...")
+    try:
+        test_find_dead_tokens()
+        test_send_and_prune()
+        test_resolve_and_cache()
+        test_cache_expires_quickly()
+    finally:
+        device_token_service._device_token_cache = None
+    logger.info("設備令牌測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,114 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from unittest import mock
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+api_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(api_dir)
+
+import firebase_admin
+from firebase_admin import messaging
+
+# 不需要真實憑證：先以預設憑證初始化（實際發送已替換為替身）
+if not firebase_admin._apps:
+    firebase_admin.initialize_app(options={"projectId": "tuckin-test"})
+
+from utils import firebase
+from utils.firebase import send_notification_to_devices, get_fcm_error_code
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "notification_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class FakeFcmSender:
+    """記錄發送的 token、執行緒與並行數的 messaging.send 替身，dead- 開頭的 token 回傳 UNREGISTERED"""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.sent = []
+        self.threads = set()
+        self._lock = threading.Lock()
+        self._active = 0
+        self.max_active = 0
+
+    def __call__(self, message, dry_run=False, app=None):
+        with self._lock:
+            self.sent.append(message.token)
+            self.threads.add(threading.current_thread().name)
+            self._active += 1
+            self.max_active = max(self.max_active, self._active)
+        time.sleep(self.latency)
+        with self._lock:
+            self._active -= 1
+
+        if message.token.startswith("dead-"):
+            raise messaging.UnregisteredError("Requested entity was not found.")
+        return f"projects/p/messages/{message.token}"
+
+
+def test_send_is_bounded_by_pool():
+    """測試 token 去重後逐一在專用執行緒池中發送：同時進行的請求數不超過執行緒池大小，並回傳每個 token 的結果"""
+    logger.info("測試 FCM 發送並行上限...")
+    sender = FakeFcmSender(latency=0.002)
+    tokens = [f"token-{i}" for i in range(1000)] + ["dead-1", "dead-2", "token-0", ""]
+    threads_before = threading.active_count()
+
+    with mock.patch.object(messaging, "send", sender):
+        result = asyncio.run(send_notification_to_devices(tokens, "標題", "內容", {"type": "test"}))
+
+    assert sorted(sender.sent) == sorted(set(tokens) - {""})
+    assert all(name.startswith("fcm-send") for name in sender.threads)
+    assert 1 < sender.max_active <= firebase.FCM_SEND_MAX_CONCURRENCY
+    assert len(sender.threads) <= firebase.FCM_SEND_MAX_CONCURRENCY
+    assert threading.active_count() - threads_before <= firebase.FCM_SEND_MAX_CONCURRENCY
+    assert result["success"] == 1000 and result["failure"] == 2
+    assert len(result["results"]) == 1002
+    failed = {item["token"]: item["error"] for item in result["results"] if not item["success"]}
+    assert failed == {"dead-1": "UNREGISTERED", "dead-2": "UNREGISTERED"}
+    logger.info(f"FCM 發送並行上限測試通過，最大並行請求 {sender.max_active}")
+
+
+def test_send_failure():
+    """測試發送失敗（例如網路錯誤）時 token 標記為失敗"""
+    def failing_sender(message, dry_run=False, app=None):
+        raise ValueError("network down")
+
+    with mock.patch.object(messaging, "send", failing_sender):
+        result = asyncio.run(send_notification_to_devices(["a", "b"], "標題", "內容"))
+
+    assert result["success"] == 0 and result["failure"] == 2
+    assert {item["error"] for item in result["results"]} == {"ValueError"}
+    assert asyncio.run(send_notification_to_devices([], "標題", "內容")) == {"success": 0, "failure": 0, "results": []}
+
+
+def test_error_codes():
+    """測試 FCM 錯誤碼"""
+    assert get_fcm_error_code(messaging.UnregisteredError("x")) == "UNREGISTERED"
+    assert get_fcm_error_code(messaging.SenderIdMismatchError("x")) == "SENDER_ID_MISMATCH"
+    assert get_fcm_error_code(firebase_admin.exceptions.InvalidArgumentError("x")) == "INVALID_ARGUMENT"
+
+
+def run_tests():
+    """運行所有 FCM 發送測試"""
+    logger.info("開始運行 FCM 發送測試...")
+    test_send_is_bounded_by_pool()
+    test_send_failure()
+    test_error_codes()
+    logger.info("FCM 發送測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,131 @@
+import os
+import sys
+import logging
+from unittest import mock
+from urllib.parse import unquote
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+api_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(api_dir)
+
+import firebase_admin
+
+# 不需要真實憑證（只檢查產生的查詢，不會實際發送）
+if not firebase_admin._apps:
+    firebase_admin.initialize_app(options={"projectId": "tuckin-test"})
+
+from postgrest import SyncPostgrestClient, APIResponse
+from postgrest._sync.request_builder import SyncQueryRequestBuilder
+
+from services.notification_service import NotificationService
+from utils.pagination import encode_cursor
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "notification_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class RecordingExecute:
+    """取代 execute，記錄送出的請求並回傳預設結果"""
+
+    def __init__(self, data=None, count=None):
+        self.data = data or []
+        self.count = count
+        self.requests = []
+
+    def __call__(self, query):
+        self.requests.append({
+            "method": query.http_method,
+            "path": query.path,
+            "params": unquote(str(query.params)),
+            "prefer": query.headers.get("prefer", "")
+        })
+        return APIResponse(data=self.data, count=self.count)
+
+
+def recording(recorder):
+    # 以函式取代方法，才能取得查詢物件本身
+    return mock.patch.object(SyncQueryRequestBuilder, "execute", lambda query: recorder(query))
+
+
+def make_service():
+    return NotificationService(supabase=SyncPostgrestClient("https://example.supabase.co/rest/v1"))
+
+
+def test_list_uses_keyset_page():
+    """測試通知列表以游標條件與 limit + 1 查詢，並回傳下一頁游標"""
+    logger.info("測試通知列表 keyset 分頁...")
+    rows = [
+        {"id": f"n{i}", "created_at": f"2026-10-19T0{9 - i}:00:00+00:00", "read_at": None}
+        for i in range(3)
+    ]
+    recorder = RecordingExecute(data=rows)
+    cursor = encode_cursor("2026-10-19T10:00:00+00:00", "n-prev")
+
+    with recording(recorder):
+        page, next_cursor = make_service().get_user_notifications("u1", unread_only=True, limit=2, cursor=cursor)
+
+    params = recorder.requests[0]["params"]
+    assert "user_id=eq.u1" in params and "read_at=is.null" in params
+    assert 'or=(created_at.lt."2026-10-19T10:00:00+00:00",and(created_at.eq."2026-10-19T10:00:00+00:00",id.lt."n-prev"))' in params
+    assert "order=created_at.desc,id.desc" in params and "limit=3" in params
+    assert [row["id"] for row in page] == ["n0", "n1"]
+    assert next_cursor == encode_cursor(rows[1]["created_at"], "n1")
+
+    recorder.data = rows[:2]
+    with recording(recorder):
+        _, next_cursor = make_service().get_user_notifications("u1", limit=2)
+    assert next_cursor is None
+    assert "&or=" not in recorder.requests[1]["params"] and "read_at=" not in recorder.requests[1]["params"]
+    logger.info("通知列表 keyset 分頁測試通過")
+
+
+def test_mark_read_is_single_update():
+    """測試標記已讀為一次 PATCH，只回傳更新數量"""
+    recorder = RecordingExecute(count=2)
+
+    with recording(recorder):
+        updated = make_service().mark_notifications_as_read("u1", ["n1", "n2"])
+        recorder.count = 7
+        updated_all = make_service().mark_notifications_as_read("u1")
+
+    assert (updated, updated_all) == (2, 7)
+    assert [request["method"] for request in recorder.requests] == ["PATCH", "PATCH"]
+    assert "id=in.(n1,n2)" in recorder.requests[0]["params"]
+    assert "id=in" not in recorder.requests[1]["params"]
+    for request in recorder.requests:
+        assert "user_id=eq.u1" in request["params"] and "read_at=is.null" in request["params"]
+        assert "return=minimal" in request["prefer"] and "count=exact" in request["prefer"]
+
+
+def test_unread_count_reads_counter():
+    """測試未讀數量讀取計數表，沒有記錄時為 0"""
+    recorder = RecordingExecute(data=[{"unread_count": 4}])
+
+    with recording(recorder):
+        assert make_service().get_unread_count("u1") == 4
+        recorder.data = []
+        assert make_service().get_unread_count("u2") == 0
+
+    assert recorder.requests[0]["path"].endswith("/user_notification_counters")
+
+
+def run_tests():
+    """運行所有通知收件匣測試"""
+    logger.info("開始運行通知收件匣測試...")
+    test_list_uses_keyset_page()
+    test_mark_read_is_single_update()
+    test_unread_count_reads_counter()
+    logger.info("通知收件匣測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
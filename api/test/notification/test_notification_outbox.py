@@ -0,0 +1,252 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+from datetime import datetime
+from unittest import mock
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+test_dir = os.path.dirname(current_dir)
+api_dir = os.path.dirname(test_dir)
+sys.path.append(api_dir)
+sys.path.append(test_dir)
+sys.path.append(current_dir)
+
+from fakes import FakeSupabase
+from test_fcm_sender import FakeFcmSender
+from test_device_tokens import FakeTokenTable
+from firebase_admin import messaging
+
+import services.device_token_service as device_token_service
+from services.device_token_service import DeviceTokenCache
+from services.notification_outbox_service import (
+    NotificationOutbox,
+    InMemoryOutboxBackend,
+    LANE_REALTIME,
+    LANE_BULK,
+    BULK_ROW_MAX_USERS,
+    OUTBOX_SENT,
+    OUTBOX_FAILED
+)
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "notification_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def make_supabase(user_count):
+    """user_notifications 與 user_device_tokens 的替身"""
+    return FakeSupabase({
+        "user_device_tokens": FakeTokenTable([f"token-{i}" for i in range(user_count)]),
+        "user_notifications": []
+    })
+
+
+class FlakySender(FakeFcmSender):
+    """前 failures 次呼叫失敗的 messaging.send 替身"""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def __call__(self, message, dry_run=False, app=None):
+        if self.failures > 0:
+            self.failures -= 1
+            raise ConnectionError("FCM unavailable")
+        return super().__call__(message, dry_run, app)
+
+
+class SlowBulkSender(FakeFcmSender):
+    """只有提醒通知會變慢的 messaging.send 替身，記錄即時通知送出的時間"""
+
+    def __init__(self, bulk_latency):
+        super().__init__()
+        self.bulk_latency = bulk_latency
+        self.realtime_sent_at = None
+
+    def __call__(self, message, dry_run=False, app=None):
+        if message.notification.title == "提醒":
+            time.sleep(self.bulk_latency)
+        else:
+            self.realtime_sent_at = time.monotonic()
+        return super().__call__(message, dry_run, app)
+
+
+def make_outbox(supabase, **kwargs):
+    # 每個測試使用新的設備令牌快取
+    device_token_service._device_token_cache = DeviceTokenCache(ttl_seconds=300, max_users=5000)
+    lanes = {
+        LANE_REALTIME: {"workers": 1, "batch_size": 10, "poll_seconds": 0.05, "send_concurrency": None},
+        LANE_BULK: {"workers": 1, "batch_size": 5, "poll_seconds": 0.05, "send_concurrency": 1}
+    }
+    return NotificationOutbox(supabase, backend=InMemoryOutboxBackend(), lanes=lanes, **kwargs)
+
+
+async def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "等待逾時"
+        await asyncio.sleep(0.01)
+
+
+def test_deliver_and_retry():
+    """測試通知寫入後由 worker 發送；暫時性失敗會重試，且通知記錄只寫入一次"""
+    logger.info("測試通知 outbox 發送與重試...")
+    supabase = make_supabase(3)
+    # 第一次嘗試的 3 個 token 全部失敗
+    sender = FlakySender(failures=3)
+
+    async def scenario():
+        outbox = make_outbox(supabase, retry_base_delay=0.05)
+        await outbox.start()
+        try:
+            outbox_id = outbox.enqueue(["u0", "u1", "u2"], "新訊息", "小明: 嗨", {"type": "chat_message"})
+            row = outbox.backend.rows[outbox_id]
+            await wait_until(lambda: row["status"] == OUTBOX_SENT)
+            return outbox, row
+        finally:
+            await outbox.stop()
+
+    with mock.patch.object(messaging, "send", sender):
+        outbox, row = asyncio.run(scenario())
+
+    assert row["attempts"] == 2 and row["inbox_stored"]
+    assert sorted(record["user_id"] for record in supabase.tables["user_notifications"].rows) == ["u0", "u1", "u2"]
+    assert sorted(sender.sent) == ["token-0", "token-1", "token-2"]
+    assert outbox.stats()["lanes"][LANE_REALTIME] == {"sent": 1, "retried": 1, "failed": 0}
+    logger.info("通知 outbox 發送與重試測試通過")
+
+
+def test_gives_up_after_max_attempts():
+    """測試超過最大嘗試次數後標記為失敗"""
+    supabase = make_supabase(1)
+    sender = FlakySender(failures=10)
+
+    async def scenario():
+        outbox = make_outbox(supabase, max_attempts=2, retry_base_delay=0.01)
+        await outbox.start()
+        try:
+            row = outbox.backend.rows[outbox.enqueue(["u0"], "新訊息", "內容")]
+            await wait_until(lambda: row["status"] == OUTBOX_FAILED)
+            return row
+        finally:
+            await outbox.stop()
+
+    with mock.patch.object(messaging, "send", sender):
+        row = asyncio.run(scenario())
+
+    assert row["attempts"] == 2 and "ConnectionError" in row["last_error"]
+
+
+def test_bulk_lane_does_not_delay_realtime():
+    """測試大量提醒排隊發送時，即時通知仍立即發送"""
+    logger.info("測試通知 outbox 優先通道...")
+    supabase = make_supabase(60)
+    sender = SlowBulkSender(bulk_latency=0.05)
+
+    async def scenario():
+        outbox = make_outbox(supabase)
+        await outbox.start()
+        try:
+            bulk_ids = outbox.enqueue_many([
+                {"user_ids": [f"u{i}"], "title": "提醒", "body": "明天聚餐", "lane": LANE_BULK}
+                for i in range(1, 60)
+            ])
+            await asyncio.sleep(0.1)
+            enqueued_at = time.monotonic()
+            outbox.enqueue(["u0"], "新訊息", "小明: 嗨")
+            await wait_until(lambda: sender.realtime_sent_at is not None)
+            pending_bulk = sum(1 for outbox_id in bulk_ids if outbox.backend.rows[outbox_id]["status"] != OUTBOX_SENT)
+            return sender.realtime_sent_at - enqueued_at, pending_bulk
+        finally:
+            await outbox.stop(timeout=2.0)
+
+    with mock.patch.object(messaging, "send", sender):
+        realtime_latency, pending_bulk = asyncio.run(scenario())
+
+    assert realtime_latency < 0.5
+    assert pending_bulk > 0
+    logger.info(f"即時通知在 {realtime_latency * 1000:.0f} 毫秒內發送，當時仍有 {pending_bulk} 則提醒排隊中")
+
+
+def test_bulk_fan_out():
+    """測試大量通知依內容合併：1200 位用戶的相同提醒只產生 3 則 outbox，每位用戶推送一次"""
+    logger.info("測試大量通知合併發送...")
+    supabase = make_supabase(1300)
+    sender = FakeFcmSender()
+    messages = [
+        {"user_id": f"u{i}", "title": "提醒", "body": "明天聚餐", "data": {"type": "booking_reminder"}}
+        for i in range(1200)
+    ] + [
+        {"user_id": f"u{i}", "title": "提醒", "body": f"今天 {i} 點", "data": {"type": "attendance_reminder"}}
+        for i in range(1200, 1210)
+    ]
+
+    async def scenario():
+        outbox = make_outbox(supabase)
+        outbox_ids = outbox.enqueue_bulk(messages)
+        inserted = dict(outbox.backend.rows)
+        await outbox.start()
+        try:
+            await wait_until(lambda: all(row["status"] == OUTBOX_SENT for row in outbox.backend.rows.values()))
+        finally:
+            await outbox.stop()
+        return outbox_ids, inserted
+
+    with mock.patch.object(messaging, "send", sender):
+        outbox_ids, inserted = asyncio.run(scenario())
+
+    assert len(outbox_ids) == 3 + 10
+    assert max(len(row["user_ids"]) for row in inserted.values()) == BULK_ROW_MAX_USERS
+    assert len(sender.sent) == 1210 and len(set(sender.sent)) == 1210
+    assert all(name.startswith(f"fcm-{LANE_BULK}") for name in sender.threads)
+    assert len(supabase.tables["user_notifications"].rows) == 1210
+    # 每批領取的通知一起查詢令牌（每 200 位用戶一次查詢），而不是每位用戶一次
+    select_count = supabase.tables["user_device_tokens"].select_count
+    assert select_count <= 10
+    logger.info(f"大量通知合併發送測試通過，令牌查詢 {select_count} 次")
+
+
+def test_matching_notification_enqueued():
+    """測試配對成功通知寫入 outbox 的即時通道，而不是在請求中直接發送"""
+    import routers.matching as matching_router
+
+    supabase = make_supabase(1)
+    outbox = make_outbox(supabase)
+    deadline = datetime(2026, 10, 20, 6, 0)
+    with mock.patch.object(matching_router, "get_notification_outbox", lambda: outbox), \
+            mock.patch.object(messaging, "send", FakeFcmSender()) as sender:
+        assert asyncio.run(matching_router.send_matching_notification("u0", "group-1", deadline))
+
+    (row,) = outbox.backend.rows.values()
+    assert row["lane"] == LANE_REALTIME and row["user_ids"] == ["u0"]
+    assert row["data"] == {"type": "matching_restaurant", "group_id": "group-1", "deadline": deadline.isoformat()}
+    # 尚未由 worker 發送
+    assert not sender.sent and not supabase.tables["user_notifications"].rows
+
+
+def run_tests():
+    """運行所有通知 outbox 測試"""
+    logger.info("開始運行通知 outbox 測試...")
+    try:
+        test_deliver_and_retry()
+        test_gives_up_after_max_attempts()
+        test_bulk_lane_does_not_delay_realtime()
+        test_bulk_fan_out()
+        test_matching_notification_enqueued()
+    finally:
+        device_token_service._device_token_cache = None
+    logger.info("通知 outbox 測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,195 @@
+import os
+import sys
+import asyncio
+import logging
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+test_dir = os.path.dirname(current_dir)
+api_dir = os.path.dirname(test_dir)
+sys.path.append(api_dir)
+sys.path.append(test_dir)
+
+import firebase_admin
+
+# 不需要真實憑證（outbox 使用記憶體後端，不會實際發送）
+if not firebase_admin._apps:
+    firebase_admin.initialize_app(options={"projectId": "tuckin-test"})
+
+from fakes import FakeSupabase, FakeTable
+
+import services.notification_outbox_service as notification_outbox_service
+from services.notification_outbox_service import NotificationOutbox, InMemoryOutboxBackend
+from services.reminder_service import ReminderService, iter_reminder_recipients, count_reminder_recipients
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "notification_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def make_supabase():
+    """450 位用戶分成 90 組，每組有一個已確認的聚餐事件與一個較舊的已取消事件"""
+    return FakeSupabase({
+        "user_matching_info": FakeTable([
+            {"user_id": f"u{i}", "matching_group_id": f"g{i // 5}", "confirmation_deadline": "2026-10-20T10:00:00+00:00"}
+            for i in range(450)
+        ]),
+        "dining_events": FakeTable([
+            event
+            for g in range(90)
+            for event in (
+                {
+                    "id": f"e{g}", "name": f"聚餐 {g}", "date": "2026-10-19T11:00:00+00:00",
+                    "restaurant_id": f"r{g}", "matching_group_id": f"g{g}", "status": "confirmed",
+                    "restaurants": {"name": f"餐廳 {g}", "address": f"地址 {g}"},
+                    # 前 3 組為強制結束投票，第 0 組的通知已發送
+                    "is_forced_close": g < 3, "vote_result_notified": g == 0
+                },
+                {
+                    "id": f"old{g}", "name": "舊聚餐", "date": "2026-10-12T11:00:00+00:00",
+                    "restaurant_id": "old", "matching_group_id": f"g{g}", "status": "cancelled",
+                    "restaurants": None, "is_forced_close": True, "vote_result_notified": False
+                }
+            )
+        ]),
+        "matching_groups": FakeTable([
+            {"id": f"g{g}", "user_ids": [f"u{i}" for i in range(g * 5, g * 5 + 5)]} for g in range(90)
+        ])
+    })
+
+
+def make_service(supabase, dry_run):
+    notification_outbox_service._notification_outbox = NotificationOutbox(supabase, backend=InMemoryOutboxBackend())
+    return ReminderService(supabase, dry_run=dry_run)
+
+
+def test_resolve_event_contexts():
+    """測試聚餐資訊以少數幾次查詢解析，不隨用戶數增加"""
+    logger.info("測試批次解析聚餐資訊...")
+    supabase = make_supabase()
+    service = make_service(supabase, dry_run=True)
+    user_ids = [f"u{i}" for i in range(450)] + ["no-group"]
+
+    contexts = asyncio.run(service._resolve_event_contexts(user_ids))
+
+    assert supabase.tables["user_matching_info"].select_count == 3
+    assert supabase.tables["dining_events"].select_count == 1
+    assert contexts["no-group"] is None
+    assert contexts["u12"]["event_id"] == "e2"
+    assert contexts["u12"]["restaurant_name"] == "餐廳 2"
+    assert contexts["u12"]["time"] == "19:00"
+    logger.info("批次解析聚餐資訊測試通過")
+
+
+def test_attendance_reminders_without_per_user_queries():
+    """測試出席提醒：產生所有訊息只需批次查詢，同一事件的成員合併為一則 outbox"""
+    supabase = make_supabase()
+    service = make_service(supabase, dry_run=False)
+    users = [{"user_id": f"u{i}"} for i in range(450)]
+    template = {"id": "t1", "title": "今天聚餐", "body": "{time} 在 {restaurant_name} 見"}
+
+    result = asyncio.run(service._send_attendance_reminders(users, template))
+
+    assert result["users_notified"] == 450 and result["failed"] == 0
+    assert supabase.tables["user_matching_info"].select_count + supabase.tables["dining_events"].select_count == 4
+    rows = list(service.outbox.backend.rows.values())
+    assert len(rows) == 90
+    assert {row["body"] for row in rows if "u12" in row["user_ids"]} == {"19:00 在 餐廳 2 見"}
+
+
+def test_matching_reminders_use_bulk_group_lookup():
+    """測試配對成功通知以批次查詢取得群組資訊"""
+    supabase = make_supabase()
+    service = make_service(supabase, dry_run=True)
+
+    result = asyncio.run(service._send_matching_reminders([{"user_id": f"u{i}"} for i in range(450)]))
+
+    assert supabase.tables["user_matching_info"].select_count == 3
+    assert result["dry_run_preview"][7]["group_info"] == {"group_id": "g1", "deadline": "2026-10-20T10:00:00+00:00"}
+
+
+def test_vote_result_reminders_use_flags():
+    """測試投票結果通知以旗標查詢強制結束的事件，並以一次更新標記已發送"""
+    supabase = make_supabase()
+    service = make_service(supabase, dry_run=False)
+
+    result = asyncio.run(service._send_vote_result_reminders([]))
+
+    assert result["users_notified"] == 10
+    events = supabase.tables["dining_events"]
+    assert [(query.payload, query.in_values) for query in events.calls("update")] == [({"vote_result_notified": True}, ["e1", "e2"])]
+    pending = [row["id"] for row in events.rows if row["is_forced_close"] and not row["vote_result_notified"]]
+    assert all(event_id.startswith("old") for event_id in pending)
+
+    # 已標記的事件不會重複通知
+    assert asyncio.run(service._send_vote_result_reminders([]))["users_notified"] == 0
+
+
+def test_preview_recipients_in_batches():
+    """測試預覽以 keyset 分批讀取用戶，每批以一次 in_ 查詢 nickname"""
+    logger.info("測試提醒預覽批次查詢...")
+    statuses = ["booking", "matching_failed", "waiting_attendance"]
+    supabase = make_supabase()
+    supabase.tables["user_status"] = FakeTable([
+        {"user_id": f"u{i:04d}", "status": statuses[i % 3]} for i in range(1000)
+    ])
+    supabase.tables["user_profiles"] = FakeTable([
+        {"user_id": f"u{i:04d}", "nickname": f"用戶{i}"} for i in range(0, 1000, 2)
+    ])
+    target_statuses = ["booking", "matching_failed"]
+
+    batches = list(iter_reminder_recipients(supabase, target_statuses, batch_size=200))
+
+    recipients = [recipient for batch in batches for recipient in batch]
+    assert [len(batch) for batch in batches] == [200, 200, 200, 67]
+    assert len({recipient["user_id"] for recipient in recipients}) == 667
+    assert all(recipient["status"] in target_statuses for recipient in recipients)
+    assert recipients[0] == {"user_id": "u0000", "status": "booking", "nickname": "用戶0"}
+    assert recipients[1]["nickname"] is None
+    assert supabase.tables["user_status"].select_count == 4
+    assert supabase.tables["user_profiles"].select_count == 4
+
+    assert count_reminder_recipients(supabase, target_statuses) == {"booking": 334, "matching_failed": 333}
+    logger.info("提醒預覽批次查詢測試通過")
+
+
+def test_eligible_users_are_paged():
+    """測試發送提醒時分頁讀取所有目標用戶，不會被 max-rows 截斷，且與預覽一致"""
+    supabase = make_supabase()
+    supabase.tables["user_status"] = FakeTable([
+        {"user_id": f"u{i:05d}", "status": "booking" if i % 2 else "waiting_attendance"} for i in range(5000)
+    ])
+    supabase.tables["user_profiles"] = FakeTable([])
+    service = make_service(supabase, dry_run=True)
+
+    users = asyncio.run(service._get_eligible_users(["booking", "matching_failed"]))
+
+    assert len(users) == 2500 and len({user["user_id"] for user in users}) == 2500
+    preview = [r for batch in iter_reminder_recipients(supabase, ["booking", "matching_failed"]) for r in batch]
+    assert [user["user_id"] for user in users] == [r["user_id"] for r in preview]
+
+
+def run_tests():
+    """運行所有提醒聚餐資訊測試"""
+    logger.info("開始運行提醒聚餐資訊測試...")
+    try:
+        test_resolve_event_contexts()
+        test_attendance_reminders_without_per_user_queries()
+        test_matching_reminders_use_bulk_group_lookup()
+        test_vote_result_reminders_use_flags()
+        test_preview_recipients_in_batches()
+        test_eligible_users_are_paged()
+    finally:
+        notification_outbox_service._notification_outbox = None
+    logger.info("提醒聚餐資訊測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
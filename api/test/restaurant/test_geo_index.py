@@ -0,0 +1,324 @@
+import os
+import sys
+import time
+import asyncio
+import threading
+import random
+import uuid
+import logging
+from unittest import mock
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+api_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(api_dir)
+
+import utils.geo_index as geo_index_module
+from utils.geo_index import (
+    RestaurantGeoIndex,
+    get_restaurant_geo_index_async,
+    encode_geohash,
+    haversine_distance,
+    geohash_cells_for_radius,
+    estimate_geohash_cell_count
+)
+from utils.restaurant_helper import are_restaurants_same
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "restaurant_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+# 台南火車站附近作為測試中心點
+CENTER_LAT = 22.9971
+CENTER_LNG = 120.2126
+
+
+def _make_restaurant(name, lat, lng, place_id=None):
+    return {
+        "id": str(uuid.uuid4()),
+        "name": name,
+        "latitude": lat,
+        "longitude": lng,
+        "google_place_id": place_id
+    }
+
+
+def _random_restaurants(count, spread_deg=0.05, seed=42):
+    rng = random.Random(seed)
+    return [
+        _make_restaurant(
+            f"餐廳{i}",
+            CENTER_LAT + rng.uniform(-spread_deg, spread_deg),
+            CENTER_LNG + rng.uniform(-spread_deg, spread_deg)
+        )
+        for i in range(count)
+    ]
+
+
+def test_encode_geohash():
+    """測試 geohash 編碼結果與公開參考值一致"""
+    logger.info("測試 geohash 編碼...")
+    assert encode_geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    assert encode_geohash(CENTER_LAT, CENTER_LNG, 6) == encode_geohash(CENTER_LAT, CENTER_LNG, 8)[:6]
+    logger.info("geohash 編碼測試通過")
+
+
+def test_haversine_distance():
+    """測試球面距離計算"""
+    logger.info("測試球面距離計算...")
+    assert haversine_distance(CENTER_LAT, CENTER_LNG, CENTER_LAT, CENTER_LNG) == 0
+    # 緯度差 0.01 度約 1.11 公里
+    distance = haversine_distance(CENTER_LAT, CENTER_LNG, CENTER_LAT + 0.01, CENTER_LNG)
+    assert 1100 < distance < 1125
+    logger.info("球面距離計算測試通過")
+
+
+def test_cells_cover_radius():
+    """測試覆蓋格子包含半徑內所有點所在的格子"""
+    logger.info("測試覆蓋格子...")
+    cells = geohash_cells_for_radius(CENTER_LAT, CENTER_LNG, 2000)
+    for restaurant in _random_restaurants(500, spread_deg=0.02, seed=7):
+        distance = haversine_distance(CENTER_LAT, CENTER_LNG, restaurant["latitude"], restaurant["longitude"])
+        if distance <= 2000:
+            assert encode_geohash(restaurant["latitude"], restaurant["longitude"]) in cells
+    logger.info("覆蓋格子測試通過")
+
+
+def test_large_radius_skips_cell_enumeration():
+    """測試格子數估計不低於實際格子數；大半徑直接掃描，不列舉格子"""
+    for latitude in (0.0, CENTER_LAT, 60.0):
+        for radius in (100, 2000, 20000):
+            cells = geohash_cells_for_radius(latitude, CENTER_LNG, radius)
+            assert len(cells) <= estimate_geohash_cell_count(latitude, CENTER_LNG, radius)
+    assert estimate_geohash_cell_count(CENTER_LAT, CENTER_LNG, 50000) > 10000
+
+    restaurants = _random_restaurants(2000)
+    index = RestaurantGeoIndex.from_restaurants(restaurants)
+    with mock.patch.object(geo_index_module, "geohash_cells_for_radius", side_effect=AssertionError("不應列舉格子")):
+        start = time.perf_counter()
+        results = index.within_radius(CENTER_LAT, CENTER_LNG, 50000)
+        elapsed = time.perf_counter() - start
+    assert len(results) == 2000
+    logger.info(f"50 公里半徑查詢耗時 {elapsed * 1000:.1f} 毫秒")
+
+
+def test_within_radius_matches_linear_scan():
+    """測試半徑查詢結果與逐筆計算的結果一致，且依距離排序"""
+    logger.info("測試半徑查詢...")
+    restaurants = _random_restaurants(2000)
+    index = RestaurantGeoIndex.from_restaurants(restaurants)
+
+    for radius in (50, 300, 1500, 8000):
+        expected = {
+            r["id"] for r in restaurants
+            if haversine_distance(CENTER_LAT, CENTER_LNG, r["latitude"], r["longitude"]) <= radius
+        }
+        results = index.within_radius(CENTER_LAT, CENTER_LNG, radius)
+        assert {r["id"] for _, r in results} == expected
+        distances = [d for d, _ in results]
+        assert distances == sorted(distances)
+
+    limited = index.within_radius(CENTER_LAT, CENTER_LNG, 8000, limit=5)
+    assert len(limited) == 5
+    logger.info("半徑查詢測試通過")
+
+
+def test_find_duplicate():
+    """測試重複餐廳檢查"""
+    logger.info("測試重複餐廳檢查...")
+    existing = _make_restaurant("阿堂鹹粥", CENTER_LAT, CENTER_LNG, place_id="ChIJ_existing")
+    index = RestaurantGeoIndex.from_restaurants([existing] + _random_restaurants(200))
+
+    # 相同 place_id
+    same_place = _make_restaurant("完全不同的名稱", 0, 0, place_id="ChIJ_existing")
+    assert index.find_duplicate(same_place)["id"] == existing["id"]
+
+    # 約 50 公尺外的同名餐廳（名稱含空白與大小寫差異）
+    nearby = _make_restaurant(" 阿堂鹹粥 ", CENTER_LAT + 0.00045, CENTER_LNG)
+    assert index.find_duplicate(nearby)["id"] == existing["id"]
+    assert are_restaurants_same(existing, nearby)
+
+    # 約 500 公尺外的同名餐廳不算重複
+    far = _make_restaurant("阿堂鹹粥", CENTER_LAT + 0.0045, CENTER_LNG)
+    assert index.find_duplicate(far) is None
+
+    # 附近但名稱不同
+    other = _make_restaurant("福記肉圓", CENTER_LAT + 0.0001, CENTER_LNG)
+    assert index.find_duplicate(other) is None
+
+    # 自己不算重複
+    assert index.find_duplicate(existing) is None
+    logger.info("重複餐廳檢查測試通過")
+
+
+def test_upsert_and_remove():
+    """測試索引同步更新"""
+    logger.info("測試索引同步更新...")
+    index = RestaurantGeoIndex()
+    restaurant = _make_restaurant("小西腳碗粿", CENTER_LAT, CENTER_LNG, place_id="ChIJ_bowl")
+    index.upsert(restaurant)
+    assert restaurant["id"] in index
+    assert index.find_by_name("小西腳碗粿")
+    assert index.nearest(CENTER_LAT, CENTER_LNG)[1]["id"] == restaurant["id"]
+
+    # 移動位置後，舊位置查不到
+    index.update_fields(restaurant["id"], {"latitude": CENTER_LAT + 0.05})
+    assert index.nearest(CENTER_LAT, CENTER_LNG) is None
+    assert len(index) == 1
+
+    index.remove(restaurant["id"])
+    assert len(index) == 0
+    assert index.find_by_place_id("ChIJ_bowl") is None
+    assert not index.find_by_name("小西腳碗粿")
+
+    # 沒有座標的餐廳仍可依名稱查詢
+    index.upsert(_make_restaurant("無座標餐廳", None, None))
+    assert index.find_by_name("無座標餐廳")
+    assert index.within_radius(CENTER_LAT, CENTER_LNG, 100000) == []
+    logger.info("索引同步更新測試通過")
+
+
+def test_index_performance():
+    """測試大量餐廳下的查詢速度"""
+    logger.info("測試大量餐廳查詢速度...")
+    restaurants = _random_restaurants(20000, spread_deg=0.5)
+    index = RestaurantGeoIndex.from_restaurants(restaurants)
+
+    start_time = time.time()
+    for _ in range(200):
+        index.within_radius(CENTER_LAT, CENTER_LNG, 1000)
+        index.find_duplicate(_make_restaurant("餐廳1", CENTER_LAT, CENTER_LNG))
+    index_time = time.time() - start_time
+
+    start_time = time.time()
+    for _ in range(200):
+        [r for r in restaurants if haversine_distance(CENTER_LAT, CENTER_LNG, r["latitude"], r["longitude"]) <= 1000]
+    scan_time = time.time() - start_time
+
+    logger.info(f"索引查詢耗時: {index_time:.4f} 秒，逐筆掃描耗時: {scan_time:.4f} 秒")
+    assert index_time < scan_time
+
+
+class SlowRestaurantTable:
+    """每次讀取都會等待 release 的 restaurants 替身，記錄讀取時的執行緒"""
+
+    def __init__(self, restaurants):
+        self.restaurants = restaurants
+        self.release = threading.Event()
+        self.threads = set()
+
+    def select(self, columns):
+        return self
+
+    def order(self, column):
+        return self
+
+    def range(self, start, end):
+        self.page = (start, end)
+        return self
+
+    def execute(self):
+        self.threads.add(threading.get_ident())
+        self.release.wait(timeout=5)
+        start, end = self.page
+        return type("Result", (), {"data": self.restaurants[start:end + 1]})()
+
+
+class SlowSupabase:
+    def __init__(self, restaurants):
+        self.restaurants = SlowRestaurantTable(restaurants)
+
+    def table(self, name):
+        return self.restaurants
+
+
+def test_async_reload_does_not_block():
+    """測試索引在執行緒池載入；過期時在背景重建，期間仍使用舊索引"""
+    logger.info("測試地理索引背景重建...")
+    supabase = SlowSupabase([_make_restaurant("餐廳A", CENTER_LAT, CENTER_LNG)])
+
+    async def scenario():
+        geo_index_module._restaurant_geo_index = None
+        # 首次載入：兩個請求共用同一次載入，等待期間事件迴圈仍可執行其他工作
+        first = asyncio.gather(get_restaurant_geo_index_async(supabase), get_restaurant_geo_index_async(supabase))
+        await asyncio.sleep(0.05)
+        supabase.restaurants.release.set()
+        index_a, index_b = await first
+        assert index_a is index_b and len(index_a) == 1
+
+        # 過期：立即回傳舊索引，背景完成後才替換
+        supabase.restaurants.release.clear()
+        supabase.restaurants.restaurants.append(_make_restaurant("餐廳B", CENTER_LAT, CENTER_LNG + 0.01))
+        index_a.built_at -= 10000
+        stale = await asyncio.wait_for(get_restaurant_geo_index_async(supabase), timeout=0.5)
+        assert stale is index_a
+        supabase.restaurants.release.set()
+        await geo_index_module._geo_index_load_task
+        fresh = await get_restaurant_geo_index_async(supabase)
+        assert fresh is not index_a and len(fresh) == 2
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        geo_index_module._restaurant_geo_index = None
+    assert threading.get_ident() not in supabase.restaurants.threads
+    logger.info("地理索引背景重建測試通過")
+
+
+class FailingSupabase:
+    def table(self, name):
+        raise ConnectionError("database unavailable")
+
+
+def test_failed_first_load_is_retried():
+    """測試首次載入失敗時不快取空索引，下一個請求重新載入"""
+    supabase = SlowSupabase([_make_restaurant("餐廳A", CENTER_LAT, CENTER_LNG)])
+    supabase.restaurants.release.set()
+
+    async def scenario():
+        geo_index_module._restaurant_geo_index = None
+        try:
+            await get_restaurant_geo_index_async(FailingSupabase())
+            assert False, "首次載入失敗時應拋出例外"
+        except ConnectionError:
+            pass
+        assert geo_index_module._restaurant_geo_index is None
+        assert geo_index_module._geo_index_load_task is None
+
+        index = await get_restaurant_geo_index_async(supabase)
+        assert len(index) == 1
+
+        # 已有索引時重建失敗：沿用舊索引
+        assert await get_restaurant_geo_index_async(FailingSupabase(), force_reload=True) is index
+
+    try:
+        asyncio.run(scenario())
+    finally:
+        geo_index_module._restaurant_geo_index = None
+
+
+def run_tests():
+    """運行所有餐廳地理索引測試"""
+    logger.info("開始運行餐廳地理索引測試...")
+    test_encode_geohash()
+    test_haversine_distance()
+    test_cells_cover_radius()
+    test_large_radius_skips_cell_enumeration()
+    test_within_radius_matches_linear_scan()
+    test_find_duplicate()
+    test_upsert_and_remove()
+    test_index_performance()
+    test_async_reload_does_not_block()
+    test_failed_first_load_is_retried()
+    logger.info("餐廳地理索引測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
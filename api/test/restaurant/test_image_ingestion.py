@@ -0,0 +1,160 @@
+import os
+import io
+import sys
+import asyncio
+import logging
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+api_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(api_dir)
+
+from PIL import Image
+
+from services.image_ingestion_service import (
+    ImageIngestionService,
+    ImageQueueFullError,
+    TASK_SUCCEEDED,
+    TASK_FAILED
+)
+from utils.image_processor import generate_image_variants
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "restaurant_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def _make_service(**kwargs):
+    options = {"worker_count": 2, "max_retries": 2, "retry_base_delay": 0.01, "use_process_pool": False}
+    options.update(kwargs)
+    return ImageIngestionService(**options)
+
+
+async def _wait_for(service, task_id, timeout=5.0):
+    for _ in range(int(timeout / 0.01)):
+        task = service.get_task(task_id)
+        if task["status"] in (TASK_SUCCEEDED, TASK_FAILED):
+            return task
+        await asyncio.sleep(0.01)
+    raise TimeoutError(f"任務 {task_id} 未在時間內完成")
+
+
+def test_task_success_and_retry():
+    """測試任務成功與失敗重試"""
+    logger.info("測試任務成功與失敗重試...")
+
+    async def run():
+        service = _make_service()
+        calls = {"flaky": 0}
+
+        async def ok_handler(payload, svc):
+            return {"value": payload["value"] * 2}
+
+        async def flaky_handler(payload, svc):
+            calls["flaky"] += 1
+            if calls["flaky"] < 3:
+                raise RuntimeError("暫時性錯誤")
+            return "ok"
+
+        async def broken_handler(payload, svc):
+            raise RuntimeError("永久錯誤")
+
+        service.register_handler("ok", ok_handler)
+        service.register_handler("flaky", flaky_handler)
+        service.register_handler("broken", broken_handler)
+        await service.start()
+
+        ok_task = await _wait_for(service, service.submit("ok", {"value": 21}))
+        flaky_task = await _wait_for(service, service.submit("flaky", {}))
+        broken_task = await _wait_for(service, service.submit("broken", {}))
+        await service.stop()
+        return ok_task, flaky_task, broken_task
+
+    ok_task, flaky_task, broken_task = asyncio.run(run())
+    assert ok_task["status"] == TASK_SUCCEEDED and ok_task["result"] == {"value": 42}
+    assert flaky_task["status"] == TASK_SUCCEEDED and flaky_task["attempts"] == 3
+    assert broken_task["status"] == TASK_FAILED and broken_task["attempts"] == 3
+    assert broken_task["error"] == "永久錯誤"
+    logger.info("任務成功與失敗重試測試通過")
+
+
+def test_backpressure_and_dedup():
+    """測試佇列滿時拒絕新任務，以及相同去重鍵不重複提交"""
+    logger.info("測試背壓與去重...")
+
+    async def run():
+        service = _make_service(worker_count=1, max_queue_size=2)
+        release = asyncio.Event()
+
+        async def blocking_handler(payload, svc):
+            await release.wait()
+            return payload["n"]
+
+        service.register_handler("block", blocking_handler)
+        await service.start()
+
+        first = service.submit("block", {"n": 1}, dedup_key="a")
+        await asyncio.sleep(0.05)  # 讓 worker 取走第一個任務
+        assert service.submit("block", {"n": 1}, dedup_key="a") == first
+        service.submit("block", {"n": 2})
+        service.submit("block", {"n": 3})
+        rejected = False
+        try:
+            service.submit("block", {"n": 4})
+        except ImageQueueFullError:
+            rejected = True
+
+        release.set()
+        task = await _wait_for(service, first)
+        await service.stop()
+        return rejected, task, service.stats()
+
+    rejected, task, stats = asyncio.run(run())
+    assert rejected
+    assert task["status"] == TASK_SUCCEEDED
+    assert stats["tasks"][TASK_SUCCEEDED] == 3
+    logger.info("背壓與去重測試通過")
+
+
+def test_process_pool_compression():
+    """測試圖片壓縮在進程池中執行"""
+    logger.info("測試進程池圖片壓縮...")
+
+    image = Image.new("RGB", (2048, 1536), color=(200, 120, 50))
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+
+    async def run():
+        service = _make_service(use_process_pool=True, process_workers=1)
+        await service.start()
+        try:
+            return await service.run_cpu(generate_image_variants, buffer.getvalue(), (1024,))
+        finally:
+            await service.stop()
+
+    variants = asyncio.run(run())
+    result = Image.open(io.BytesIO(variants[0]["data"]))
+    assert len(variants) == 1
+    assert result.format == "WEBP"
+    assert result.size == (1024, 768)
+    logger.info("進程池圖片壓縮測試通過")
+
+
+def run_tests():
+    """運行所有圖片處理服務測試"""
+    logger.info("開始運行圖片處理服務測試...")
+    test_task_success_and_retry()
+    test_backpressure_and_dedup()
+    test_process_pool_compression()
+    logger.info("圖片處理服務測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,143 @@
+import os
+import io
+import sys
+import asyncio
+import logging
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+test_dir = os.path.dirname(current_dir)
+api_dir = os.path.dirname(test_dir)
+sys.path.append(api_dir)
+sys.path.append(test_dir)
+sys.path.append(current_dir)
+
+from PIL import Image
+
+import utils.r2_storage as r2_storage
+import utils.r2_existence_index as r2_existence_index
+from utils.r2_storage import AsyncObjectStorage
+from utils.r2_existence_index import R2ExistenceIndex
+from utils.image_processor import (
+    generate_image_variants,
+    get_variant_key,
+    pick_primary_variant,
+    delete_unreferenced_variants
+)
+from config import R2_BUCKET_NAME
+from fakes import FakeSupabase
+from test_r2_storage import InMemoryS3Client
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "restaurant_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def _make_image(size, mode="RGB", image_format="PNG"):
+    image = Image.new(mode, size, color=(30, 160, 90) if mode == "RGB" else (30, 160, 90, 128))
+    buffer = io.BytesIO()
+    image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def test_variant_sizes():
+    """測試產生的衍生圖尺寸與格式"""
+    logger.info("測試衍生圖尺寸...")
+
+    variants = generate_image_variants(_make_image((2000, 1500)), sizes=(256, 512, 1024))
+    assert [(v["width"], v["height"]) for v in variants] == [(256, 192), (512, 384), (1024, 768)]
+    for variant in variants:
+        assert variant["format"] == "webp"
+        assert variant["content_type"] == "image/webp"
+        decoded = Image.open(io.BytesIO(variant["data"]))
+        assert decoded.format == "WEBP"
+        assert decoded.size == (variant["width"], variant["height"])
+    logger.info("衍生圖尺寸測試通過")
+
+
+def test_no_upscale():
+    """測試原圖較小時不放大，且相同尺寸只產生一次"""
+    logger.info("測試小圖不放大...")
+
+    variants = generate_image_variants(_make_image((400, 300)), sizes=(256, 512, 1024))
+    assert [(v["width"], v["height"]) for v in variants] == [(256, 192), (400, 300)]
+
+    # 直式圖片以長邊計算
+    variants = generate_image_variants(_make_image((600, 1200)), sizes=(256,))
+    assert (variants[0]["width"], variants[0]["height"]) == (128, 256)
+    logger.info("小圖不放大測試通過")
+
+
+def test_mode_conversion():
+    """測試調色盤與透明圖片可正常轉換"""
+    palette = Image.new("P", (300, 300))
+    buffer = io.BytesIO()
+    palette.save(buffer, format="PNG")
+    assert len(generate_image_variants(buffer.getvalue(), sizes=(256,))) == 1
+
+    variants = generate_image_variants(_make_image((300, 300), mode="RGBA"), sizes=(256,))
+    assert Image.open(io.BytesIO(variants[0]["data"])).mode == "RGBA"
+
+
+def test_keys_and_primary():
+    """測試衍生圖路徑與主要圖片選擇"""
+    assert get_variant_key("abc", 512, "webp") == "places/abc/512w.webp"
+    records = [
+        {"width": 256, "format": "webp", "url": "a"},
+        {"width": 1024, "format": "avif", "url": "b"},
+        {"width": 1024, "format": "webp", "url": "c"},
+    ]
+    assert pick_primary_variant(records)["url"] == "c"
+    assert pick_primary_variant([]) is None
+
+
+def test_delete_unreferenced_variants():
+    """測試刪除餐廳後，只有在沒有其他餐廳引用時才刪除整個衍生圖前綴"""
+    shared, other = "places/" + "a" * 32 + "/", "places/" + "b" * 32 + "/"
+    client = InMemoryS3Client()
+    for key in (f"{shared}512w.webp", f"{shared}1024w.webp", f"{shared}variants.json", f"{other}512w.webp"):
+        client.objects[(R2_BUCKET_NAME, key)] = {"Body": b"x"}
+    index = R2ExistenceIndex(capacity=100, lru_size=10)
+    index.add(f"{shared}variants.json", {"image_variants": []})
+    rows = [{"id": "r2", "image_path": f"https://cdn.example.com/{shared}1024w.webp"}]
+    supabase = FakeSupabase({"restaurants": rows})
+
+    r2_storage._object_storage = AsyncObjectStorage(lambda: client, max_concurrency=2)
+    r2_existence_index._r2_existence_index = index
+    try:
+        # 另一家餐廳仍使用相同的原圖
+        assert asyncio.run(delete_unreferenced_variants(supabase, f"{shared}1024w.webp")) == 0
+        assert (R2_BUCKET_NAME, f"{shared}variants.json") in client.objects
+
+        rows.clear()
+        assert asyncio.run(delete_unreferenced_variants(supabase, f"{shared}1024w.webp")) == 3
+        assert [key for _, key in client.objects] == [f"{other}512w.webp"]
+        assert index.get(f"{shared}variants.json") is None
+
+        # 非內容雜湊路徑不處理
+        assert asyncio.run(delete_unreferenced_variants(supabase, "restaurant_images/r1.jpg")) == 0
+    finally:
+        r2_storage._object_storage = None
+        r2_existence_index._r2_existence_index = None
+
+
+def run_tests():
+    """運行所有衍生圖測試"""
+    logger.info("開始運行衍生圖測試...")
+    test_variant_sizes()
+    test_no_upscale()
+    test_mode_conversion()
+    test_keys_and_primary()
+    test_delete_unreferenced_variants()
+    logger.info("衍生圖測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,106 @@
+import os
+import sys
+import asyncio
+import logging
+import tempfile
+from unittest import mock
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+test_dir = os.path.dirname(current_dir)
+api_dir = os.path.dirname(test_dir)
+sys.path.append(api_dir)
+sys.path.append(test_dir)
+
+# 導入腳本在載入時檢查環境變數（不會實際連線）
+os.environ.setdefault("GOOGLE_PLACES_API_KEY", "test-key")
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "test.service.key")
+
+from fakes import FakeSupabase, FakeTable
+
+import utils.import_restaurants as import_restaurants
+from utils.import_restaurants import ImportCheckpoint, bulk_import
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "restaurant_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class BulkRestaurantTable(FakeTable):
+    """與 PostgREST 相同：批次寫入時每筆資料的欄位必須一致"""
+
+    def execute(self, query):
+        if query.action in ("insert", "upsert") and isinstance(query.payload, list):
+            keys = {frozenset(row) for row in query.payload}
+            if len(keys) > 1:
+                raise RuntimeError("All object keys must match")
+        return super().execute(query)
+
+
+async def fake_place_details(place_id):
+    return {
+        "displayName": {"text": f"餐廳 {place_id}"},
+        "formattedAddress": "100台灣台北市中正區測試路1號",
+        "location": {"latitude": 25.04, "longitude": 121.51},
+        "photos": [{"name": f"places/{place_id}/photos/p"}]
+    }
+
+
+async def fake_photo_variants(photo_reference):
+    # 只有 ok 開頭的地點圖片處理成功
+    if not photo_reference.startswith("places/ok"):
+        return None
+    return {
+        "image_path": "https://cdn.example.com/places/abc/1024w.webp",
+        "image_variants": [{"width": 1024, "height": 768, "format": "webp", "url": "https://cdn.example.com/places/abc/1024w.webp", "size": 100}]
+    }
+
+
+async def no_existing_place_ids():
+    return set()
+
+
+def test_batch_with_and_without_image():
+    """測試同一批次中圖片處理成功與失敗的餐廳一起寫入，不會因欄位不一致而整批失敗"""
+    logger.info("測試餐廳批次導入...")
+    supabase = FakeSupabase({"restaurants": BulkRestaurantTable()})
+    urls = [
+        ("https://www.google.com/maps/place/?place_id=ok-1", "咖啡"),
+        ("https://www.google.com/maps/place/?place_id=no-image-1", "咖啡"),
+    ]
+
+    with tempfile.TemporaryDirectory() as directory, \
+            mock.patch.object(import_restaurants, "supabase", supabase), \
+            mock.patch.object(import_restaurants, "expand_short_url_if_needed", lambda url: url), \
+            mock.patch.object(import_restaurants, "get_existing_place_ids", no_existing_place_ids), \
+            mock.patch.object(import_restaurants, "get_place_details", fake_place_details), \
+            mock.patch.object(import_restaurants, "download_and_upload_photo_variants", fake_photo_variants):
+        checkpoint = ImportCheckpoint(os.path.join(directory, "checkpoint.json"))
+        stats = asyncio.run(bulk_import(urls, checkpoint, rate=1000, batch_size=10))
+
+    assert stats["imported"] == 2 and stats["failed"] == 0
+    rows = {row["google_place_id"]: row for row in supabase.tables["restaurants"].rows}
+    assert len(supabase.tables["restaurants"].calls("upsert")) == 1
+    assert rows["ok-1"]["image_variants"][0]["width"] == 1024
+    assert rows["no-image-1"]["image_path"] is None and rows["no-image-1"]["image_variants"] is None
+    assert all(entry["status"] == "imported" for entry in checkpoint.entries.values())
+    logger.info("餐廳批次導入測試通過")
+
+
+def run_tests():
+    """運行所有餐廳導入測試"""
+    logger.info("開始運行餐廳導入測試...")
+    test_batch_with_and_without_image()
+    logger.info("餐廳導入測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
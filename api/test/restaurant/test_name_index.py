@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+import random
+import logging
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+api_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(api_dir)
+
+from utils.name_index import NGramNameIndex, default_name_normalizer
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "restaurant_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+CHARACTERS = "阿堂鹹粥福記肉圓小西腳碗粿牛肉湯鍋燒意麵蝦捲米糕豆花冰店早餐咖啡茶"
+
+
+def _random_names(count, seed=42):
+    rng = random.Random(seed)
+    return [
+        "".join(rng.choice(CHARACTERS) for _ in range(rng.randint(3, 8))) + str(i)
+        for i in range(count)
+    ]
+
+
+def _brute_force_scores(index, names, query):
+    query_grams = index.ngrams(default_name_normalizer(query))
+    scores = {}
+    for name in names:
+        grams = index.ngrams(default_name_normalizer(name))
+        common = len(query_grams & grams)
+        if common:
+            scores[name] = common / len(query_grams | grams)
+    return scores
+
+
+def test_ngrams():
+    """測試 n-gram 切分"""
+    logger.info("測試 n-gram 切分...")
+    index = NGramNameIndex(n=2)
+    assert index.ngrams("阿堂") == {" 阿", "阿堂", "堂 "}
+    assert NGramNameIndex(n=3).ngrams("ab") == {"  a", " ab", "ab ", "b  "}
+    assert index.ngrams("") == set()
+    logger.info("n-gram 切分測試通過")
+
+
+def test_top_k():
+    """測試相似名稱查詢"""
+    logger.info("測試相似名稱查詢...")
+    names = ["阿堂鹹粥", "阿堂鹹粥 本店", "福記肉圓", "小西腳碗粿", "阿江鍋燒意麵"]
+    index = NGramNameIndex.from_items(names, key=lambda n: n)
+
+    results = index.top_k("阿堂鹹粥", k=2)
+    assert results[0] == (1.0, "阿堂鹹粥")
+    assert results[1][1] == "阿堂鹹粥 本店"
+    assert index.top_k("完全無關", k=3) == []
+    assert index.contains_candidates("福記") == ["福記肉圓"]
+    assert set(index.contains_candidates("阿堂鹹粥")) == {"阿堂鹹粥", "阿堂鹹粥 本店"}
+    logger.info("相似名稱查詢測試通過")
+
+
+def test_single_character_containment():
+    """測試單字名稱與較長名稱的包含關係（與逐筆比對相同）"""
+    names = ["一蘭拉麵", "大麵羹", "麵", "阿明"]
+    index = NGramNameIndex.from_items(names, key=lambda n: n)
+
+    assert index.contains_candidates("麵") == ["一蘭拉麵", "大麵羹", "麵"]
+    assert index.contains_candidates("好吃的麵店") == ["麵"]
+    for query in ("麵", "蘭", "好吃的麵店", "阿明"):
+        expected = [n for n in names if query in n or n in query]
+        assert index.contains_candidates(query) == expected
+
+
+def test_top_k_matches_brute_force():
+    """測試索引查詢結果與逐筆計算一致"""
+    logger.info("測試索引查詢與逐筆計算一致...")
+    names = _random_names(3000)
+    index = NGramNameIndex.from_items(names, key=lambda n: n)
+
+    for query in names[:50] + ["阿堂鹹粥", "咖啡茶"]:
+        expected = _brute_force_scores(index, names, query)
+        results = index.top_k(query, k=5)
+        expected_scores = sorted((round(score, 4) for score in expected.values()), reverse=True)[:5]
+        assert [score for score, _ in results] == expected_scores
+        for score, name in results:
+            assert round(expected[name], 4) == score
+    logger.info("索引查詢與逐筆計算一致測試通過")
+
+
+def test_index_performance():
+    """測試大量名稱下的查詢速度"""
+    logger.info("測試大量名稱查詢速度...")
+    names = _random_names(20000)
+    index = NGramNameIndex.from_items(names, key=lambda n: n)
+    queries = names[:100]
+
+    start_time = time.time()
+    for query in queries:
+        index.top_k(query, k=5)
+    index_time = time.time() - start_time
+
+    start_time = time.time()
+    for query in queries[:5]:
+        _brute_force_scores(index, names, query)
+    scan_time = (time.time() - start_time) * 20
+
+    logger.info(f"索引查詢耗時: {index_time:.4f} 秒，逐筆比對估計耗時: {scan_time:.4f} 秒")
+    assert index_time < scan_time
+
+
+def run_tests():
+    """運行所有餐廳名稱索引測試"""
+    logger.info("開始運行餐廳名稱索引測試...")
+    test_ngrams()
+    test_top_k()
+    test_single_character_containment()
+    test_top_k_matches_brute_force()
+    test_index_performance()
+    logger.info("餐廳名稱索引測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
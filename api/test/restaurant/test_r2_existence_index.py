@@ -0,0 +1,89 @@
+import os
+import sys
+import logging
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+api_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(api_dir)
+
+from utils.r2_existence_index import BloomFilter, R2ExistenceIndex
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "restaurant_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def test_bloom_filter():
+    """測試 Bloom filter 無漏判且誤判率接近設定值"""
+    logger.info("測試 Bloom filter...")
+
+    bloom = BloomFilter(capacity=10000, error_rate=0.01)
+    for i in range(10000):
+        bloom.add(f"places/{i}/variants.json")
+    assert all(f"places/{i}/variants.json" in bloom for i in range(10000))
+
+    false_positives = sum(f"places/other-{i}/variants.json" in bloom for i in range(10000))
+    assert false_positives / 10000 < 0.03
+    logger.info(f"Bloom filter 測試通過，誤判率 {false_positives / 10000:.4f}")
+
+
+def test_seed_and_lookup():
+    """測試從儲存桶載入後的查詢結果"""
+    logger.info("測試存在索引載入與查詢...")
+
+    keys = [f"places/h{i}/variants.json" for i in range(10)] + ["chat_images/x.webp"]
+    index = R2ExistenceIndex(capacity=1000, error_rate=0.001, lru_size=2)
+
+    # 載入前無法確定不存在
+    assert index.exists("places/missing/variants.json") is None
+
+    assert index.seed(key for key in keys if key.startswith("places/")) == 10
+    assert index.exists("places/missing/variants.json") is False
+    # 只在 Bloom filter 中的物件仍需向 R2 確認
+    assert index.exists("places/h1/variants.json") is None
+
+    index.add("places/new/variants.json", {"image_path": "url"})
+    assert index.exists("places/new/variants.json") is True
+    assert index.get("places/new/variants.json") == {"image_path": "url"}
+    logger.info("存在索引載入與查詢測試通過")
+
+
+def test_lru_alias_and_discard():
+    """測試 LRU 淘汰、別名與刪除"""
+    index = R2ExistenceIndex(capacity=100, lru_size=2)
+    index.is_seeded = True
+    index.add("a", {"n": 1})
+    index.add("b", {"n": 2})
+    index.add_alias("ref-a", "a")
+    assert index.resolve_alias("ref-a") == {"n": 1}
+
+    # a 剛被使用，新增 c 時淘汰 b
+    index.add("c", {"n": 3})
+    assert index.get("b") is None
+    assert index.exists("b") is None
+    assert index.resolve_alias("ref-a") == {"n": 1}
+
+    index.discard("a")
+    assert index.resolve_alias("ref-a") is None
+    assert index.exists("a") is None
+
+
+def run_tests():
+    """運行所有 R2 存在索引測試"""
+    logger.info("開始運行 R2 存在索引測試...")
+    test_bloom_filter()
+    test_seed_and_lookup()
+    test_lru_alias_and_discard()
+    logger.info("R2 存在索引測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
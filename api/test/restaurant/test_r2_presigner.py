@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+import logging
+from datetime import datetime, timezone
+from unittest import mock
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+api_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(api_dir)
+
+import boto3
+from botocore.client import Config
+
+from utils.r2_presigner import SigV4Presigner, PresignedUrlCache
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "restaurant_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+ENDPOINT = "https://account.r2.cloudflarestorage.com"
+FIXED_TIME = datetime(2026, 10, 19, 12, 0, 0, tzinfo=timezone.utc)
+KEYS = [
+    "avatars/0b6a4c1e-user.webp",
+    "chat_images/event 1/訊息+1~.webp",
+    "chat_images/event-1/a=b&c.webp",
+]
+
+
+def _botocore_url(client, key, expiration, operation="get_object", **params):
+    with mock.patch("botocore.auth.datetime") as mocked:
+        mocked.datetime.utcnow.return_value = FIXED_TIME.replace(tzinfo=None)
+        mocked.datetime.now.return_value = FIXED_TIME.replace(tzinfo=None)
+        return client.generate_presigned_url(
+            operation, Params={"Bucket": "private-bucket", "Key": key, **params}, ExpiresIn=expiration
+        )
+
+
+def test_matches_botocore():
+    """測試批次簽章結果與 botocore 完全相同"""
+    logger.info("測試 SigV4 批次簽章...")
+
+    client = boto3.client(
+        "s3",
+        endpoint_url=ENDPOINT,
+        aws_access_key_id="AKIDEXAMPLE",
+        aws_secret_access_key="wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY",
+        config=Config(signature_version="s3v4")
+    )
+    presigner = SigV4Presigner(
+        ENDPOINT, "AKIDEXAMPLE", "wJalrXUtnFEMI/K7MDENG+bPxRfiCYEXAMPLEKEY", region=client.meta.region_name
+    )
+    urls = presigner.presign_get_many("private-bucket", KEYS, 5400, now=FIXED_TIME)
+    for key in KEYS:
+        assert urls[key] == _botocore_url(client, key, 5400), key
+
+    # PUT URL 簽入 Content-Type 標頭
+    put_urls = presigner.presign_put_many("private-bucket", KEYS, 3600, content_type="image/webp", now=FIXED_TIME)
+    for key in KEYS:
+        assert put_urls[key] == _botocore_url(client, key, 3600, "put_object", ContentType="image/webp"), key
+    logger.info("SigV4 批次簽章測試通過")
+
+
+def test_batch_signing_speed():
+    """測試大量鍵值的簽章速度"""
+    presigner = SigV4Presigner(ENDPOINT, "AKID", "SECRET")
+    keys = [f"chat_images/event/{i}.webp" for i in range(2000)]
+    start_time = time.perf_counter()
+    urls = presigner.presign_get_many("private-bucket", keys, 3600)
+    elapsed = time.perf_counter() - start_time
+    assert len(urls) == 2000
+    assert elapsed < 1.0
+    logger.info(f"簽章 2000 個 URL 耗時 {elapsed * 1000:.1f} ms")
+
+
+def test_invalid_expiration():
+    presigner = SigV4Presigner(ENDPOINT, "AKID", "SECRET")
+    try:
+        presigner.presign_get_many("bucket", ["a"], 8 * 24 * 3600)
+        assert False, "超過 7 天應拋出錯誤"
+    except ValueError:
+        pass
+
+
+def test_cache_reuse_and_invalidation():
+    """測試快取重用、有效期涵蓋與失效"""
+    logger.info("測試 Presigned URL 快取...")
+
+    cache = PresignedUrlCache(max_entries=2, reuse_seconds=100)
+    assert cache.sign_expiration(3600) == 3700
+
+    cache.put_many("b", {"k1": "url1", "k2": "url2"}, 3700)
+    found, missing = cache.get_many("b", ["k1", "k2", "k3"], 3600)
+    assert found == {"k1": "url1", "k2": "url2"} and missing == ["k3"]
+
+    # 要求更長的有效期時不可使用簽章有效期不足的快取
+    found, missing = cache.get_many("b", ["k1"], 7200)
+    assert found == {} and missing == ["k1"]
+
+    # LRU 淘汰最久未使用的項目
+    cache.put_many("b", {"k3": "url3"}, 3700)
+    assert len(cache) == 2
+
+    cache.invalidate("b", "k3")
+    assert cache.get_many("b", ["k3"], 3600)[1] == ["k3"]
+
+    # 超過重用時間後需重新簽章
+    cache.put_many("b", {"k4": "url4"}, 3700)
+    with mock.patch("utils.r2_presigner.time.monotonic", return_value=time.monotonic() + 101):
+        assert cache.get_many("b", ["k4"], 3600)[1] == ["k4"]
+    logger.info("Presigned URL 快取測試通過")
+
+
+def run_tests():
+    """運行所有 Presigned URL 測試"""
+    logger.info("開始運行 Presigned URL 測試...")
+    test_matches_botocore()
+    test_batch_signing_speed()
+    test_invalid_expiration()
+    test_cache_reuse_and_invalidation()
+    logger.info("Presigned URL 測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,178 @@
+import io
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+api_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(api_dir)
+
+from botocore.exceptions import ClientError
+
+from utils.r2_storage import AsyncObjectStorage
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "restaurant_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+class InMemoryS3Client:
+    """記憶體中的 S3 相容客戶端替身（同步、執行緒安全），可記錄最大並行請求數"""
+
+    def __init__(self, latency=0.0):
+        self.objects = {}
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._active = 0
+        self.max_active = 0
+
+    def _enter(self):
+        with self._lock:
+            self._active += 1
+            self.max_active = max(self.max_active, self._active)
+        time.sleep(self.latency)
+
+    def _exit(self):
+        with self._lock:
+            self._active -= 1
+
+    @staticmethod
+    def _not_found(operation):
+        return ClientError({"Error": {"Code": "404" if operation == "HeadObject" else "NoSuchKey"}}, operation)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self._enter()
+        try:
+            self.objects[(Bucket, Key)] = {"Body": Body, **kwargs}
+            return {}
+        finally:
+            self._exit()
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise self._not_found("HeadObject")
+        obj = self.objects[(Bucket, Key)]
+        return {"ContentLength": len(obj["Body"]), "ContentType": obj.get("ContentType")}
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise self._not_found("GetObject")
+        return {"Body": io.BytesIO(self.objects[(Bucket, Key)]["Body"])}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def delete_objects(self, Bucket, Delete):
+        assert len(Delete["Objects"]) <= 1000
+        deleted = []
+        for item in Delete["Objects"]:
+            self.objects.pop((Bucket, item["Key"]), None)
+            deleted.append({"Key": item["Key"]})
+        return {"Deleted": deleted}
+
+    def get_paginator(self, name):
+        assert name == "list_objects_v2"
+        client = self
+
+        class Paginator:
+            def paginate(self, Bucket, Prefix, PaginationConfig=None):
+                page_size = (PaginationConfig or {}).get("PageSize", 1000)
+                keys = sorted(key for bucket, key in client.objects if bucket == Bucket and key.startswith(Prefix))
+                for start in range(0, len(keys), page_size):
+                    yield {"Contents": [{"Key": key} for key in keys[start:start + page_size]]}
+
+        return Paginator()
+
+    def generate_presigned_url(self, operation, Params, ExpiresIn):
+        return f"https://example.test/{Params['Bucket']}/{Params['Key']}?op={operation}&expires={ExpiresIn}"
+
+
+def test_basic_operations():
+    """測試單筆 put/head/get/delete 與 presign"""
+    logger.info("測試儲存層基本操作...")
+
+    client = InMemoryS3Client()
+    storage = AsyncObjectStorage(lambda: client, max_concurrency=4)
+
+    async def run():
+        await storage.put("public", "places/a.webp", b"abc", "image/webp", CacheControl="max-age=60")
+        head = await storage.head("public", "places/a.webp")
+        body = await storage.get("public", "places/a.webp")
+        missing_head = await storage.head("public", "places/missing.webp")
+        missing_body = await storage.get("public", "places/missing.webp")
+        url = await storage.presign("get_object", {"Bucket": "private", "Key": "avatars/u.webp"}, 600)
+        await storage.delete("public", "places/a.webp")
+        return head, body, missing_head, missing_body, url
+
+    head, body, missing_head, missing_body, url = asyncio.run(run())
+    storage.close()
+    assert head["ContentLength"] == 3 and head["ContentType"] == "image/webp"
+    assert body == b"abc"
+    assert missing_head is None and missing_body is None
+    assert url.endswith("avatars/u.webp?op=get_object&expires=600")
+    assert client.objects == {}
+    logger.info("儲存層基本操作測試通過")
+
+
+def test_batch_operations_respect_concurrency():
+    """測試批次上傳受並行上限限制，批次刪除與分頁列出正確"""
+    logger.info("測試儲存層批次操作...")
+
+    client = InMemoryS3Client(latency=0.01)
+    storage = AsyncObjectStorage(lambda: client, max_concurrency=3)
+    items = [(f"chat_images/e1/{i}.webp", b"x" * i, "image/webp") for i in range(30)]
+
+    async def run():
+        put_results = await storage.put_many("private", items)
+        keys = await storage.list_keys("private", "chat_images/", page_size=7)
+        delete_result = await storage.delete_prefix("private", "chat_images/")
+        remaining = await storage.list_keys("private", "chat_images/")
+        return put_results, keys, delete_result, remaining
+
+    put_results, keys, delete_result, remaining = asyncio.run(run())
+    storage.close()
+    assert all(error is None for error in put_results.values()) and len(put_results) == 30
+    assert 1 < client.max_active <= 3
+    assert len(keys) == 30
+    assert delete_result == {"deleted_count": 30, "errors": []}
+    assert remaining == []
+    logger.info(f"儲存層批次操作測試通過，最大並行數 {client.max_active}")
+
+
+def test_delete_many_batches():
+    """測試批次刪除超過 1000 個物件時分批進行"""
+    client = InMemoryS3Client()
+    storage = AsyncObjectStorage(lambda: client, max_concurrency=4)
+    keys = [f"places/{i}.webp" for i in range(2500)]
+    for key in keys:
+        client.objects[("public", key)] = {"Body": b""}
+
+    result = asyncio.run(storage.delete_many("public", keys))
+    storage.close()
+    assert result == {"deleted_count": 2500, "errors": []}
+    assert client.objects == {}
+
+
+def run_tests():
+    """運行所有儲存層測試"""
+    logger.info("開始運行儲存層測試...")
+    test_basic_operations()
+    test_batch_operations_respect_concurrency()
+    test_delete_many_batches()
+    logger.info("儲存層測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,87 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+api_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(api_dir)
+
+from utils.rate_limiter import TokenBucket
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "restaurant_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def test_burst_within_capacity():
+    """測試桶容量內的請求不需等待"""
+    logger.info("測試令牌桶瞬間請求...")
+
+    async def run():
+        bucket = TokenBucket(rate=10, capacity=5)
+        start_time = time.monotonic()
+        for _ in range(5):
+            await bucket.acquire()
+        return time.monotonic() - start_time, bucket.acquired_count
+
+    elapsed, count = asyncio.run(run())
+    assert elapsed < 0.05
+    assert count == 5
+    logger.info("令牌桶瞬間請求測試通過")
+
+
+def test_rate_is_limited():
+    """測試超過容量後依速率放行"""
+    logger.info("測試令牌桶速率限制...")
+
+    async def run():
+        bucket = TokenBucket(rate=20, capacity=2)
+        start_time = time.monotonic()
+        # 10 個並行請求：前 2 個立即放行，其餘 8 個約需 0.4 秒
+        await asyncio.gather(*(bucket.acquire() for _ in range(10)))
+        return time.monotonic() - start_time
+
+    elapsed = asyncio.run(run())
+    assert 0.35 < elapsed < 0.8
+    logger.info(f"令牌桶速率限制測試通過，耗時 {elapsed:.3f} 秒")
+
+
+def test_invalid_arguments():
+    """測試不合法的參數"""
+    try:
+        TokenBucket(rate=0)
+        assert False, "rate 為 0 時應拋出錯誤"
+    except ValueError:
+        pass
+
+    async def run():
+        await TokenBucket(rate=1, capacity=1).acquire(2)
+
+    try:
+        asyncio.run(run())
+        assert False, "超過容量時應拋出錯誤"
+    except ValueError:
+        pass
+
+
+def run_tests():
+    """運行所有限流器測試"""
+    logger.info("開始運行限流器測試...")
+    test_burst_within_capacity()
+    test_rate_is_limited()
+    test_invalid_arguments()
+    logger.info("限流器測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
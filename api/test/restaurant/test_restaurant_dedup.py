@@ -0,0 +1,135 @@
+import os
+import sys
+import time
+import random
+import uuid
+import logging
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+api_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(api_dir)
+
+from utils.restaurant_dedup import find_duplicate_candidates, score_pair
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "restaurant_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+CENTER_LAT = 22.9971
+CENTER_LNG = 120.2126
+
+
+def _make_restaurant(name, lat, lng, place_id=None, address=None, created_at="2024-01-01T00:00:00"):
+    return {
+        "id": str(uuid.uuid4()),
+        "name": name,
+        "latitude": lat,
+        "longitude": lng,
+        "google_place_id": place_id,
+        "address": address,
+        "created_at": created_at
+    }
+
+
+def test_score_pair():
+    """測試配對分數計算"""
+    logger.info("測試配對分數計算...")
+    a = _make_restaurant("阿堂鹹粥", CENTER_LAT, CENTER_LNG, address="台南市中西區西門路一段728號")
+    b = _make_restaurant("阿堂鹹粥", CENTER_LAT + 0.0001, CENTER_LNG, address="中西區西門路一段728號")
+    result = score_pair(a, b)
+    assert result["reasons"] == ["name", "distance", "address"]
+    assert 0.95 < result["score"] <= 1.0
+
+    # 名稱相同但距離太遠、地址也不同
+    far = _make_restaurant("阿堂鹹粥", CENTER_LAT + 0.01, CENTER_LNG, address="台南市東區")
+    assert score_pair(a, far) is None
+
+    # place_id 相同
+    c = _make_restaurant("A", 0, 0, place_id="ChIJ_same")
+    d = _make_restaurant("B", 10, 10, place_id="ChIJ_same")
+    assert score_pair(c, d)["score"] == 1.0
+
+    # place_id 不同，即使同名同地點也不是同一家
+    e = _make_restaurant("阿堂鹹粥", CENTER_LAT, CENTER_LNG, place_id="ChIJ_other")
+    f = _make_restaurant("阿堂鹹粥", CENTER_LAT, CENTER_LNG, place_id="ChIJ_another")
+    assert score_pair(e, f) is None
+    logger.info("配對分數計算測試通過")
+
+
+def test_find_duplicate_candidates():
+    """測試合併候選與合併群組"""
+    logger.info("測試合併候選...")
+    keep = _make_restaurant("福記肉圓", CENTER_LAT, CENTER_LNG, place_id="ChIJ_fuji", created_at="2023-01-01T00:00:00")
+    dup1 = _make_restaurant("福記肉圓", CENTER_LAT + 0.0003, CENTER_LNG)
+    dup2 = _make_restaurant("福記 肉圓", CENTER_LAT + 0.0006, CENTER_LNG)
+    other_branch = _make_restaurant("福記肉圓", CENTER_LAT + 0.05, CENTER_LNG)
+    no_coords = _make_restaurant("福記肉圓", None, None, address="台南市北區")
+    restaurants = [dup1, other_branch, keep, no_coords, dup2]
+
+    result = find_duplicate_candidates(restaurants)
+    pairs = {frozenset((c["keep_id"], c["duplicate_id"])) for c in result["candidates"]}
+    assert frozenset((keep["id"], dup1["id"])) in pairs
+    assert frozenset((dup1["id"], dup2["id"])) in pairs
+    assert all(other_branch["id"] not in pair for pair in pairs)
+    assert all(no_coords["id"] not in pair for pair in pairs)
+
+    assert len(result["groups"]) == 1
+    group = result["groups"][0]
+    assert group["keep_id"] == keep["id"]
+    assert set(group["duplicate_ids"]) == {dup1["id"], dup2["id"]}
+    logger.info("合併候選測試通過")
+
+
+def test_large_catalog_performance():
+    """測試十萬筆餐廳資料的去重速度"""
+    logger.info("測試十萬筆餐廳去重速度...")
+    rng = random.Random(42)
+    restaurants = []
+    for i in range(100000):
+        # 約 1% 為連鎖店名稱，散布在整個區域
+        name = f"連鎖店{i % 50}" if i % 100 == 0 else f"餐廳{i}"
+        restaurants.append(_make_restaurant(
+            name,
+            CENTER_LAT + rng.uniform(-0.5, 0.5),
+            CENTER_LNG + rng.uniform(-0.5, 0.5),
+            place_id=f"ChIJ_{i}" if i % 3 == 0 else None
+        ))
+
+    # 注入 200 筆位於原餐廳旁的重複資料
+    injected = []
+    for i in rng.sample(range(100000), 200):
+        original = restaurants[i]
+        duplicate = _make_restaurant(original["name"], original["latitude"] + 0.0002, original["longitude"])
+        injected.append((original["id"], duplicate["id"]))
+        restaurants.append(duplicate)
+
+    start_time = time.time()
+    result = find_duplicate_candidates(restaurants)
+    elapsed = time.time() - start_time
+    logger.info(f"十萬筆資料去重耗時: {elapsed:.2f} 秒，比對配對數: {result['compared_pairs']}")
+
+    pairs = {frozenset((c["keep_id"], c["duplicate_id"])) for c in result["candidates"]}
+    for original_id, duplicate_id in injected:
+        assert frozenset((original_id, duplicate_id)) in pairs
+    assert elapsed < 10
+
+
+def run_tests():
+    """運行所有餐廳去重測試"""
+    logger.info("開始運行餐廳去重測試...")
+    test_score_pair()
+    test_find_duplicate_candidates()
+    test_large_catalog_performance()
+    logger.info("餐廳去重測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,56 @@
+import os
+import sys
+import asyncio
+import logging
+
+# 添加父級目錄到路徑，以便導入模組
+current_dir = os.path.dirname(os.path.abspath(__file__))
+api_dir = os.path.dirname(os.path.dirname(current_dir))
+sys.path.append(api_dir)
+
+# 檢查腳本在載入時建立 Supabase 客戶端（不會實際連線）
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "test.service.key")
+
+from utils.restaurant_url_checker import build_db_lookup, is_restaurant_in_db
+
+# 配置日誌
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(levelname)s - %(message)s',
+    handlers=[
+        logging.FileHandler(os.path.join(os.path.dirname(os.path.abspath(__file__)), "restaurant_test.log")),
+        logging.StreamHandler()
+    ]
+)
+logger = logging.getLogger(__name__)
+
+
+def test_url_lookup():
+    """測試網址比對：完全相同、資料庫網址帶有查詢參數或較長路徑、相同短網址ID"""
+    lookup = build_db_lookup([
+        {"name": "阿堂鹹粥", "website": "https://maps.app.goo.gl/abc123?g_st=ic"},
+        {"name": "福記肉圓", "website": "https://www.google.com/maps/place/?q=place_id:ChIJ1"},
+        {"name": "小西腳碗粿", "website": "https://example.com/shop/tainan/menu"},
+    ])
+
+    def check(url):
+        return asyncio.run(is_restaurant_in_db(url, None, lookup))
+
+    assert check("https://maps.app.goo.gl/abc123") == (True, "阿堂鹹粥")
+    assert check("https://maps.app.goo.gl/abc123?g_st=ac") == (True, "阿堂鹹粥")
+    assert check("https://www.google.com/maps/place/?q=place_id:ChIJ1") == (True, "福記肉圓")
+    assert check("https://example.com/shop/tainan") == (True, "小西腳碗粿")
+    assert check("https://www.google.com/maps/place/?q=place_id:ChIJ2") == (False, None)
+    assert check("https://example.com/shop/tai") == (False, None)
+
+
+def run_tests():
+    """運行所有餐廳網址檢查測試"""
+    logger.info("開始運行餐廳網址檢查測試...")
+    test_url_lookup()
+    logger.info("餐廳網址檢查測試完成")
+
+
+if __name__ == "__main__":
+    run_tests()
@@ -10,6 +10,8 @@ sys.path.append(api_dir)
 sys.path.append(current_dir)
 sys.path.append(os.path.join(current_dir, "matching"))
 sys.path.append(os.path.join(current_dir, "notification"))
+sys.path.append(os.path.join(current_dir, "restaurant"))
+sys.path.append(os.path.join(current_dir, "chat"))
 
 # 設置日誌
 logging.basicConfig(
@@ -62,6 +64,119 @@ def run_notification_tests():
     except Exception as e:
         logger.error(f"運行通知服務測試時出錯: {e}")
 
+def run_fcm_tests():
+    """運行 FCM 發送測試（不需要數據庫與 Firebase 憑證）"""
+    logger.info("運行 FCM 發送測試...")
+    try:
+        from notification.test_fcm_sender import run_tests
+        run_tests()
+        logger.info("FCM 發送測試完成")
+    except Exception as e:
+        logger.error(f"運行 FCM 發送測試時出錯: {e}")
+
+def run_device_token_tests():
+    """運行設備令牌測試（不需要數據庫與 Firebase 憑證）"""
+    logger.info("運行設備令牌測試...")
+    try:
+        from notification.test_device_tokens import run_tests
+        run_tests()
+        logger.info("設備令牌測試完成")
+    except Exception as e:
+        logger.error(f"運行設備令牌測試時出錯: {e}")
+
+def run_notification_outbox_tests():
+    """運行通知 outbox 測試（不需要數據庫與 Firebase 憑證）"""
+    logger.info("運行通知 outbox 測試...")
+    try:
+        from notification.test_notification_outbox import run_tests
+        run_tests()
+        logger.info("通知 outbox 測試完成")
+    except Exception as e:
+        logger.error(f"運行通知 outbox 測試時出錯: {e}")
+
+def run_reminder_context_tests():
+    """運行提醒聚餐資訊測試（不需要數據庫與 Firebase 憑證）"""
+    logger.info("運行提醒聚餐資訊測試...")
+    try:
+        from notification.test_reminder_context import run_tests
+        run_tests()
+        logger.info("提醒聚餐資訊測試完成")
+    except Exception as e:
+        logger.error(f"運行提醒聚餐資訊測試時出錯: {e}")
+
+def run_chat_push_coalescer_tests():
+    """運行聊天推送合併測試（不需要數據庫與 Firebase 憑證）"""
+    logger.info("運行聊天推送合併測試...")
+    try:
+        from notification.test_chat_push_coalescer import run_tests
+        run_tests()
+        logger.info("聊天推送合併測試完成")
+    except Exception as e:
+        logger.error(f"運行聊天推送合併測試時出錯: {e}")
+
+def run_notification_inbox_tests():
+    """運行通知收件匣測試（不需要數據庫與 Firebase 憑證）"""
+    logger.info("運行通知收件匣測試...")
+    try:
+        from notification.test_notification_inbox import run_tests
+        run_tests()
+        logger.info("通知收件匣測試完成")
+    except Exception as e:
+        logger.error(f"運行通知收件匣測試時出錯: {e}")
+
+def run_notification_unit_tests():
+    """運行所有不需要數據庫的通知測試"""
+    run_fcm_tests()
+    run_device_token_tests()
+    run_notification_outbox_tests()
+    run_reminder_context_tests()
+    run_chat_push_coalescer_tests()
+    run_notification_inbox_tests()
+
+def run_restaurant_tests():
+    """運行餐廳相關測試（不需要數據庫）"""
+    logger.info("運行餐廳相關測試...")
+    try:
+        from restaurant.test_geo_index import run_tests as run_geo_index_tests
+        from restaurant.test_restaurant_dedup import run_tests as run_dedup_tests
+        from restaurant.test_name_index import run_tests as run_name_index_tests
+        from restaurant.test_rate_limiter import run_tests as run_rate_limiter_tests
+        from restaurant.test_image_ingestion import run_tests as run_image_ingestion_tests
+        from restaurant.test_image_variants import run_tests as run_image_variants_tests
+        from restaurant.test_r2_existence_index import run_tests as run_r2_existence_index_tests
+        from restaurant.test_r2_storage import run_tests as run_r2_storage_tests
+        from restaurant.test_r2_presigner import run_tests as run_r2_presigner_tests
+        from restaurant.test_import_restaurants import run_tests as run_import_restaurants_tests
+        from restaurant.test_restaurant_url_checker import run_tests as run_restaurant_url_checker_tests
+        run_geo_index_tests()
+        run_dedup_tests()
+        run_name_index_tests()
+        run_rate_limiter_tests()
+        run_image_ingestion_tests()
+        run_image_variants_tests()
+        run_r2_existence_index_tests()
+        run_r2_storage_tests()
+        run_r2_presigner_tests()
+        run_import_restaurants_tests()
+        run_restaurant_url_checker_tests()
+        logger.info("餐廳相關測試完成")
+    except Exception as e:
+        logger.error(f"運行餐廳相關測試時出錯: {e}")
+
+def run_chat_tests():
+    """運行聊天相關測試（不需要數據庫）"""
+    logger.info("運行聊天相關測試...")
+    try:
+        from chat.test_chat_auth import run_tests as run_chat_auth_tests
+        from chat.test_pagination import run_tests as run_pagination_tests
+        from chat.test_thumbnails import run_tests as run_thumbnails_tests
+        run_chat_auth_tests()
+        run_pagination_tests()
+        run_thumbnails_tests()
+        logger.info("聊天相關測試完成")
+    except Exception as e:
+        logger.error(f"運行聊天相關測試時出錯: {e}")
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="測試工具")
     parser.add_argument("--all", action="store_true", help="運行所有測試")
@@ -70,12 +185,14 @@ if __name__ == "__main__":
     parser.add_argument("--scenarios", action="store_true", help="運行配對場景測試")
     parser.add_argument("--mock", action="store_true", help="運行模擬數據庫配對邏輯測試")
     parser.add_argument("--notification", action="store_true", help="運行通知服務測試")
+    parser.add_argument("--restaurant", action="store_true", help="運行餐廳相關測試")
+    parser.add_argument("--chat", action="store_true", help="運行聊天相關測試")
     parser.add_argument("--no-db", action="store_true", help="只運行不需要數據庫的測試")
     
     args = parser.parse_args()
     
     # 如果沒有指定參數，則預設運行所有測試
-    if not (args.all or args.matching or args.basic or args.scenarios or args.mock or args.notification or args.no_db):
+    if not (args.all or args.matching or args.basic or args.scenarios or args.mock or args.notification or args.restaurant or args.chat or args.no_db):
         args.all = True
     
     logger.info("開始運行測試...")
@@ -83,6 +200,9 @@ if __name__ == "__main__":
     if args.no_db:
         # 只運行不需要數據庫的測試
         run_mock_tests()
+        run_notification_unit_tests()
+        run_restaurant_tests()
+        run_chat_tests()
     else:
         # 運行需要數據庫的測試
         if args.all or args.matching or args.basic:
@@ -95,6 +215,13 @@ if __name__ == "__main__":
             run_mock_tests()
         
         if args.all or args.notification:
+            run_notification_unit_tests()
             run_notification_tests()
+        
+        if args.all or args.restaurant:
+            run_restaurant_tests()
+        
+        if args.all or args.chat:
+            run_chat_tests()
     
     logger.info("所有測試執行完畢") 
\ No newline at end of file
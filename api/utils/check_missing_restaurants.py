@@ -19,6 +19,8 @@ from bs4 import BeautifulSoup
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+from .name_index import NGramNameIndex
+
 # 配置日誌記錄
 logging.basicConfig(
     level=logging.INFO,
@@ -108,12 +110,29 @@ def extract_restaurant_name_from_url(url: str) -> Optional[str]:
         logger.error(f"從URL提取餐廳名稱出錯: {url}, 錯誤: {str(e)}")
         return None
 
-async def check_restaurant_exists(url: str, category: str = None) -> Tuple[bool, Optional[str], Optional[Dict]]:
+def build_name_index(db_restaurants: List[Dict]) -> NGramNameIndex:
+    """
+    為資料庫餐廳名稱建立 n-gram 索引，每次執行只建立一次
+    
+    Args:
+        db_restaurants: 資料庫中所有餐廳列表
+        
+    Returns:
+        NGramNameIndex: 以小寫名稱建立的索引
+    """
+    return NGramNameIndex.from_items(
+        db_restaurants,
+        key=lambda r: r.get("name", ""),
+        normalizer=lambda name: name.lower()
+    )
+
+async def check_restaurant_exists(url: str, name_index: NGramNameIndex, category: str = None) -> Tuple[bool, Optional[str], Optional[Dict]]:
     """
     檢查餐廳是否存在於資料庫
     
     Args:
         url: Google Maps URL
+        name_index: 資料庫餐廳名稱索引
         category: 餐廳類別
         
     Returns:
@@ -131,35 +150,27 @@ async def check_restaurant_exists(url: str, category: str = None) -> Tuple[bool,
             
         logger.info(f"獲取到餐廳名稱: {restaurant_name}")
             
-        # 使用餐廳名稱在資料庫中進行模糊匹配
-        name_query = supabase.table("restaurants").select("*").ilike("name", f"%{restaurant_name}%")
-        name_result = name_query.execute()
+        # 使用名稱索引找出名稱互相包含的餐廳（取代逐筆比對整個資料庫）
+        matches = name_index.contains_candidates(restaurant_name)
         
         # 輸出查詢結果，以便調試
         debug_data = {
             "restaurant_name": restaurant_name,
-            "query_type": "by_name",
-            "result_count": len(name_result.data) if name_result.data else 0,
-            "results": name_result.data
+            "query_type": "by_name_index",
+            "result_count": len(matches),
+            "results": matches,
+            "similar_names": [
+                {"score": score, "name": r.get("name")}
+                for score, r in name_index.top_k(restaurant_name, k=5)
+            ]
         }
         save_debug_data("db_query_name", debug_data, restaurant_name)
         
-        if name_result.data and len(name_result.data) > 0:
-            restaurant = name_result.data[0]
+        if matches:
+            restaurant = matches[0]
             logger.info(f"通過名稱找到餐廳: {restaurant.get('name')}")
             return True, restaurant_name, restaurant
         
-        # 如果模糊匹配失敗，嘗試更寬鬆的匹配
-        # 例如：可以檢查名稱的一部分是否包含在資料庫中的餐廳名稱中
-        for db_restaurant in await get_all_restaurants_from_db():
-            db_name = db_restaurant.get("name", "").lower()
-            search_name = restaurant_name.lower()
-            
-            # 檢查名稱是否有部分匹配
-            if db_name in search_name or search_name in db_name:
-                logger.info(f"通過部分名稱匹配找到餐廳: DB名稱={db_name}, 搜索名稱={search_name}")
-                return True, restaurant_name, db_restaurant
-        
         # 打印資料庫查詢結果摘要
         logger.warning(f"餐廳不存在於資料庫: name={restaurant_name}")
         return False, restaurant_name, None
@@ -268,9 +279,9 @@ async def main():
     db_restaurants = await get_all_restaurants_from_db()
     logger.info(f"從資料庫獲取到 {len(db_restaurants)} 個餐廳")
     
-    # 創建資料庫餐廳名稱集合，用於快速查詢
-    db_names = {r.get("name", "").lower() for r in db_restaurants if r.get("name")}
-    logger.info(f"資料庫中有 {len(db_names)} 個不同的餐廳名稱")
+    # 建立資料庫餐廳名稱索引，用於快速查詢
+    name_index = build_name_index(db_restaurants)
+    logger.info(f"已建立餐廳名稱索引，共 {len(name_index)} 個餐廳名稱")
     
     # 檢查每個餐廳清單中的URL
     missing_restaurants = []
@@ -287,7 +298,7 @@ async def main():
     try:
         for i, (url, category) in enumerate(restaurants_to_check):
             logger.info(f"處理第 {i+1}/{len(restaurants_to_check)} 個餐廳...")
-            exists, restaurant_name, restaurant_data = await check_restaurant_exists(url, category)
+            exists, restaurant_name, restaurant_data = await check_restaurant_exists(url, name_index, category)
             
             if exists:
                 db_name = restaurant_data.get("name", "未知")
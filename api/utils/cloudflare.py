@@ -7,12 +7,23 @@ import logging
 import asyncio
 from functools import lru_cache
 
-from config import R2_ACCOUNT_ID, R2_ACCESS_KEY_ID, R2_SECRET_ACCESS_KEY, R2_BUCKET_NAME, R2_PRIVATE_BUCKET_NAME
+from config import (
+    R2_ACCOUNT_ID,
+    R2_ACCESS_KEY_ID,
+    R2_SECRET_ACCESS_KEY,
+    R2_ENDPOINT_URL,
+    R2_BUCKET_NAME,
+    R2_PRIVATE_BUCKET_NAME,
+    R2_STORAGE_MAX_CONCURRENCY
+)
+from .r2_existence_index import get_r2_existence_index
+from .r2_storage import get_object_storage
+from .r2_presigner import SigV4Presigner, PresignedUrlCache
 
 logger = logging.getLogger(__name__)
 
-# 設置 Cloudflare R2 端點
-R2_ENDPOINT = f'https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com'
+# 設置 Cloudflare R2 端點（可用 R2_ENDPOINT_URL 指向本地的 S3 相容服務）
+R2_ENDPOINT = R2_ENDPOINT_URL or f'https://{R2_ACCOUNT_ID}.r2.cloudflarestorage.com'
 
 # 單例 R2 客戶端（避免重複創建）
 _r2_client = None
@@ -26,10 +37,30 @@ def get_r2_client():
             endpoint_url=R2_ENDPOINT,
             aws_access_key_id=R2_ACCESS_KEY_ID,
             aws_secret_access_key=R2_SECRET_ACCESS_KEY,
-            config=Config(signature_version='s3v4')
+            config=Config(signature_version='s3v4', max_pool_connections=R2_STORAGE_MAX_CONCURRENCY)
         )
     return _r2_client
 
+# 單例 Presigned URL 簽章器與 GET URL 快取
+_presigner = None
+_presigned_url_cache = PresignedUrlCache()
+
+def get_presigner() -> SigV4Presigner:
+    """獲取 SigV4 簽章器單例（與 R2 客戶端使用相同的端點與區域）"""
+    global _presigner
+    if _presigner is None:
+        _presigner = SigV4Presigner(
+            endpoint_url=R2_ENDPOINT,
+            access_key_id=R2_ACCESS_KEY_ID,
+            secret_access_key=R2_SECRET_ACCESS_KEY,
+            region=get_r2_client().meta.region_name
+        )
+    return _presigner
+
+def invalidate_presigned_get_url(file_key: str, bucket_name: str = None) -> None:
+    """物件內容變更時移除快取的 GET URL，下次請求會重新簽章"""
+    _presigned_url_cache.invalidate(bucket_name or R2_PRIVATE_BUCKET_NAME, file_key)
+
 # 上傳檔案到 R2
 async def upload_file_to_r2(
     file_content: bytes,
@@ -50,18 +81,11 @@ async def upload_file_to_r2(
         成功上傳後的檔案 URL，失敗時返回 None
     """
     try:
-        client = get_r2_client()
-        
         # 生成唯一檔案名
         filename = f"{folder}/{uuid.uuid4()}.{file_extension}"
         
         # 上傳檔案
-        client.put_object(
-            Bucket=R2_BUCKET_NAME,
-            Key=filename,
-            Body=file_content,
-            ContentType=content_type
-        )
+        await get_object_storage().put(R2_BUCKET_NAME, filename, file_content, content_type)
         
         # 返回檔案 URL
         return f"https://{R2_BUCKET_NAME}.r2.dev/{filename}"
@@ -81,13 +105,9 @@ async def delete_file_from_r2(file_path: str) -> bool:
         刪除操作是否成功
     """
     try:
-        client = get_r2_client()
-        
         # 刪除檔案
-        client.delete_object(
-            Bucket=R2_BUCKET_NAME,
-            Key=file_path
-        )
+        await get_object_storage().delete(R2_BUCKET_NAME, file_path)
+        get_r2_existence_index().discard(file_path)
         
         return True
     except Exception as e:
@@ -167,9 +187,9 @@ async def generate_presigned_put_url_async(
     content_type: str = "image/png"
 ) -> Optional[str]:
     """
-    生成用於上傳的 Presigned PUT URL（非同步版本）
+    生成用於上傳的 Presigned PUT URL（非同步版本，在儲存層的執行緒池中執行）
     """
-    return await asyncio.to_thread(
+    return await get_object_storage().run(
         generate_presigned_put_url,
         file_key,
         bucket_name,
@@ -177,6 +197,51 @@ async def generate_presigned_put_url_async(
         content_type
     )
 
+async def generate_presigned_put_urls_batch(
+    file_keys: List[str],
+    bucket_name: str = None,
+    expiration: int = 3600,
+    content_type: str = "image/png"
+) -> Dict[str, Optional[str]]:
+    """
+    批量生成用於上傳的 Presigned PUT URLs
+    
+    所有鍵值在一次執行器呼叫中以同一個時間戳簽章（上傳 URL 不快取）
+    
+    Args:
+        file_keys: R2 中的檔案鍵值列表
+        bucket_name: Bucket 名稱，預設為私有 bucket
+        expiration: URL 過期時間（秒），預設 1 小時
+        content_type: 檔案的 MIME 類型（上傳時需帶相同的 Content-Type）
+        
+    Returns:
+        {file_key: url} 的映射字典，失敗時對應 None
+    """
+    if not file_keys:
+        return {}
+    
+    if bucket_name is None:
+        bucket_name = R2_PRIVATE_BUCKET_NAME
+    
+    if not bucket_name:
+        logger.error("未設置 Bucket 名稱")
+        return {key: None for key in file_keys}
+    
+    try:
+        urls = await get_object_storage().run(
+            get_presigner().presign_put_many,
+            bucket_name,
+            list(dict.fromkeys(file_keys)),
+            expiration,
+            content_type
+        )
+        logger.debug(f"已生成 {len(urls)} 個 PUT Presigned URL")
+    except Exception as e:
+        logger.error(f"批量生成 PUT Presigned URL 時發生錯誤: {e}")
+        urls = {}
+    
+    return {key: urls.get(key) for key in file_keys}
+
 # 生成 Presigned GET URL (用於讀取) - 同步版本
 def generate_presigned_get_url(
     file_key: str,
@@ -227,24 +292,23 @@ async def generate_presigned_get_url_async(
     expiration: int = 3600
 ) -> Optional[str]:
     """
-    生成用於讀取的 Presigned GET URL（非同步版本）
+    生成用於讀取的 Presigned GET URL（非同步版本，使用快取）
     """
-    return await asyncio.to_thread(
-        generate_presigned_get_url,
-        file_key,
-        bucket_name,
-        expiration
-    )
+    urls = await generate_presigned_get_urls_batch([file_key], bucket_name, expiration)
+    return urls.get(file_key)
 
 
-# 批量生成 Presigned GET URLs - 非同步並行版本
+# 批量生成 Presigned GET URLs - 非同步版本
 async def generate_presigned_get_urls_batch(
     file_keys: List[str],
     bucket_name: str = None,
     expiration: int = 3600
 ) -> Dict[str, Optional[str]]:
     """
-    批量生成用於讀取的 Presigned GET URLs（非同步並行版本）
+    批量生成用於讀取的 Presigned GET URLs
+    
+    先查詢快取，未命中的鍵值在一次執行器呼叫中全部簽章（SigV4 為純 CPU 運算，簽章金鑰依日期快取）。
+    快取的 URL 剩餘有效期一定不少於 expiration
     
     Args:
         file_keys: R2 中的檔案鍵值列表
@@ -252,24 +316,37 @@ async def generate_presigned_get_urls_batch(
         expiration: URL 過期時間（秒），預設 1 小時
         
     Returns:
-        {file_key: url} 的映射字典
+        {file_key: url} 的映射字典，失敗的鍵值對應 None
     """
     if not file_keys:
         return {}
     
-    async def generate_single(file_key: str) -> tuple[str, Optional[str]]:
-        url = await asyncio.to_thread(
-            generate_presigned_get_url,
-            file_key,
-            bucket_name,
-            expiration
-        )
-        return file_key, url
+    if bucket_name is None:
+        bucket_name = R2_PRIVATE_BUCKET_NAME
     
-    # 並行生成所有 URL
-    results = await asyncio.gather(*[generate_single(key) for key in file_keys])
+    if not bucket_name:
+        logger.error("未設置 Bucket 名稱")
+        return {key: None for key in file_keys}
     
-    return {key: url for key, url in results}
+    unique_keys = list(dict.fromkeys(file_keys))
+    urls, missing = _presigned_url_cache.get_many(bucket_name, unique_keys, expiration)
+    
+    if missing:
+        signed_expiration = _presigned_url_cache.sign_expiration(expiration)
+        try:
+            signed = await get_object_storage().run(
+                get_presigner().presign_get_many,
+                bucket_name,
+                missing,
+                signed_expiration
+            )
+            _presigned_url_cache.put_many(bucket_name, signed, signed_expiration)
+            urls.update(signed)
+        except Exception as e:
+            logger.error(f"批量生成 GET Presigned URL 時發生錯誤: {e}")
+        logger.debug(f"已生成 {len(missing)} 個 GET Presigned URL，快取命中 {len(unique_keys) - len(missing)} 個")
+    
+    return {key: urls.get(key) for key in file_keys}
 
 # 從私有 R2 刪除檔案
 async def delete_file_from_private_r2(file_key: str) -> bool:
@@ -287,13 +364,9 @@ async def delete_file_from_private_r2(file_key: str) -> bool:
             logger.error("未設置私有 Bucket 名稱")
             return False
             
-        client = get_r2_client()
-        
         # 刪除檔案
-        client.delete_object(
-            Bucket=R2_PRIVATE_BUCKET_NAME,
-            Key=file_key
-        )
+        await get_object_storage().delete(R2_PRIVATE_BUCKET_NAME, file_key)
+        invalidate_presigned_get_url(file_key, R2_PRIVATE_BUCKET_NAME)
         
         logger.info(f"已從私有 R2 刪除檔案: {file_key}")
         return True
@@ -303,9 +376,9 @@ async def delete_file_from_private_r2(file_key: str) -> bool:
 
 
 # 刪除私有 R2 資料夾內的所有檔案
-def delete_folder_from_private_r2_sync(folder_prefix: str) -> dict:
+async def delete_folder_from_private_r2(folder_prefix: str) -> dict:
     """
-    從 Cloudflare R2 私有 Bucket 中刪除指定資料夾（前綴）內的所有檔案（同步版本）
+    從 Cloudflare R2 私有 Bucket 中刪除指定資料夾（前綴）內的所有檔案
     
     Args:
         folder_prefix: 資料夾前綴，例如 "chat_images/"
@@ -320,50 +393,14 @@ def delete_folder_from_private_r2_sync(folder_prefix: str) -> dict:
             logger.error("未設置私有 Bucket 名稱")
             result["errors"].append("未設置私有 Bucket 名稱")
             return result
-            
-        client = get_r2_client()
         
-        # 列出資料夾內的所有物件
-        paginator = client.get_paginator('list_objects_v2')
-        pages = paginator.paginate(
-            Bucket=R2_PRIVATE_BUCKET_NAME,
-            Prefix=folder_prefix
-        )
-        
-        objects_to_delete = []
+        # 分頁列出後批量刪除（每次最多 1000 個，各批次並行）
+        result = await get_object_storage().delete_prefix(R2_PRIVATE_BUCKET_NAME, folder_prefix)
         
-        for page in pages:
-            if 'Contents' in page:
-                for obj in page['Contents']:
-                    objects_to_delete.append({'Key': obj['Key']})
-        
-        if not objects_to_delete:
+        if result["deleted_count"] == 0 and not result["errors"]:
             logger.info(f"資料夾 '{folder_prefix}' 內沒有檔案需要刪除")
             return result
         
-        # 批量刪除（每次最多 1000 個）
-        batch_size = 1000
-        for i in range(0, len(objects_to_delete), batch_size):
-            batch = objects_to_delete[i:i + batch_size]
-            
-            try:
-                delete_response = client.delete_objects(
-                    Bucket=R2_PRIVATE_BUCKET_NAME,
-                    Delete={'Objects': batch}
-                )
-                
-                # 統計成功刪除的數量
-                if 'Deleted' in delete_response:
-                    result["deleted_count"] += len(delete_response['Deleted'])
-                
-                # 記錄錯誤
-                if 'Errors' in delete_response:
-                    for error in delete_response['Errors']:
-                        result["errors"].append(f"{error['Key']}: {error['Message']}")
-                        
-            except Exception as batch_error:
-                result["errors"].append(f"批量刪除錯誤: {str(batch_error)}")
-        
         logger.info(f"已從私有 R2 刪除資料夾 '{folder_prefix}' 內的 {result['deleted_count']} 個檔案")
         
         if result["errors"]:
@@ -375,17 +412,3 @@ def delete_folder_from_private_r2_sync(folder_prefix: str) -> dict:
         logger.error(f"從私有 R2 刪除資料夾時發生錯誤: {e}")
         result["errors"].append(str(e))
         return result
-
-
-# 刪除私有 R2 資料夾內的所有檔案 - 非同步版本
-async def delete_folder_from_private_r2(folder_prefix: str) -> dict:
-    """
-    從 Cloudflare R2 私有 Bucket 中刪除指定資料夾（前綴）內的所有檔案（非同步版本）
-    
-    Args:
-        folder_prefix: 資料夾前綴，例如 "chat_images/"
-        
-    Returns:
-        包含刪除結果的字典 {"deleted_count": int, "errors": list}
-    """
-    return await asyncio.to_thread(delete_folder_from_private_r2_sync, folder_prefix)
\ No newline at end of file
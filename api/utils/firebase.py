@@ -1,12 +1,17 @@
 import json
 import os
 import base64
+import asyncio
+import logging
+from concurrent.futures import Executor, ThreadPoolExecutor
 import firebase_admin
 from firebase_admin import credentials, messaging
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
 
-from config import FIREBASE_CONFIG
+from config import FIREBASE_CONFIG, FCM_SEND_MAX_CONCURRENCY
+
+logger = logging.getLogger(__name__)
 
 def initialize_firebase():
     # 載入環境變數
@@ -52,6 +57,33 @@ def initialize_firebase():
 if not firebase_admin._apps:
     initialize_firebase()
 
+# 發送通知的專用執行緒池（firebase_admin 為同步 API，不可在事件迴圈中直接呼叫）
+# 每個 token 以 messaging.send 發送一次，同時進行的 HTTP 請求數即為執行緒數（FCM_SEND_MAX_CONCURRENCY）。
+# 不使用 send_each_for_multicast：firebase-admin 6.2 每次呼叫會另開 max_workers=len(tokens) 的執行緒池，
+# 500 個 token 就會產生 500 個執行緒，不受這裡的上限控制。
+_fcm_executor = ThreadPoolExecutor(max_workers=FCM_SEND_MAX_CONCURRENCY, thread_name_prefix="fcm-send")
+
+# FCM 錯誤類別對應的錯誤碼
+_FCM_ERROR_CODES = {
+    messaging.UnregisteredError: "UNREGISTERED",
+    messaging.SenderIdMismatchError: "SENDER_ID_MISMATCH",
+    messaging.QuotaExceededError: "QUOTA_EXCEEDED",
+    messaging.ThirdPartyAuthError: "THIRD_PARTY_AUTH_ERROR",
+}
+
+
+def get_fcm_error_code(error: Exception) -> str:
+    """取得 FCM 發送失敗的錯誤碼（例如 UNREGISTERED、INVALID_ARGUMENT）"""
+    for error_type, code in _FCM_ERROR_CODES.items():
+        if isinstance(error, error_type):
+            return code
+    return str(getattr(error, "code", None) or type(error).__name__)
+
+
+async def _run_in_fcm_executor(func, *args, executor: Optional[Executor] = None):
+    return await asyncio.get_running_loop().run_in_executor(executor or _fcm_executor, func, *args)
+
+
 # 發送推送通知給單個設備
 async def send_notification_to_device(
     token: str,
@@ -73,43 +105,68 @@ async def send_notification_to_device(
             token=token
         )
         
-        response = messaging.send(message)
+        await _run_in_fcm_executor(messaging.send, message)
         return True
     except Exception as e:
-        print(f"發送通知失敗: {e}")
+        logger.error(f"發送通知失敗: {e}")
         return False
 
+
+def _send_to_token(token: str, title: str, body: str, data: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """發送通知給單一 token，返回發送結果（在執行緒池中執行）"""
+    message = messaging.Message(
+        notification=messaging.Notification(
+            title=title,
+            body=body
+        ),
+        data=data,
+        token=token
+    )
+    try:
+        messaging.send(message)
+        return {"token": token, "success": True, "error": None}
+    except Exception as e:
+        return {"token": token, "success": False, "error": get_fcm_error_code(e)}
+
+
 # 發送推送通知給多個設備
 async def send_notification_to_devices(
     tokens: List[str],
     title: str,
     body: str,
-    data: Dict[str, Any] = None
-) -> Dict[str, int]:
+    data: Dict[str, Any] = None,
+    executor: Optional[Executor] = None
+) -> Dict[str, Any]:
+    """
+    發送通知給多個設備
+    
+    token 去重後逐一在執行緒池中發送，同時進行的請求數等於執行緒池大小
+    （預設為 FCM_SEND_MAX_CONCURRENCY，不會另外產生執行緒）
+    
+    Args:
+        executor: 指定發送用的執行緒池（例如大量推送使用獨立的執行緒池，不佔用即時推送的執行緒）
+    
+    Returns:
+        {"success": 成功數, "failure": 失敗數, "results": [{"token", "success", "error"}]}
+    """
     # 確保 Firebase 已初始化
     if not firebase_admin._apps:
         initialize_firebase()
 
+    tokens = list(dict.fromkeys(token for token in tokens if token))
     if not tokens:
-        return {"success": 0, "failure": 0}
+        return {"success": 0, "failure": 0, "results": []}
     
-    success_count = 0
-    failure_count = 0
+    results = await asyncio.gather(*(
+        _run_in_fcm_executor(_send_to_token, token, title, body, data, executor=executor)
+        for token in tokens
+    ))
     
-    # 改為逐個發送
-    for token in tokens:
-        try:
-            # 確保 Firebase 已初始化 (雖然前面已有檢查，但多一層保險)
-            if not firebase_admin._apps:
-                initialize_firebase()
-                
-            result = await send_notification_to_device(token, title, body, data)
-            if result:
-                success_count += 1
-            else:
-                failure_count += 1
-        except Exception as e:
-            print(f"單一設備通知發送失敗 (token: {token[:20]}...): {e}")
-            failure_count += 1
+    results = list(results)
+    success_count = sum(1 for result in results if result["success"])
+    failure_count = len(results) - success_count
+    
+    if failure_count:
+        logger.warning(f"發送 {len(results)} 個設備通知，{failure_count} 個失敗")
     
-    return {"success": success_count, "failure": failure_count}
\ No newline at end of file
+    return {"success": success_count, "failure": failure_count, "results": results}
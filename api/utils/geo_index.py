@@ -0,0 +1,422 @@
+"""
+餐廳地理空間索引
+
+以 geohash 網格將餐廳座標分桶，存放在記憶體中，提供：
+- 半徑查詢：找出距離某點 R 公尺內的餐廳
+- 重複檢查：新增餐廳前，找出附近同名（或同 place_id）的既有餐廳
+
+索引以單例形式存在，第一次使用時從 restaurants 表載入，
+之後由新增/刪除餐廳的 API 同步更新，並定期整批重建以吸收其他途徑（匯入腳本等）寫入的資料。
+API 透過 get_restaurant_geo_index_async 取得索引：載入在執行緒池中進行，
+索引過期時在背景重建，重建期間繼續使用舊索引，不會阻塞事件迴圈。
+"""
+
+import math
+import time
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Optional, Dict, Any, List, Tuple, Set, Iterable
+
+from .restaurant_helper import normalize_restaurant_name
+
+logger = logging.getLogger(__name__)
+
+# 地球半徑（公尺）
+EARTH_RADIUS_METERS = 6371000
+
+# 每一緯度約等於的公尺數
+METERS_PER_DEGREE_LAT = 111320
+
+# 索引使用的 geohash 精度（6 位約 1.2km x 0.6km）
+GEO_INDEX_PRECISION = 6
+
+# 判斷為同一家餐廳的最大距離（公尺）
+DUPLICATE_DISTANCE_METERS = 100
+
+# 索引整批重建的間隔（秒）
+GEO_INDEX_REFRESH_SECONDS = 600
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def haversine_distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """計算兩點間的球面距離（單位：公尺）"""
+    d_lat = math.radians(lat2 - lat1)
+    d_lng = math.radians(lng2 - lng1)
+    a = (
+        math.sin(d_lat / 2) ** 2
+        + math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) * math.sin(d_lng / 2) ** 2
+    )
+    return EARTH_RADIUS_METERS * 2 * math.asin(math.sqrt(a))
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int = GEO_INDEX_PRECISION) -> str:
+    """將經緯度編碼為指定精度的 geohash 字串"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    is_lng_bit = True
+
+    while len(chars) < precision:
+        if is_lng_bit:
+            mid = (lng_range[0] + lng_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lng_range[0] = mid
+            else:
+                bits <<= 1
+                lng_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits <<= 1
+                lat_range[1] = mid
+
+        is_lng_bit = not is_lng_bit
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(chars)
+
+
+def geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """回傳指定精度下單一 geohash 格子的 (緯度跨度, 經度跨度)，單位為度"""
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (2 ** lat_bits), 360.0 / (2 ** lng_bits)
+
+
+def _radius_bounds(latitude: float, longitude: float, radius_meters: float) -> Tuple[float, float, float, float]:
+    """以 (latitude, longitude) 為圓心、radius_meters 為半徑之外接矩形的 (min_lat, max_lat, min_lng, max_lng)"""
+    d_lat = radius_meters / METERS_PER_DEGREE_LAT
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    d_lng = radius_meters / (METERS_PER_DEGREE_LAT * cos_lat)
+    return (
+        max(latitude - d_lat, -90.0),
+        min(latitude + d_lat, 90.0),
+        max(longitude - d_lng, -180.0),
+        min(longitude + d_lng, 180.0)
+    )
+
+
+def estimate_geohash_cell_count(
+    latitude: float,
+    longitude: float,
+    radius_meters: float,
+    precision: int = GEO_INDEX_PRECISION
+) -> int:
+    """估計 geohash_cells_for_radius 會回傳的格子數上限（不實際列舉）"""
+    min_lat, max_lat, min_lng, max_lng = _radius_bounds(latitude, longitude, radius_meters)
+    cell_lat, cell_lng = geohash_cell_size(precision)
+    rows = math.ceil((max_lat - min_lat) / cell_lat) + 1
+    columns = math.ceil((max_lng - min_lng) / cell_lng) + 1
+    return rows * columns
+
+
+def geohash_cells_for_radius(
+    latitude: float,
+    longitude: float,
+    radius_meters: float,
+    precision: int = GEO_INDEX_PRECISION
+) -> Set[str]:
+    """
+    找出覆蓋以 (latitude, longitude) 為圓心、radius_meters 為半徑之外接矩形的所有 geohash 格子
+
+    以格子大小為步距在矩形內取樣，相鄰取樣點恰好相差一格，因此不會漏掉任何格子
+    """
+    min_lat, max_lat, min_lng, max_lng = _radius_bounds(latitude, longitude, radius_meters)
+    cell_lat, cell_lng = geohash_cell_size(precision)
+
+    def _samples(start: float, end: float, step: float) -> List[float]:
+        values = []
+        value = start
+        while value < end:
+            values.append(value)
+            value += step
+        values.append(end)
+        return values
+
+    cells = set()
+    for lat in _samples(min_lat, max_lat, cell_lat):
+        for lng in _samples(min_lng, max_lng, cell_lng):
+            cells.add(encode_geohash(lat, lng, precision))
+    return cells
+
+
+def _get_coordinates(restaurant: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """取得餐廳的經緯度，資料不完整時回傳 None"""
+    lat = restaurant.get("latitude")
+    lng = restaurant.get("longitude")
+    if lat is None or lng is None:
+        return None
+    try:
+        return float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+
+
+class RestaurantGeoIndex:
+    """以 geohash 網格分桶的餐廳記憶體索引"""
+
+    def __init__(self, precision: int = GEO_INDEX_PRECISION):
+        self.precision = precision
+        self.built_at = time.monotonic()
+        # geohash -> {restaurant_id: restaurant}
+        self._cells: Dict[str, Dict[str, Dict[str, Any]]] = defaultdict(dict)
+        # restaurant_id -> (geohash 或 None, restaurant)
+        self._entries: Dict[str, Tuple[Optional[str], Dict[str, Any]]] = {}
+        # google_place_id -> restaurant_id
+        self._place_ids: Dict[str, str] = {}
+        # 標準化名稱 -> {restaurant_id}
+        self._names: Dict[str, Set[str]] = defaultdict(set)
+
+    @classmethod
+    def from_restaurants(cls, restaurants: Iterable[Dict[str, Any]], precision: int = GEO_INDEX_PRECISION) -> "RestaurantGeoIndex":
+        """由餐廳列表建立索引"""
+        index = cls(precision)
+        for restaurant in restaurants:
+            index.upsert(restaurant)
+        return index
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, restaurant_id: str) -> bool:
+        return str(restaurant_id) in self._entries
+
+    def is_stale(self, max_age_seconds: float = GEO_INDEX_REFRESH_SECONDS) -> bool:
+        """索引是否已超過重建間隔"""
+        return time.monotonic() - self.built_at > max_age_seconds
+
+    def get(self, restaurant_id: str) -> Optional[Dict[str, Any]]:
+        """依 ID 取得索引中的餐廳"""
+        entry = self._entries.get(str(restaurant_id))
+        return entry[1] if entry else None
+
+    def upsert(self, restaurant: Dict[str, Any]) -> bool:
+        """
+        新增或更新一筆餐廳
+
+        沒有經緯度的餐廳仍會記錄名稱與 place_id，只是不參與距離查詢
+        """
+        restaurant_id = restaurant.get("id")
+        if not restaurant_id:
+            return False
+        restaurant_id = str(restaurant_id)
+
+        self.remove(restaurant_id)
+
+        coordinates = _get_coordinates(restaurant)
+        cell = encode_geohash(coordinates[0], coordinates[1], self.precision) if coordinates else None
+        if cell:
+            self._cells[cell][restaurant_id] = restaurant
+
+        self._entries[restaurant_id] = (cell, restaurant)
+
+        if restaurant.get("google_place_id"):
+            self._place_ids[restaurant["google_place_id"]] = restaurant_id
+
+        normalized_name = normalize_restaurant_name(restaurant.get("name", ""))
+        if normalized_name:
+            self._names[normalized_name].add(restaurant_id)
+
+        return True
+
+    def update_fields(self, restaurant_id: str, fields: Dict[str, Any]) -> bool:
+        """更新索引中既有餐廳的欄位（例如圖片路徑）"""
+        restaurant = self.get(restaurant_id)
+        if restaurant is None:
+            return False
+        return self.upsert({**restaurant, **fields})
+
+    def remove(self, restaurant_id: str) -> bool:
+        """從索引中移除餐廳"""
+        restaurant_id = str(restaurant_id)
+        entry = self._entries.pop(restaurant_id, None)
+        if entry is None:
+            return False
+
+        cell, restaurant = entry
+        if cell and cell in self._cells:
+            self._cells[cell].pop(restaurant_id, None)
+            if not self._cells[cell]:
+                del self._cells[cell]
+
+        place_id = restaurant.get("google_place_id")
+        if place_id and self._place_ids.get(place_id) == restaurant_id:
+            del self._place_ids[place_id]
+
+        normalized_name = normalize_restaurant_name(restaurant.get("name", ""))
+        if normalized_name in self._names:
+            self._names[normalized_name].discard(restaurant_id)
+            if not self._names[normalized_name]:
+                del self._names[normalized_name]
+
+        return True
+
+    def find_by_place_id(self, google_place_id: str) -> Optional[Dict[str, Any]]:
+        """依 Google Place ID 查詢餐廳"""
+        restaurant_id = self._place_ids.get(google_place_id)
+        return self.get(restaurant_id) if restaurant_id else None
+
+    def find_by_name(self, name: str) -> List[Dict[str, Any]]:
+        """查詢標準化名稱完全相同的餐廳"""
+        normalized_name = normalize_restaurant_name(name)
+        return [self._entries[rid][1] for rid in self._names.get(normalized_name, ())]
+
+    def within_radius(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_meters: float,
+        limit: Optional[int] = None
+    ) -> List[Tuple[float, Dict[str, Any]]]:
+        """
+        查詢距離 (latitude, longitude) 在 radius_meters 以內的餐廳
+
+        Returns:
+            依距離由近到遠排序的 [(距離公尺, 餐廳)] 列表
+        """
+        # 半徑很大時，逐格查詢反而比直接掃描所有已分桶餐廳慢；先以估計值判斷，避免列舉大量格子
+        if estimate_geohash_cell_count(latitude, longitude, radius_meters, self.precision) > len(self._cells):
+            candidate_groups = self._cells.values()
+        else:
+            cells = geohash_cells_for_radius(latitude, longitude, radius_meters, self.precision)
+            candidate_groups = [self._cells[cell] for cell in cells if cell in self._cells]
+
+        results = []
+        for group in candidate_groups:
+            for restaurant in group.values():
+                lat, lng = _get_coordinates(restaurant)
+                distance = haversine_distance(latitude, longitude, lat, lng)
+                if distance <= radius_meters:
+                    results.append((distance, restaurant))
+
+        results.sort(key=lambda item: item[0])
+        return results[:limit] if limit else results
+
+    def nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        max_distance_meters: float = DUPLICATE_DISTANCE_METERS
+    ) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """查詢 max_distance_meters 內最近的一家餐廳"""
+        results = self.within_radius(latitude, longitude, max_distance_meters, limit=1)
+        return results[0] if results else None
+
+    def find_duplicate(
+        self,
+        restaurant: Dict[str, Any],
+        max_distance_meters: float = DUPLICATE_DISTANCE_METERS
+    ) -> Optional[Dict[str, Any]]:
+        """
+        找出與指定餐廳重複的既有餐廳
+
+        判斷順序：
+        1. Google Place ID 相同
+        2. 標準化名稱相同，且距離在 max_distance_meters 以內
+        """
+        own_id = str(restaurant.get("id")) if restaurant.get("id") else None
+
+        place_id = restaurant.get("google_place_id")
+        if place_id:
+            existing = self.find_by_place_id(place_id)
+            if existing and str(existing.get("id")) != own_id:
+                return existing
+
+        normalized_name = normalize_restaurant_name(restaurant.get("name", ""))
+        coordinates = _get_coordinates(restaurant)
+        if not normalized_name or not coordinates:
+            return None
+
+        for _, candidate in self.within_radius(coordinates[0], coordinates[1], max_distance_meters):
+            if own_id and str(candidate.get("id")) == own_id:
+                continue
+            if normalize_restaurant_name(candidate.get("name", "")) == normalized_name:
+                return candidate
+
+        return None
+
+
+# 單例索引（避免每次請求重新載入）
+_restaurant_geo_index: Optional[RestaurantGeoIndex] = None
+
+# 進行中的載入任務（同一時間只載入一次）
+_geo_index_load_task: Optional[asyncio.Task] = None
+
+
+def fetch_all_restaurants(supabase, page_size: int = 1000) -> List[Dict[str, Any]]:
+    """分頁讀取 restaurants 表的所有資料"""
+    restaurants = []
+    start = 0
+    while True:
+        result = supabase.table("restaurants") \
+            .select("*") \
+            .order("id") \
+            .range(start, start + page_size - 1) \
+            .execute()
+        batch = result.data or []
+        restaurants.extend(batch)
+        if len(batch) < page_size:
+            break
+        start += page_size
+    return restaurants
+
+
+async def _reload_restaurant_geo_index(supabase) -> RestaurantGeoIndex:
+    """在執行緒池中讀取資料並建立索引，完成後才替換單例"""
+    global _restaurant_geo_index, _geo_index_load_task
+    try:
+        loop = asyncio.get_running_loop()
+        index = await loop.run_in_executor(
+            None, lambda: RestaurantGeoIndex.from_restaurants(fetch_all_restaurants(supabase))
+        )
+        _restaurant_geo_index = index
+        logger.info(f"已建立餐廳地理索引: {len(index)} 家餐廳")
+    except Exception as e:
+        logger.error(f"建立餐廳地理索引時出錯: {str(e)}")
+        if _restaurant_geo_index is None:
+            # 首次載入失敗：不快取空索引，等待中的請求收到例外，下一個請求重新載入
+            raise
+        # 沿用舊索引，下一個重建間隔再試
+        _restaurant_geo_index.built_at = time.monotonic()
+    finally:
+        _geo_index_load_task = None
+    return _restaurant_geo_index
+
+
+async def get_restaurant_geo_index_async(supabase, force_reload: bool = False) -> RestaurantGeoIndex:
+    """
+    獲取餐廳地理索引單例（供 async 路由使用）
+
+    - 尚未載入或 force_reload：等待執行緒池中的載入完成（首次載入失敗時拋出例外）
+    - 索引過期：在背景重建，這次請求直接使用舊索引
+    同時有多個請求時共用同一個載入任務
+    """
+    global _geo_index_load_task
+    index = _restaurant_geo_index
+    if index is not None and not force_reload and not index.is_stale():
+        return index
+
+    if _geo_index_load_task is None:
+        _geo_index_load_task = asyncio.create_task(_reload_restaurant_geo_index(supabase))
+
+    if index is not None and not force_reload:
+        return index
+    return await asyncio.shield(_geo_index_load_task)
+
+
+def peek_restaurant_geo_index() -> Optional[RestaurantGeoIndex]:
+    """取得目前已載入的索引（不觸發載入），用於背景任務同步更新"""
+    return _restaurant_geo_index
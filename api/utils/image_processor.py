@@ -1,24 +1,197 @@
 import io
+import re
+import json
 import httpx
+import asyncio
 import logging
 import hashlib
-from typing import Optional
+from concurrent.futures import Executor
+from functools import partial
+from typing import Optional, Dict, Any, List, Sequence
 from PIL import Image
 
-from config import GOOGLE_PLACES_API_KEY, R2_BUCKET_NAME, R2_PUBLIC_URL
-from .cloudflare import get_r2_client
+from config import (
+    GOOGLE_PLACES_API_KEY,
+    R2_BUCKET_NAME,
+    R2_PUBLIC_URL,
+    IMAGE_VARIANT_SIZES,
+    IMAGE_ENABLE_AVIF
+)
+from .r2_storage import get_object_storage
+from .r2_existence_index import get_r2_existence_index
 
 logger = logging.getLogger(__name__)
 
-async def download_and_upload_photo(photo_reference: str) -> Optional[str]:
+def _avif_supported() -> bool:
+    """目前的 Pillow 是否支援輸出 AVIF"""
+    try:
+        # 舊版 Pillow 需要額外安裝 pillow-avif-plugin
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pass
+    Image.init()
+    return "AVIF" in Image.SAVE
+
+def get_variant_formats() -> List[str]:
+    """要產生的衍生圖格式，AVIF 需開啟設定且 Pillow 支援才會產生"""
+    formats = ["webp"]
+    if IMAGE_ENABLE_AVIF:
+        if _avif_supported():
+            formats.append("avif")
+        else:
+            logger.warning("已開啟 AVIF 衍生圖，但目前的 Pillow 不支援 AVIF，僅產生 WebP")
+    return formats
+
+def generate_image_variants(
+    image_data: bytes,
+    sizes: Sequence[int] = IMAGE_VARIANT_SIZES,
+    formats: Sequence[str] = ("webp",),
+    quality: int = 80
+) -> List[Dict[str, Any]]:
     """
-    下載Google Places圖片並上傳至Cloudflare R2
+    產生多種尺寸與格式的衍生圖（CPU 密集，建議在進程池中執行）
+
+    sizes 為長邊的像素上限；原圖較小時不放大，相同尺寸只產生一次。
+    由大到小依序縮圖，每次以上一張為來源，減少重複運算。
+
+    Returns:
+        由小到大排序的 [{"width", "height", "format", "content_type", "data"}]
+    """
+    image = Image.open(io.BytesIO(image_data))
+    image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    original_max = max(image.size)
+    targets = sorted({min(size, original_max) for size in sizes}, reverse=True)
+
+    variants = []
+    current = image
+    for target in targets:
+        if max(current.size) > target:
+            scale = target / max(current.size)
+            new_size = (max(1, round(current.width * scale)), max(1, round(current.height * scale)))
+            current = current.resize(new_size, Image.LANCZOS)
+
+        for image_format in formats:
+            output = io.BytesIO()
+            if image_format == "avif":
+                current.save(output, format="AVIF", quality=quality)
+            else:
+                current.save(output, format="WEBP", quality=quality, method=4)
+            variants.append({
+                "width": current.width,
+                "height": current.height,
+                "format": image_format,
+                "content_type": f"image/{image_format}",
+                "data": output.getvalue()
+            })
+
+    variants.sort(key=lambda v: (v["width"], v["format"]))
+    return variants
+
+# 以內容雜湊定址的衍生圖路徑（places/{雜湊}/...）
+_CONTENT_ADDRESSED_KEY = re.compile(r"^places/[0-9a-f]{32}/")
+
+def get_variant_key(content_hash: str, width: int, image_format: str) -> str:
+    """衍生圖在 R2 中的路徑（以原圖內容雜湊定址）"""
+    return f"places/{content_hash}/{width}w.{image_format}"
+
+def is_content_addressed_key(r2_path: str) -> bool:
+    """
+    是否為以內容雜湊定址的衍生圖路徑
+
+    使用相同原圖的餐廳（包含重複的餐廳）共用這些檔案，刪除餐廳時需確認沒有其他餐廳引用才可刪除
+    """
+    return bool(_CONTENT_ADDRESSED_KEY.match(r2_path))
+
+def get_content_addressed_prefix(r2_path: str) -> Optional[str]:
+    """衍生圖路徑所在的內容雜湊前綴（places/{雜湊}/），不是衍生圖路徑時回傳 None"""
+    match = _CONTENT_ADDRESSED_KEY.match(r2_path)
+    return match.group(0) if match else None
+
+async def delete_unreferenced_variants(supabase, r2_path: str) -> int:
+    """
+    刪除已無餐廳引用的衍生圖（同一內容雜湊前綴下的所有尺寸與 variants.json）
+
+    需在刪除餐廳資料之後呼叫；仍有其他餐廳的 image_path 位於同一前綴時不刪除
+
+    Returns:
+        刪除的物件數量
+    """
+    prefix = get_content_addressed_prefix(r2_path)
+    if not prefix:
+        return 0
+
+    referenced = await asyncio.to_thread(
+        lambda: supabase.table("restaurants").select("id").like("image_path", f"%/{prefix}%").limit(1).execute()
+    )
+    if referenced.data:
+        logger.info(f"衍生圖 {prefix} 仍有餐廳引用，保留")
+        return 0
+
+    result = await get_object_storage().delete_prefix(R2_BUCKET_NAME, prefix)
+    # 移除存在索引中的 variants.json，之後相同的原圖會重新產生衍生圖
+    get_r2_existence_index().discard(f"{prefix}variants.json")
+    if result["errors"]:
+        logger.warning(f"刪除衍生圖 {prefix} 時部分失敗: {result['errors']}")
+    logger.info(f"已刪除無餐廳引用的衍生圖 {prefix}: {result['deleted_count']} 個物件")
+    return result["deleted_count"]
+
+def pick_primary_variant(variants: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """選出作為 image_path 的衍生圖：最大尺寸的 WebP"""
+    webp_variants = [v for v in variants if v["format"] == "webp"] or variants
+    return max(webp_variants, key=lambda v: v["width"]) if webp_variants else None
+
+async def _download_place_photo(photo_reference: str) -> Optional[bytes]:
+    """從 Google Places 下載原始圖片"""
+    # 處理不同格式的照片引用ID
+    if photo_reference.startswith("places/"):
+        # 已經是完整路徑格式
+        photo_url = f"https://places.googleapis.com/v1/{photo_reference}/media?maxHeightPx=1200&maxWidthPx=1200&key={GOOGLE_PLACES_API_KEY}"
+    else:
+        # 基本格式：place_id直接作為路徑
+        photo_url = f"https://places.googleapis.com/v1/places/{photo_reference}/photos/media?maxHeightPx=1200&maxWidthPx=1200&key={GOOGLE_PLACES_API_KEY}"
+        
+    logger.info(f"嘗試下載圖片，URL: {photo_url}")
+    
+    async with httpx.AsyncClient(follow_redirects=True) as client:
+        response = await client.get(photo_url)
+        
+        if response.status_code != 200:
+            logger.error(f"下載圖片失敗: {response.status_code}")
+            
+            # 嘗試第二種格式
+            if photo_reference.startswith("places/"):
+                return None
+            alternative_url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=1200&photoreference={photo_reference}&key={GOOGLE_PLACES_API_KEY}"
+            logger.info(f"嘗試替代URL格式: {alternative_url}")
+            
+            response = await client.get(alternative_url)
+            if response.status_code != 200:
+                logger.error(f"使用替代URL格式下載圖片也失敗: {response.status_code}")
+                return None
+            
+        return response.content
+
+async def download_and_upload_photo_variants(
+    photo_reference: str,
+    cpu_executor: Optional[Executor] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    下載Google Places圖片，產生多種尺寸的衍生圖並上傳至Cloudflare R2
+    
+    衍生圖路徑以原圖內容的 SHA-256 定址（places/{雜湊}/{寬度}w.webp），相同圖片只會處理一次；
+    所有衍生圖上傳完成後才寫入 variants.json，作為已處理完成的標記。
+    是否已處理過先查詢本地的 R2 存在索引，只有索引無法確定時才向 R2 請求。
+    R2 請求經由非同步儲存層、圖片處理在執行器中進行，不會阻塞事件迴圈
     
     Args:
         photo_reference: Google Places API的照片引用ID
+        cpu_executor: 執行圖片處理的執行器（建議使用進程池），未提供時使用預設執行緒池
         
     Returns:
-        公開的URL路徑，失敗時返回None
+        {"image_path": 主要圖片URL, "image_variants": [{"width", "height", "format", "url", "size"}]}，失敗時返回None
     """
     if not photo_reference:
         logger.warning("未提供照片引用ID")
@@ -29,83 +202,97 @@ async def download_and_upload_photo(photo_reference: str) -> Optional[str]:
         if not R2_BUCKET_NAME or not R2_PUBLIC_URL:
             logger.error("缺少必要的R2環境變數，無法進行圖片上傳")
             return None
-            
-        # 計算照片雜湊值作為文件名
-        photo_hash = hashlib.md5(photo_reference.encode()).hexdigest()
-        file_name = f"places/{photo_hash}.jpg"
         
-        logger.info(f"正在處理圖片: {photo_reference[:30]}... -> {file_name}")
+        loop = asyncio.get_running_loop()
+        storage = get_object_storage()
+        existence_index = get_r2_existence_index()
         
-        try:
-            # 初始化R2客戶端
-            r2_client = get_r2_client()
-            bucket_name = R2_BUCKET_NAME
-            
-            # 檢查圖片是否已存在於R2
-            r2_client.head_object(Bucket=bucket_name, Key=file_name)
-            logger.info(f"圖片已存在於R2: {file_name}")
-            return f"{R2_PUBLIC_URL}/{file_name}"
-        except Exception as e:
-            if "Not Found" in str(e) or "404" in str(e):
-                # 圖片不存在於R2，需要下載
-                logger.info(f"圖片不存在於R2，開始下載: {photo_reference[:30]}...")
-            else:
-                # 其他R2錯誤
+        # 同一照片引用ID最近已處理過時，直接使用記憶體中的結果，不需下載與請求R2
+        cached_manifest = existence_index.resolve_alias(photo_reference)
+        if cached_manifest:
+            logger.info(f"圖片已存在於R2（本地索引）: {photo_reference[:30]}...")
+            return cached_manifest
+        
+        image_data = await _download_place_photo(photo_reference)
+        if not image_data:
+            return None
+        
+        content_hash = hashlib.sha256(image_data).hexdigest()[:32]
+        manifest_key = f"places/{content_hash}/variants.json"
+        logger.info(f"正在處理圖片: {photo_reference[:30]}... -> places/{content_hash}/")
+        
+        # 檢查相同內容的圖片是否已處理過：先查本地索引，無法確定時才向R2確認
+        manifest_exists = existence_index.exists(manifest_key)
+        cached_manifest = existence_index.get(manifest_key)
+        if isinstance(cached_manifest, dict):
+            existence_index.add_alias(photo_reference, manifest_key)
+            logger.info(f"圖片已存在於R2（本地索引）: {manifest_key}")
+            return cached_manifest
+        if manifest_exists is not False:
+            try:
+                manifest_body = await storage.get(R2_BUCKET_NAME, manifest_key)
+                if manifest_body is not None:
+                    manifest = json.loads(manifest_body)
+                    existence_index.add(manifest_key, manifest)
+                    existence_index.add_alias(photo_reference, manifest_key)
+                    logger.info(f"圖片已存在於R2: {manifest_key}")
+                    return manifest
+            except Exception as e:
                 logger.error(f"檢查R2中的圖片時出錯: {str(e)}")
                 if "NoCredentialProviders" in str(e) or "InvalidAccessKeyId" in str(e):
                     logger.error("R2認證錯誤，請檢查 ACCESS_KEY_ID 和 SECRET_ACCESS_KEY")
                     return None
         
-        # 修正Google Places API的圖片URL格式
-        # 處理不同格式的照片引用ID
-        if photo_reference.startswith("places/"):
-            # 已經是完整路徑格式
-            photo_url = f"https://places.googleapis.com/v1/{photo_reference}/media?maxHeightPx=1200&maxWidthPx=1200&key={GOOGLE_PLACES_API_KEY}"
-        else:
-            # 嘗試兩種可能的格式
-            # 1. 基本格式：place_id直接作為路徑
-            photo_url = f"https://places.googleapis.com/v1/places/{photo_reference}/photos/media?maxHeightPx=1200&maxWidthPx=1200&key={GOOGLE_PLACES_API_KEY}"
-            
-        logger.info(f"嘗試下載圖片，URL: {photo_url}")
+        # 產生衍生圖
+        variants = await loop.run_in_executor(
+            cpu_executor,
+            partial(generate_image_variants, image_data, IMAGE_VARIANT_SIZES, get_variant_formats())
+        )
         
-        async with httpx.AsyncClient(follow_redirects=True) as client:
-            response = await client.get(photo_url)
-            
-            if response.status_code != 200:
-                logger.error(f"下載圖片失敗: {response.status_code}")
-                
-                # 嘗試第二種格式
-                if not photo_reference.startswith("places/"):
-                    alternative_url = f"https://maps.googleapis.com/maps/api/place/photo?maxwidth=1200&photoreference={photo_reference}&key={GOOGLE_PLACES_API_KEY}"
-                    logger.info(f"嘗試替代URL格式: {alternative_url}")
-                    
-                    response = await client.get(alternative_url)
-                    if response.status_code != 200:
-                        logger.error(f"使用替代URL格式下載圖片也失敗: {response.status_code}")
-                        return None
-                else:
-                    return None
-                
-            image_data = response.content
-        
-        # 壓縮圖片
-        compressed_image = compress_image(image_data)
+        # 上傳所有衍生圖
+        upload_options = {
+            "CacheControl": 'public, max-age=31536000, immutable',
+            "ACL": 'public-read'
+        }
         
-        # 上傳到R2
         try:
-            logger.info(f"準備上傳圖片到R2: bucket={R2_BUCKET_NAME}, key={file_name}")
-            r2_client.put_object(
-                Bucket=R2_BUCKET_NAME,
-                Key=file_name,
-                Body=compressed_image,
-                ContentType='image/jpeg',
-                ACL='public-read'
+            variant_records = []
+            uploads = []
+            for variant in variants:
+                key = get_variant_key(content_hash, variant["width"], variant["format"])
+                uploads.append((key, variant["data"], variant["content_type"]))
+                variant_records.append({
+                    "width": variant["width"],
+                    "height": variant["height"],
+                    "format": variant["format"],
+                    "url": f"{R2_PUBLIC_URL}/{key}",
+                    "size": len(variant["data"])
+                })
+            upload_errors = {
+                key: error
+                for key, error in (await storage.put_many(R2_BUCKET_NAME, uploads, **upload_options)).items()
+                if error
+            }
+            if upload_errors:
+                raise RuntimeError(f"{len(upload_errors)} 個衍生圖上傳失敗: {next(iter(upload_errors.values()))}")
+            existence_index.add_many(key for key, _, _ in uploads)
+            
+            manifest = {
+                "image_path": pick_primary_variant(variant_records)["url"],
+                "image_variants": variant_records
+            }
+            await storage.put(
+                R2_BUCKET_NAME,
+                manifest_key,
+                json.dumps(manifest).encode(),
+                'application/json',
+                **upload_options
             )
+            existence_index.add(manifest_key, manifest)
+            existence_index.add_alias(photo_reference, manifest_key)
             
-            logger.info(f"圖片已上傳至R2: {file_name}")
-            public_url = f"{R2_PUBLIC_URL}/{file_name}"
-            logger.info(f"圖片公開URL: {public_url}")
-            return public_url
+            logger.info(f"圖片衍生圖已上傳至R2: {len(variant_records)} 個，原圖 {len(image_data)} 字節")
+            return manifest
         except Exception as r2_error:
             logger.error(f"上傳圖片到R2時出錯: {str(r2_error)}")
             if "NoSuchBucket" in str(r2_error):
@@ -116,59 +303,37 @@ async def download_and_upload_photo(photo_reference: str) -> Optional[str]:
         logger.error(f"處理圖片時出錯: {str(e)}")
         return None
 
-def compress_image(image_data: bytes) -> bytes:
+async def download_and_upload_photo(
+    photo_reference: str,
+    cpu_executor: Optional[Executor] = None
+) -> Optional[str]:
     """
-    壓縮圖片：
-    1. 調整尺寸至最大1024x1024像素
-    2. 設置JPEG壓縮質量為80%
+    下載Google Places圖片並上傳至Cloudflare R2
+    
+    Returns:
+        主要圖片（最大尺寸 WebP）的公開URL，失敗時返回None
     """
-    try:
-        # 打開圖片
-        image = Image.open(io.BytesIO(image_data))
-        
-        # 獲取原始尺寸
-        width, height = image.size
-        
-        # 如果圖片尺寸超過1024x1024，則等比例縮小
-        max_size = 1024
-        if width > max_size or height > max_size:
-            # 計算等比例縮放後的尺寸
-            if width > height:
-                new_width = max_size
-                new_height = int(max_size * height / width)
-            else:
-                new_height = max_size
-                new_width = int(max_size * width / height)
-                
-            # 調整圖片尺寸
-            image = image.resize((new_width, new_height), Image.LANCZOS)
-            logger.info(f"圖片已調整尺寸: {width}x{height} -> {new_width}x{new_height}")
-        
-        # 轉換為RGB模式（某些圖片可能是RGBA或其他模式）
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        # 保存為JPEG，質量為80%
-        output = io.BytesIO()
-        image.save(output, format='JPEG', quality=80, optimize=True)
-        compressed_data = output.getvalue()
-        
-        logger.info(f"圖片已壓縮: 原始大小={len(image_data)}字節, 壓縮後={len(compressed_data)}字節, 壓縮率={(1-len(compressed_data)/len(image_data))*100:.2f}%")
-        return compressed_data
-    except Exception as e:
-        logger.error(f"壓縮圖片時出錯: {str(e)}")
-        # 如果壓縮失敗，返回原始圖片
-        return image_data
+    result = await download_and_upload_photo_variants(photo_reference, cpu_executor)
+    return result["image_path"] if result else None
 
-async def process_and_update_image(photo_reference: str, restaurant_id: str, supabase, request_id: str) -> Optional[str]:
+async def process_and_update_image(
+    photo_reference: str,
+    restaurant_id: str,
+    supabase,
+    request_id: str,
+    cpu_executor: Optional[Executor] = None,
+    io_executor: Optional[Executor] = None
+) -> Optional[str]:
     """
-    處理圖片並更新餐廳圖片路徑
+    處理圖片並更新餐廳圖片路徑與衍生圖列表
     
     Args:
         photo_reference: Google Places API的照片引用ID
         restaurant_id: 餐廳ID
         supabase: Supabase客戶端實例
         request_id: 請求ID，用於日誌關聯
+        cpu_executor: 執行圖片處理的執行器
+        io_executor: 執行資料庫請求的執行器
         
     Returns:
         成功時返回圖片URL，失敗時返回None
@@ -176,17 +341,29 @@ async def process_and_update_image(photo_reference: str, restaurant_id: str, sup
     try:
         logger.info(f"[{request_id}] 開始處理餐廳 {restaurant_id} 的圖片")
         
-        image_url = await download_and_upload_photo(photo_reference)
-        if not image_url:
+        result = await download_and_upload_photo_variants(photo_reference, cpu_executor)
+        if not result:
             logger.warning(f"[{request_id}] 無法取得餐廳 {restaurant_id} 的圖片")
             return None
+        image_url = result["image_path"]
+        image_fields = {
+            "image_path": image_url,
+            "image_variants": result["image_variants"]
+        }
             
         # 更新數據庫中的圖片路徑
-        update_result = supabase.table('restaurants').update({
-            "image_path": image_url
-        }).eq('id', restaurant_id).execute()
+        update_result = await asyncio.get_running_loop().run_in_executor(
+            io_executor,
+            lambda: supabase.table('restaurants').update(image_fields).eq('id', restaurant_id).execute()
+        )
         
         if len(update_result.data) > 0:
+            # 同步更新已載入的地理索引，避免搜尋結果回傳舊的圖片路徑
+            from .geo_index import peek_restaurant_geo_index
+            geo_index = peek_restaurant_geo_index()
+            if geo_index is not None:
+                geo_index.update_fields(restaurant_id, image_fields)
+
             logger.info(f"[{request_id}] 已更新餐廳 {restaurant_id} 的圖片路徑: {image_url}")
             return image_url
         else:
@@ -195,4 +372,24 @@ async def process_and_update_image(photo_reference: str, restaurant_id: str, sup
             
     except Exception as e:
         logger.error(f"[{request_id}] 處理和更新餐廳 {restaurant_id} 的圖片時出錯: {str(e)}")
-        return None 
\ No newline at end of file
+        return None 
+
+async def handle_restaurant_photo_task(payload: Dict[str, Any], service) -> Dict[str, Any]:
+    """
+    圖片處理服務中 "restaurant_photo" 任務的處理函數
+
+    payload 需包含 photo_reference、restaurant_id、supabase，可選 request_id；
+    處理失敗時拋出例外，交由服務重試
+    """
+    request_id = payload.get("request_id", "image")
+    image_url = await process_and_update_image(
+        payload["photo_reference"],
+        payload["restaurant_id"],
+        payload["supabase"],
+        request_id,
+        cpu_executor=service.process_pool,
+        io_executor=service.thread_pool
+    )
+    if not image_url:
+        raise RuntimeError(f"餐廳 {payload['restaurant_id']} 的圖片處理失敗")
+    return {"image_path": image_url}
@@ -2,12 +2,19 @@
 餐廳資料導入腳本
 從餐廳清單.md文件中導入所有餐廳到資料庫
 
+- 多個餐廳同時處理（有上限），並以令牌桶限制 Google API 的請求速率
+- 已完成的URL記錄在檢查點檔案中，中斷後重新執行會自動跳過
+- 餐廳資料累積成批次後一次寫入資料庫
+
 執行方式:
-python -m api.utils.import_restaurants
+python -m api.utils.import_restaurants [--concurrency 4] [--rate 5] [--batch-size 20]
 """
 
 import os
+import json
+import time
 import asyncio
+import argparse
 import logging
 import uuid
 import re
@@ -61,11 +68,18 @@ supabase: Client = create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY)
 # 導入圖片處理相關函數
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
-from utils.image_processor import download_and_upload_photo
+from utils.image_processor import download_and_upload_photo_variants
+from utils.rate_limiter import TokenBucket
 
 # 餐廳清單檔案路徑
 RESTAURANT_LIST_PATH = "docs/產品設計/餐廳清單.md"
 
+# 檢查點檔案路徑
+CHECKPOINT_PATH = "logs/import_checkpoint.json"
+
+# 檢查點中視為已完成、重新執行時會跳過的狀態
+FINISHED_STATUSES = {"imported", "exists"}
+
 # 實現必要的函數，避免導入問題
 def expand_short_url_if_needed(url: str) -> str:
     """
@@ -279,7 +293,9 @@ async def process_place_details(place_id: str, place_details: dict, request_id:
         logger.info(f"[{request_id}] 使用Google Maps連結: {website}")
     
     # 處理圖片 - 初始化為None，後續在資料儲存前再處理
+    # image_variants 一律帶上：批次 upsert 時每筆資料的欄位必須一致
     image_path = None
+    image_variants = None
     
     restaurant_data = {
         "id": str(uuid4()),
@@ -290,6 +306,7 @@ async def process_place_details(place_id: str, place_details: dict, request_id:
         "latitude": place_details.get("location", {}).get("latitude"),
         "longitude": place_details.get("location", {}).get("longitude"),
         "image_path": image_path,
+        "image_variants": image_variants,
         "business_hours": str(place_details.get("regularOpeningHours", {})) if place_details.get("regularOpeningHours") else None,
         "google_place_id": place_id,
         "is_user_added": True,  # 將在調用函數中覆蓋
@@ -301,24 +318,90 @@ async def process_place_details(place_id: str, place_details: dict, request_id:
     logger.info(f"[{request_id}] 從Google Places API成功獲取餐廳資訊: {restaurant_data['name']}")
     return restaurant_data
 
-async def import_restaurant(url: str, category: str) -> bool:
+class ImportCheckpoint:
     """
-    導入單個餐廳到資料庫
-    
+    導入檢查點，記錄每個URL的處理結果
+
+    檔案格式: {"urls": {url: {"status": "imported" | "exists" | "failed", "place_id": ..., "updated_at": ...}}}
+    """
+
+    def __init__(self, path: str = CHECKPOINT_PATH):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.entries = json.load(f).get("urls", {})
+                logger.info(f"已載入檢查點: {path}，共 {len(self.entries)} 筆記錄")
+            except Exception as e:
+                logger.error(f"讀取檢查點檔案出錯，將重新開始: {str(e)}")
+
+    def is_finished(self, url: str, retry_failed: bool = True) -> bool:
+        """URL是否已處理完成"""
+        status = self.entries.get(url, {}).get("status")
+        if status in FINISHED_STATUSES:
+            return True
+        return status == "failed" and not retry_failed
+
+    def mark(self, url: str, status: str, place_id: Optional[str] = None) -> None:
+        """記錄URL的處理結果"""
+        self.entries[url] = {
+            "status": status,
+            "place_id": place_id,
+            "updated_at": datetime.utcnow().isoformat()
+        }
+
+    def save(self) -> None:
+        """寫入檢查點檔案（先寫暫存檔再取代，避免中斷時留下損毀的檔案）"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({"urls": self.entries}, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, self.path)
+
+async def get_existing_place_ids(page_size: int = 1000) -> set:
+    """分頁讀取資料庫中已存在的 google_place_id，取代每個餐廳各查詢一次"""
+    place_ids = set()
+    start = 0
+    while True:
+        result = supabase.table("restaurants") \
+            .select("google_place_id") \
+            .range(start, start + page_size - 1) \
+            .execute()
+        batch = result.data or []
+        place_ids.update(r["google_place_id"] for r in batch if r.get("google_place_id"))
+        if len(batch) < page_size:
+            break
+        start += page_size
+    return place_ids
+
+async def import_restaurant(
+    url: str,
+    category: str,
+    rate_limiter: TokenBucket,
+    existing_place_ids: set
+) -> Tuple[str, Optional[Dict[str, Any]]]:
+    """
+    處理單個餐廳，回傳待寫入資料庫的餐廳資料
+
     Args:
         url: Google Maps 餐廳連結
         category: 餐廳類別
-        
+        rate_limiter: Google API 請求的限流器
+        existing_place_ids: 資料庫中與本次執行中已存在的 place_id
+
     Returns:
-        bool: 是否成功導入
+        Tuple[str, Optional[Dict]]: (狀態 "imported" | "exists" | "failed", 餐廳資料)
     """
     try:
         # 生成唯一請求ID用於日誌追踪
         request_id = uuid.uuid4().hex[:8]
         logger.info(f"[{request_id}] 開始處理餐廳: {url}, 類別: {category}")
         
-        # 展開短網址
-        full_url = expand_short_url_if_needed(url)
+        # 展開短網址（同步請求，放到執行緒中避免阻塞其他餐廳的處理）
+        full_url = await asyncio.to_thread(expand_short_url_if_needed, url)
         if full_url != url:
             logger.info(f"[{request_id}] 短網址已展開: {full_url}")
             
@@ -330,16 +413,6 @@ async def import_restaurant(url: str, category: str) -> bool:
         if original_place_id and not original_place_id.startswith("0x") and ":" not in original_place_id:
             logger.info(f"[{request_id}] 使用標準格式place_id: {original_place_id}")
             valid_place_id = original_place_id
-            
-            # 檢查是否已存在於資料庫
-            existing_restaurant = supabase.table("restaurants") \
-                .select("*") \
-                .eq("google_place_id", valid_place_id) \
-                .execute()
-                
-            if existing_restaurant.data and len(existing_restaurant.data) > 0:
-                logger.info(f"[{request_id}] 餐廳已存在於資料庫: {existing_restaurant.data[0].get('name', '未知')}, place_id: {valid_place_id}")
-                return False
                 
         # 如果直接提取失敗，使用Text Search搜尋
         if not valid_place_id:
@@ -349,37 +422,35 @@ async def import_restaurant(url: str, category: str) -> bool:
             
             if place_name:
                 logger.info(f"[{request_id}] 從URL提取的名稱: {place_name}")
+                await rate_limiter.acquire()
                 if coordinates:
                     logger.info(f"[{request_id}] 使用 Text Search 名稱+經緯度搜尋")
                     valid_place_id = await search_place_by_text(place_name, coordinates[0], coordinates[1])
                 else:
                     logger.info(f"[{request_id}] 使用 Text Search 僅名稱搜尋")
                     valid_place_id = await search_place_by_text(place_name)
-                    
-                if valid_place_id:
-                    # 再次檢查是否已存在於資料庫
-                    existing_restaurant = supabase.table("restaurants") \
-                        .select("*") \
-                        .eq("google_place_id", valid_place_id) \
-                        .execute()
-                        
-                    if existing_restaurant.data and len(existing_restaurant.data) > 0:
-                        logger.info(f"[{request_id}] 餐廳已存在於資料庫: {existing_restaurant.data[0].get('name', '未知')}, place_id: {valid_place_id}")
-                        return False
         
         if not valid_place_id:
             logger.warning(f"[{request_id}] 使用所有方法都無法獲取有效的地點ID: {url}")
             failed_logger.info(f"無法獲取地點ID, URL: {url}, 類別: {category}")
-            return False
+            return "failed", None
+        
+        # 檢查是否已存在於資料庫或本次執行中已處理過
+        if valid_place_id in existing_place_ids:
+            logger.info(f"[{request_id}] 餐廳已存在於資料庫, place_id: {valid_place_id}")
+            return "exists", {"google_place_id": valid_place_id}
+        existing_place_ids.add(valid_place_id)
         
         logger.info(f"[{request_id}] 最終使用的有效place_id: {valid_place_id}")
         
         # 從 Google Places API 獲取餐廳詳細資訊
+        await rate_limiter.acquire()
         place_details = await get_place_details(valid_place_id)
         if not place_details:
             logger.error(f"[{request_id}] 無法從 Google Places API 獲取地點詳情: {valid_place_id}")
             failed_logger.info(f"無法獲取地點詳情, URL: {url}, place_id: {valid_place_id}, 類別: {category}")
-            return False
+            existing_place_ids.discard(valid_place_id)
+            return "failed", None
             
         # 處理餐廳資料
         restaurant_data = await process_place_details(valid_place_id, place_details, request_id)
@@ -389,7 +460,7 @@ async def import_restaurant(url: str, category: str) -> bool:
         restaurant_data["category"] = category  # 使用傳入的類別，而非 Google API 提供的類別
         restaurant_data["created_at"] = datetime.utcnow().isoformat()
         
-        # 如果有圖片，同步處理並保存圖片URL
+        # 如果有圖片，處理並保存圖片URL
         if place_details.get("photos") and len(place_details.get("photos")) > 0:
             photo = place_details.get("photos")[0]
             photo_reference = None
@@ -401,39 +472,37 @@ async def import_restaurant(url: str, category: str) -> bool:
                 photo_reference = photo.get("photoReference")
                 
             if photo_reference:
-                logger.info(f"[{request_id}] 開始非同步處理和保存圖片...")
-                image_url = await download_and_upload_photo(photo_reference)
-                if image_url:
-                    logger.info(f"[{request_id}] 圖片處理成功，更新餐廳圖片路徑: {image_url}")
-                    restaurant_data["image_path"] = image_url
+                logger.info(f"[{request_id}] 開始處理和保存圖片...")
+                await rate_limiter.acquire()
+                image_result = await download_and_upload_photo_variants(photo_reference)
+                if image_result:
+                    logger.info(f"[{request_id}] 圖片處理成功，更新餐廳圖片路徑: {image_result['image_path']}")
+                    restaurant_data["image_path"] = image_result["image_path"]
+                    restaurant_data["image_variants"] = image_result["image_variants"]
                 else:
                     logger.warning(f"[{request_id}] 圖片處理失敗")
         
-        # 保存到資料庫
-        result = supabase.table("restaurants").insert(restaurant_data).execute()
-        
-        if result.data and len(result.data) > 0:
-            logger.info(f"[{request_id}] 餐廳保存成功: {restaurant_data['name']}, place_id: {valid_place_id}")
-            return True
-        else:
-            logger.error(f"[{request_id}] 餐廳保存失敗")
-            failed_logger.info(f"數據庫保存失敗, URL: {url}, 名稱: {restaurant_data.get('name', '未知')}, 類別: {category}")
-            return False
+        return "imported", restaurant_data
             
     except Exception as e:
         logger.error(f"處理餐廳時出錯: {url}, 錯誤: {str(e)}")
         failed_logger.info(f"處理出錯, URL: {url}, 類別: {category}, 錯誤: {str(e)}")
-        return False
+        return "failed", None
 
-async def parse_restaurant_list():
+def parse_restaurant_list() -> List[Tuple[str, str]]:
     """
-    解析餐廳清單文件並導入餐廳
+    解析餐廳清單文件並返回所有餐廳URL和類別
+    
+    Returns:
+        List[Tuple[str, str]]: URL和類別的列表
     """
+    restaurants = []
+    
     try:
         # 檢查文件是否存在
         if not os.path.exists(RESTAURANT_LIST_PATH):
             logger.error(f"餐廳清單文件不存在: {RESTAURANT_LIST_PATH}")
-            return
+            return restaurants
             
         # 讀取餐廳清單文件
         with open(RESTAURANT_LIST_PATH, 'r', encoding='utf-8') as file:
@@ -442,11 +511,6 @@ async def parse_restaurant_list():
         # 分割為不同的類別章節
         sections = re.split(r'## (.+)', content)
         
-        # 第一個元素是空的，之後的元素是交替的類別名稱和內容
-        total_count = 0
-        success_count = 0
-        failed_urls = []
-        
         # 從索引1開始，每兩個元素為一組 (類別名稱和內容)
         for i in range(1, len(sections), 2):
             if i + 1 < len(sections):
@@ -458,36 +522,164 @@ async def parse_restaurant_list():
                 
                 logger.info(f"發現 {len(links)} 個 {category} 類別的餐廳")
                 
-                # 處理每個連結
                 for link in links:
-                    total_count += 1
-                    success = await import_restaurant(link, category)
-                    if success:
-                        success_count += 1
-                    else:
-                        failed_urls.append((link, category))
-                    
-                    # 為了避免 API 請求過於頻繁，加入延遲
-                    await asyncio.sleep(1)
-        
-        logger.info(f"餐廳導入完成！共處理 {total_count} 個餐廳，成功導入 {success_count} 個")
-        
-        # 記錄失敗的URL
-        if failed_urls:
-            logger.info(f"以下 {len(failed_urls)} 個餐廳導入失敗:")
-            for url, category in failed_urls:
-                logger.info(f"- {url} (類別: {category})")
+                    restaurants.append((link, category))
             
     except Exception as e:
         logger.error(f"解析餐廳清單文件時出錯: {str(e)}")
+        
+    return restaurants
+
+async def bulk_import(
+    restaurants: List[Tuple[str, str]],
+    checkpoint: ImportCheckpoint,
+    concurrency: int = 4,
+    rate: float = 5.0,
+    batch_size: int = 20,
+    retry_failed: bool = True
+) -> Dict[str, Any]:
+    """
+    並行導入餐廳
+
+    Args:
+        restaurants: URL和類別的列表
+        checkpoint: 導入檢查點
+        concurrency: 同時處理的餐廳數量上限
+        rate: 每秒最多送出的 Google API 請求數
+        batch_size: 每批寫入資料庫的餐廳數量
+        retry_failed: 是否重試檢查點中標記為失敗的URL
+
+    Returns:
+        Dict: 導入統計
+    """
+    start_time = time.monotonic()
+    stats = {"total": len(restaurants), "skipped": 0, "imported": 0, "exists": 0, "failed": 0}
+    failed_urls = []
+
+    pending = []
+    for url, category in restaurants:
+        if checkpoint.is_finished(url, retry_failed):
+            stats["skipped"] += 1
+        else:
+            pending.append((url, category))
+    logger.info(f"共 {stats['total']} 個餐廳，檢查點中已完成 {stats['skipped']} 個，待處理 {len(pending)} 個")
+
+    existing_place_ids = await get_existing_place_ids()
+    logger.info(f"資料庫中已有 {len(existing_place_ids)} 個餐廳")
+
+    rate_limiter = TokenBucket(rate)
+    semaphore = asyncio.Semaphore(concurrency)
+    batch: List[Tuple[str, Dict[str, Any]]] = []
+    batch_lock = asyncio.Lock()
+    processed = 0
+
+    async def flush_batch():
+        """將累積的餐廳資料一次寫入資料庫，成功後才更新檢查點"""
+        nonlocal batch
+        if not batch:
+            return
+        current, batch = batch, []
+        rows = [data for _, data in current]
+        try:
+            # 以主鍵 upsert，重試同一批次時不會產生重複資料
+            supabase.table("restaurants").upsert(rows, on_conflict="id").execute()
+            for url, data in current:
+                checkpoint.mark(url, "imported", data["google_place_id"])
+            stats["imported"] += len(current)
+            logger.info(f"已批次寫入 {len(current)} 個餐廳")
+        except Exception as e:
+            logger.error(f"批次寫入餐廳時出錯: {str(e)}")
+            for url, data in current:
+                checkpoint.mark(url, "failed", data["google_place_id"])
+                existing_place_ids.discard(data["google_place_id"])
+                failed_logger.info(f"數據庫保存失敗, URL: {url}, 名稱: {data.get('name', '未知')}")
+                failed_urls.append((url, data.get("category")))
+            stats["failed"] += len(current)
+        checkpoint.save()
+
+    async def worker(url: str, category: str):
+        nonlocal processed
+        async with semaphore:
+            status, data = await import_restaurant(url, category, rate_limiter, existing_place_ids)
+
+        async with batch_lock:
+            processed += 1
+            if status == "imported":
+                batch.append((url, data))
+                if len(batch) >= batch_size:
+                    await flush_batch()
+            else:
+                stats[status] += 1
+                checkpoint.mark(url, status, (data or {}).get("google_place_id"))
+                if status == "failed":
+                    failed_urls.append((url, category))
+                checkpoint.save()
+
+            if processed % 10 == 0 or processed == len(pending):
+                elapsed = time.monotonic() - start_time
+                logger.info(f"進度: {processed}/{len(pending)}，{processed / elapsed:.2f} 個/秒")
+
+    try:
+        await asyncio.gather(*(worker(url, category) for url, category in pending))
+    finally:
+        async with batch_lock:
+            await flush_batch()
+        checkpoint.save()
+
+    elapsed = time.monotonic() - start_time
+    stats["elapsed_seconds"] = round(elapsed, 2)
+    stats["throughput"] = round(processed / elapsed, 2) if elapsed > 0 else 0
+    stats["google_api_requests"] = rate_limiter.acquired_count
+    stats["failed_urls"] = failed_urls
+    return stats
+
+def report(stats: Dict[str, Any]) -> None:
+    """輸出導入統計"""
+    logger.info("\n=============== 導入結果 ===============")
+    logger.info(f"總餐廳數: {stats['total']}")
+    logger.info(f"檢查點跳過: {stats['skipped']}")
+    logger.info(f"成功導入: {stats['imported']}")
+    logger.info(f"已存在: {stats['exists']}")
+    logger.info(f"導入失敗: {stats['failed']}")
+    logger.info(f"耗時: {stats['elapsed_seconds']} 秒，處理速度: {stats['throughput']} 個/秒")
+    logger.info(f"Google API 請求數: {stats['google_api_requests']}")
+
+    # 記錄失敗的URL
+    if stats["failed_urls"]:
+        logger.info(f"以下 {len(stats['failed_urls'])} 個餐廳導入失敗:")
+        for url, category in stats["failed_urls"]:
+            logger.info(f"- {url} (類別: {category})")
 
 async def main():
     """
     主函數
     """
+    parser = argparse.ArgumentParser(description="從餐廳清單導入餐廳資料")
+    parser.add_argument("--concurrency", type=int, default=4, help="同時處理的餐廳數量上限")
+    parser.add_argument("--rate", type=float, default=5.0, help="每秒最多送出的 Google API 請求數")
+    parser.add_argument("--batch-size", type=int, default=20, help="每批寫入資料庫的餐廳數量")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_PATH, help="檢查點檔案路徑")
+    parser.add_argument("--no-retry-failed", action="store_true", help="不重試檢查點中標記為失敗的URL")
+    parser.add_argument("--reset", action="store_true", help="忽略既有檢查點，全部重新處理")
+    args = parser.parse_args()
+
     logger.info("開始導入餐廳資料...")
-    await parse_restaurant_list()
+    restaurants = parse_restaurant_list()
+
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+    checkpoint = ImportCheckpoint(args.checkpoint)
+
+    stats = await bulk_import(
+        restaurants,
+        checkpoint,
+        concurrency=args.concurrency,
+        rate=args.rate,
+        batch_size=args.batch_size,
+        retry_failed=not args.no_retry_failed
+    )
+    report(stats)
     logger.info("餐廳資料導入完成")
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,140 @@
+"""
+餐廳名稱 n-gram 倒排索引
+
+將名稱切成字元 n-gram（前後補空白，與 pg_trgm 相同做法），建立 n-gram -> 名稱 的倒排索引。
+查詢時只掃描與查詢名稱共用 n-gram 的名稱，以 Jaccard 相似度排序後回傳前 k 筆，
+不需要逐一比對資料庫中的每一家餐廳。
+"""
+
+import re
+import heapq
+import unicodedata
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+
+def default_name_normalizer(name: str) -> str:
+    """預設的名稱標準化：NFKC、轉小寫、移除空白與標點"""
+    if not name:
+        return ""
+    name = unicodedata.normalize('NFKC', name).lower()
+    return re.sub(r'[^\w]+', '', name)
+
+
+class NGramNameIndex:
+    """字元 n-gram 倒排索引，用於快速找出相似的餐廳名稱"""
+
+    def __init__(self, n: int = 2, normalizer: Optional[Callable[[str], str]] = None):
+        """
+        Args:
+            n: n-gram 長度，中文店名通常很短，預設使用 2
+            normalizer: 名稱標準化函數，建立索引與查詢時使用同一個
+        """
+        self.n = n
+        self.normalizer = normalizer or default_name_normalizer
+        # n-gram -> 文件編號集合
+        self._postings: Dict[str, Set[int]] = defaultdict(set)
+        # 文件編號 -> (標準化名稱, n-gram 數量, 附帶資料)
+        self._documents: List[Tuple[str, int, Any]] = []
+        # 長度小於 n 的名稱：只有前後補空白的 n-gram，出現在較長名稱中間時無法由倒排索引找到
+        self._short_ids: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def ngrams(self, name: str) -> Set[str]:
+        """將已標準化的名稱切成 n-gram 集合"""
+        if not name:
+            return set()
+        padding = " " * (self.n - 1)
+        padded = f"{padding}{name}{padding}"
+        return {padded[i:i + self.n] for i in range(len(padded) - self.n + 1)}
+
+    def add(self, name: str, payload: Any = None) -> None:
+        """
+        將名稱加入索引
+
+        Args:
+            name: 原始名稱
+            payload: 查詢時一併回傳的資料（例如資料庫中的餐廳），未提供時使用原始名稱
+        """
+        normalized = self.normalizer(name or "")
+        grams = self.ngrams(normalized)
+        if not grams:
+            return
+
+        doc_id = len(self._documents)
+        self._documents.append((normalized, len(grams), payload if payload is not None else name))
+        if len(normalized) < self.n:
+            self._short_ids.append(doc_id)
+        for gram in grams:
+            self._postings[gram].add(doc_id)
+
+    @classmethod
+    def from_items(
+        cls,
+        items: List[Any],
+        key: Callable[[Any], str],
+        n: int = 2,
+        normalizer: Optional[Callable[[str], str]] = None
+    ) -> "NGramNameIndex":
+        """由資料列表建立索引，key 用來取得每筆資料的名稱"""
+        index = cls(n, normalizer)
+        for item in items:
+            index.add(key(item), item)
+        return index
+
+    def top_k(self, name: str, k: int = 5, min_score: float = 0.0) -> List[Tuple[float, Any]]:
+        """
+        查詢最相似的 k 個名稱
+
+        Returns:
+            依相似度由高到低排序的 [(Jaccard 相似度, 附帶資料)]
+        """
+        query_grams = self.ngrams(self.normalizer(name or ""))
+        if not query_grams:
+            return []
+
+        # 只計算與查詢共用 n-gram 的文件
+        overlaps: Dict[int, int] = defaultdict(int)
+        for gram in query_grams:
+            for doc_id in self._postings.get(gram, ()):
+                overlaps[doc_id] += 1
+
+        query_size = len(query_grams)
+        scored = []
+        for doc_id, common in overlaps.items():
+            doc_size = self._documents[doc_id][1]
+            score = common / (query_size + doc_size - common)
+            if score >= min_score:
+                scored.append((score, doc_id))
+
+        best = heapq.nlargest(k, scored)
+        return [(round(score, 4), self._documents[doc_id][2]) for score, doc_id in best]
+
+    def contains_candidates(self, name: str, limit: int = 20) -> List[Any]:
+        """
+        找出標準化名稱與查詢互相包含的資料
+
+        長度至少為 n 的名稱互相包含時必定共用 n-gram，因此只需掃描倒排索引；
+        長度小於 n 的名稱沒有中間的 n-gram，查詢時直接逐筆比對，索引中的短名稱則一律檢查
+        """
+        normalized = self.normalizer(name or "")
+        if not normalized:
+            return []
+
+        matches = []
+        if len(normalized) < self.n:
+            candidate_ids = range(len(self._documents))
+        else:
+            candidate_ids = set(self._short_ids)
+            for gram in self.ngrams(normalized):
+                candidate_ids.update(self._postings.get(gram, ()))
+
+        for doc_id in sorted(candidate_ids):
+            doc_name, _, payload = self._documents[doc_id]
+            if normalized in doc_name or doc_name in normalized:
+                matches.append(payload)
+                if len(matches) >= limit:
+                    break
+        return matches
@@ -0,0 +1,90 @@
+"""
+Keyset（游標）分頁
+
+以 (created_at, id) 作為排序鍵，下一頁只查詢排序鍵之後的資料，成本不隨頁數增加：
+- 游標為排序鍵的 base64url 編碼，對客戶端不透明
+- 每頁多查詢一筆判斷是否還有下一頁，不需另外計算總數
+"""
+
+import json
+import base64
+from typing import Any, Dict, List, Optional, Tuple
+
+
+def encode_cursor(created_at: str, row_id: Any) -> str:
+    """將排序鍵編碼為游標"""
+    raw = json.dumps({"c": created_at, "i": str(row_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """
+    解析游標
+
+    Returns:
+        (created_at, id)
+
+    Raises:
+        ValueError: 游標格式錯誤
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        created_at, row_id = data["c"], data["i"]
+    except Exception:
+        raise ValueError("無效的分頁游標")
+    # 游標的值會放進篩選條件，不允許引號與反斜線
+    if not isinstance(created_at, str) or not isinstance(row_id, str) or any(
+        char in value for value in (created_at, row_id) for char in '"\\'
+    ):
+        raise ValueError("無效的分頁游標")
+    return created_at, row_id
+
+
+def keyset_filter(created_at: str, row_id: str, desc: bool = False) -> str:
+    """產生 PostgREST or 篩選條件：排序鍵在 (created_at, id) 之後的資料"""
+    op = "lt" if desc else "gt"
+    # 值以雙引號包住，避免時間戳中的符號被當成語法
+    return f'(created_at.{op}."{created_at}",and(created_at.eq."{created_at}",id.{op}."{row_id}"))'
+
+
+def apply_keyset(query, cursor: str, desc: bool = False):
+    """
+    將游標條件加入 Supabase 查詢（postgrest-py 0.10 沒有 or_()，直接加入 or 查詢參數）
+
+    Raises:
+        ValueError: 游標格式錯誤
+    """
+    created_at, row_id = decode_cursor(cursor)
+    query.params = query.params.add("or", keyset_filter(created_at, row_id, desc))
+    return query
+
+
+def split_page(rows: List[Dict[str, Any]], limit: int) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    拆分多查詢一筆的結果
+
+    Args:
+        rows: 以 limit + 1 查詢的資料（需包含 created_at 與 id）
+        limit: 每頁數量
+
+    Returns:
+        (本頁資料, 下一頁游標；沒有下一頁時為 None)
+    """
+    page = rows[:limit]
+    if len(rows) <= limit or not page:
+        return page, None
+    last = page[-1]
+    return page, encode_cursor(last["created_at"], last["id"])
+
+
+def order_keyset(query, desc: bool = False):
+    """
+    依排序鍵 (created_at, id) 排序
+
+    postgrest-py 0.10 連續呼叫 order() 會產生多個 order 參數，PostgREST 只採用其中一個，
+    因此以單一 order 參數同時指定兩個欄位
+    """
+    direction = "desc" if desc else "asc"
+    query.params = query.params.add("order", f"created_at.{direction},id.{direction}")
+    return query
@@ -0,0 +1,186 @@
+"""
+R2 物件存在索引
+
+記錄 R2 中已上傳的 places/ 物件，讓圖片處理流程在常見情況下不需向 R2 發出 HEAD/GET 請求：
+- Bloom filter：記錄所有已知的物件路徑，回答「一定不存在」或「可能存在」
+- LRU：保存最近確認存在的物件（與其內容，例如 variants.json），命中時可直接使用
+
+索引以單例形式存在，啟動時以儲存層分頁列出儲存桶內容建立，之後每次上傳/刪除時同步更新。
+Bloom filter 無法刪除項目，因此「可能存在」只在 LRU 命中時才視為確定存在，其餘情況仍需向 R2 確認；
+在完成初次載入前，「一定不存在」也不可信，此時一律回傳未知。
+"""
+
+import math
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+from config import (
+    R2_BUCKET_NAME,
+    R2_EXISTENCE_INDEX_CAPACITY,
+    R2_EXISTENCE_INDEX_ERROR_RATE,
+    R2_EXISTENCE_INDEX_LRU_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+# 物件路徑前綴
+PLACES_PREFIX = "places/"
+
+
+class BloomFilter:
+    """以 bytearray 實作的 Bloom filter（雙重雜湊）"""
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        if capacity <= 0:
+            raise ValueError("capacity 必須大於 0")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate 必須介於 0 與 1 之間")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bit_count = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        self.hash_count = max(1, int(round(self.bit_count / capacity * math.log(2))))
+        self._bits = bytearray((self.bit_count + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item: str):
+        digest = hashlib.sha256(item.encode("utf-8")).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:16], "big") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.bit_count
+
+    def add(self, item: str) -> None:
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class R2ExistenceIndex:
+    """R2 物件存在索引（執行緒安全，可在執行緒池中更新）"""
+
+    def __init__(
+        self,
+        capacity: int = R2_EXISTENCE_INDEX_CAPACITY,
+        error_rate: float = R2_EXISTENCE_INDEX_ERROR_RATE,
+        lru_size: int = R2_EXISTENCE_INDEX_LRU_SIZE
+    ):
+        self._bloom = BloomFilter(capacity, error_rate)
+        self._recent: "OrderedDict[str, Any]" = OrderedDict()
+        # 別名 -> 物件路徑（例如 Google 照片引用ID -> variants.json），只存在記憶體中
+        self._aliases: "OrderedDict[str, str]" = OrderedDict()
+        self._lru_size = lru_size
+        self._lock = threading.Lock()
+        # 完成初次載入後，Bloom filter 的否定結果才可信
+        self.is_seeded = False
+
+    def add(self, key: str, value: Any = True) -> None:
+        """記錄已上傳的物件，value 可保存物件內容（例如 variants.json）"""
+        with self._lock:
+            self._bloom.add(key)
+            self._recent[key] = value
+            self._recent.move_to_end(key)
+            while len(self._recent) > self._lru_size:
+                self._recent.popitem(last=False)
+
+    def add_many(self, keys: Iterable[str]) -> int:
+        """批次記錄物件（只寫入 Bloom filter），回傳筆數"""
+        count = 0
+        with self._lock:
+            for key in keys:
+                self._bloom.add(key)
+                count += 1
+        return count
+
+    def add_alias(self, alias: str, key: str) -> None:
+        """記錄別名對應的物件路徑"""
+        with self._lock:
+            self._aliases[alias] = key
+            self._aliases.move_to_end(alias)
+            while len(self._aliases) > self._lru_size:
+                self._aliases.popitem(last=False)
+
+    def resolve_alias(self, alias: str) -> Optional[Any]:
+        """以別名取得 LRU 中保存的物件內容，物件已移出 LRU 或已刪除時回傳 None"""
+        with self._lock:
+            key = self._aliases.get(alias)
+        return self.get(key) if key else None
+
+    def discard(self, key: str) -> None:
+        """物件已刪除：移出 LRU，之後的查詢需再向 R2 確認"""
+        with self._lock:
+            self._recent.pop(key, None)
+
+    def get(self, key: str) -> Optional[Any]:
+        """LRU 命中時回傳保存的內容，否則回傳 None"""
+        with self._lock:
+            if key not in self._recent:
+                return None
+            self._recent.move_to_end(key)
+            return self._recent[key]
+
+    def exists(self, key: str) -> Optional[bool]:
+        """
+        查詢物件是否存在
+
+        Returns:
+            True：確定存在（LRU 命中）
+            False：確定不存在（已完成初次載入且 Bloom filter 未命中）
+            None：無法確定，需向 R2 確認
+        """
+        with self._lock:
+            if key in self._recent:
+                self._recent.move_to_end(key)
+                return True
+            if self.is_seeded and key not in self._bloom:
+                return False
+            return None
+
+    def seed(self, keys: Iterable[str], prefix: str = PLACES_PREFIX) -> int:
+        """以儲存桶中既有的物件鍵值建立索引，回傳載入的物件數量"""
+        total = self.add_many(keys)
+        if total > self._bloom.capacity:
+            # 超過設計容量時誤判率會升高，但否定結果仍然正確
+            logger.warning(f"R2 存在索引載入 {total} 個物件，超過設計容量 {self._bloom.capacity}")
+        self.is_seeded = True
+        logger.info(f"已建立 R2 存在索引: {total} 個 {prefix} 物件")
+        return total
+
+    def stats(self) -> dict:
+        return {
+            "seeded": self.is_seeded,
+            "bloom_items": self._bloom.count,
+            "bloom_capacity": self._bloom.capacity,
+            "lru_items": len(self._recent),
+            "aliases": len(self._aliases)
+        }
+
+
+# 單例索引
+_r2_existence_index: Optional[R2ExistenceIndex] = None
+
+
+def get_r2_existence_index() -> R2ExistenceIndex:
+    """獲取 R2 存在索引單例（未載入時所有查詢皆回傳未知或 LRU 結果）"""
+    global _r2_existence_index
+    if _r2_existence_index is None:
+        _r2_existence_index = R2ExistenceIndex()
+    return _r2_existence_index
+
+
+async def seed_r2_existence_index() -> R2ExistenceIndex:
+    """分頁列出儲存桶內容建立索引，失敗時保留未載入狀態，查詢會退回向 R2 確認"""
+    from .r2_storage import get_object_storage
+
+    index = get_r2_existence_index()
+    try:
+        keys = await get_object_storage().list_keys(R2_BUCKET_NAME, PLACES_PREFIX)
+        index.seed(keys)
+    except Exception as e:
+        logger.error(f"建立 R2 存在索引時出錯: {str(e)}")
+    return index
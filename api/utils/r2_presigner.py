@@ -0,0 +1,211 @@
+"""
+R2 Presigned URL 批次簽章與 GET URL 快取
+
+- SigV4Presigner：以 SigV4 查詢字串簽章產生 GET/PUT URL，簽章金鑰依日期快取，
+  一批鍵值共用同一個時間戳，整批在一次執行器呼叫中完成（純 CPU，不需網路）
+- PresignedUrlCache：依 (bucket, key) 快取已簽章的 URL。
+  URL 以「要求的有效期 + 重用時間」簽章，只在重用時間內回傳快取，
+  因此回傳給客戶端的 URL 剩餘有效期一定不少於要求的有效期
+"""
+
+import hmac
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from config import R2_PRESIGNED_URL_CACHE_SIZE, R2_PRESIGNED_URL_REUSE_SECONDS
+
+# SigV4 允許的最長有效期（7 天）
+MAX_PRESIGN_EXPIRATION = 7 * 24 * 3600
+
+ALGORITHM = "AWS4-HMAC-SHA256"
+
+
+def _hmac_sha256(key: bytes, message: str) -> bytes:
+    return hmac.new(key, message.encode("utf-8"), hashlib.sha256).digest()
+
+
+class SigV4Presigner:
+    """S3 相容服務的 SigV4 查詢字串簽章（path-style，與 botocore 產生的 URL 相同）"""
+
+    def __init__(
+        self,
+        endpoint_url: str,
+        access_key_id: str,
+        secret_access_key: str,
+        region: str = "us-east-1",
+        service: str = "s3"
+    ):
+        parts = urlsplit(endpoint_url)
+        self.scheme = parts.scheme or "https"
+        self.host = parts.netloc
+        self.access_key_id = access_key_id
+        self.secret_access_key = secret_access_key
+        self.region = region
+        self.service = service
+        self._signing_keys: Dict[str, bytes] = {}
+        self._lock = threading.Lock()
+
+    def _signing_key(self, date_stamp: str) -> bytes:
+        """取得當日的簽章金鑰（四次 HMAC 只在換日時計算）"""
+        with self._lock:
+            key = self._signing_keys.get(date_stamp)
+            if key is None:
+                key = _hmac_sha256(f"AWS4{self.secret_access_key}".encode("utf-8"), date_stamp)
+                for part in (self.region, self.service, "aws4_request"):
+                    key = _hmac_sha256(key, part)
+                # 只保留當日金鑰
+                self._signing_keys = {date_stamp: key}
+            return key
+
+    def presign_get_many(
+        self,
+        bucket: str,
+        keys: Iterable[str],
+        expiration: int = 3600,
+        now: Optional[datetime] = None
+    ) -> Dict[str, str]:
+        """
+        批次產生 GET URL（同一個時間戳）
+
+        Args:
+            bucket: Bucket 名稱
+            keys: 物件鍵值
+            expiration: 有效期（秒）
+            now: 簽章時間（UTC），預設為目前時間
+
+        Returns:
+            {key: url}
+        """
+        return self._presign_many("GET", bucket, keys, expiration, now)
+
+    def presign_put_many(
+        self,
+        bucket: str,
+        keys: Iterable[str],
+        expiration: int = 3600,
+        content_type: Optional[str] = None,
+        now: Optional[datetime] = None
+    ) -> Dict[str, str]:
+        """
+        批次產生 PUT URL（同一個時間戳）
+
+        指定 content_type 時會一併簽入 Content-Type 標頭，上傳時必須帶相同的標頭
+
+        Returns:
+            {key: url}
+        """
+        return self._presign_many("PUT", bucket, keys, expiration, now, content_type)
+
+    def _presign_many(
+        self,
+        method: str,
+        bucket: str,
+        keys: Iterable[str],
+        expiration: int,
+        now: Optional[datetime],
+        content_type: Optional[str] = None
+    ) -> Dict[str, str]:
+        if not 1 <= expiration <= MAX_PRESIGN_EXPIRATION:
+            raise ValueError(f"expiration 必須介於 1 與 {MAX_PRESIGN_EXPIRATION} 秒之間")
+
+        now = now or datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        date_stamp = now.strftime("%Y%m%d")
+        scope = f"{date_stamp}/{self.region}/{self.service}/aws4_request"
+        signing_key = self._signing_key(date_stamp)
+
+        # 簽入的標頭（依名稱排序）
+        if content_type:
+            canonical_headers = f"content-type:{content_type.strip()}\nhost:{self.host}\n"
+            signed_headers = "content-type;host"
+        else:
+            canonical_headers = f"host:{self.host}\n"
+            signed_headers = "host"
+
+        # 參數已依名稱排序
+        query = (
+            f"X-Amz-Algorithm={ALGORITHM}"
+            f"&X-Amz-Credential={quote(f'{self.access_key_id}/{scope}', safe='-_.~')}"
+            f"&X-Amz-Date={amz_date}"
+            f"&X-Amz-Expires={expiration}"
+            f"&X-Amz-SignedHeaders={quote(signed_headers, safe='-_.~')}"
+        )
+        bucket_path = f"/{quote(bucket, safe='-_.~')}/"
+
+        urls = {}
+        for key in keys:
+            path = bucket_path + quote(key, safe="/-_.~")
+            canonical_request = f"{method}\n{path}\n{query}\n{canonical_headers}\n{signed_headers}\nUNSIGNED-PAYLOAD"
+            string_to_sign = (
+                f"{ALGORITHM}\n{amz_date}\n{scope}\n"
+                f"{hashlib.sha256(canonical_request.encode('utf-8')).hexdigest()}"
+            )
+            signature = hmac.new(signing_key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+            urls[key] = f"{self.scheme}://{self.host}{path}?{query}&X-Amz-Signature={signature}"
+        return urls
+
+
+class PresignedUrlCache:
+    """Presigned GET URL 快取（LRU，執行緒安全）"""
+
+    def __init__(
+        self,
+        max_entries: int = R2_PRESIGNED_URL_CACHE_SIZE,
+        reuse_seconds: int = R2_PRESIGNED_URL_REUSE_SECONDS
+    ):
+        self.max_entries = max_entries
+        self.reuse_seconds = reuse_seconds
+        # (bucket, key) -> (url, 簽章的有效期, 可重用到的時間)
+        self._entries: "OrderedDict[Tuple[str, str], Tuple[str, int, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def sign_expiration(self, expiration: int) -> int:
+        """快取的 URL 需以較長的有效期簽章"""
+        return min(expiration + self.reuse_seconds, MAX_PRESIGN_EXPIRATION)
+
+    def get_many(self, bucket: str, keys: Iterable[str], expiration: int) -> Tuple[Dict[str, str], List[str]]:
+        """
+        查詢快取
+
+        Returns:
+            (命中的 {key: url}, 未命中的鍵值列表)
+        """
+        now = time.monotonic()
+        found, missing = {}, []
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get((bucket, key))
+                # 簽章有效期需涵蓋本次要求的有效期 + 重用時間
+                if entry and now < entry[2] and entry[1] >= self.sign_expiration(expiration):
+                    self._entries.move_to_end((bucket, key))
+                    found[key] = entry[0]
+                else:
+                    missing.append(key)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, bucket: str, urls: Dict[str, str], signed_expiration: int) -> None:
+        """寫入剛簽章的 URL"""
+        reusable_until = time.monotonic() + self.reuse_seconds
+        with self._lock:
+            for key, url in urls.items():
+                self._entries[(bucket, key)] = (url, signed_expiration, reusable_until)
+                self._entries.move_to_end((bucket, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, bucket: str, key: str) -> None:
+        """物件內容已變更（例如重新上傳頭像）時移除快取"""
+        with self._lock:
+            self._entries.pop((bucket, key), None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,207 @@
+"""
+非同步物件儲存層
+
+boto3 的 S3 客戶端是同步且執行緒安全的：所有 R2 請求都在專用的執行緒池中執行，
+並以 semaphore 限制同時進行的請求數量，避免阻塞事件迴圈或耗盡連線池。
+提供單筆與批次的 put/head/get/delete/list 操作，以及 presigned URL 生成。
+
+客戶端可注入，測試時可換成本地的 S3 相容服務（設定 R2_ENDPOINT_URL，例如 MinIO）或替身物件。
+"""
+
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from botocore.exceptions import ClientError
+
+from config import R2_STORAGE_MAX_CONCURRENCY
+
+logger = logging.getLogger(__name__)
+
+# S3 DeleteObjects 單次最多刪除的物件數量
+DELETE_BATCH_SIZE = 1000
+
+# 代表物件不存在的錯誤碼
+NOT_FOUND_ERROR_CODES = {"404", "NoSuchKey", "NotFound"}
+
+
+def is_not_found_error(error: Exception) -> bool:
+    """判斷是否為物件不存在的錯誤"""
+    if isinstance(error, ClientError):
+        return str(error.response.get("Error", {}).get("Code")) in NOT_FOUND_ERROR_CODES
+    return False
+
+
+class AsyncObjectStorage:
+    """非同步物件儲存"""
+
+    def __init__(
+        self,
+        client_factory: Callable[[], Any],
+        max_concurrency: int = R2_STORAGE_MAX_CONCURRENCY
+    ):
+        """
+        Args:
+            client_factory: 建立同步 S3 客戶端的函數（第一次使用時呼叫）
+            max_concurrency: 同時進行的請求上限，亦為執行緒池大小
+        """
+        self._client_factory = client_factory
+        self._client = None
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="r2-storage")
+        # semaphore 需在事件迴圈中建立，依迴圈分別保存
+        self._semaphores: Dict[int, asyncio.Semaphore] = {}
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._client_factory()
+        return self._client
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop_id = id(asyncio.get_running_loop())
+        semaphore = self._semaphores.get(loop_id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._semaphores[loop_id] = semaphore
+        return semaphore
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """在儲存層的執行緒池中執行同步函數（受並行上限限制）"""
+        async with self._semaphore():
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, partial(func, *args, **kwargs)
+            )
+
+    async def call(self, operation: str, **params) -> Any:
+        """呼叫 S3 客戶端的任意操作，例如 call("put_object", Bucket=..., Key=...)"""
+        return await self.run(lambda: getattr(self.client, operation)(**params))
+
+    async def put(self, bucket: str, key: str, body: bytes, content_type: Optional[str] = None, **extra) -> None:
+        """上傳物件，extra 可傳入 CacheControl、ACL 等參數"""
+        params = {"Bucket": bucket, "Key": key, "Body": body, **extra}
+        if content_type:
+            params["ContentType"] = content_type
+        await self.call("put_object", **params)
+
+    async def head(self, bucket: str, key: str) -> Optional[Dict[str, Any]]:
+        """取得物件資訊，物件不存在時返回 None"""
+        try:
+            return await self.call("head_object", Bucket=bucket, Key=key)
+        except Exception as e:
+            if is_not_found_error(e):
+                return None
+            raise
+
+    async def get(self, bucket: str, key: str) -> Optional[bytes]:
+        """讀取物件內容，物件不存在時返回 None"""
+        def read() -> Optional[bytes]:
+            try:
+                return self.client.get_object(Bucket=bucket, Key=key)["Body"].read()
+            except Exception as e:
+                if is_not_found_error(e):
+                    return None
+                raise
+
+        return await self.run(read)
+
+    async def delete(self, bucket: str, key: str) -> None:
+        """刪除物件"""
+        await self.call("delete_object", Bucket=bucket, Key=key)
+
+    async def put_many(
+        self,
+        bucket: str,
+        items: Sequence[Tuple[str, bytes, Optional[str]]],
+        **extra
+    ) -> Dict[str, Optional[str]]:
+        """
+        並行上傳多個物件
+
+        Args:
+            items: [(key, body, content_type)]
+
+        Returns:
+            {key: None（成功）或錯誤訊息}
+        """
+        async def put_one(key: str, body: bytes, content_type: Optional[str]) -> Tuple[str, Optional[str]]:
+            try:
+                await self.put(bucket, key, body, content_type, **extra)
+                return key, None
+            except Exception as e:
+                logger.error(f"上傳 R2 物件 {key} 時發生錯誤: {e}")
+                return key, str(e)
+
+        results = await asyncio.gather(*(put_one(*item) for item in items))
+        return dict(results)
+
+    async def delete_many(self, bucket: str, keys: Iterable[str]) -> Dict[str, Any]:
+        """
+        批次刪除物件（每次最多 1000 個，各批次並行）
+
+        Returns:
+            {"deleted_count": int, "errors": list}
+        """
+        keys = list(keys)
+        result = {"deleted_count": 0, "errors": []}
+
+        async def delete_batch(batch: List[str]) -> None:
+            try:
+                response = await self.call(
+                    "delete_objects",
+                    Bucket=bucket,
+                    Delete={"Objects": [{"Key": key} for key in batch]}
+                )
+                result["deleted_count"] += len(response.get("Deleted", []))
+                for error in response.get("Errors", []):
+                    result["errors"].append(f"{error['Key']}: {error['Message']}")
+            except Exception as e:
+                result["errors"].append(f"批量刪除錯誤: {str(e)}")
+
+        await asyncio.gather(*(
+            delete_batch(keys[i:i + DELETE_BATCH_SIZE]) for i in range(0, len(keys), DELETE_BATCH_SIZE)
+        ))
+        return result
+
+    async def list_keys(self, bucket: str, prefix: str = "", page_size: int = 1000) -> List[str]:
+        """分頁列出前綴下的所有物件鍵值"""
+        def list_all() -> List[str]:
+            paginator = self.client.get_paginator("list_objects_v2")
+            keys = []
+            for page in paginator.paginate(Bucket=bucket, Prefix=prefix, PaginationConfig={"PageSize": page_size}):
+                keys.extend(item["Key"] for item in page.get("Contents", []))
+            return keys
+
+        return await self.run(list_all)
+
+    async def delete_prefix(self, bucket: str, prefix: str) -> Dict[str, Any]:
+        """刪除前綴下的所有物件"""
+        keys = await self.list_keys(bucket, prefix)
+        if not keys:
+            return {"deleted_count": 0, "errors": []}
+        return await self.delete_many(bucket, keys)
+
+    async def presign(self, operation: str, params: Dict[str, Any], expiration: int = 3600) -> str:
+        """生成 presigned URL"""
+        return await self.run(
+            lambda: self.client.generate_presigned_url(operation, Params=params, ExpiresIn=expiration)
+        )
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+# 單例儲存層
+_object_storage: Optional[AsyncObjectStorage] = None
+
+
+def get_object_storage() -> AsyncObjectStorage:
+    """獲取 R2 物件儲存單例"""
+    global _object_storage
+    if _object_storage is None:
+        from .cloudflare import get_r2_client
+
+        _object_storage = AsyncObjectStorage(get_r2_client)
+    return _object_storage
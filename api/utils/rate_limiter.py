@@ -0,0 +1,48 @@
+"""
+非同步令牌桶限流器
+
+用於限制對外部 API（例如 Google Places）的請求速率：
+令牌以固定速率補充，桶滿時最多允許 capacity 個請求瞬間送出，之後平均每秒 rate 個請求。
+"""
+
+import time
+import asyncio
+from typing import Optional
+
+
+class TokenBucket:
+    """非同步令牌桶"""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Args:
+            rate: 每秒補充的令牌數
+            capacity: 桶容量（允許的瞬間請求數），預設等於 rate
+        """
+        if rate <= 0:
+            raise ValueError("rate 必須大於 0")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.acquired_count = 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        """取得令牌，令牌不足時等待到補足為止"""
+        if tokens > self.capacity:
+            raise ValueError("一次取得的令牌數不能超過桶容量")
+
+        # 以鎖保證等待中的請求依序取得令牌
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+            self.acquired_count += 1
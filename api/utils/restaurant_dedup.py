@@ -0,0 +1,293 @@
+"""
+餐廳資料批次去重腳本
+找出 restaurants 表中可能重複的餐廳，輸出合併候選與分數
+
+做法是先分塊（blocking）再比對：
+- 相同 Google Place ID 的餐廳放在同一塊
+- 標準化名稱相同的餐廳放在同一塊，塊內再以 geohash 格子切分，
+  只和距離門檻內可能出現的格子比對
+因此只需比對少量候選配對，十萬筆資料也能在數秒內完成
+
+執行方式:
+python utils/restaurant_dedup.py [--input restaurants.json] [--output result.json]
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from datetime import datetime
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Tuple, Set
+
+# 添加 api 目錄到路徑，以便直接執行此腳本
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.restaurant_helper import normalize_restaurant_name
+from utils.geo_index import (
+    GEO_INDEX_PRECISION,
+    DUPLICATE_DISTANCE_METERS,
+    encode_geohash,
+    geohash_cells_for_radius,
+    haversine_distance,
+    fetch_all_restaurants
+)
+
+logger = logging.getLogger(__name__)
+
+# 各比對項目的分數權重（名稱相同為前提）
+NAME_SCORE = 0.5
+DISTANCE_SCORE = 0.35
+ADDRESS_SCORE = 0.15
+
+# 預設輸出的最低分數
+DEFAULT_MIN_SCORE = 0.5
+
+
+def _coordinates(restaurant: Dict[str, Any]) -> Optional[Tuple[float, float]]:
+    """取得餐廳經緯度，資料不完整時回傳 None"""
+    lat = restaurant.get("latitude")
+    lng = restaurant.get("longitude")
+    if lat is None or lng is None:
+        return None
+    try:
+        return float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+
+
+def score_pair(
+    restaurant1: Dict[str, Any],
+    restaurant2: Dict[str, Any],
+    max_distance_meters: float = DUPLICATE_DISTANCE_METERS
+) -> Optional[Dict[str, Any]]:
+    """
+    計算兩家餐廳為同一家的分數
+
+    判斷條件與 are_restaurants_same 一致：
+    - Google Place ID 相同直接視為同一家；不同則視為不同餐廳
+    - 否則名稱必須相同，且距離在門檻內或地址互相包含
+
+    Returns:
+        {"score", "reasons", "distance_meters"}，不是候選時回傳 None
+    """
+    place_id1 = restaurant1.get("google_place_id")
+    place_id2 = restaurant2.get("google_place_id")
+    if place_id1 and place_id2:
+        if place_id1 != place_id2:
+            return None
+        return {"score": 1.0, "reasons": ["google_place_id"], "distance_meters": None}
+
+    name1 = normalize_restaurant_name(restaurant1.get("name", ""))
+    name2 = normalize_restaurant_name(restaurant2.get("name", ""))
+    if not name1 or name1 != name2:
+        return None
+
+    score = NAME_SCORE
+    reasons = ["name"]
+    distance = None
+
+    coords1 = _coordinates(restaurant1)
+    coords2 = _coordinates(restaurant2)
+    if coords1 and coords2:
+        distance = haversine_distance(coords1[0], coords1[1], coords2[0], coords2[1])
+        if distance < max_distance_meters:
+            score += DISTANCE_SCORE * (1 - distance / max_distance_meters)
+            reasons.append("distance")
+
+    addr1 = (restaurant1.get("address") or "").lower()
+    addr2 = (restaurant2.get("address") or "").lower()
+    if addr1 and addr2 and (addr1 in addr2 or addr2 in addr1):
+        score += ADDRESS_SCORE
+        reasons.append("address")
+
+    if len(reasons) == 1:
+        return None
+
+    return {
+        "score": round(score, 3),
+        "reasons": reasons,
+        "distance_meters": round(distance, 1) if distance is not None else None
+    }
+
+
+def _keep_priority(restaurant: Dict[str, Any]) -> Tuple:
+    """合併時保留哪一筆：有 place_id、非用戶新增、較早建立者優先"""
+    return (
+        0 if restaurant.get("google_place_id") else 1,
+        1 if restaurant.get("is_user_added") else 0,
+        restaurant.get("created_at") or "",
+        str(restaurant.get("id"))
+    )
+
+
+def _candidate_pairs(
+    restaurants: List[Dict[str, Any]],
+    max_distance_meters: float,
+    precision: int
+) -> Set[Tuple[int, int]]:
+    """以 place_id 與「名稱 + geohash 格子」分塊，產生需要比對的配對 (i, j)，i < j"""
+    pairs = set()
+
+    # 1. 相同 place_id 的分塊
+    place_blocks = defaultdict(list)
+    for i, restaurant in enumerate(restaurants):
+        if restaurant.get("google_place_id"):
+            place_blocks[restaurant["google_place_id"]].append(i)
+    for members in place_blocks.values():
+        for a in range(len(members)):
+            for b in range(a + 1, len(members)):
+                pairs.add((members[a], members[b]))
+
+    # 2. 相同標準化名稱的分塊
+    name_blocks = defaultdict(list)
+    for i, restaurant in enumerate(restaurants):
+        name = normalize_restaurant_name(restaurant.get("name", ""))
+        if name:
+            name_blocks[name].append(i)
+
+    for members in name_blocks.values():
+        if len(members) < 2:
+            continue
+
+        # 塊內依 geohash 格子再切分；沒有座標的餐廳只能靠地址比對，與整塊比較
+        cells = defaultdict(list)
+        without_coordinates = []
+        for i in members:
+            coords = _coordinates(restaurants[i])
+            if coords:
+                cells[encode_geohash(coords[0], coords[1], precision)].append(i)
+            else:
+                without_coordinates.append(i)
+
+        for i in members:
+            coords = _coordinates(restaurants[i])
+            if coords:
+                nearby_cells = geohash_cells_for_radius(coords[0], coords[1], max_distance_meters, precision)
+                candidates = [j for cell in nearby_cells for j in cells.get(cell, ())]
+                candidates.extend(without_coordinates)
+            else:
+                candidates = members
+
+            for j in candidates:
+                if i < j:
+                    pairs.add((i, j))
+                elif j < i:
+                    pairs.add((j, i))
+
+    return pairs
+
+
+def find_duplicate_candidates(
+    restaurants: List[Dict[str, Any]],
+    max_distance_meters: float = DUPLICATE_DISTANCE_METERS,
+    min_score: float = DEFAULT_MIN_SCORE,
+    precision: int = GEO_INDEX_PRECISION
+) -> Dict[str, Any]:
+    """
+    找出可能重複的餐廳
+
+    Returns:
+        {
+            "candidates": [{"keep_id", "duplicate_id", "keep_name", "duplicate_name", "score", "reasons", "distance_meters"}],
+            "groups": [{"keep_id", "duplicate_ids"}],  # 以候選配對串連而成的合併群組
+            "compared_pairs": 實際比對的配對數
+        }
+    """
+    pairs = _candidate_pairs(restaurants, max_distance_meters, precision)
+
+    candidates = []
+    parent = list(range(len(restaurants)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for i, j in pairs:
+        result = score_pair(restaurants[i], restaurants[j], max_distance_meters)
+        if not result or result["score"] < min_score:
+            continue
+
+        keep, duplicate = sorted((restaurants[i], restaurants[j]), key=_keep_priority)
+        candidates.append({
+            "keep_id": keep.get("id"),
+            "duplicate_id": duplicate.get("id"),
+            "keep_name": keep.get("name"),
+            "duplicate_name": duplicate.get("name"),
+            **result
+        })
+        parent[find(i)] = find(j)
+
+    candidates.sort(key=lambda c: c["score"], reverse=True)
+
+    clusters = defaultdict(list)
+    for i in {index for pair in pairs for index in pair}:
+        clusters[find(i)].append(restaurants[i])
+
+    groups = []
+    for members in clusters.values():
+        if len(members) < 2:
+            continue
+        members.sort(key=_keep_priority)
+        groups.append({
+            "keep_id": members[0].get("id"),
+            "duplicate_ids": [m.get("id") for m in members[1:]]
+        })
+
+    return {
+        "candidates": candidates,
+        "groups": groups,
+        "compared_pairs": len(pairs)
+    }
+
+
+def main():
+    """主函數"""
+    parser = argparse.ArgumentParser(description="找出 restaurants 表中可能重複的餐廳")
+    parser.add_argument("--input", help="餐廳資料 JSON 檔（未指定時從資料庫讀取）")
+    parser.add_argument("--output", help="結果輸出路徑（預設為 logs/restaurant_dedup_時間.json）")
+    parser.add_argument("--max-distance", type=float, default=DUPLICATE_DISTANCE_METERS, help="視為同一地點的最大距離（公尺）")
+    parser.add_argument("--min-score", type=float, default=DEFAULT_MIN_SCORE, help="輸出候選的最低分數")
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+
+    if args.input:
+        with open(args.input, 'r', encoding='utf-8') as f:
+            restaurants = json.load(f)
+    else:
+        from supabase import create_client
+        from config import SUPABASE_URL, SUPABASE_SERVICE_KEY
+
+        if not SUPABASE_URL or not SUPABASE_SERVICE_KEY:
+            logger.error("缺少必要的Supabase環境變數，無法繼續執行")
+            sys.exit(1)
+        restaurants = fetch_all_restaurants(create_client(SUPABASE_URL, SUPABASE_SERVICE_KEY))
+
+    logger.info(f"共讀取 {len(restaurants)} 家餐廳，開始比對...")
+    start_time = time.time()
+    result = find_duplicate_candidates(restaurants, args.max_distance, args.min_score)
+    elapsed = time.time() - start_time
+
+    logger.info(f"比對完成，耗時 {elapsed:.2f} 秒，比對配對數: {result['compared_pairs']}")
+    logger.info(f"合併候選: {len(result['candidates'])} 組，合併群組: {len(result['groups'])} 個")
+
+    output_path = args.output
+    if not output_path:
+        os.makedirs('logs', exist_ok=True)
+        output_path = f'logs/restaurant_dedup_{datetime.now().strftime("%Y%m%d_%H%M%S")}.json'
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+    logger.info(f"結果已保存: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -225,26 +225,14 @@ def are_restaurants_same(restaurant1: Dict[str, Any], restaurant2: Dict[str, Any
     if (restaurant1.get("latitude") and restaurant1.get("longitude") and 
         restaurant2.get("latitude") and restaurant2.get("longitude")):
         # 計算兩點之間的距離，如果小於100米，認為是同一家餐廳
-        from math import radians, cos, sin, asin, sqrt
-        
-        def haversine(lat1, lon1, lat2, lon2):
-            # 計算兩點間距離的函數（單位：米）
-            R = 6371000  # 地球半徑（米）
-            dLat = radians(lat2 - lat1)
-            dLon = radians(lon2 - lon1)
-            lat1 = radians(lat1)
-            lat2 = radians(lat2)
-            
-            a = sin(dLat/2)**2 + cos(lat1) * cos(lat2) * sin(dLon/2)**2
-            c = 2 * asin(sqrt(a))
-            return R * c
-            
-        distance = haversine(
+        from .geo_index import haversine_distance, DUPLICATE_DISTANCE_METERS
+
+        distance = haversine_distance(
             restaurant1["latitude"], restaurant1["longitude"],
             restaurant2["latitude"], restaurant2["longitude"]
         )
         
-        if distance < 100:  # 距離小於100米
+        if distance < DUPLICATE_DISTANCE_METERS:  # 距離小於100米
             return True
     
     return False 
\ No newline at end of file
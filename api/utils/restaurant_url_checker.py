@@ -17,6 +17,8 @@ from typing import List, Tuple, Dict, Optional, Set
 from dotenv import load_dotenv
 from supabase import create_client, Client
 
+from .name_index import NGramNameIndex
+
 # 配置日誌記錄
 logging.basicConfig(
     level=logging.INFO,
@@ -187,39 +189,95 @@ def is_name_similar(name1: str, name2: str) -> bool:
     
     return False
 
-async def is_restaurant_in_db(url: str, restaurant_name: str, db_restaurants: List[Dict]) -> Tuple[bool, Optional[str]]:
+def extract_short_url_id(url: str) -> Optional[str]:
+    """從Google Maps短網址中提取ID"""
+    if not url:
+        return None
+    short_id_match = re.search(r'maps\.app\.goo\.gl/([A-Za-z0-9]+)', url)
+    return short_id_match.group(1) if short_id_match else None
+
+# 網址中可視為截斷點的分隔字元
+URL_DELIMITERS = "/?&#"
+
+def url_prefix_keys(website: str) -> List[str]:
+    """
+    網址本身與在分隔字元處截斷的所有前綴
+
+    查詢網址等於其中任一個時，即表示資料庫網址以查詢網址開頭（後面接查詢參數或較長的路徑）
+    """
+    keys = [website]
+    start = website.find("://") + 3 if "://" in website else 0
+    for i in range(start, len(website)):
+        if website[i] in URL_DELIMITERS:
+            keys.append(website[:i])
+            keys.append(website[:i + 1])
+    return keys
+
+def build_db_lookup(db_restaurants: List[Dict]) -> Dict:
+    """
+    為資料庫餐廳建立查詢索引，每次執行只建立一次
+    
+    Args:
+        db_restaurants: 資料庫中所有餐廳列表
+        
+    Returns:
+        Dict: {"websites": 網址前綴/短網址ID -> 餐廳名稱, "name_index": 餐廳名稱 n-gram 索引}
+    """
+    websites = {}
+    for db_restaurant in db_restaurants:
+        db_website = db_restaurant.get("website") or ""
+        if not db_website:
+            continue
+        # 與逐筆比對相同，多家餐廳符合時使用第一家
+        for key in url_prefix_keys(db_website):
+            websites.setdefault(key, db_restaurant.get("name", ""))
+        short_id = extract_short_url_id(db_website)
+        if short_id:
+            websites.setdefault(short_id, db_restaurant.get("name", ""))
+    
+    name_index = NGramNameIndex.from_items(
+        db_restaurants,
+        key=lambda r: r.get("name", ""),
+        normalizer=lambda name: clean_restaurant_name(name.lower()).replace(" ", "")
+    )
+    logger.info(f"已建立餐廳查詢索引: {len(name_index)} 個名稱, {len(websites)} 個網址鍵值")
+    
+    return {"websites": websites, "name_index": name_index}
+
+async def is_restaurant_in_db(url: str, restaurant_name: str, db_lookup: Dict) -> Tuple[bool, Optional[str]]:
     """
     檢查餐廳是否存在於資料庫
     
+    網址比對：資料庫網址等於查詢網址，或以查詢網址開頭並在分隔字元（/?&#）處接續，
+    或包含相同的短網址ID；查詢網址只出現在資料庫網址中間時不視為相符
+    
     Args:
         url: Google Maps URL
         restaurant_name: 從URL提取的餐廳名稱
-        db_restaurants: 資料庫中所有餐廳列表
+        db_lookup: build_db_lookup 建立的查詢索引
         
     Returns:
         Tuple[bool, Optional[str]]: 是否存在於資料庫，匹配的餐廳名稱
     """
     try:
-        # 從URL中提取可能的識別符
-        url_id = None
-        short_id_match = re.search(r'maps\.app\.goo\.gl/([A-Za-z0-9]+)', url)
-        if short_id_match:
-            url_id = short_id_match.group(1)
+        # 檢查URL匹配
+        websites = db_lookup["websites"]
+        url_id = extract_short_url_id(url)
+        for key in (url, url_id):
+            if key and key in websites:
+                logger.debug(f"通過URL找到餐廳: {websites[key]}")
+                return True, websites[key]
         
-        # 檢查每個資料庫餐廳
-        for db_restaurant in db_restaurants:
-            db_name = db_restaurant.get("name", "")
-            db_website = db_restaurant.get("website", "")
-            
-            # 檢查URL匹配
-            if url in db_website or (url_id and url_id in db_website):
-                logger.debug(f"通過URL找到餐廳: {db_name}")
-                return True, db_name
-            
-            # 檢查名稱匹配
-            if restaurant_name and is_name_similar(restaurant_name, db_name):
-                logger.debug(f"通過名稱匹配找到餐廳: {db_name}")
-                return True, db_name
+        # 檢查名稱匹配：只比對索引找出的相似名稱與包含關係的名稱
+        if restaurant_name:
+            name_index = db_lookup["name_index"]
+            candidates = name_index.contains_candidates(restaurant_name)
+            candidates += [r for _, r in name_index.top_k(restaurant_name, k=10)]
+            for db_restaurant in candidates:
+                db_name = db_restaurant.get("name", "")
+                if is_name_similar(restaurant_name, db_name):
+                    logger.debug(f"通過名稱匹配找到餐廳: {db_name}")
+                    return True, db_name
         
         logger.debug(f"餐廳不存在於資料庫: {restaurant_name}")
         return False, None
@@ -312,6 +370,7 @@ async def check_restaurants():
     # 從資料庫獲取所有餐廳
     db_restaurants = await get_all_restaurants_from_db()
     logger.info(f"從資料庫獲取到 {len(db_restaurants)} 個餐廳")
+    db_lookup = build_db_lookup(db_restaurants)
     
     # 檢查每個餐廳清單中的URL
     imported_restaurants = []
@@ -336,7 +395,7 @@ async def check_restaurants():
             categories_stats[category]["total"] += 1
             
             # 檢查是否存在於資料庫
-            is_imported, matched_name = await is_restaurant_in_db(url, restaurant_name, db_restaurants)
+            is_imported, matched_name = await is_restaurant_in_db(url, restaurant_name, db_lookup)
             
             # 記錄結果
             if is_imported:
@@ -0,0 +1,114 @@
+"""
+使用者上傳圖片的縮圖
+
+聊天圖片與頭像由前端以 Presigned PUT URL 直接上傳至私有 R2，上傳完成後前端呼叫通知 API，
+由圖片處理服務在背景讀取原圖、產生縮圖並寫在原圖旁邊：
+- chat_images/{dining_event_id}/{message_id}.webp -> chat_images/{dining_event_id}/{message_id}_thumb.webp
+- avatars/{user_id}.webp -> avatars/{user_id}_thumb.webp
+縮圖路徑寫回 chat_messages.thumbnail_path / user_profiles.avatar_thumbnail_path，
+批次讀取 API 預設回傳縮圖 URL，沒有縮圖時退回原圖。
+"""
+
+import logging
+from typing import Any, Dict
+
+from config import R2_PRIVATE_BUCKET_NAME, CHAT_THUMBNAIL_SIZE, AVATAR_THUMBNAIL_SIZE
+from .cloudflare import invalidate_presigned_get_url
+from .image_processor import generate_image_variants
+from .r2_storage import get_object_storage
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SUFFIX = "_thumb"
+
+# 縮圖的 WebP 品質
+THUMBNAIL_QUALITY = 75
+
+
+def get_thumbnail_key(original_key: str) -> str:
+    """原圖路徑對應的縮圖路徑"""
+    return f"{original_key.rsplit('.', 1)[0]}{THUMBNAIL_SUFFIX}.webp"
+
+
+async def create_thumbnail(original_key: str, size: int, service) -> str:
+    """
+    讀取私有 R2 上的原圖並寫入縮圖
+
+    Args:
+        original_key: 原圖路徑
+        size: 縮圖長邊像素
+        service: 圖片處理服務（使用其進程池執行縮圖）
+
+    Returns:
+        縮圖路徑
+
+    Raises:
+        RuntimeError: 原圖尚未上傳或無法處理，交由服務重試
+    """
+    storage = get_object_storage()
+    image_data = await storage.get(R2_PRIVATE_BUCKET_NAME, original_key)
+    if image_data is None:
+        raise RuntimeError(f"原圖尚未上傳: {original_key}")
+
+    variants = await service.run_cpu(generate_image_variants, image_data, (size,), ("webp",), THUMBNAIL_QUALITY)
+    thumbnail = variants[0]
+    thumbnail_key = get_thumbnail_key(original_key)
+
+    await storage.put(R2_PRIVATE_BUCKET_NAME, thumbnail_key, thumbnail["data"], thumbnail["content_type"])
+    # 縮圖內容已更新，舊的讀取 URL 不再重用
+    invalidate_presigned_get_url(thumbnail_key, R2_PRIVATE_BUCKET_NAME)
+
+    logger.info(
+        f"已產生縮圖 {thumbnail_key}: {thumbnail['width']}x{thumbnail['height']}，"
+        f"{len(image_data)} -> {len(thumbnail['data'])} 字節"
+    )
+    return thumbnail_key
+
+
+async def handle_chat_thumbnail_task(payload: Dict[str, Any], service) -> Dict[str, Any]:
+    """
+    圖片處理服務中 "chat_thumbnail" 任務的處理函數
+
+    payload 需包含 dining_event_id、image_path、supabase。
+    訊息可能在圖片上傳後才寫入 chat_messages，找不到訊息時拋出例外，交由服務稍後重試
+    """
+    image_path = payload["image_path"]
+    # 重試時不需重新產生縮圖
+    if not payload.get("thumbnail_path"):
+        payload["thumbnail_path"] = await create_thumbnail(image_path, CHAT_THUMBNAIL_SIZE, service)
+    thumbnail_path = payload["thumbnail_path"]
+
+    supabase = payload["supabase"]
+    result = await service.run_io(
+        lambda: supabase.table("chat_messages")
+        .update({"thumbnail_path": thumbnail_path})
+        .eq("dining_event_id", payload["dining_event_id"])
+        .eq("image_path", image_path)
+        .execute()
+    )
+    if not result.data:
+        raise RuntimeError(f"找不到圖片 {image_path} 對應的聊天訊息")
+    return {"thumbnail_path": thumbnail_path}
+
+
+async def handle_avatar_thumbnail_task(payload: Dict[str, Any], service) -> Dict[str, Any]:
+    """
+    圖片處理服務中 "avatar_thumbnail" 任務的處理函數
+
+    payload 需包含 user_id、avatar_path、supabase
+    """
+    avatar_path = payload["avatar_path"]
+    if not payload.get("thumbnail_path"):
+        payload["thumbnail_path"] = await create_thumbnail(avatar_path, AVATAR_THUMBNAIL_SIZE, service)
+    thumbnail_path = payload["thumbnail_path"]
+
+    supabase = payload["supabase"]
+    result = await service.run_io(
+        lambda: supabase.table("user_profiles")
+        .update({"avatar_thumbnail_path": thumbnail_path})
+        .eq("user_id", payload["user_id"])
+        .execute()
+    )
+    if not result.data:
+        raise RuntimeError(f"找不到用戶 {payload['user_id']} 的資料")
+    return {"thumbnail_path": thumbnail_path}
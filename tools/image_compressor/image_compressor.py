@@ -1,13 +1,31 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 
+import io
 import os
 import sys
+import json
+import time
+import hashlib
 import argparse
-from PIL import Image, ImageOps
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from PIL import Image, ImageMath, ImageOps
 from pathlib import Path
 import logging
 
+# 壓縮記錄檔名（記錄每個輸入檔案的內容雜湊與壓縮設定，用於跳過未變更的檔案）
+MANIFEST_FILENAME = '.image_compressor_manifest.json'
+
+SUPPORTED_FORMATS = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp'}
+
+# 品質搜尋的預設下限
+DEFAULT_MIN_QUALITY = 30
+
+# SSIM 計算的區塊大小與常數（8 位元影像）
+SSIM_BLOCK_SIZE = 8
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+
 def setup_logging():
     """設置日誌記錄"""
     logging.basicConfig(
@@ -48,22 +66,192 @@ def calculate_new_size(original_size, max_dimension):
     
     return (new_width, new_height)
 
-def compress_image(input_path, output_path, max_dimension=None, output_format=None, quality=85):
+def _save_kwargs(output_format, source_format, quality):
+    """依輸出格式決定 Image.save 的參數"""
+    if output_format == 'JPEG':
+        return {
+            'format': 'JPEG',
+            'quality': quality,
+            'optimize': True
+        }
+    elif output_format == 'PNG':
+        return {
+            'format': 'PNG',
+            'optimize': True
+        }
+    elif output_format == 'WEBP':
+        return {
+            'format': 'WEBP',
+            'quality': quality,
+            'optimize': True
+        }
+    # 保持原格式
+    save_kwargs = {'format': source_format, 'optimize': True}
+    if source_format == 'JPEG':
+        save_kwargs['quality'] = quality
+    return save_kwargs
+
+def _encode(img, save_kwargs, quality=None):
+    """將圖片編碼為位元組"""
+    if quality is not None and 'quality' in save_kwargs:
+        save_kwargs = dict(save_kwargs, quality=quality)
+    buffer = io.BytesIO()
+    img.save(buffer, **save_kwargs)
+    return buffer.getvalue()
+
+def compute_ssim(reference, candidate, block_size=SSIM_BLOCK_SIZE):
     """
-    壓縮單張圖片
+    計算兩張圖片亮度的 SSIM（以不重疊的區塊計算後取平均，1.0 表示完全相同）
+    
+    只使用 Pillow：區塊平均值以 BOX 縮圖取得，逐區塊的 SSIM 以 ImageMath 計算
+    
+    Args:
+        reference (PIL.Image): 參考圖片（壓縮前）
+        candidate (PIL.Image): 比較的圖片（壓縮後），尺寸需與參考圖片相同
+        block_size (int): 區塊邊長
+    
+    Returns:
+        float: SSIM 分數
+    """
+    x = reference.convert('L').convert('F')
+    y = candidate.convert('L').convert('F')
+    
+    # 裁切為區塊的整數倍；圖片小於一個區塊時以整張圖為一個區塊
+    block_w = min(block_size, x.width)
+    block_h = min(block_size, x.height)
+    blocks = (x.width // block_w, x.height // block_h)
+    box = (0, 0, blocks[0] * block_w, blocks[1] * block_h)
+    x, y = x.crop(box), y.crop(box)
+    
+    def block_mean(image):
+        return image.resize(blocks, Image.Resampling.BOX)
+    
+    xx = ImageMath.lambda_eval(lambda a: a['x'] * a['x'], x=x)
+    yy = ImageMath.lambda_eval(lambda a: a['y'] * a['y'], y=y)
+    xy = ImageMath.lambda_eval(lambda a: a['x'] * a['y'], x=x, y=y)
+    ssim_map = ImageMath.lambda_eval(
+        lambda a: ((a['mx'] * a['my'] * 2 + SSIM_C1) * ((a['mxy'] - a['mx'] * a['my']) * 2 + SSIM_C2))
+        / ((a['mx'] * a['mx'] + a['my'] * a['my'] + SSIM_C1)
+           * (a['mxx'] - a['mx'] * a['mx'] + a['myy'] - a['my'] * a['my'] + SSIM_C2)),
+        mx=block_mean(x), my=block_mean(y),
+        mxx=block_mean(xx), myy=block_mean(yy), mxy=block_mean(xy)
+    )
+    # ImageStat 對 F 模式以直方圖計算，無法得到精確平均值；區塊數量不多，直接加總
+    values = list(ssim_map.getdata())
+    return sum(values) / len(values)
+
+def search_lowest_quality(is_acceptable, low, high, start=None):
+    """
+    以二分搜尋找出讓 is_acceptable(quality) 成立的最低品質（假設品質越高越容易成立）
+    
+    Args:
+        is_acceptable (callable): 判斷品質是否達標的函數
+        low (int): 品質下限
+        high (int): 品質上限
+        start (int or None): 起始猜測（例如上次的結果），接近答案時只需少數幾次編碼
+    
+    Returns:
+        int or None: 達標的最低品質，上限仍不達標時返回 None
+    """
+    results = {}
+    
+    def check(quality):
+        if quality not in results:
+            results[quality] = is_acceptable(quality)
+        return results[quality]
+    
+    if start is not None and low <= start <= high:
+        if check(start):
+            # 上次的品質仍達標，確認再低一級是否也達標
+            if start == low or not check(start - 1):
+                return start
+            high = start - 1
+        else:
+            low = start + 1
+    
+    answer = None
+    while low <= high:
+        middle = (low + high) // 2
+        if check(middle):
+            answer = middle
+            high = middle - 1
+        else:
+            low = middle + 1
+    return answer
+
+def _find_quality(img, save_kwargs, max_quality, min_quality, target_ssim, max_bytes, start_quality):
+    """
+    依目標 SSIM 與位元組上限尋找編碼品質
+    
+    先找出達到目標 SSIM 的最低品質；若該品質超過位元組上限，改用不超過上限的最高品質。
+    
+    Returns:
+        tuple: (品質, 編碼後資料, SSIM 分數或 None, 是否達成所有目標)
+    """
+    encoded = {}
+    
+    def encode(quality):
+        if quality not in encoded:
+            encoded[quality] = _encode(img, save_kwargs, quality)
+        return encoded[quality]
+    
+    def meets_ssim(quality):
+        candidate = Image.open(io.BytesIO(encode(quality)))
+        return compute_ssim(img, candidate) >= target_ssim
+    
+    quality, targets_met = max_quality, True
+    if target_ssim is not None:
+        found = search_lowest_quality(meets_ssim, min_quality, max_quality, start_quality)
+        if found is None:
+            targets_met = False
+        else:
+            quality = found
+    
+    if max_bytes is not None and len(encode(quality)) > max_bytes:
+        # 不超過上限的最高品質 = 超過上限的最低品質的前一級
+        over_budget_from = search_lowest_quality(lambda q: len(encode(q)) > max_bytes, min_quality, quality)
+        if over_budget_from > min_quality:
+            quality = over_budget_from - 1
+        else:
+            quality = min_quality
+        # 為了符合上限而降低品質時，SSIM 目標（若有）不再保證達成
+        targets_met = len(encode(quality)) <= max_bytes and target_ssim is None
+    
+    data = encode(quality)
+    ssim = compute_ssim(img, Image.open(io.BytesIO(data))) if target_ssim is not None else None
+    return quality, data, ssim, targets_met
+
+def compress_image_to(input_path, output_path, max_dimension=None, output_format=None, quality=85,
+                      target_ssim=None, max_bytes=None, min_quality=DEFAULT_MIN_QUALITY, start_quality=None):
+    """
+    壓縮單張圖片並返回結果（不寫日誌，可在子進程中執行）
     
     Args:
         input_path (str): 輸入圖片路徑
-        output_path (str): 輸出圖片路徑
+        output_path (str or None): 輸出圖片路徑，None 表示只在記憶體中壓縮以估算大小（dry-run）
         max_dimension (int or None): 最大邊長，如果為 None 則不調整尺寸
         output_format (str): 輸出格式 ('JPEG', 'PNG', 'WEBP' 等)
-        quality (int): JPEG 品質 (1-100)
+        quality (int): JPEG 品質 (1-100)，指定目標時為搜尋的品質上限
+        target_ssim (float or None): 目標 SSIM，指定時搜尋達標的最低品質
+        max_bytes (int or None): 位元組上限，指定時品質不會讓檔案超過此大小
+        min_quality (int): 搜尋的品質下限
+        start_quality (int or None): 搜尋的起始品質（上次的結果）
     
     Returns:
-        bool: 是否成功壓縮
+        dict: 壓縮結果，包含 success、原始/壓縮後大小與尺寸、使用的品質，失敗時包含 error
     """
+    result = {
+        'input': input_path,
+        'output': output_path,
+        'success': False,
+        'original_size': 0,
+        'compressed_size': 0
+    }
     try:
+        result['original_size'] = os.path.getsize(input_path)
         with Image.open(input_path) as img:
+            source_format = img.format
+            
             # 轉換 RGBA 到 RGB（如果輸出格式不支持透明度）
             if output_format == 'JPEG' and img.mode in ('RGBA', 'LA', 'P'):
                 # 創建白色背景
@@ -77,60 +265,133 @@ def compress_image(input_path, output_path, max_dimension=None, output_format=No
             img = ImageOps.exif_transpose(img)
             
             # 計算新尺寸
-            original_size = img.size
-            new_size = calculate_new_size(original_size, max_dimension)
+            original_dimensions = img.size
+            new_dimensions = calculate_new_size(original_dimensions, max_dimension)
             
             # 調整圖片大小
-            if new_size != original_size:
-                img = img.resize(new_size, Image.Resampling.LANCZOS)
+            if new_dimensions != original_dimensions:
+                img = img.resize(new_dimensions, Image.Resampling.LANCZOS)
             
-            # 保存圖片
-            save_kwargs = {}
-            if output_format == 'JPEG':
-                save_kwargs = {
-                    'format': 'JPEG',
-                    'quality': quality,
-                    'optimize': True
-                }
-            elif output_format == 'PNG':
-                save_kwargs = {
-                    'format': 'PNG',
-                    'optimize': True
-                }
-            elif output_format == 'WEBP':
-                save_kwargs = {
-                    'format': 'WEBP',
-                    'quality': quality,
-                    'optimize': True
-                }
+            # 壓縮到記憶體，再寫入檔案（dry-run 時不寫入）
+            save_kwargs = _save_kwargs(output_format, source_format, quality)
+            ssim, targets_met = None, None
+            if (target_ssim is not None or max_bytes is not None) and 'quality' in save_kwargs:
+                quality, data, ssim, targets_met = _find_quality(
+                    img, save_kwargs, quality, min_quality, target_ssim, max_bytes, start_quality
+                )
             else:
-                # 保持原格式
-                save_kwargs = {'optimize': True}
-                if img.format == 'JPEG':
-                    save_kwargs['quality'] = quality
-            
-            img.save(output_path, **save_kwargs)
-            
-            # 計算壓縮比
-            file_original_size = os.path.getsize(input_path)
-            compressed_size = os.path.getsize(output_path)
-            compression_ratio = (1 - compressed_size / file_original_size) * 100
-            
-            logging.info(f"✓ {input_path} -> {output_path}")
-            if new_size != original_size:
-                logging.info(f"  尺寸: {original_size} -> {new_size}")
-            else:
-                logging.info(f"  尺寸: {original_size} (未調整)")
-            logging.info(f"  大小: {file_original_size:,} bytes -> {compressed_size:,} bytes ({compression_ratio:.1f}% 減少)")
-            
-            return True
-            
+                data = _encode(img, save_kwargs)
+        
+        if output_path is not None:
+            with open(output_path, 'wb') as f:
+                f.write(data)
+        
+        result.update({
+            'success': True,
+            'compressed_size': len(data),
+            'output_sha256': hashlib.sha256(data).hexdigest(),
+            'original_dimensions': original_dimensions,
+            'new_dimensions': new_dimensions,
+            'quality': quality if 'quality' in save_kwargs else None,
+            'ssim': ssim,
+            'targets_met': targets_met
+        })
     except Exception as e:
-        logging.error(f"✗ 處理 {input_path} 時發生錯誤: {str(e)}")
+        result['error'] = str(e)
+    return result
+
+def log_result(result, dry_run=False):
+    """記錄單張圖片的壓縮結果"""
+    if not result['success']:
+        logging.error(f"✗ 處理 {result['input']} 時發生錯誤: {result.get('error')}")
+        return
+    
+    compression_ratio = (1 - result['compressed_size'] / result['original_size']) * 100 if result['original_size'] else 0
+    if dry_run:
+        logging.info(f"○ {result['input']} (預估)")
+    else:
+        logging.info(f"✓ {result['input']} -> {result['output']}")
+    if result['new_dimensions'] != result['original_dimensions']:
+        logging.info(f"  尺寸: {result['original_dimensions']} -> {result['new_dimensions']}")
+    else:
+        logging.info(f"  尺寸: {result['original_dimensions']} (未調整)")
+    logging.info(f"  大小: {result['original_size']:,} bytes -> {result['compressed_size']:,} bytes ({compression_ratio:.1f}% 減少)")
+    if result.get('targets_met') is not None:
+        ssim_text = f", SSIM: {result['ssim']:.4f}" if result.get('ssim') is not None else ""
+        logging.info(f"  品質: {result['quality']}{ssim_text}{'' if result['targets_met'] else ' (未達成目標)'}")
+
+def compress_image(input_path, output_path, max_dimension=None, output_format=None, quality=85):
+    """
+    壓縮單張圖片
+    
+    Args:
+        input_path (str): 輸入圖片路徑
+        output_path (str): 輸出圖片路徑
+        max_dimension (int or None): 最大邊長，如果為 None 則不調整尺寸
+        output_format (str): 輸出格式 ('JPEG', 'PNG', 'WEBP' 等)
+        quality (int): JPEG 品質 (1-100)
+    
+    Returns:
+        bool: 是否成功壓縮
+    """
+    result = compress_image_to(input_path, output_path, max_dimension, output_format, quality)
+    log_result(result)
+    return result['success']
+
+def file_sha256(path):
+    """計算檔案內容的 SHA-256"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def get_output_path(image_file, output_format=None, overwrite=False, output_suffix="_compressed"):
+    """決定圖片的輸出路徑"""
+    if output_format:
+        suffix = '.jpg' if output_format.upper() == 'JPEG' else f'.{output_format.lower()}'
+    else:
+        suffix = image_file.suffix
+    
+    if overwrite:
+        # 更改副檔名
+        return image_file.with_suffix(suffix)
+    # 創建新檔名
+    return image_file.parent / f"{image_file.stem}{output_suffix}{suffix}"
+
+def load_manifest(directory):
+    """讀取目錄中的壓縮記錄（不存在或損壞時返回空記錄）"""
+    manifest_path = Path(directory) / MANIFEST_FILENAME
+    if not manifest_path.exists():
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('files', {})
+    except (OSError, ValueError) as e:
+        logging.warning(f"無法讀取壓縮記錄 {manifest_path}，將重新處理所有檔案: {str(e)}")
+        return {}
+
+def save_manifest(directory, files):
+    """寫入壓縮記錄（先寫入暫存檔再取代，避免中斷時損壞）"""
+    manifest_path = Path(directory) / MANIFEST_FILENAME
+    temp_path = manifest_path.with_suffix('.tmp')
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': 1, 'files': files}, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(temp_path, manifest_path)
+
+def _is_up_to_date(entry, input_hash, settings, output_path):
+    """檢查記錄中的結果是否仍適用：設定相同、輸入未變更且輸出檔案仍存在"""
+    if not entry or entry.get('settings') != settings:
         return False
+    if not output_path.exists() or output_path.stat().st_size != entry.get('compressed_size'):
+        return False
+    # 覆寫原檔時，輸入檔案即為上次的輸出
+    return input_hash in (entry.get('input_sha256'), entry.get('output_sha256'))
 
 def process_directory(directory, max_dimension=None, output_format=None, quality=90, 
-                     recursive=False, overwrite=False, output_suffix="_compressed"):
+                     recursive=False, overwrite=False, output_suffix="_compressed",
+                     jobs=1, dry_run=False, use_manifest=True,
+                     target_ssim=None, max_bytes=None, min_quality=DEFAULT_MIN_QUALITY):
     """
     處理目錄中的所有圖片
     
@@ -142,59 +403,135 @@ def process_directory(directory, max_dimension=None, output_format=None, quality
         recursive (bool): 是否遞歸處理子目錄
         overwrite (bool): 是否覆寫原檔案
         output_suffix (str): 輸出檔案後綴
+        jobs (int): 並行的進程數，1 表示在目前進程中依序處理
+        dry_run (bool): 只估算壓縮後大小，不寫入任何檔案
+        use_manifest (bool): 使用壓縮記錄跳過未變更的檔案
+        target_ssim (float or None): 目標 SSIM，逐張搜尋達標的最低品質
+        max_bytes (int or None): 每張圖片的位元組上限
+        min_quality (int): 品質搜尋的下限
+    
+    Returns:
+        dict: 處理結果摘要
     """
+    start_time = time.perf_counter()
     directory = Path(directory)
-    supported_formats = {'.jpg', '.jpeg', '.png', '.bmp', '.tiff', '.tif', '.webp'}
+    summary = {
+        'found': 0, 'processed': 0, 'skipped': 0, 'failed': 0,
+        'original_bytes': 0, 'compressed_bytes': 0, 'elapsed': 0.0
+    }
     
     # 取得所有圖片檔案
     if recursive:
-        image_files = [f for f in directory.rglob('*') if f.suffix.lower() in supported_formats]
+        image_files = [f for f in directory.rglob('*') if f.is_file() and f.suffix.lower() in SUPPORTED_FORMATS]
     else:
-        image_files = [f for f in directory.iterdir() if f.is_file() and f.suffix.lower() in supported_formats]
+        image_files = [f for f in directory.iterdir() if f.is_file() and f.suffix.lower() in SUPPORTED_FORMATS]
+    
+    manifest = load_manifest(directory) if use_manifest else {}
+    settings = {
+        'max_dimension': max_dimension,
+        'output_format': output_format,
+        'quality': quality,
+        'overwrite': overwrite,
+        'output_suffix': None if overwrite else output_suffix,
+        'target_ssim': target_ssim,
+        'max_bytes': max_bytes,
+        'min_quality': min_quality if target_ssim is not None or max_bytes is not None else None
+    }
+    
+    # 排除先前產生的輸出檔案，避免重複壓縮
+    previous_outputs = {entry['output'] for key, entry in manifest.items() if entry.get('output') != key}
+    if not overwrite:
+        image_files = [f for f in image_files if not f.stem.endswith(output_suffix)]
+    image_files = [f for f in sorted(image_files) if f.relative_to(directory).as_posix() not in previous_outputs]
     
     if not image_files:
         logging.warning(f"在 {directory} 中沒有找到支援的圖片檔案")
-        return
+        return summary
     
+    summary['found'] = len(image_files)
     logging.info(f"找到 {len(image_files)} 個圖片檔案")
     
-    successful = 0
-    failed = 0
-    
+    # 找出需要處理的檔案
+    pending = []
     for image_file in image_files:
+        relative_path = image_file.relative_to(directory).as_posix()
+        output_path = get_output_path(image_file, output_format, overwrite, output_suffix)
         try:
-            if overwrite:
-                output_path = image_file
-                if output_format:
-                    # 更改副檔名
-                    if output_format.upper() == 'JPEG':
-                        output_path = image_file.with_suffix('.jpg')
-                    else:
-                        output_path = image_file.with_suffix(f'.{output_format.lower()}')
-            else:
-                # 創建新檔名
-                stem = image_file.stem
-                if output_format:
-                    if output_format.upper() == 'JPEG':
-                        suffix = '.jpg'
-                    else:
-                        suffix = f'.{output_format.lower()}'
-                else:
-                    suffix = image_file.suffix
-                
-                output_path = image_file.parent / f"{stem}{output_suffix}{suffix}"
-            
-            if compress_image(str(image_file), str(output_path), max_dimension, 
-                            output_format, quality):
-                successful += 1
-            else:
-                failed += 1
-                
-        except Exception as e:
-            logging.error(f"處理 {image_file} 時發生未預期的錯誤: {str(e)}")
-            failed += 1
+            input_hash = file_sha256(image_file)
+        except OSError as e:
+            logging.error(f"讀取 {image_file} 時發生錯誤: {str(e)}")
+            summary['failed'] += 1
+            continue
+        if use_manifest and _is_up_to_date(manifest.get(relative_path), input_hash, settings, output_path):
+            summary['skipped'] += 1
+            continue
+        pending.append((relative_path, image_file, output_path, input_hash))
     
-    logging.info(f"處理完成！成功: {successful}, 失敗: {failed}")
+    if summary['skipped']:
+        logging.info(f"跳過 {summary['skipped']} 個未變更的檔案")
+    
+    def handle_result(relative_path, output_path, input_hash, result):
+        log_result(result, dry_run)
+        if not result['success']:
+            summary['failed'] += 1
+            return
+        summary['processed'] += 1
+        summary['original_bytes'] += result['original_size']
+        summary['compressed_bytes'] += result['compressed_size']
+        if not dry_run:
+            manifest[relative_path] = {
+                'input_sha256': input_hash,
+                'output_sha256': result['output_sha256'],
+                'output': output_path.relative_to(directory).as_posix(),
+                'settings': settings,
+                'original_size': result['original_size'],
+                'compressed_size': result['compressed_size'],
+                'quality': result.get('quality'),
+                'ssim': result.get('ssim')
+            }
+    
+    # 品質搜尋以上次的結果作為起點
+    tasks = [
+        (str(image_file), None if dry_run else str(output_path), max_dimension, output_format, quality,
+         target_ssim, max_bytes, min_quality, (manifest.get(relative_path) or {}).get('quality'))
+        for relative_path, image_file, output_path, _ in pending
+    ]
+    try:
+        if jobs > 1 and len(pending) > 1:
+            with ProcessPoolExecutor(max_workers=jobs) as executor:
+                futures = {
+                    executor.submit(compress_image_to, *task): item
+                    for task, item in zip(tasks, pending)
+                }
+                for future in as_completed(futures):
+                    relative_path, _, output_path, input_hash = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'input': futures[future][1], 'success': False, 'error': str(e)}
+                    handle_result(relative_path, output_path, input_hash, result)
+        else:
+            for task, (relative_path, _, output_path, input_hash) in zip(tasks, pending):
+                handle_result(relative_path, output_path, input_hash, compress_image_to(*task))
+    finally:
+        if use_manifest and not dry_run and pending:
+            save_manifest(directory, manifest)
+    
+    summary['elapsed'] = time.perf_counter() - start_time
+    log_summary(summary, dry_run)
+    return summary
+
+def log_summary(summary, dry_run=False):
+    """記錄處理摘要：數量、節省的位元組與處理速度"""
+    elapsed = summary['elapsed'] or 1e-9
+    original_bytes = summary['original_bytes']
+    saved_bytes = original_bytes - summary['compressed_bytes']
+    saved_ratio = saved_bytes / original_bytes * 100 if original_bytes else 0
+    
+    logging.info("-" * 50)
+    logging.info(f"{'預估完成' if dry_run else '處理完成'}！成功: {summary['processed']}, 跳過: {summary['skipped']}, 失敗: {summary['failed']}")
+    logging.info(f"{'預估大小' if dry_run else '大小'}: {original_bytes:,} bytes -> {summary['compressed_bytes']:,} bytes (節省 {saved_bytes:,} bytes, {saved_ratio:.1f}%)")
+    logging.info(f"耗時: {summary['elapsed']:.2f} 秒, 速度: {summary['processed'] / elapsed:.1f} 張/秒, {original_bytes / elapsed / 1024 / 1024:.2f} MB/秒")
 
 def main():
     parser = argparse.ArgumentParser(
@@ -206,6 +543,10 @@ def main():
   python image_compressor.py --max-size 512 --format png --recursive
   python image_compressor.py --max-size 256 --format jpeg --overwrite
   python image_compressor.py --directory ./avatar --max-size 128 --format webp
+  python image_compressor.py --recursive --max-size 512 --format webp --jobs 8
+  python image_compressor.py --recursive --max-size 512 --format webp --dry-run
+  python image_compressor.py --max-size 512 --format webp --quality 90 --target-ssim 0.97
+  python image_compressor.py --max-size 512 --format jpeg --max-bytes 60000
         """
     )
     
@@ -256,6 +597,46 @@ def main():
         help='輸出檔案後綴 (當不覆寫時使用, 預設: _compressed)'
     )
     
+    parser.add_argument(
+        '--target-ssim',
+        type=float,
+        default=None,
+        help='目標 SSIM (0-1)，逐張搜尋達到此相似度的最低品質，--quality 為搜尋上限 (僅 JPEG/WEBP)'
+    )
+    
+    parser.add_argument(
+        '--max-bytes',
+        type=int,
+        default=None,
+        help='每張圖片的位元組上限，逐張搜尋不超過上限的最高品質 (僅 JPEG/WEBP)'
+    )
+    
+    parser.add_argument(
+        '--min-quality',
+        type=int,
+        default=DEFAULT_MIN_QUALITY,
+        help=f'品質搜尋的下限 (預設: {DEFAULT_MIN_QUALITY})'
+    )
+    
+    parser.add_argument(
+        '--jobs', '-j',
+        type=int,
+        default=1,
+        help='並行的進程數，0 表示使用所有 CPU 核心 (預設: 1)'
+    )
+    
+    parser.add_argument(
+        '--dry-run',
+        action='store_true',
+        help='只估算壓縮後大小，不寫入任何檔案'
+    )
+    
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='忽略壓縮記錄，重新處理所有檔案'
+    )
+    
     args = parser.parse_args()
     
     # 設置日誌
@@ -270,6 +651,26 @@ def main():
         logging.error("品質必須在 1-100 之間")
         sys.exit(1)
     
+    if args.target_ssim is not None and not 0 < args.target_ssim <= 1:
+        logging.error("目標 SSIM 必須在 0-1 之間")
+        sys.exit(1)
+    
+    if args.max_bytes is not None and args.max_bytes <= 0:
+        logging.error("位元組上限必須大於 0")
+        sys.exit(1)
+    
+    search_quality = args.target_ssim is not None or args.max_bytes is not None
+    if search_quality and not 1 <= args.min_quality <= args.quality:
+        logging.error("品質下限必須在 1 與 --quality 之間")
+        sys.exit(1)
+    # 未開啟品質搜尋時不使用品質下限，只需確保不超過 --quality
+    min_quality = min(args.min_quality, args.quality)
+    
+    if args.jobs < 0:
+        logging.error("進程數不能小於 0")
+        sys.exit(1)
+    jobs = args.jobs or os.cpu_count() or 1
+    
     # 標準化格式名稱
     output_format = None
     if args.format:
@@ -292,6 +693,13 @@ def main():
     logging.info(f"覆寫原檔: {'是' if args.overwrite else '否'}")
     if not args.overwrite:
         logging.info(f"檔案後綴: {args.suffix}")
+    if args.target_ssim is not None:
+        logging.info(f"目標 SSIM: {args.target_ssim} (品質 {min_quality}-{args.quality})")
+    if args.max_bytes is not None:
+        logging.info(f"位元組上限: {args.max_bytes:,} bytes")
+    logging.info(f"並行進程: {jobs}")
+    if args.dry_run:
+        logging.info("模式: 只估算大小 (dry-run)")
     logging.info("-" * 50)
     
     # 處理圖片
@@ -302,7 +710,13 @@ def main():
         args.quality,
         args.recursive,
         args.overwrite,
-        args.suffix
+        args.suffix,
+        jobs=jobs,
+        dry_run=args.dry_run,
+        use_manifest=not args.force,
+        target_ssim=args.target_ssim,
+        max_bytes=args.max_bytes,
+        min_quality=min_quality
     )
 
 if __name__ == "__main__":